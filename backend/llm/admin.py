@@ -0,0 +1,5 @@
+# llm/admin.py
+from django.contrib import admin
+from .models import LLMResponse
+
+admin.site.register(LLMResponse)
@@ -0,0 +1,220 @@
+# llm/gateway.py
+"""
+LLM gateway: mọi lời gọi LLM của app đi qua đây thay vì mỗi điện thoại tự gọi Gemini.
+
+- Cache theo đầu vào đã chuẩn hóa (llm/prompts.py): khóa = sha256(task, model,
+  inputs), lưu ở bảng llm_responses nên dùng chung giữa các worker và người
+  dùng; quá LLM_CACHE_TTL_HOURS thì sinh lại và ghi đè.
+- Gộp yêu cầu (coalescing): các request trùng khóa đến trong lúc provider đang
+  sinh thì chờ kết quả của request đầu tiên thay vì gọi thêm lần nữa (trong
+  một process; giữa các process thì bảng cache chặn từ lần sau).
+- Thống kê: số token, độ trễ provider (p50/p95), tỉ lệ cache hit theo tác vụ
+  trong process (LLMMetrics); từng dòng cache giữ số token, độ trễ và số lần hit.
+
+Lỗi provider (mạng, quota, phản hồi hỏng) ném LLMProviderError và không được cache.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .providers import LLMProviderError, llm_provider
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL_HOURS = 168
+LATENCY_WINDOW = 1000
+
+
+def cache_key(task, model, inputs):
+    payload = json.dumps([task, model, inputs], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else None
+
+
+class LLMMetrics:
+    """Bộ đếm theo tác vụ trong process: nguồn kết quả, token và độ trễ provider."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._tasks = {}
+
+    def record(self, task, source, latency_ms=None, prompt_tokens=0, completion_tokens=0):
+        """source: 'cache' | 'coalesced' | 'provider' | 'error'."""
+        with self._lock:
+            stats = self._tasks.setdefault(task, {
+                'requests': 0, 'cache': 0, 'coalesced': 0, 'provider': 0, 'error': 0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'latencies': deque(maxlen=self.window),
+            })
+            stats['requests'] += 1
+            stats[source] += 1
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            if source == 'provider' and latency_ms is not None:
+                stats['latencies'].append(latency_ms)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for task, stats in self._tasks.items():
+                latencies = list(stats['latencies'])
+                result[task] = {
+                    **{name: value for name, value in stats.items() if name != 'latencies'},
+                    'hit_rate': round((stats['cache'] + stats['coalesced']) / stats['requests'], 4),
+                    'provider_latency_ms': {
+                        'p50': _percentile(latencies, 0.5),
+                        'p95': _percentile(latencies, 0.95),
+                        'max': max(latencies) if latencies else None,
+                    },
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._tasks.clear()
+
+
+class _Call:
+    """Một lời gọi provider đang chạy; các request trùng khóa chờ ở đây."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.output = None
+        self.error = None
+
+
+class LLMGateway:
+    def __init__(self, provider=None, ttl_hours=None):
+        self._provider = provider
+        self._ttl_hours = ttl_hours
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.metrics = LLMMetrics()
+
+    @property
+    def provider(self):
+        return self._provider or llm_provider()
+
+    @property
+    def ttl(self):
+        hours = self._ttl_hours
+        if hours is None:
+            hours = getattr(settings, 'LLM_CACHE_TTL_HOURS', DEFAULT_CACHE_TTL_HOURS)
+        return datetime.timedelta(hours=hours)
+
+    def generate(self, task, inputs, prompt, parse, json_mode=False):
+        """
+        Kết quả của `task` cho `inputs` (đã chuẩn hóa): từ cache, từ lời gọi trùng đang
+        chạy, hoặc gọi provider với `prompt()` rồi `parse(text, inputs)`.
+        Trả về {'output': ..., 'source': 'cache' | 'coalesced' | 'provider'}.
+        """
+        provider = self.provider
+        key = cache_key(task, provider.model, inputs)
+        output = self._lookup(key)
+        if output is not None:
+            self.metrics.record(task, 'cache')
+            return {'output': output, 'source': 'cache'}
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            if not call.done.wait(getattr(settings, 'LLM_TIMEOUT', 30) + 5):
+                self.metrics.record(task, 'error')
+                raise LLMProviderError('Hết thời gian chờ kết quả LLM.')
+            if call.error is not None:
+                self.metrics.record(task, 'error')
+                raise call.error
+            self.metrics.record(task, 'coalesced')
+            return {'output': call.output, 'source': 'coalesced'}
+
+        try:
+            # Leader trước có thể đã ghi cache và gỡ khỏi _inflight giữa lần tra ở trên và lúc đăng ký
+            output = self._lookup(key)
+            if output is not None:
+                call.output = output
+                self.metrics.record(task, 'cache')
+                return {'output': output, 'source': 'cache'}
+            started = time.perf_counter()
+            try:
+                completion = provider.generate(task, prompt(), json_mode=json_mode)
+                output = parse(completion['text'], inputs)
+                latency_ms = int((time.perf_counter() - started) * 1000)
+                self._store(key, task, provider.model, inputs, output, completion, latency_ms)
+            except Exception as exc:
+                call.error = exc
+                self.metrics.record(task, 'error')
+                logger.warning('LLM %s (%s): %s', task, provider.model, exc)
+                raise
+            call.output = output
+            self.metrics.record(task, 'provider', latency_ms, completion['prompt_tokens'],
+                                completion['completion_tokens'])
+            logger.info('LLM %s (%s): %d ms, %d + %d token', task, provider.model, latency_ms,
+                        completion['prompt_tokens'], completion['completion_tokens'])
+            return {'output': output, 'source': 'provider'}
+        finally:
+            # Kết quả đã nằm trong bảng cache trước khi gỡ khỏi _inflight
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def _lookup(self, key):
+        from .models import LLMResponse
+
+        now = timezone.now()
+        row = (LLMResponse.objects.filter(key=key, created_at__gte=now - self.ttl)
+               .values_list('pk', 'output').first())
+        if row is None:
+            return None
+        LLMResponse.objects.filter(pk=row[0]).update(hit_count=F('hit_count') + 1, last_hit_at=now)
+        return row[1]
+
+    def _store(self, key, task, model, inputs, output, completion, latency_ms):
+        from .models import LLMResponse
+
+        LLMResponse.objects.bulk_create([LLMResponse(
+            key=key, task=task, model=model, inputs=inputs, output=output,
+            prompt_tokens=completion['prompt_tokens'], completion_tokens=completion['completion_tokens'],
+            latency_ms=latency_ms, hit_count=0, created_at=timezone.now(), last_hit_at=None,
+        )], update_conflicts=True, unique_fields=['key'], update_fields=[
+            'output', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'hit_count', 'created_at', 'last_hit_at',
+        ])
+
+
+llm_gateway = LLMGateway()
+
+
+def recommend_routes(location='', interests=(), difficulty=None, duration_days=1, group_size=1,
+                     route_ids=(), gateway=None):
+    """Gợi ý tối đa 5 route kèm ai_reason: {'output': [{'id', 'ai_reason'}], 'source': ...}."""
+    from .prompts import parse_recommendations, recommendation_inputs, recommendation_prompt
+
+    gateway = gateway or llm_gateway
+    inputs, rows = recommendation_inputs(location, interests, difficulty, duration_days, group_size, route_ids)
+    if not rows:
+        return {'output': [], 'source': 'empty'}
+    return gateway.generate('recommend_routes', inputs, lambda: recommendation_prompt(inputs, rows),
+                            parse_recommendations, json_mode=True)
+
+
+def route_note(name, location=None, description=None, tags=(), gateway=None):
+    """Ghi chú ngắn (địa hình, thời tiết, lưu ý) cho một cung đường: {'output': str, 'source': ...}."""
+    from .prompts import parse_note, route_note_inputs, route_note_prompt
+
+    gateway = gateway or llm_gateway
+    return gateway.generate('route_note', route_note_inputs(name, location, description, tags),
+                            lambda: route_note_prompt(name, location, description, tags), parse_note)
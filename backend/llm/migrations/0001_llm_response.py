@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('task', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('inputs', models.JSONField()),
+                ('output', models.JSONField()),
+                ('prompt_tokens', models.IntegerField(default=0)),
+                ('completion_tokens', models.IntegerField(default=0)),
+                ('latency_ms', models.IntegerField(default=0)),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'llm_responses',
+                'indexes': [models.Index(fields=['task', 'created_at'], name='llm_response_task_idx')],
+            },
+        ),
+    ]
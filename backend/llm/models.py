@@ -0,0 +1,29 @@
+# llm/models.py
+from django.db import models
+from django.utils import timezone
+
+
+class LLMResponse(models.Model):
+    """
+    Kết quả LLM đã sinh, dùng chung cho mọi người dùng (xem llm/gateway.py).
+    key = sha256(task, model, đầu vào đã chuẩn hóa); hết LLM_CACHE_TTL_HOURS thì sinh lại và ghi đè.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    task = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    inputs = models.JSONField()
+    output = models.JSONField()
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    latency_ms = models.IntegerField(default=0)
+    # Số lần được trả từ cache thay vì gọi provider
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'llm_responses'
+        indexes = [models.Index(fields=['task', 'created_at'], name='llm_response_task_idx')]
+
+    def __str__(self):
+        return f'{self.task} {self.key[:12]}'
@@ -0,0 +1,164 @@
+# llm/prompts.py
+"""
+Chuẩn hóa đầu vào và soạn prompt cho từng tác vụ LLM (chuyển từ
+frontend/lib/services/gemini_service.dart sang backend).
+
+Đầu vào được chuẩn hóa trước khi làm khóa cache, để những yêu cầu cùng ý
+nghĩa dùng chung một kết quả: bỏ dấu / chữ hoa / khoảng trắng thừa, sở thích
+sắp xếp lại và bỏ trùng, "Người mới" = "easy", "3 ngày 2 đêm" = 3, danh
+sách route sắp xếp theo id.
+"""
+import hashlib
+import json
+import re
+
+from plan.itinerary import difficulty_name
+from plan.search import fold
+from plan.tag_index import normalize_tags
+
+from .providers import LLMProviderError, parse_json
+
+MAX_RECOMMENDATIONS = 5
+MAX_CANDIDATES = 100
+# Mô tả route bị cắt bớt trong prompt để tiết kiệm token
+DESCRIPTION_CHARS = 300
+HARD_ELEVATION_M = 1000
+
+_INTEREST_SEPARATORS = re.compile(r'[,;/|\n]+')
+_NUMBER = re.compile(r'\d+')
+
+
+def normalize_interests(value):
+    """'Săn mây, suối' / ['suối', 'Săn Mây'] -> ('san may', 'suoi')"""
+    if isinstance(value, str):
+        value = _INTEREST_SEPARATORS.split(value)
+    if not isinstance(value, (list, tuple, set)):
+        return ()
+    return tuple(sorted({fold(item) for item in value if isinstance(item, str) and fold(item)}))
+
+
+def normalize_count(value, default=1):
+    """3 / '3' / '3 ngày 2 đêm' -> 3"""
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return max(int(value), 1)
+    match = _NUMBER.search(str(value or ''))
+    return max(int(match.group()), 1) if match else default
+
+
+def route_rows(route_ids):
+    """Dữ liệu route đưa vào prompt và phiên bản (hash) của chúng."""
+    from plan.models import Route
+
+    rows = [
+        {'id': route_id, 'name': name, 'description': (description or '')[:DESCRIPTION_CHARS],
+         'difficulty': 'Khó' if (elevation_gain_m or 0) > HARD_ELEVATION_M else 'Dễ',
+         'terrain': sorted(normalize_tags(tags))}
+        for route_id, name, description, elevation_gain_m, tags in (
+            Route.objects.filter(pk__in=route_ids).order_by('id')
+            .values_list('id', 'name', 'description', 'elevation_gain_m', 'tags')
+        )
+    ]
+    version = hashlib.sha256(json.dumps(rows, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return rows, version[:16]
+
+
+# --- Gợi ý cung đường (GeminiService.recommendRoutes) ---
+
+def recommendation_inputs(location='', interests=(), difficulty=None, duration_days=1, group_size=1,
+                          route_ids=()):
+    """Đầu vào đã chuẩn hóa; route_ids rỗng = MAX_CANDIDATES route đầu tiên."""
+    from plan.models import Route
+
+    route_ids = sorted({int(route_id) for route_id in route_ids})
+    if not route_ids:
+        route_ids = list(Route.objects.order_by('id').values_list('id', flat=True)[:MAX_CANDIDATES])
+    rows, version = route_rows(route_ids[:MAX_CANDIDATES])
+    inputs = {
+        'location': fold(location),
+        'interests': list(normalize_interests(interests)),
+        'difficulty': difficulty_name(difficulty),
+        'duration_days': normalize_count(duration_days),
+        'group_size': normalize_count(group_size),
+        'route_ids': [row['id'] for row in rows],
+        # Sửa nội dung route thì khóa cũng đổi
+        'routes_version': version,
+    }
+    return inputs, rows
+
+
+def recommendation_prompt(inputs, rows):
+    return f'''
+Bạn là chuyên gia tư vấn du lịch Trekking tại Việt Nam.
+
+HỒ SƠ NGƯỜI DÙNG:
+- Muốn đi: {inputs['location'] or 'đi đâu cũng được'}
+- Kinh nghiệm: {inputs['difficulty']}
+- Thời gian: {inputs['duration_days']} ngày
+- Nhóm: {inputs['group_size']} người
+- Sở thích/Yêu cầu: {', '.join(inputs['interests']) or 'không có'}
+
+DANH SÁCH CUNG ĐƯỜNG HIỆN CÓ (JSON):
+{json.dumps(rows, ensure_ascii=False)}
+
+NHIỆM VỤ:
+1. Chọn ra tối đa {MAX_RECOMMENDATIONS} cung đường phù hợp nhất.
+2. Viết một đoạn "ai_reason" (khoảng 2 câu) thật ngắn gọn, súc tích, giải thích tại sao cung này hợp với họ (xưng "bạn").
+3. Nếu người dùng thích "Săn mây", ưu tiên cung cao. Nếu thích "Suối/Thác", ưu tiên cung có nước.
+
+TRẢ VỀ KẾT QUẢ DẠNG JSON MẢNG (Array):
+[{{"id": 123, "ai_reason": "Cung này hợp vì..."}}]
+'''.strip()
+
+
+def parse_recommendations(text, inputs):
+    """[{'id', 'ai_reason'}]: chỉ giữ id có trong danh sách ứng viên, bỏ trùng, tối đa MAX_RECOMMENDATIONS."""
+    items = parse_json(text)
+    if not isinstance(items, list):
+        raise LLMProviderError('Gợi ý phải là một mảng JSON.')
+    allowed, seen, result = set(inputs['route_ids']), set(), []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        route_id, reason = item.get('id'), item.get('ai_reason')
+        if isinstance(route_id, str) and route_id.isdigit():
+            route_id = int(route_id)
+        if route_id in allowed and route_id not in seen and isinstance(reason, str):
+            seen.add(route_id)
+            result.append({'id': route_id, 'ai_reason': reason.strip()})
+    return result[:MAX_RECOMMENDATIONS]
+
+
+# --- Ghi chú cung đường (GeminiService.generateRouteNote) ---
+
+def route_note_inputs(name, location=None, description=None, tags=()):
+    return {'name': fold(name), 'location': fold(location),
+            'description': fold((description or '')[:DESCRIPTION_CHARS]),
+            'tags': sorted({fold(tag) for tag in normalize_tags(tags)})}
+
+
+def route_note_prompt(name, location=None, description=None, tags=()):
+    place = f' tại {location}' if location else ''
+    known = ''
+    if description:
+        known += f'\nMô tả hiện có: {description[:DESCRIPTION_CHARS]}'
+    if normalize_tags(tags):
+        known += f"\nĐặc điểm: {', '.join(sorted(normalize_tags(tags)))}"
+    return f'''
+Bạn là chuyên gia du lịch mạo hiểm. Hãy viết một ghi chú ngắn gọn (khoảng 3-4 câu) về cung đường trekking: "{name}"{place}.{known}
+
+Nội dung cần bao gồm 3 ý chính:
+1. Địa hình chung (dốc, bằng phẳng, rừng rậm, hay núi đá...).
+2. Thời tiết điển hình cần lưu ý.
+3. Một lưu ý đặc biệt quan trọng cho người đi cung này.
+
+Vui lòng trả về dưới dạng văn bản liền mạch hoặc gạch đầu dòng, giọng văn hữu ích, cảnh báo an toàn nếu cần. Không cần tiêu đề.
+'''.strip()
+
+
+def parse_note(text, inputs=None):
+    text = (text or '').strip()
+    if not text:
+        raise LLMProviderError('Ghi chú rỗng.')
+    return text
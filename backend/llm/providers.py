@@ -0,0 +1,119 @@
+# llm/providers.py
+"""
+Provider sinh văn bản cho LLM gateway (llm/gateway.py).
+
+Mọi provider có cùng giao diện:
+
+    provider.model                                  # tên model, nằm trong khóa cache
+    provider.generate(task, prompt, json_mode=False)
+        -> {'text': '...', 'prompt_tokens': 812, 'completion_tokens': 95}
+
+Lỗi mạng / quota / phản hồi hỏng đều ném LLMProviderError.
+- 'gemini' : Gemini REST API (cùng model app Flutter đang gọi), cần GEMINI_API_KEY.
+- 'fake'   : sinh tất định tại chỗ, không gọi mạng; dùng khi dev / test.
+"""
+import hashlib
+import json
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+
+class LLMProviderError(Exception):
+    pass
+
+
+def estimate_tokens(text):
+    # Xấp xỉ ~4 ký tự một token, đủ cho thống kê khi provider không báo số token
+    return max(len(text or '') // 4, 1)
+
+
+class FakeLLMProvider:
+    """
+    Provider giả lập. `responder(task, prompt) -> str` quyết định nội dung trả về;
+    mặc định: '[]' khi cần JSON, ngược lại một ghi chú ngắn suy ra từ prompt.
+    `delay` (giây) mô phỏng độ trễ mạng; `calls` đếm số lần thật sự được gọi.
+    """
+    model = 'fake'
+
+    def __init__(self, responder=None, delay=0.0):
+        self.responder = responder
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, task, prompt, json_mode=False):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.responder is not None:
+            text = self.responder(task, prompt)
+        elif json_mode:
+            text = '[]'
+        else:
+            digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+            text = f'Ghi chú tự động ({task}, {digest}).'
+        return {'text': text, 'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(text)}
+
+
+class GeminiProvider:
+    url = 'https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent'
+    temperature = 0.7
+
+    @property
+    def model(self):
+        return getattr(settings, 'LLM_MODEL', 'gemini-flash-latest')
+
+    def generate(self, task, prompt, json_mode=False):
+        api_key = getattr(settings, 'GEMINI_API_KEY', '')
+        if not api_key:
+            raise LLMProviderError('GEMINI_API_KEY chưa được cấu hình.')
+        config = {'temperature': self.temperature}
+        if json_mode:
+            config['responseMimeType'] = 'application/json'
+        try:
+            response = requests.post(
+                self.url.format(model=self.model), params={'key': api_key},
+                json={'contents': [{'parts': [{'text': prompt}]}], 'generationConfig': config},
+                timeout=getattr(settings, 'LLM_TIMEOUT', 30),
+            )
+            response.raise_for_status()
+            payload = response.json()
+            text = ''.join(part.get('text', '') for part in payload['candidates'][0]['content']['parts'])
+        except (requests.RequestException, ValueError, KeyError, IndexError) as exc:
+            raise LLMProviderError(f'Gemini: {exc}') from exc
+        usage = payload.get('usageMetadata', {})
+        return {
+            'text': text,
+            'prompt_tokens': usage.get('promptTokenCount') or estimate_tokens(prompt),
+            'completion_tokens': usage.get('candidatesTokenCount') or estimate_tokens(text),
+        }
+
+
+LLM_PROVIDERS = {
+    'fake': FakeLLMProvider(),
+    'gemini': GeminiProvider(),
+}
+
+
+def llm_provider(name=None):
+    name = getattr(settings, 'LLM_PROVIDER', 'fake') if name is None else name
+    try:
+        return LLM_PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM_PROVIDER: {name!r}")
+
+
+def parse_json(text):
+    """JSON từ phản hồi LLM, bỏ rào ```json ... ``` nếu model thêm vào."""
+    text = (text or '').strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    try:
+        return json.loads(text)
+    except ValueError as exc:
+        raise LLMProviderError(f'Phản hồi không phải JSON: {exc}') from exc
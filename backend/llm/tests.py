@@ -0,0 +1,168 @@
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from plan.models import Route
+from .gateway import LLMGateway, llm_gateway, recommend_routes, route_note
+from .models import LLMResponse
+from .providers import FakeLLMProvider, LLMProviderError, parse_json
+
+
+User = get_user_model()
+
+
+def make_route(name, tags, elevation=500.0, **extra):
+    return Route.objects.create(name=name, description=f"Mô tả {name}", total_distance_km=10.0,
+                                elevation_gain_m=elevation, path_coordinates={}, tags=tags, **extra)
+
+
+def recommend_all(task, prompt):
+    # Chọn mọi route có trong prompt, thêm một id lạ và một id trùng
+    if task != 'recommend_routes':
+        return f'Ghi chú {task}'
+    rows = json.loads(prompt.split('(JSON):\n', 1)[1].split('\n', 1)[0])
+    items = [{'id': row['id'], 'ai_reason': f"Hợp với bạn: {row['name']}"} for row in rows]
+    return json.dumps(items + [{'id': 999999, 'ai_reason': 'x'}] + items[:1])
+
+
+class LLMGatewayTests(APITestCase):
+    def setUp(self):
+        self.provider = FakeLLMProvider(responder=recommend_all)
+        self.gateway = LLMGateway(provider=self.provider)
+        self.routes = [make_route("Lảo Thẩn", ["Săn mây"], 1500), make_route("Tà Năng", ["Đồi cỏ"], 800)]
+        self.route_ids = [route.pk for route in self.routes]
+
+    def test_equivalent_inputs_share_one_generation(self):
+        first = recommend_routes("Lào Cai", "Săn mây, Suối", "Người mới", "2 ngày 1 đêm", 4,
+                                 self.route_ids, gateway=self.gateway)
+        self.assertEqual(first['source'], 'provider')
+        self.assertEqual([item['id'] for item in first['output']], self.route_ids)
+
+        second = recommend_routes(" lao  cai", ["suối", "SĂN MÂY", "suối"], "easy", 2, "4",
+                                  self.route_ids[::-1], gateway=self.gateway)
+        self.assertEqual(second, {'output': first['output'], 'source': 'cache'})
+        self.assertEqual(self.provider.calls, 1)
+
+        entry = LLMResponse.objects.get()
+        self.assertEqual(entry.hit_count, 1)
+        self.assertEqual(entry.inputs['interests'], ['san may', 'suoi'])
+        self.assertGreater(entry.prompt_tokens, 0)
+
+        recommend_routes("Lào Cai", "Săn mây", "hard", 2, 4, self.route_ids, gateway=self.gateway)
+        self.assertEqual(self.provider.calls, 2)
+
+    def test_route_changes_and_expiry_regenerate(self):
+        recommend_routes("", (), None, 1, 1, self.route_ids, gateway=self.gateway)
+        self.routes[0].description = "Đường mới mở"
+        self.routes[0].save()
+        recommend_routes("", (), None, 1, 1, self.route_ids, gateway=self.gateway)
+        self.assertEqual(self.provider.calls, 2)
+
+        expired = LLMGateway(provider=self.provider, ttl_hours=0)
+        self.assertEqual(recommend_routes("", (), None, 1, 1, self.route_ids, gateway=expired)['source'],
+                         'provider')
+        self.assertEqual(LLMResponse.objects.count(), 2)
+
+    def test_provider_errors_are_not_cached(self):
+        def broken(task, prompt):
+            raise LLMProviderError('quota')
+
+        gateway = LLMGateway(provider=FakeLLMProvider(responder=broken))
+        with self.assertRaises(LLMProviderError):
+            route_note("Lảo Thẩn", gateway=gateway)
+        gateway = LLMGateway(provider=FakeLLMProvider(responder=lambda task, prompt: 'không phải JSON'))
+        with self.assertRaises(LLMProviderError):
+            recommend_routes(route_ids=self.route_ids, gateway=gateway)
+        self.assertFalse(LLMResponse.objects.exists())
+        self.assertEqual(gateway.metrics.snapshot()['recommend_routes']['error'], 1)
+
+    def test_new_leader_rechecks_cache(self):
+        first = route_note("Lảo Thẩn", gateway=self.gateway)
+        keys = []
+
+        def lookup(key):
+            # Lần tra đầu trượt như khi leader trước ghi cache ngay sau đó
+            keys.append(key)
+            return None if len(keys) == 1 else LLMGateway._lookup(self.gateway, key)
+
+        with mock.patch.object(self.gateway, '_lookup', side_effect=lookup):
+            second = route_note("Lảo Thẩn", gateway=self.gateway)
+        self.assertEqual(second, {'output': first['output'], 'source': 'cache'})
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(self.provider.calls, 1)
+
+    def test_parse_json_strips_code_fence(self):
+        self.assertEqual(parse_json('```json\n[{"id": 1}]\n```'), [{'id': 1}])
+
+    def test_endpoints(self):
+        url = reverse('llm-recommend-routes')
+        payload = {'location': 'Lào Cai', 'interests': ['Săn mây'], 'difficulty': 'Người mới',
+                   'duration_days': 2, 'group_size': 4, 'route_ids': self.route_ids}
+        self.assertIn(self.client.post(url, payload, format='json').status_code,
+                      (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+        user = User.objects.create_user(email='trekker@example.com', password='password123')
+        self.client.force_authenticate(user=user)
+        with mock.patch.object(llm_gateway, '_provider', self.provider):
+            llm_gateway.metrics.reset()
+            response = self.client.post(url, payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), 2)
+            self.assertEqual(self.client.post(url, payload, format='json').data['source'], 'cache')
+            self.assertEqual(self.client.post(url, {'route_ids': ['a']}, format='json').status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+            note_url = reverse('llm-route-note', args=[self.routes[0].pk])
+            self.assertEqual(self.client.get(note_url).data['source'], 'provider')
+            self.routes[0].ai_note = "Ghi chú đã lưu"
+            self.routes[0].save()
+            self.assertEqual(self.client.get(note_url).data, {
+                'route_id': self.routes[0].pk, 'note': "Ghi chú đã lưu", 'source': 'route'})
+
+            metrics_url = reverse('llm-metrics')
+            self.assertEqual(self.client.get(metrics_url).status_code, status.HTTP_403_FORBIDDEN)
+            self.client.force_authenticate(user=User.objects.create_superuser(
+                email='admin@example.com', password='password123'))
+            data = self.client.get(metrics_url).data
+        self.assertEqual(data['process']['recommend_routes']['provider'], 1)
+        self.assertEqual(data['process']['recommend_routes']['cache'], 1)
+        self.assertEqual(data['cache']['recommend_routes']['hits'], 1)
+        self.assertGreater(data['cache']['recommend_routes']['saved_tokens'], 0)
+
+        with mock.patch.object(llm_gateway, '_provider', FakeLLMProvider(responder=lambda task, prompt: '')):
+            response = self.client.get(reverse('llm-route-note', args=[self.routes[1].pk]))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class LLMCoalescingTests(TransactionTestCase):
+    def test_concurrent_identical_prompts_call_provider_once(self):
+        provider = FakeLLMProvider(delay=0.3)
+        gateway = LLMGateway(provider=provider)
+        results = []
+
+        def worker():
+            try:
+                results.append(route_note("Tà Xùa", "Sơn La", gateway=gateway))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(len({result['output'] for result in results}), 1)
+        self.assertEqual(sorted(result['source'] for result in results).count('provider'), 1)
+        self.assertEqual(LLMResponse.objects.count(), 1)
+        stats = gateway.metrics.snapshot()['route_note']
+        self.assertEqual(stats['requests'], 6)
+        self.assertEqual(stats['coalesced'] + stats['cache'], 5)
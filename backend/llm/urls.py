@@ -0,0 +1,14 @@
+# llm/urls.py
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # /api/llm/recommend-routes/ (POST, gợi ý cung đường qua LLM gateway, xem llm/gateway.py)
+    path('llm/recommend-routes/', views.RouteRecommendationView.as_view(), name='llm-recommend-routes'),
+
+    # /api/llm/routes/<id>/note/ (GET, ghi chú AI của cung đường)
+    path('llm/routes/<int:pk>/note/', views.RouteNoteView.as_view(), name='llm-route-note'),
+
+    # /api/llm/metrics/ (GET, admin)
+    path('llm/metrics/', views.LLMMetricsView.as_view(), name='llm-metrics'),
+]
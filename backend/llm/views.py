@@ -0,0 +1,86 @@
+# llm/views.py
+from django.db.models import Count, F, Sum
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from plan.models import Route
+
+from .gateway import llm_gateway, recommend_routes, route_note
+from .models import LLMResponse
+from .prompts import MAX_CANDIDATES
+from .providers import LLMProviderError
+
+
+class LLMUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Dịch vụ AI tạm thời không khả dụng, vui lòng thử lại sau.'
+    default_code = 'llm_unavailable'
+
+
+# Tương ứng: POST /api/llm/recommend-routes/
+#   {"location": "Lào Cai", "interests": ["Săn mây"], "difficulty": "Người mới",
+#    "duration_days": 2, "group_size": 4, "route_ids": [1, 2, 3]}
+class RouteRecommendationView(APIView):
+    """
+    Gợi ý tối đa 5 cung đường kèm ai_reason (thay GeminiService.recommendRoutes).
+    Yêu cầu cùng ý nghĩa dùng chung kết quả đã sinh (xem llm/gateway.py).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        data = request.data
+        route_ids = data.get('route_ids') or []
+        if not isinstance(route_ids, list) or not all(isinstance(route_id, int) for route_id in route_ids):
+            raise ValidationError({'route_ids': 'Phải là danh sách id (số nguyên).'})
+        if len(route_ids) > MAX_CANDIDATES:
+            raise ValidationError({'route_ids': f'Tối đa {MAX_CANDIDATES} id mỗi lần gọi.'})
+        try:
+            result = recommend_routes(
+                location=data.get('location') or '',
+                interests=data.get('interests') or (),
+                difficulty=data.get('difficulty'),
+                duration_days=data.get('duration_days') or data.get('duration'),
+                group_size=data.get('group_size'),
+                route_ids=route_ids,
+            )
+        except LLMProviderError:
+            raise LLMUnavailable()
+        return Response({'results': result['output'], 'source': result['source']})
+
+
+# Tương ứng: GET /api/llm/routes/<id>/note/?location=Lào Cai
+class RouteNoteView(APIView):
+    """Ghi chú AI của cung đường (thay GeminiService.generateRouteNote); ưu tiên Route.ai_note đã lưu."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        route = Route.objects.only('id', 'name', 'description', 'tags', 'ai_note').filter(pk=pk).first()
+        if route is None:
+            raise NotFound('Không tìm thấy cung đường.')
+        if route.ai_note:
+            return Response({'route_id': route.pk, 'note': route.ai_note, 'source': 'route'})
+        try:
+            result = route_note(route.name, request.query_params.get('location'), route.description, route.tags)
+        except LLMProviderError:
+            raise LLMUnavailable()
+        return Response({'route_id': route.pk, 'note': result['output'], 'source': result['source']})
+
+
+# Tương ứng: GET /api/llm/metrics/ (admin)
+class LLMMetricsView(APIView):
+    """Thống kê của process này (token, độ trễ, cache hit) và của toàn bộ bảng cache."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        cache = {
+            row.pop('task'): row for row in LLMResponse.objects.values('task').annotate(
+                entries=Count('id'),
+                hits=Sum('hit_count'),
+                tokens=Sum(F('prompt_tokens') + F('completion_tokens')),
+                # Token đã không phải trả nhờ cache
+                saved_tokens=Sum(F('hit_count') * (F('prompt_tokens') + F('completion_tokens'))),
+            ).order_by('task')
+        }
+        return Response({'process': llm_gateway.metrics.snapshot(), 'cache': cache})
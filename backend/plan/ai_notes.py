@@ -0,0 +1,117 @@
+# plan/ai_notes.py
+"""
+Sinh trước Route.ai_note ở backend (thay vì mỗi lần xem route, điện thoại lại
+gọi GeminiService.generateRouteNote).
+
+- Chỉ sinh cho route chưa có ghi chú hoặc có name / description / tags (hoặc
+  model của provider) đổi so với lúc sinh: so sha256 của chúng với
+  Route.ai_note_hash. Ghi chú giả lập của provider 'fake' vì thế được sinh lại
+  khi chuyển sang model thật.
+- Gọi provider của LLM gateway (llm/providers.py; 'fake' khi dev / test) từ
+  một thread pool, luôn có tối đa `concurrency` lời gọi đang chạy.
+- Ghi bằng bulk_update mỗi `batch_size` ghi chú: mỗi lô là một checkpoint,
+  chạy bị ngắt thì chạy lại chỉ làm tiếp những route chưa ghi.
+- Route lỗi (mạng, quota, phản hồi rỗng) giữ nguyên, lần chạy sau thử lại.
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm.prompts import parse_note, route_note_prompt
+from llm.providers import LLMProviderError, llm_provider
+
+from .tag_index import normalize_tags
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi đổi prompt để sinh lại toàn bộ ghi chú
+NOTE_VERSION = 1
+SCAN_CHUNK = 500
+
+
+def note_hash(name, description, tags, model):
+    payload = json.dumps([NOTE_VERSION, model, name or '', description or '', sorted(normalize_tags(tags))],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pending_notes(queryset, model, force=False):
+    """Các route cần sinh ghi chú, duyệt theo id từng SCAN_CHUNK dòng."""
+    queryset = queryset.order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values_list(
+            'id', 'name', 'description', 'tags', 'ai_note', 'ai_note_hash')[:SCAN_CHUNK])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        for route_id, name, description, tags, note, current in rows:
+            digest = note_hash(name, description, tags, model)
+            if force or not note or digest != current:
+                yield {'id': route_id, 'name': name, 'description': description, 'tags': tags, 'hash': digest}
+
+
+def _generate(provider, route):
+    completion = provider.generate('route_note', route_note_prompt(
+        route['name'], description=route['description'], tags=route['tags']))
+    return parse_note(completion['text']), completion
+
+
+def generate_route_notes(queryset=None, provider=None, concurrency=4, batch_size=50, force=False, limit=None):
+    """
+    Sinh ai_note cho các route cần sinh (trong `queryset` hoặc mọi route).
+    Trả về {'generated', 'failed', 'prompt_tokens', 'completion_tokens'}.
+    """
+    from .models import Route
+
+    provider = provider or llm_provider()
+    queryset = Route.objects.all() if queryset is None else queryset
+    pending = pending_notes(queryset, provider.model, force=force)
+    stats = {'generated': 0, 'failed': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+    done = []
+
+    def flush():
+        Route.objects.bulk_update(
+            [Route(pk=route['id'], ai_note=note, ai_note_hash=route['hash']) for route, note in done],
+            ['ai_note', 'ai_note_hash'],
+        )
+        done.clear()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        running, submitted = {}, 0
+
+        def submit():
+            nonlocal submitted
+            if limit is not None and submitted >= limit:
+                return
+            route = next(pending, None)
+            if route is not None:
+                running[pool.submit(_generate, provider, route)] = route
+                submitted += 1
+
+        try:
+            for _ in range(concurrency):
+                submit()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    route = running.pop(future)
+                    try:
+                        note, completion = future.result()
+                    except LLMProviderError as exc:
+                        stats['failed'] += 1
+                        logger.warning('ai_note route %s: %s', route['id'], exc)
+                    else:
+                        done.append((route, note))
+                        stats['generated'] += 1
+                        stats['prompt_tokens'] += completion['prompt_tokens']
+                        stats['completion_tokens'] += completion['completion_tokens']
+                        if len(done) >= batch_size:
+                            flush()
+                    submit()
+        finally:
+            # Bị ngắt (Ctrl+C) vẫn ghi những ghi chú đã xong
+            if done:
+                flush()
+    return stats
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PlanConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'plan'
+
+    def ready(self):
+        # Đăng ký signal giữ cho các index trong bộ nhớ đồng bộ với bảng routes
+        from . import signals  # noqa: F401
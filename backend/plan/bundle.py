@@ -0,0 +1,427 @@
+# plan/bundle.py
+"""
+Gói offline cho một Plan: các cung như Sơn Đoòng, Pu Ta Leng không có
+sóng, nên mọi thứ app cần để hiện lộ trình được gói sẵn vào một file
+SQLite theo chuẩn MBTiles (vector tile 'routes' / 'waypoints' của
+plan/tiles.py, nén gzip) kèm các bảng:
+- documents: plan, route, profile (hồ sơ độ cao), waypoints, hazards,
+  equipment (checklist), dạng JSON camelCase như API.
+- geometry: track ở các mức rút gọn (encoded polyline) và track gốc.
+- thumbnails: ảnh gallery đã thu nhỏ (cần Pillow; không có thì bỏ qua).
+  Ảnh chỉ được tải trong `manage.py build_plan_bundles` (cache_thumbnails),
+  không bao giờ trong request; bundle kèm những thumbnail đã có sẵn.
+
+Bundle được dựng một lần rồi cache trên đĩa theo hash đầu vào
+(BUNDLE_CACHE_DIR/plan-<id>-<hash>.mbtiles). bundle_signature() chỉ đọc vài
+cột nhỏ (plan, route + path_hash, route / waypoint / hazard quanh vùng tile,
+equipment, thumbnail đã cache) nên rẻ; collect_bundle() (serialize, hồ sơ độ
+cao, render tile...) chỉ chạy khi chưa có file cho hash đó. File được phục vụ
+kèm HTTP Range để app tải tiếp khi mất kết nối giữa chừng.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+
+import requests
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from djangorestframework_camel_case.util import camelize
+
+from .elevation import build_route_profile
+from .geometry import path_hash
+from .simplify import build_route_geometry, encode_polyline
+from .tiles import BUFFER, WAYPOINT_MIN_ZOOM, path_bounds, route_bounds, tile_bounds, tile_cache, tile_range
+from .track import route_points
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow là tùy chọn: không có thì bundle không kèm thumbnail
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_TILE_ZOOMS = (8, 10, 12, 14)
+# Waypoint / hazard thuộc về route nếu cách track không quá khoảng này
+WAYPOINT_CORRIDOR_KM = 1.0
+THUMBNAIL_PX = 320
+RANGE_CHUNK_BYTES = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+CREATE TABLE documents (name TEXT PRIMARY KEY, body TEXT);
+CREATE TABLE geometry (zoom INTEGER, tolerance_m REAL, points INTEGER, polyline TEXT);
+CREATE TABLE thumbnails (url TEXT PRIMARY KEY, position INTEGER, width INTEGER, height INTEGER,
+                         mime_type TEXT, data BLOB);
+"""
+
+
+def bundle_directory():
+    return getattr(settings, 'BUNDLE_CACHE_DIR', '')
+
+
+def thumbnail_path(url):
+    name = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+    return os.path.join(bundle_directory(), 'thumbnails', f'{name}.jpg')
+
+
+def _camel(data):
+    return camelize(json.loads(json.dumps(data, default=str)))
+
+
+def _waypoints_and_hazards(points):
+    from routes.models import Waypoint
+    from routes.spatial import waypoints_near_path
+    from safety.models import Static_Hazard
+
+    from .geometry import cumulative_distance_km
+
+    near = waypoints_near_path(points, WAYPOINT_CORRIDOR_KM)
+    distances = cumulative_distance_km(points)
+    rows = Waypoint.objects.in_bulk([waypoint_id for waypoint_id, _, _ in near])
+    waypoints = [
+        {'id': waypoint_id, 'route_id': rows[waypoint_id].route_id, 'name': rows[waypoint_id].name,
+         'description': rows[waypoint_id].description, 'type': rows[waypoint_id].type,
+         'latitude': rows[waypoint_id].latitude, 'longitude': rows[waypoint_id].longitude,
+         'distance_along_km': round(float(distances[index]), 3), 'offset_km': offset}
+        for waypoint_id, index, offset in near if waypoint_id in rows
+    ]
+    trail_ids = sorted({waypoint['route_id'] for waypoint in waypoints})
+    hazards = list(Static_Hazard.objects.filter(route_id__in=trail_ids).order_by('id')
+                   .values('id', 'route_id', 'description', 'condition'))
+    return waypoints, hazards
+
+
+def _equipment(checklist):
+    """Checklist {category: [{id, quantity, reason}]} kèm thông tin món đồ từ bảng equipment."""
+    from .models import Equipment
+
+    items = [item for value in (checklist or {}).values() if isinstance(value, list)
+             for item in value if isinstance(item, dict)]
+    ids = {item.get('id') for item in items}
+    catalog = {
+        str(row['id']): row for row in Equipment.objects.filter(
+            pk__in=[int(i) for i in ids if str(i).isdigit()]
+        ).values('id', 'name', 'category', 'weight_grams', 'price', 'image_url')
+    }
+    return {'checklist': checklist, 'items': [catalog[key] for key in sorted(catalog, key=int)]}
+
+
+def collect_bundle(plan):
+    """Nội dung bundle (chưa có thumbnail) và hash của nó."""
+    from .serializers import PlanSerializer, RouteProfileSerializer, RouteSerializer
+
+    route = plan.route
+    documents = {
+        'plan': _camel(PlanSerializer(plan).data),
+        'hazards': _camel({'plan': plan.dangers_snapshot or plan.dangers, 'static': []}),
+        'equipment': _camel(_equipment(plan.personalized_equipment_list)),
+    }
+    geometry, tiles, gallery, bounds = [], [], [], None
+    if route is not None:
+        route_data = RouteSerializer(route).data
+        route_data.pop('path_coordinates', None)
+        documents['route'] = _camel(route_data)
+        documents['profile'] = _camel(RouteProfileSerializer(build_route_profile(route)).data)
+
+        points = route_points(route)
+        waypoints, static_hazards = _waypoints_and_hazards(points)
+        documents['waypoints'] = _camel(waypoints)
+        documents['hazards']['static'] = _camel(static_hazards)
+
+        geometry = [(level['zoom'], level['tolerance_m'], level['points'], level['polyline'])
+                    for level in build_route_geometry(route).levels]
+        geometry.append((None, None, len(points), encode_polyline(points)))
+
+        bounds = path_bounds(points)
+        if bounds is not None:
+            for z in BUNDLE_TILE_ZOOMS:
+                x0, x1, y0, y1 = tile_range(bounds, z)
+                tiles += [(z, x, y, tile_cache.get_or_render(z, x, y))
+                          for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        gallery = _gallery(route)
+
+    return {'documents': documents, 'geometry': geometry, 'tiles': tiles, 'gallery': gallery, 'bounds': bounds}
+
+
+def _gallery(route):
+    return [url for url in (route.gallery or []) if isinstance(url, str)] if route is not None else []
+
+
+def _tile_area(bounds, z):
+    """bbox của mọi tile ở zoom z chạm bounds, kể cả phần BUFFER mà render_tile đọc."""
+    x0, x1, y0, y1 = tile_range(bounds, z)
+    south, west = tile_bounds(z, x0, y1, BUFFER)[:2]
+    north, east = tile_bounds(z, x1, y0, BUFFER)[2:]
+    return south, west, north, east
+
+
+def bundle_signature(plan):
+    """
+    Hash các đầu vào của bundle, đủ rẻ để tính ở mỗi request: plan, route
+    (path_hash thay cho track), route / waypoint / hazard nằm trong vùng tile
+    của bundle, equipment trong checklist và các thumbnail đã cache. Hồ sơ độ
+    cao phụ thuộc DEM, coi như không đổi.
+    """
+    from django.db.models import TextField
+    from django.db.models.functions import Cast, MD5
+    from routes.models import Waypoint
+    from safety.models import Static_Hazard
+
+    from .models import Equipment, Route
+
+    route = plan.route
+    inputs = {
+        'version': [BUNDLE_FORMAT_VERSION, BUNDLE_TILE_ZOOMS, WAYPOINT_CORRIDOR_KM],
+        'plan': [(field.attname, field.value_from_object(plan)) for field in plan._meta.concrete_fields],
+    }
+    items = _equipment(plan.personalized_equipment_list)['items']
+    inputs['equipment'] = items
+    if route is not None:
+        inputs['route'] = [(field.attname, field.value_from_object(route)) for field in route._meta.concrete_fields
+                           if field.attname not in ('path_coordinates', 'search_text')]
+        inputs['path'] = path_hash(route.path_coordinates)
+        inputs['thumbnails'] = [url for url in _gallery(route) if os.path.exists(thumbnail_path(url))]
+        bounds = path_bounds(route_points(route))
+        if bounds is not None:
+            margin = WAYPOINT_CORRIDOR_KM / 111.0 * 2
+            bounds = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+            inputs['routes'] = list(
+                Route.objects.filter(pk__in=route_bounds.intersecting(_tile_area(bounds, min(BUNDLE_TILE_ZOOMS))))
+                .order_by('id')
+                .values_list('id', 'name', 'total_distance_km', 'elevation_gain_m',
+                             MD5(Cast('path_coordinates', TextField())))
+            )
+            zoom = min((z for z in BUNDLE_TILE_ZOOMS if z >= WAYPOINT_MIN_ZOOM), default=max(BUNDLE_TILE_ZOOMS))
+            south, west, north, east = _tile_area(bounds, zoom)
+            inputs['waypoints'] = list(
+                Waypoint.objects.filter(latitude__range=(south, north), longitude__range=(west, east))
+                .order_by('id').values_list('id', 'route_id', 'name', 'description', 'type', 'latitude', 'longitude')
+            )
+            inputs['hazards'] = list(
+                Static_Hazard.objects.filter(route_id__in={row[1] for row in inputs['waypoints']})
+                .order_by('id').values_list('id', 'route_id', 'description', 'condition')
+            )
+    payload = json.dumps(inputs, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fetch_image(url):
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+
+def make_thumbnail(data, size=THUMBNAIL_PX):
+    """Ảnh gốc -> (JPEG đã thu nhỏ, rộng, cao), hoặc None nếu không có Pillow / ảnh lỗi."""
+    if Image is None:
+        return None
+    try:
+        image = Image.open(io.BytesIO(data)).convert('RGB')
+        image.thumbnail((size, size))
+        out = io.BytesIO()
+        image.save(out, format='JPEG', quality=80, optimize=True)
+    except Exception as exc:
+        logger.warning("Không tạo được thumbnail: %s", exc)
+        return None
+    return out.getvalue(), image.width, image.height
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+def cache_thumbnails(urls, fetch=fetch_image):
+    """Tải và thu nhỏ các ảnh chưa có trong BUNDLE_CACHE_DIR/thumbnails; trả về số ảnh mới."""
+    if Image is None or not bundle_directory():
+        return 0
+    cached = 0
+    for url in urls:
+        if not isinstance(url, str):
+            continue
+        path = thumbnail_path(url)
+        if os.path.exists(path):
+            continue
+        try:
+            thumbnail = make_thumbnail(fetch(url))
+        except Exception as exc:
+            logger.warning("Không tải được ảnh %s: %s", url, exc)
+            continue
+        if thumbnail is not None:
+            _write_atomic(path, thumbnail[0])
+            cached += 1
+    return cached
+
+
+def _cached_thumbnail(url):
+    try:
+        with open(thumbnail_path(url), 'rb') as handle:
+            data = handle.read()
+        width, height = Image.open(io.BytesIO(data)).size
+    except (OSError, ValueError):
+        return None
+    return data, width, height
+
+
+def write_bundle(path, content, digest):
+    """Ghi nội dung bundle ra file MBTiles/SQLite `path`; thumbnail lấy từ cache (cache_thumbnails)."""
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SCHEMA)
+        metadata = {
+            'name': content['documents']['plan'].get('name', ''),
+            'format': 'pbf',
+            'type': 'overlay',
+            'version': str(BUNDLE_FORMAT_VERSION),
+            'content_hash': digest,
+            'json': json.dumps({'vector_layers': [
+                {'id': 'routes', 'fields': {'name': 'String', 'distance_km': 'Number',
+                                            'elevation_gain_m': 'Number'}},
+                {'id': 'waypoints', 'fields': {'name': 'String', 'type': 'String', 'route_id': 'Number'}},
+            ]}),
+        }
+        if content['tiles']:
+            metadata.update(minzoom=str(min(BUNDLE_TILE_ZOOMS)), maxzoom=str(max(BUNDLE_TILE_ZOOMS)))
+        if content['bounds'] is not None:
+            min_lat, min_lng, max_lat, max_lng = content['bounds']
+            metadata['bounds'] = f'{min_lng},{min_lat},{max_lng},{max_lat}'
+            metadata['center'] = f'{(min_lng + max_lng) / 2},{(min_lat + max_lat) / 2},{BUNDLE_TILE_ZOOMS[-2]}'
+        connection.executemany('INSERT INTO metadata VALUES (?, ?)', metadata.items())
+        # MBTiles dùng sơ đồ TMS: hàng đếm từ phía nam
+        connection.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)', [
+            (z, x, 2 ** z - 1 - y, gzip.compress(data, mtime=0))
+            for z, x, y, data in content['tiles'] if data
+        ])
+        connection.executemany('INSERT INTO documents VALUES (?, ?)', [
+            (name, json.dumps(body, ensure_ascii=False)) for name, body in content['documents'].items()
+        ])
+        connection.executemany('INSERT INTO geometry VALUES (?, ?, ?, ?)', content['geometry'])
+        for position, url in enumerate(content['gallery'] if Image is not None else []):
+            thumbnail = _cached_thumbnail(url)
+            if thumbnail is not None:
+                data, width, height = thumbnail
+                connection.execute('INSERT OR IGNORE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?)',
+                                   (url, position, width, height, 'image/jpeg', data))
+        connection.commit()
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+
+
+def build_plan_bundle(plan, force=False):
+    """Đường dẫn file bundle của plan và hash đầu vào; chỉ dựng (collect_bundle) khi hash đổi."""
+    directory = bundle_directory()
+    digest = bundle_signature(plan)
+    path = os.path.join(directory, f"plan-{plan.pk}-{digest[:32]}.mbtiles")
+    if force or not os.path.exists(path):
+        content = collect_bundle(plan)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)  # sqlite3 coi file rỗng là database mới
+        try:
+            write_bundle(tmp, content, digest)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    # Bỏ các bản cũ của cùng plan (request đang tải bản cũ đã mở file, vẫn đọc tiếp được)
+    prefix = f'plan-{plan.pk}-'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith('.mbtiles') and os.path.join(directory, name) != path:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass  # request khác vừa xóa
+    return path, digest
+
+
+def open_plan_bundle(plan):
+    """(file bundle đã mở, hash): mở ngay sau khi dựng để request khác không kịp xóa mất file."""
+    for _ in range(3):
+        path, digest = build_plan_bundle(plan)
+        try:
+            return open(path, 'rb'), digest
+        except FileNotFoundError:
+            continue  # bundle vừa bị thay bởi request khác: tính lại hash
+    raise FileNotFoundError(path)
+
+
+# --- Phục vụ file kèm HTTP Range (RFC 9110) ---
+
+def _read_range(handle, start, length):
+    with handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(RANGE_CHUNK_BYTES, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _byte_range(range_header, size):
+    """
+    (start, end) của `Range: bytes=a-b`, 'unsatisfiable' (416) khi khoảng bắt
+    đầu từ sau cuối file, hoặc None để bỏ qua header và trả cả file: header
+    sai cú pháp hay không hợp lệ (vd. bytes=5-3), nhiều khoảng (RFC 9110 §14.2).
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        suffix = int(last)
+        return (max(size - suffix, 0), size - 1) if suffix and size else 'unsatisfiable'
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def ranged_file_response(request, handle, etag, content_type='application/octet-stream', filename=None):
+    """
+    Response cho file đã mở `handle`, hỗ trợ một khoảng `Range: bytes=a-b`
+    (206 / 416), If-Range và If-None-Match. Nhiều khoảng trong một header thì
+    trả cả file (200).
+    """
+    etag = f'"{etag}"'
+    size = os.fstat(handle.fileno()).st_size
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = _byte_range(range_header, size)
+
+    if request.headers.get('If-None-Match') == etag:
+        handle.close()
+        response = HttpResponse(status=304)
+    elif byte_range is None:
+        response = FileResponse(handle, content_type=content_type)
+    elif byte_range == 'unsatisfiable':
+        handle.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(handle, start, end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
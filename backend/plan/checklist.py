@@ -0,0 +1,325 @@
+# plan/checklist.py
+"""
+Checklist đồ dùng cho Plan, chọn từ bảng equipment ở backend.
+
+Thay cho prompt Gemini trên điện thoại (GeminiService.generateChecklist):
+- Mỗi món trong catalogue được xếp vào một "loại" theo từ khóa trong tên
+  (ITEM_KINDS: lều, túi ngủ, áo mưa...), với giá trị cơ bản, cách tính số
+  lượng (mỗi người / dùng chung cho nhóm / mỗi người mỗi ngày) và điều kiện
+  cần (ngủ lều, qua đêm, lạnh). Món không khớp loại nào thuộc loại
+  "khác" của category, giá trị thấp.
+- Mỗi loại chọn nhiều nhất một món: knapsack nhiều lựa chọn với hai ràng
+  buộc — khối lượng mỗi người phải mang và tổng ngân sách của nhóm. Quy
+  hoạch động trên lưới (khối lượng theo WEIGHT_STEP_G, tiền theo
+  BUDGET_STEPS bậc; làm tròn lên nên không bao giờ vượt giới hạn thật),
+  mỗi lựa chọn là một phép dịch mảng NumPy.
+- Đồ dùng chung (lều, bếp, bộ sơ cứu...) chỉ mua đủ cho cả nhóm, khối
+  lượng chia đều cho các thành viên.
+- Kết quả tất định (hòa thì chọn món nhẹ hơn, rẻ hơn, id nhỏ hơn) và được
+  cache theo chữ ký đầu vào + phiên bản catalogue.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .ranking import ACCOMMODATION_TAGS, DIFFICULTY_LEVELS
+from .search import fold
+from .tag_index import DEFAULT_TTL_SECONDS, normalize_tags
+
+WEIGHT_STEP_G = 50
+BUDGET_STEPS = 400
+# Món chưa có weight_grams được tính như nặng chừng này
+DEFAULT_WEIGHT_G = 500
+# Khối lượng đồ tối đa mỗi người mang theo trình độ (easy, medium, hard)
+MAX_WEIGHT_PER_PERSON_G = (8000, 11000, 14000)
+# Giới hạn trên cho tham số của người dùng: lưới DP có max_weight_g / WEIGHT_STEP_G hàng
+MAX_WEIGHT_LIMIT_G = 2 * MAX_WEIGHT_PER_PERSON_G[-1]
+MAX_BUDGET = 1_000_000_000
+# Trên độ cao này (m, theo RouteProfile) coi là lạnh
+COLD_ELEVATION_M = 2000
+RESULT_CACHE_SIZE = 256
+
+# (loại, từ khóa đã bỏ dấu, giá trị, cách tính số lượng, điều kiện cần, (điều kiện, cộng thêm))
+ITEM_KINDS = (
+    ('balo', ('balo', 'ba lo', 'backpack'), 10, 'person', None, None),
+    ('giay', ('giay', 'shoes', 'boots'), 10, 'person', None, None),
+    ('ao_mua', ('ao mua', 'poncho', 'raincoat'), 8, 'person', None, None),
+    ('leu', ('leu', 'tent'), 10, 'shared', 'camping', None),
+    ('tui_ngu', ('tui ngu', 'sleeping bag'), 9, 'person', 'camping', ('cold', 2)),
+    ('tham', ('tham', 'dem hoi'), 5, 'person', 'camping', None),
+    ('den', ('den pin', 'den doi', 'headlamp', 'flashlight'), 7, 'person', 'overnight', None),
+    ('so_cuu', ('so cuu', 'y te', 'first aid'), 8, 'shared', None, None),
+    ('bep', ('bep', 'stove'), 5, 'shared', 'camping', None),
+    ('noi', ('noi', 'cookware'), 3, 'shared', 'camping', None),
+    ('loc_nuoc', ('loc nuoc', 'water filter'), 4, 'shared', 'overnight', None),
+    ('binh_nuoc', ('binh nuoc', 'bottle'), 7, 'person', None, None),
+    ('gay', ('gay', 'trekking pole'), 4, 'person', None, ('hard', 3)),
+    ('ao_am', ('ao am', 'ao khoac', 'giu nhiet', 'jacket', 'fleece'), 5, 'person', None, ('cold', 4)),
+    ('gang_tay', ('gang tay', 'gloves'), 3, 'person', 'cold', None),
+    ('mu', ('mu', 'non', 'hat'), 3, 'person', None, None),
+    ('kinh', ('kinh',), 2, 'person', None, None),
+    ('do_an', ('luong kho', 'do an', 'thuc pham', 'snack'), 6, 'day', None, None),
+)
+OTHER_VALUE = 1
+CAPACITY_PATTERN = re.compile(r'(\d+)\s*(?:nguoi|person|people|p)\b')
+
+
+def item_kind(name):
+    """Loại của một món theo tên (so theo từ, đã bỏ dấu) hoặc None."""
+    padded = f' {fold(name)} '
+    for kind, keywords, *_ in ITEM_KINDS:
+        if any(f' {keyword} ' in padded for keyword in keywords):
+            return kind
+    return None
+
+
+def item_capacity(name):
+    """'Lều 3 người' -> 3; None nếu tên không ghi sức chứa."""
+    match = CAPACITY_PATTERN.search(fold(name))
+    return int(match.group(1)) if match and int(match.group(1)) > 0 else None
+
+
+class EquipmentCatalog:
+    """Ảnh chụp bảng equipment (kèm loại của từng món) và cache kết quả theo chữ ký đầu vào."""
+
+    def __init__(self, ttl=None, cache_size=RESULT_CACHE_SIZE):
+        self._lock = threading.RLock()
+        self._ttl = ttl
+        self.cache_size = cache_size
+        self._items = []
+        self._version = ''
+        self._built_at = None
+        self._results = OrderedDict()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'ROUTE_TAG_INDEX_TTL', DEFAULT_TTL_SECONDS)
+
+    def build(self):
+        from .models import Equipment
+
+        rows = list(Equipment.objects.order_by('id').values_list('id', 'name', 'category', 'price', 'weight_grams'))
+        items = [
+            {'id': item_id, 'name': name, 'category': category, 'price': float(price or 0.0),
+             'weight_grams': weight_grams, 'kind': item_kind(name)}
+            for item_id, name, category, price, weight_grams in rows
+        ]
+        version = hashlib.sha256(repr(rows).encode('utf-8')).hexdigest()
+        with self._lock:
+            self._items = items
+            if version != self._version:
+                self._results.clear()
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+                self.build()
+
+    def snapshot(self):
+        self._ensure_built()
+        with self._lock:
+            return self._items, self._version
+
+    def cached(self, key, compute):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return result
+
+
+equipment_catalog = EquipmentCatalog()
+
+
+def _options(items, group_size, duration_days, conditions):
+    """Gom các món theo loại -> {loại: [lựa chọn]} với số lượng, kg/người, chi phí nhóm đã tính."""
+    kinds = {kind: (value, mode, required, boost) for kind, _, value, mode, required, boost in ITEM_KINDS}
+    groups = {}
+    for item in items:
+        if item['kind'] is None:
+            group, value, mode = f"khac:{item['category']}", OTHER_VALUE, 'person'
+        else:
+            value, mode, required, boost = kinds[item['kind']]
+            if required and required not in conditions:
+                continue
+            if boost and boost[0] in conditions:
+                value += boost[1]
+            group = item['kind']
+
+        weight = item['weight_grams'] if item['weight_grams'] is not None else DEFAULT_WEIGHT_G
+        if mode == 'shared':
+            quantity = math.ceil(group_size / (item_capacity(item['name']) or group_size))
+            per_person = weight * quantity / group_size
+        elif mode == 'day':
+            quantity = group_size * duration_days
+            per_person = weight * duration_days
+        else:
+            quantity = group_size
+            per_person = weight
+        groups.setdefault(group, []).append({
+            **item, 'value': value, 'mode': mode, 'quantity': quantity,
+            'weight_per_person_g': per_person, 'cost': item['price'] * quantity,
+        })
+    # Cùng loại thì cùng giá trị: chỉ giữ các món không bị món khác vừa nhẹ hơn vừa rẻ hơn lấn át
+    for group, options in groups.items():
+        options.sort(key=lambda option: (option['weight_per_person_g'], option['cost'], option['id']))
+        front, cheapest = [], math.inf
+        for option in options:
+            if option['cost'] < cheapest:
+                front.append(option)
+                cheapest = option['cost']
+        groups[group] = front
+    return dict(sorted(groups.items()))
+
+
+def solve(groups, max_weight_g, budget=None):
+    """
+    Knapsack nhiều lựa chọn, hai ràng buộc. groups: {loại: [lựa chọn]}.
+    Trả về danh sách lựa chọn đã chọn (tối đa một mỗi loại), tổng giá trị lớn nhất.
+    """
+    weight_cells = int(max_weight_g // WEIGHT_STEP_G)
+    budget_cells = BUDGET_STEPS if budget else 0
+    budget_unit = budget / BUDGET_STEPS if budget else None
+
+    best = np.zeros((weight_cells + 1, budget_cells + 1))
+    choices = []
+    for options in groups.values():
+        current = best.copy()
+        choice = np.zeros(best.shape, dtype=np.int16)
+        for index, option in enumerate(options, start=1):
+            dw = math.ceil(option['weight_per_person_g'] / WEIGHT_STEP_G - 1e-9)
+            db = math.ceil(option['cost'] / budget_unit - 1e-9) if budget_unit else 0
+            if dw > weight_cells or db > budget_cells:
+                continue
+            candidate = np.full(best.shape, -np.inf)
+            candidate[dw:, db:] = best[:best.shape[0] - dw, :best.shape[1] - db] + option['value']
+            better = candidate > current
+            current[better] = candidate[better]
+            choice[better] = index
+            option['cells'] = (dw, db)
+        best = current
+        choices.append(choice)
+
+    chosen, w, b = [], weight_cells, budget_cells
+    for options, choice in zip(reversed(list(groups.values())), reversed(choices)):
+        index = int(choice[w, b])
+        if index:
+            option = options[index - 1]
+            chosen.append(option)
+            w, b = w - option['cells'][0], b - option['cells'][1]
+    return chosen[::-1]
+
+
+def _reason(option, group_size, duration_days):
+    if option['mode'] == 'shared':
+        return f"Dùng chung: {option['quantity']} cho nhóm {group_size} người"
+    if option['mode'] == 'day':
+        return f"Mỗi người {duration_days} phần cho {duration_days} ngày"
+    return 'Mỗi người một' if group_size > 1 else 'Cần cho chuyến đi'
+
+
+def trip_conditions(difficulty=None, duration_days=1, rest_type=None, route_tags=(), max_elevation_m=None):
+    """Các điều kiện bật/tắt loại đồ: camping, overnight, cold, hard."""
+    conditions = set()
+    folded = fold(rest_type)
+    tags = {ACCOMMODATION_TAGS.get(tag) for tag in route_tags}
+    if any(word in f' {folded} ' for word in (' leu ', ' cam trai ', ' camping ', ' tent ')) or (
+            not folded and 'Cắm trại' in tags):
+        conditions.add('camping')
+    if duration_days > 1:
+        conditions.add('overnight')
+    if max_elevation_m is not None and max_elevation_m >= COLD_ELEVATION_M:
+        conditions.add('cold')
+    if DIFFICULTY_LEVELS.get(difficulty) == 2:
+        conditions.add('hard')
+    return frozenset(conditions)
+
+
+def build_checklist(group_size=1, duration_days=1, difficulty=None, conditions=frozenset(),
+                    budget=None, max_weight_g=None, catalog=None):
+    """
+    Checklist {category: [{id, quantity, reason}]} (định dạng app đang lưu trong
+    Plan.personalized_equipment_list) kèm chi tiết từng món và tổng khối lượng / chi phí.
+    """
+    catalog = catalog or equipment_catalog
+    group_size = max(int(group_size or 1), 1)
+    duration_days = max(int(duration_days or 1), 1)
+    if max_weight_g is None:
+        max_weight_g = MAX_WEIGHT_PER_PERSON_G[DIFFICULTY_LEVELS.get(difficulty, 1)]
+    max_weight_g = min(max_weight_g, MAX_WEIGHT_LIMIT_G)
+    if budget:
+        budget = min(budget, MAX_BUDGET)
+    items, version = catalog.snapshot()
+    key = (version, group_size, duration_days, tuple(sorted(conditions)),
+           float(budget) if budget else None, int(max_weight_g))
+
+    def compute():
+        groups = _options(items, group_size, duration_days, conditions)
+        chosen = solve(groups, max_weight_g, budget)
+        checklist, details = {}, []
+        for option in sorted(chosen, key=lambda option: (option['category'], option['id'])):
+            reason = _reason(option, group_size, duration_days)
+            checklist.setdefault(option['category'], []).append(
+                {'id': option['id'], 'quantity': option['quantity'], 'reason': reason})
+            details.append({
+                'id': option['id'], 'name': option['name'], 'category': option['category'],
+                'kind': option['kind'], 'quantity': option['quantity'],
+                'shared': option['mode'] == 'shared',
+                'weight_per_person_g': round(option['weight_per_person_g'], 1),
+                'cost': round(option['cost'], 2),
+            })
+        picked = {option['kind'] for option in chosen}
+        return {
+            'checklist': checklist,
+            'items': details,
+            'group_size': group_size,
+            'duration_days': duration_days,
+            'conditions': sorted(conditions),
+            'weight_per_person_g': round(sum(item['weight_per_person_g'] for item in details), 1),
+            'max_weight_per_person_g': int(max_weight_g),
+            'total_cost': round(sum(item['cost'] for item in details), 2),
+            'budget': float(budget) if budget else None,
+            # Loại cần thiết (giá trị >= 8) có trong catalogue nhưng không vừa ràng buộc
+            'missing_kinds': sorted(
+                group for group, options in groups.items()
+                if options[0]['value'] >= 8 and group not in picked
+            ),
+        }
+
+    return catalog.cached(key, compute)
+
+
+def plan_checklist(plan=None, route=None, difficulty=None, group_size=1, duration_days=1, rest_type=None,
+                   budget=None, max_weight_g=None):
+    """build_checklist cho một Plan (hoặc các thông số Trip Info rời), điều kiện lấy từ route."""
+    from .models import RouteProfile
+
+    if plan is not None:
+        route, difficulty = plan.route, plan.difficulty
+        group_size, duration_days, rest_type = plan.group_size, plan.duration_days, plan.rest_type
+    max_elevation = None
+    if route is not None:
+        max_elevation = (RouteProfile.objects.filter(route_id=route.pk)
+                         .values_list('max_elevation_m', flat=True).first())
+    conditions = trip_conditions(difficulty, duration_days or 1, rest_type,
+                                 normalize_tags(route.tags) if route is not None else (), max_elevation)
+    return build_checklist(group_size, duration_days, difficulty, conditions, budget, max_weight_g)
@@ -0,0 +1,162 @@
+# plan/elevation.py
+"""
+Hồ sơ độ cao (elevation profile) của Route, tính ở backend.
+
+Trước đây app Flutter tự lấy mẫu tọa độ, gọi open-elevation API từ điện
+thoại mỗi lần mở bản đồ rồi tự cộng dồn khoảng cách. Giờ:
+- Khoảng cách cộng dồn tính bằng haversine vector hóa trên path_coordinates.
+- Độ cao đọc từ kho DEM cục bộ: các tile SRTM .hgt (1° x 1°, int16
+  big-endian) trong DEM_TILE_DIR, mở bằng np.memmap nên chỉ những ô cần
+  đọc mới được nạp từ đĩa. Nội suy song tuyến (bilinear).
+- Kết quả (tối đa PROFILE_MAX_SAMPLES điểm cách đều) được lưu gọn trong
+  RouteProfile và chỉ tính lại khi path_coordinates đổi (so path_hash).
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .geometry import cumulative_distance_km, path_array, path_hash, resample
+
+HGT_VOID = -32768
+PROFILE_MAX_SAMPLES = 256
+
+
+def tile_name(lat_floor, lng_floor):
+    """Tên tile SRTM chứa góc tây-nam (lat_floor, lng_floor), vd. N22E103.hgt"""
+    ns = 'N' if lat_floor >= 0 else 'S'
+    ew = 'E' if lng_floor >= 0 else 'W'
+    return f'{ns}{abs(lat_floor):02d}{ew}{abs(lng_floor):03d}.hgt'
+
+
+class DemTileStore:
+    """Các tile .hgt được memory-map khi cần; giữ tối đa `max_open` tile đang mở."""
+
+    def __init__(self, directory=None, max_open=64):
+        self._directory = directory
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._tiles = OrderedDict()  # (lat_floor, lng_floor) -> np.memmap hoặc None
+
+    @property
+    def directory(self):
+        return self._directory or getattr(settings, 'DEM_TILE_DIR', '')
+
+    def _open(self, key):
+        path = os.path.join(self.directory, tile_name(*key))
+        if not os.path.exists(path):
+            return None
+        size = int(math.isqrt(os.path.getsize(path) // 2))
+        return np.memmap(path, dtype='>i2', mode='r', shape=(size, size))
+
+    def tile(self, lat_floor, lng_floor):
+        key = (int(lat_floor), int(lng_floor))
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+            tile = self._open(key)
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_open:
+                self._tiles.popitem(last=False)
+            return tile
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+    def elevations(self, lat, lng):
+        """Độ cao (m) tại các điểm; NaN nếu không có tile hoặc ô trống (void)."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        result = np.full(lat.shape, np.nan)
+        lat_floor, lng_floor = np.floor(lat).astype(np.int64), np.floor(lng).astype(np.int64)
+
+        for key in set(zip(lat_floor.tolist(), lng_floor.tolist())):
+            tile = self.tile(*key)
+            if tile is None:
+                continue
+            mask = (lat_floor == key[0]) & (lng_floor == key[1])
+            last = tile.shape[0] - 1
+            # Hàng 0 của tile là mép bắc; cột 0 là mép tây
+            row = (key[0] + 1 - lat[mask]) * last
+            col = (lng[mask] - key[1]) * last
+            r0 = np.clip(np.floor(row).astype(np.int64), 0, last - 1)
+            c0 = np.clip(np.floor(col).astype(np.int64), 0, last - 1)
+            fr, fc = row - r0, col - c0
+
+            corners = [tile[r0, c0], tile[r0, c0 + 1], tile[r0 + 1, c0], tile[r0 + 1, c0 + 1]]
+            v00, v01, v10, v11 = (np.where(v == HGT_VOID, np.nan, v).astype(np.float64) for v in corners)
+            result[mask] = ((v00 * (1 - fc) + v01 * fc) * (1 - fr)
+                            + (v10 * (1 - fc) + v11 * fc) * fr)
+        return result
+
+
+dem_tiles = DemTileStore()
+
+
+def compute_profile(path_coordinates, dem=None, max_samples=PROFILE_MAX_SAMPLES):
+    """
+    Trả về dict gồm mảng `samples` float32 (n, 4): lat, lng, distance_km,
+    elevation_m (NaN nếu không có DEM) và các số liệu tổng hợp.
+    """
+    dem = dem or dem_tiles
+    points = path_array(path_coordinates)
+    if len(points) < 2:
+        samples = np.zeros((len(points), 4), dtype=np.float32)
+        samples[:, :2] = points
+        samples[:, 3] = np.nan
+        return {'samples': samples, 'total_distance_km': 0.0, 'elevation_gain_m': None,
+                'elevation_loss_m': None, 'min_elevation_m': None, 'max_elevation_m': None,
+                'max_grade_pct': None}
+
+    distances = cumulative_distance_km(points)
+    sampled, sample_distances = resample(points, distances, min(max_samples, len(points)))
+    elevation = dem.elevations(sampled[:, 0], sampled[:, 1])
+
+    summary = {'elevation_gain_m': None, 'elevation_loss_m': None, 'min_elevation_m': None,
+               'max_elevation_m': None, 'max_grade_pct': None}
+    valid = ~np.isnan(elevation)
+    if valid.any():
+        # Lấp các ô trống của DEM bằng nội suy theo quãng đường
+        elevation = np.interp(sample_distances, sample_distances[valid], elevation[valid])
+        climb = np.diff(elevation)
+        summary = {
+            'elevation_gain_m': round(float(climb[climb > 0].sum()), 1),
+            'elevation_loss_m': round(float(-climb[climb < 0].sum()), 1),
+            'min_elevation_m': round(float(elevation.min()), 1),
+            'max_elevation_m': round(float(elevation.max()), 1),
+            'max_grade_pct': round(float(np.abs(grades(sample_distances, elevation)).max()), 1),
+        }
+
+    samples = np.column_stack([sampled, sample_distances, elevation]).astype(np.float32)
+    return {'samples': samples, 'total_distance_km': round(float(distances[-1]), 3), **summary}
+
+
+def grades(distances_km, elevations_m):
+    """Độ dốc (%) của đoạn kết thúc tại mỗi điểm; điểm đầu = 0."""
+    run = np.diff(distances_km) * 1000.0
+    rise = np.diff(elevations_m)
+    grade = np.divide(rise, run, out=np.zeros_like(rise), where=run > 0) * 100.0
+    return np.concatenate([[0.0], grade])
+
+
+def build_route_profile(route, dem=None, force=False):
+    """Lấy RouteProfile của route, tính (lại) nếu chưa có hoặc path_coordinates đã đổi."""
+    from .models import RouteProfile
+
+    digest = path_hash(route.path_coordinates)
+    profile = RouteProfile.objects.filter(route_id=route.pk).first()
+    if profile is not None and profile.path_hash == digest and not force:
+        return profile
+
+    data = compute_profile(route.path_coordinates, dem=dem)
+    samples = data.pop('samples')
+    profile, _ = RouteProfile.objects.update_or_create(
+        route_id=route.pk,
+        defaults={'path_hash': digest, 'samples': samples.tobytes(), **data},
+    )
+    return profile
@@ -0,0 +1,54 @@
+# plan/geometry.py
+"""
+Tiện ích hình học cho Route.path_coordinates (danh sách [lat, lng]).
+Mọi phép tính làm trên mảng NumPy (n, 2), không lặp từng điểm trong Python.
+"""
+import hashlib
+import json
+
+import numpy as np
+
+from routes.spatial import haversine_km
+
+
+def path_array(path_coordinates):
+    """[[lat, lng], ...] (JSON) -> mảng float64 (n, 2); bỏ các phần tử không hợp lệ."""
+    if not isinstance(path_coordinates, list) or not path_coordinates:
+        return np.empty((0, 2), dtype=np.float64)
+    try:
+        points = np.array(path_coordinates, dtype=np.float64)
+    except (TypeError, ValueError):
+        points = np.array([
+            point[:2] for point in path_coordinates
+            if isinstance(point, (list, tuple)) and len(point) >= 2
+            and all(isinstance(value, (int, float)) for value in point[:2])
+        ], dtype=np.float64).reshape(-1, 2)
+    if points.ndim != 2 or points.shape[1] < 2:
+        return np.empty((0, 2), dtype=np.float64)
+    return points[:, :2]
+
+
+def path_hash(path_coordinates):
+    """Dấu vân tay của path_coordinates, để biết dữ liệu dẫn xuất đã cũ hay chưa."""
+    raw = json.dumps(path_coordinates, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def segment_lengths_km(points):
+    """Độ dài (km) của n - 1 đoạn giữa các điểm liên tiếp."""
+    if len(points) < 2:
+        return np.zeros(0, dtype=np.float64)
+    return haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+
+
+def cumulative_distance_km(points):
+    """Khoảng cách (km) từ điểm xuất phát tới từng điểm; phần tử đầu là 0."""
+    return np.concatenate([[0.0], np.cumsum(segment_lengths_km(points))])
+
+
+def resample(points, distances, count):
+    """`count` điểm cách đều theo quãng đường, nội suy tuyến tính lat/lng."""
+    targets = np.linspace(0.0, distances[-1], count)
+    lat = np.interp(targets, distances, points[:, 0])
+    lng = np.interp(targets, distances, points[:, 1])
+    return np.column_stack([lat, lng]), targets
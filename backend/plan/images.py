@@ -0,0 +1,239 @@
+# plan/images.py
+"""
+Tìm ảnh cho Route (image_url + gallery) từ một nguồn tìm ảnh cắm được.
+
+Thay cho vòng lặp tuần tự cũ của crawl_images (mỗi route nghỉ 5-10 s, bị
+chặn thì ngủ 30-40 s, mỗi route một lần save):
+- Nhiều route được tìm song song trên thread pool (`concurrency`), nhưng mọi
+  request cùng đi qua một TokenBucket (`rate` request/giây, `burst`): thêm
+  worker chỉ tăng tốc tới đúng giới hạn của nguồn.
+- Bị chặn (RateLimited) thì chờ theo backoff lũy thừa có jitter ("full
+  jitter") rồi thử lại, tối đa `max_retries` lần.
+- Kết quả được ghi theo lô: bulk_update Route (image_url, gallery) và
+  upsert RouteImageCrawl trong cùng transaction. Route đã 'done' / 'empty'
+  được bỏ qua ở lần chạy sau, nên chạy bị ngắt chỉ làm tiếp phần còn lại.
+
+Nguồn (IMAGE_SEARCH_PROVIDER):
+- 'duckduckgo' : gói duckduckgo_search (cài riêng: pip install duckduckgo_search).
+- 'fake'       : URL giả lập tất định, không gọi mạng; dùng khi dev / test.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+IMAGES_PER_ROUTE = 4
+DEFAULT_RATE = 0.5
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_CAP_SECONDS = 60.0
+
+
+class ImageSearchError(Exception):
+    pass
+
+
+class RateLimited(ImageSearchError):
+    pass
+
+
+def route_query(route_name):
+    return f"{route_name} trekking vietnam scenery nature"
+
+
+# --- Nguồn tìm ảnh ---
+
+class DuckDuckGoImageSearch:
+    region = 'vn-vi'
+
+    def search(self, query, max_results=IMAGES_PER_ROUTE):
+        try:
+            from duckduckgo_search import DDGS
+        except ImportError:
+            raise ImageSearchError('Cần gói duckduckgo_search: pip install duckduckgo_search')
+        try:
+            with DDGS() as ddgs:
+                results = list(ddgs.images(query, region=self.region, safesearch='off', max_results=max_results))
+        except Exception as exc:
+            # DDG trả 202 / RatelimitException khi bị chặn
+            if '202' in str(exc) or 'ratelimit' in f'{type(exc).__name__} {exc}'.lower():
+                raise RateLimited(str(exc)) from exc
+            raise ImageSearchError(str(exc)) from exc
+        return [result['image'] for result in results if result.get('image')]
+
+
+class FakeImageSearch:
+    """
+    URL ảnh giả lập suy ra từ query. `delay` mô phỏng độ trễ mạng;
+    `rate_limited(query, call_number) -> bool` mô phỏng bị chặn.
+    """
+
+    def __init__(self, delay=0.0, rate_limited=None, empty=()):
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.empty = set(empty)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, max_results=IMAGES_PER_ROUTE):
+        with self._lock:
+            self.calls += 1
+            call_number = self.calls
+        if self.delay:
+            time.sleep(self.delay)
+        if self.rate_limited is not None and self.rate_limited(query, call_number):
+            raise RateLimited('fake rate limit')
+        if query in self.empty:
+            return []
+        digest = hashlib.sha256(query.encode('utf-8')).hexdigest()[:12]
+        return [f'https://images.example.com/{digest}/{i}.jpg' for i in range(max_results)]
+
+
+IMAGE_SEARCH_PROVIDERS = {
+    'duckduckgo': DuckDuckGoImageSearch(),
+    'fake': FakeImageSearch(),
+}
+
+
+def image_search(name=None):
+    name = getattr(settings, 'IMAGE_SEARCH_PROVIDER', 'duckduckgo') if name is None else name
+    try:
+        return IMAGE_SEARCH_PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown IMAGE_SEARCH_PROVIDER: {name!r}")
+
+
+# --- Giới hạn tốc độ ---
+
+class TokenBucket:
+    """Tối đa `rate` lần acquire() mỗi giây, cho phép dồn `burst` lần; dùng chung cho mọi thread."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('rate phải > 0')
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = clock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            self._sleep(wait_seconds)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_CAP_SECONDS, rng=random):
+    """Full jitter: ngẫu nhiên trong [0, min(cap, base * 2^attempt)]."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# --- Pipeline ---
+
+def _search_route(provider, bucket, route, images, max_retries, sleep):
+    """-> (status, urls, attempts, error) cho một route."""
+    query = route_query(route['name'])
+    error = ''
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            urls = provider.search(query, max_results=images)
+        except RateLimited as exc:
+            error = f'rate limited: {exc}'
+            if attempt < max_retries:
+                sleep(backoff_delay(attempt))
+            continue
+        except ImageSearchError as exc:
+            return 'failed', [], attempt + 1, str(exc)
+        return ('done' if urls else 'empty'), urls[:images], attempt + 1, ''
+    return 'failed', [], max_retries + 1, error
+
+
+def pending_routes(queryset, force=False):
+    """Route chưa tìm ảnh xong ('done' / 'empty'), trừ khi force."""
+    from .models import RouteImageCrawl
+
+    if not force:
+        queryset = queryset.exclude(image_crawl__status__in=[RouteImageCrawl.STATUS_DONE,
+                                                             RouteImageCrawl.STATUS_EMPTY])
+    return queryset.order_by('pk').values('id', 'name').iterator(chunk_size=500)
+
+
+def crawl_route_images(queryset=None, provider=None, concurrency=4, rate=None, burst=None, batch_size=20,
+                       max_retries=3, images=IMAGES_PER_ROUTE, force=False, sleep=time.sleep, progress=None):
+    """
+    Tìm ảnh cho các route chưa xong (trong `queryset` hoặc mọi route).
+    `progress(route, status, urls)` được gọi ở thread chính sau mỗi route.
+    Trả về {'done', 'empty', 'failed'}.
+    """
+    from .models import Route, RouteImageCrawl
+
+    provider = provider or image_search()
+    rate = rate or getattr(settings, 'IMAGE_CRAWL_RATE', DEFAULT_RATE)
+    bucket = TokenBucket(rate, burst or concurrency)
+    # Đọc hết id trước: thread chính còn ghi DB trong lúc duyệt
+    pending = iter(list(pending_routes(Route.objects.all() if queryset is None else queryset, force)))
+    stats = {'done': 0, 'empty': 0, 'failed': 0}
+    results = []
+
+    def flush():
+        found = [Route(pk=route['id'], image_url=urls[0], gallery=urls)
+                 for route, status, urls, _, _ in results if urls]
+        states = [
+            RouteImageCrawl(route_id=route['id'], status=status, query=route_query(route['name'])[:500],
+                            attempts=attempts, image_count=len(urls), last_error=error)
+            for route, status, urls, attempts, error in results
+        ]
+        with transaction.atomic():
+            Route.objects.bulk_update(found, ['image_url', 'gallery'])
+            RouteImageCrawl.objects.bulk_create(
+                states, update_conflicts=True, unique_fields=['route'],
+                update_fields=['status', 'query', 'attempts', 'image_count', 'last_error', 'updated_at'],
+            )
+        results.clear()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        running = {}
+
+        def submit():
+            route = next(pending, None)
+            if route is not None:
+                running[pool.submit(_search_route, provider, bucket, route, images, max_retries, sleep)] = route
+
+        try:
+            for _ in range(concurrency):
+                submit()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    route = running.pop(future)
+                    status, urls, attempts, error = future.result()
+                    if status == 'failed':
+                        logger.warning('Ảnh route %s: %s', route['id'], error)
+                    results.append((route, status, urls, attempts, error))
+                    stats[status] += 1
+                    if progress is not None:
+                        progress(route, status, urls)
+                    if len(results) >= batch_size:
+                        flush()
+                    submit()
+        finally:
+            # Bị ngắt (Ctrl+C) vẫn ghi những route đã xong
+            if results:
+                flush()
+    return stats
@@ -0,0 +1,195 @@
+# plan/itinerary.py
+"""
+Chia một Route thành các chặng theo ngày (Plan.duration_days).
+
+- Thời gian đi mỗi đoạn tính theo Naismith (plan/ranking.py) trên hồ sơ
+  độ cao RouteProfile, nhân hệ số tốc độ theo trình độ.
+- Điểm nghỉ cuối ngày ưu tiên Waypoint CAMPSITE, rồi WATER_SOURCE (waypoint
+  cách track không quá STOP_CORRIDOR_KM); ngoài ra vẫn dừng được ở bất kỳ
+  đâu trên track nhưng bị phạt (STOP_PENALTY_HOURS).
+- Quy hoạch động trên các vị trí dừng đã sắp theo quãng đường: tối thiểu
+  tổng bình phương độ lệch giờ đi mỗi ngày so với trung bình, cộng phạt
+  điểm dừng. Mỗi ngày là một phép toán ma trận NumPy m x m (m ~ vài trăm
+  vị trí), nên track 60 km vẫn chỉ mất vài ms.
+- Kết quả lưu trong RouteItinerary theo (route, số ngày, trình độ); bị xóa
+  khi path_coordinates hoặc waypoint gần track thay đổi (xem plan/signals.py).
+"""
+import numpy as np
+
+from .geometry import path_hash
+from .ranking import CAPACITY_HOURS_PER_DAY, DIFFICULTY_LEVELS, naismith_hours
+
+STOP_TYPES = ('CAMPSITE', 'WATER_SOURCE')
+STOP_CORRIDOR_KM = 1.0
+# Sẵn sàng lệch thêm bấy nhiêu giờ/ngày để được nghỉ ở loại điểm này (None = giữa đường mòn)
+STOP_PENALTY_HOURS = {'CAMPSITE': 0.0, 'WATER_SOURCE': 0.75, None: 1.5}
+# Số vị trí dừng tự do cách đều trên track
+TRACK_STOP_SAMPLES = 200
+MAX_DAYS = 30
+
+DIFFICULTY_NAMES = ('easy', 'medium', 'hard')
+# Thời gian thực tế so với Naismith theo trình độ (easy, medium, hard)
+PACE_FACTORS = (1.25, 1.0, 0.85)
+
+
+def difficulty_name(value):
+    """'Người mới' / 'easy' / ... -> 'easy' | 'medium' | 'hard' (mặc định 'medium')."""
+    return DIFFICULTY_NAMES[DIFFICULTY_LEVELS.get(value, 1)]
+
+
+def effort_profile(distance_km, elevation_m=None, elevation_gain_m=None):
+    """
+    Giờ đi (Naismith), tổng leo và tổng xuống cộng dồn tại mỗi mẫu.
+    Không có DEM thì rải đều elevation_gain_m của route theo quãng đường.
+    """
+    distance_km = np.asarray(distance_km, dtype=np.float64)
+    elevation = None if elevation_m is None else np.asarray(elevation_m, dtype=np.float64)
+    if elevation is None or np.isnan(elevation).any():
+        total = distance_km[-1] if len(distance_km) else 0.0
+        ascent = (distance_km / total * (elevation_gain_m or 0.0) if total > 0
+                  else np.zeros_like(distance_km))
+        descent = np.zeros_like(distance_km)
+    else:
+        climb = np.diff(elevation, prepend=elevation[:1])
+        ascent = np.cumsum(np.maximum(climb, 0.0))
+        descent = np.cumsum(np.maximum(-climb, 0.0))
+    return naismith_hours(distance_km, ascent), ascent, descent
+
+
+def split_stages(positions, penalties, total, days):
+    """
+    Chọn days - 1 điểm dừng trong `positions` (giờ cộng dồn, tăng dần, nằm
+    trong (0, total)) sao cho tổng (giờ chặng - total/days)^2 + phạt là nhỏ
+    nhất. Trả về chỉ số các điểm được chọn, theo thứ tự.
+    """
+    if days <= 1:
+        return []
+    positions = np.asarray(positions, dtype=np.float64)
+    if len(positions) < days - 1:
+        raise ValueError('Không đủ vị trí dừng cho số ngày yêu cầu.')
+
+    t = np.concatenate([[0.0], positions, [total]])
+    penalty = np.concatenate([[0.0], np.asarray(penalties, dtype=np.float64), [0.0]])
+    m = len(t)
+    # stage[i, j]: chi phí một ngày đi từ vị trí i tới vị trí j (> i) rồi nghỉ ở j
+    stage = (t[None, :] - t[:, None] - total / days) ** 2 + penalty[None, :]
+    stage[np.tril_indices(m)] = np.inf
+
+    cost = np.full(m, np.inf)
+    cost[0] = 0.0
+    back = np.empty((days, m), dtype=np.int64)
+    columns = np.arange(m)
+    for day in range(days):
+        candidates = cost[:, None] + stage
+        back[day] = candidates.argmin(axis=0)
+        cost = candidates[back[day], columns]
+
+    chosen, j = [], m - 1
+    for day in range(days - 1, 0, -1):
+        j = int(back[day][j])
+        chosen.append(j - 1)
+    return chosen[::-1]
+
+
+def route_stops(points, distances_km):
+    """Waypoint CAMPSITE / WATER_SOURCE gần track, kèm quãng đường tới đó (km)."""
+    from routes.models import Waypoint
+    from routes.spatial import waypoints_near_path
+
+    near = waypoints_near_path(points, STOP_CORRIDOR_KM, types=STOP_TYPES)
+    rows = Waypoint.objects.in_bulk([waypoint_id for waypoint_id, _, _ in near])
+    return [
+        {'waypoint_id': waypoint_id, 'type': rows[waypoint_id].type, 'name': rows[waypoint_id].name,
+         'latitude': rows[waypoint_id].latitude, 'longitude': rows[waypoint_id].longitude,
+         'distance_km': float(distances_km[index])}
+        for waypoint_id, index, _ in near if waypoint_id in rows
+    ]
+
+
+def compute_itinerary(samples, days, difficulty='medium', stops=(),
+                      total_distance_km=None, elevation_gain_m=None):
+    """
+    samples: mảng (n, 4) lat, lng, distance_km, elevation_m của RouteProfile.
+    Track rỗng thì dùng total_distance_km / elevation_gain_m của route (không có tọa độ).
+    Trả về dict gồm `stages` và các số liệu tổng hợp (giờ đã nhân hệ số trình độ).
+    """
+    level = DIFFICULTY_NAMES.index(difficulty_name(difficulty))
+    samples = np.asarray(samples, dtype=np.float64).reshape(-1, 4)
+    if len(samples) < 2 or samples[-1, 2] <= 0:
+        samples = np.array([[np.nan, np.nan, 0.0, np.nan],
+                            [np.nan, np.nan, total_distance_km or 0.0, np.nan]])
+    distance = samples[:, 2]
+    total_km = float(distance[-1])
+    hours, ascent, descent = effort_profile(distance, samples[:, 3], elevation_gain_m)
+    hours = hours * PACE_FACTORS[level]
+
+    # Vị trí dừng: waypoint nằm giữa track + các điểm cách đều trên track
+    free = np.linspace(0.0, total_km, TRACK_STOP_SAMPLES + 2)[1:-1]
+    candidates = ([dict(stop) for stop in stops if 0.0 < stop['distance_km'] < total_km]
+                  + [{'type': None, 'distance_km': float(km)} for km in free])
+    candidates.sort(key=lambda stop: (stop['distance_km'], stop['type'] is None))
+    at_km = np.array([stop['distance_km'] for stop in candidates], dtype=np.float64)
+    penalties = np.array([STOP_PENALTY_HOURS.get(stop['type'], STOP_PENALTY_HOURS[None]) ** 2
+                          for stop in candidates])
+    total_hours = float(hours[-1])
+    chosen = split_stages(np.interp(at_km, distance, hours), penalties, total_hours, days)
+
+    def at(km, values):
+        return float(np.interp(km, distance, values))
+
+    ends = [candidates[index] for index in chosen] + [None]
+    stages, start_km = [], 0.0
+    for day, stop in enumerate(ends, start=1):
+        end_km = stop['distance_km'] if stop else total_km
+        if stop is not None and stop['type'] is None:
+            lat, lng = at(end_km, samples[:, 0]), at(end_km, samples[:, 1])
+            stop = {**stop, 'latitude': None if np.isnan(lat) else round(lat, 6),
+                    'longitude': None if np.isnan(lng) else round(lng, 6)}
+        if stop is not None:
+            stop['distance_km'] = round(stop['distance_km'], 3)
+        stage_hours = at(end_km, hours) - at(start_km, hours)
+        stages.append({
+            'day': day,
+            'start_km': round(start_km, 3),
+            'end_km': round(end_km, 3),
+            'distance_km': round(end_km - start_km, 3),
+            'ascent_m': round(at(end_km, ascent) - at(start_km, ascent), 1),
+            'descent_m': round(at(end_km, descent) - at(start_km, descent), 1),
+            'hours': round(stage_hours, 2),
+            'over_capacity': bool(stage_hours > CAPACITY_HOURS_PER_DAY[level]),
+            'stop': stop,
+        })
+        start_km = end_km
+
+    stage_hours = [stage['hours'] for stage in stages]
+    return {
+        'stages': stages,
+        'total_hours': round(total_hours, 2),
+        'target_hours': round(total_hours / days, 2),
+        'capacity_hours': float(CAPACITY_HOURS_PER_DAY[level]),
+        'imbalance_hours': round(max(stage_hours) - min(stage_hours), 2),
+    }
+
+
+def build_route_itinerary(route, days, difficulty=None, force=False):
+    """Lấy RouteItinerary của (route, days, trình độ), tính (lại) nếu chưa có hoặc track đã đổi."""
+    from .elevation import build_route_profile
+    from .models import RouteItinerary
+
+    difficulty = difficulty_name(difficulty)
+    digest = path_hash(route.path_coordinates)
+    itinerary = RouteItinerary.objects.filter(route_id=route.pk, duration_days=days,
+                                              difficulty=difficulty).first()
+    if itinerary is not None and itinerary.path_hash == digest and not force:
+        return itinerary
+
+    samples = build_route_profile(route).sample_array().astype(np.float64)
+    stops = route_stops(samples[:, :2], samples[:, 2]) if len(samples) >= 2 else []
+    data = compute_itinerary(samples, days, difficulty, stops,
+                             total_distance_km=route.total_distance_km,
+                             elevation_gain_m=route.elevation_gain_m)
+    itinerary, _ = RouteItinerary.objects.update_or_create(
+        route_id=route.pk, duration_days=days, difficulty=difficulty,
+        defaults={'path_hash': digest, **data},
+    )
+    return itinerary
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from plan.images import FakeImageSearch, crawl_route_images
+from plan.models import Route, RouteImageCrawl
+
+
+class Command(BaseCommand):
+    help = ('Đo thông lượng crawl_route_images theo concurrency với nguồn ảnh giả lập có độ trễ; '
+            'thông lượng tăng theo số worker tới --rate rồi dừng. Dữ liệu được rollback sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', type=int, default=200)
+        parser.add_argument('--latency', type=float, default=0.2, help='Độ trễ giả lập mỗi request (s)')
+        parser.add_argument('--rate', type=float, default=20.0, help='Giới hạn request/giây của nguồn')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'workers':>8} | {'seconds':>8} | {'routes/s':>8}")
+        self.stdout.write("-" * 32)
+        with transaction.atomic():
+            Route.objects.bulk_create([
+                Route(name=f'Cung giả lập {i:06d}', description='', total_distance_km=10, elevation_gain_m=500,
+                      path_coordinates={}, tags=[])
+                for i in range(options['routes'])
+            ])
+            routes = Route.objects.filter(name__startswith='Cung giả lập ')
+            for concurrency in options['concurrency']:
+                RouteImageCrawl.objects.filter(route__in=routes).delete()
+                started = time.perf_counter()
+                stats = crawl_route_images(routes, provider=FakeImageSearch(delay=options['latency']),
+                                           concurrency=concurrency, rate=options['rate'], burst=1, batch_size=50)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{concurrency:>8} | {elapsed:>8.2f} | {stats['done'] / elapsed:>8.1f}")
+            transaction.set_rollback(True)
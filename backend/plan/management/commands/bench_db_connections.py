@@ -0,0 +1,152 @@
+import datetime
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from plan.models import Plan
+
+BENCH_EMAIL = 'bench-connections@example.com'
+BENCH_SECRET = 'bench-db-connections-local-only-secret'
+MODES = ['none', 'persistent', 'pgbouncer', 'pool']
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server với số thread cố định (như gunicorn gthread) để mỗi thread giữ được kết nối DB."""
+
+    def __init__(self, *args, threads=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Đo p50/p99 latency của /api/plans/ với từng DB_CONN_MODE (none / persistent / '
+            'pgbouncer / pool) trên Postgres cục bộ. Mỗi mode chạy một server riêng với '
+            'số thread cố định; user và plan giả lập bị xóa sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--threads', type=int, default=8, help='Số thread của server')
+        parser.add_argument('--plans', type=int, default=50)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--serve', action='store_true', help='(nội bộ) chạy server cho một mode')
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self._serve(options['port'], options['threads'])
+
+        user = get_user_model().objects.create_user(email=BENCH_EMAIL, password='x')
+        try:
+            Plan.objects.bulk_create(
+                Plan(user=user, name=f"Bench plan {i}", location="Lào Cai", group_size=2,
+                     start_date=datetime.date(2026, 1, 1), duration_days=2)
+                for i in range(options['plans'])
+            )
+            token = jwt.encode({'email': BENCH_EMAIL, 'exp': int(time.time()) + 3600},
+                               BENCH_SECRET, algorithm='HS256')
+
+            self.stdout.write(f"{'mode':>10} | {'req/s':>8} | {'p50 ms':>8} | {'p99 ms':>8} | errors")
+            self.stdout.write("-" * 54)
+            for mode in options['modes']:
+                self._bench_mode(mode, token, options)
+        finally:
+            user.delete()
+
+        self.stdout.write(self.style.SUCCESS("Đã đo xong (dữ liệu giả lập đã được xóa)."))
+
+    def _bench_mode(self, mode, token, options):
+        port = options['port']
+        env = {**os.environ, 'DB_CONN_MODE': mode, 'SUPABASE_JWT_SECRET': BENCH_SECRET}
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_db_connections',
+             '--serve', '--port', str(port), '--threads', str(options['threads'])],
+            env=env, stderr=subprocess.PIPE,
+        )
+        try:
+            if not self._wait_for_port(port, server):
+                self.stdout.write(f"{mode:>10} | không chạy được: {self._last_error(server)}")
+                return
+
+            url = f'http://127.0.0.1:{port}/api/plans/'
+
+            def fetch(_):
+                request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                        error = None
+                except OSError as exc:
+                    error = str(exc)
+                return (time.perf_counter() - started) * 1000, error
+
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                list(pool.map(fetch, range(options['concurrency'] * 4)))  # làm nóng
+                started = time.perf_counter()
+                results = list(pool.map(fetch, range(options['requests'])))
+                elapsed = time.perf_counter() - started
+
+            timings = [ms for ms, error in results if error is None]
+            errors = [error for _, error in results if error is not None]
+            if len(timings) < 2:
+                self.stdout.write(f"{mode:>10} | {len(errors)} request lỗi: {errors[0]}")
+                return
+            percentiles = statistics.quantiles(timings, n=100)
+            self.stdout.write(
+                f"{mode:>10} | {len(results) / elapsed:>8.1f} | {statistics.median(timings):>8.2f} | "
+                f"{percentiles[98]:>8.2f} | {len(errors)}"
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    def _last_error(self, server):
+        server.wait()
+        lines = server.stderr.read().decode(errors='replace').strip().splitlines()
+        return lines[-1] if lines else f'server exited with {server.returncode}'
+
+    def _wait_for_port(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                return False
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                return True
+            except OSError:
+                time.sleep(0.1)
+        return False
+
+    def _serve(self, port, threads):
+        application = get_wsgi_application()
+        httpd = PooledWSGIServer(('127.0.0.1', port), QuietHandler, threads=threads)
+        httpd.set_app(application)
+        httpd.serve_forever()
@@ -0,0 +1,60 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from plan.checklist import ITEM_KINDS, build_checklist, item_kind, trip_conditions
+
+
+class _SyntheticCatalog:
+    """Catalogue giả lập trong bộ nhớ, không cache: đo đúng thời gian giải."""
+
+    def __init__(self, items):
+        self.items = items
+
+    def snapshot(self):
+        return self.items, 'bench'
+
+    def cached(self, key, compute):
+        return compute()
+
+
+class Command(BaseCommand):
+    help = ('Đo thời gian chọn checklist đồ dùng (knapsack khối lượng + ngân sách) trên '
+            'một catalogue giả lập, với các cỡ nhóm và ràng buộc khác nhau.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500, help='Số món trong catalogue')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        catalog = _SyntheticCatalog(self._synthetic_items(rng, options['items']))
+        conditions = trip_conditions('hard', 3, 'Lều', max_elevation_m=2800)
+
+        self.stdout.write(f"Catalogue {options['items']} món, điều kiện {sorted(conditions)}")
+        self.stdout.write(f"{'group':>5} | {'budget':>10} | {'median ms':>9} | {'max ms':>7} | "
+                          f"{'items':>5} | {'kg/người':>8} | cost")
+        self.stdout.write("-" * 72)
+        for group_size, budget in ((1, None), (4, None), (4, 8_000_000), (10, 15_000_000), (10, 3_000_000)):
+            timings, result = [], None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = build_checklist(group_size, 3, 'hard', conditions, budget, catalog=catalog)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f"{group_size:>5} | {budget or '-':>10} | {statistics.median(timings):>9.2f} | "
+                              f"{max(timings):>7.2f} | {len(result['items']):>5} | "
+                              f"{result['weight_per_person_g'] / 1000:>8.2f} | {result['total_cost']:,.0f}")
+
+    def _synthetic_items(self, rng, count):
+        names = [keywords[0] for _, keywords, *_ in ITEM_KINDS] + ['phu kien', 'day du', 'tui chong nuoc']
+        items = []
+        for item_id in range(1, count + 1):
+            name = f"{rng.choice(names)} {rng.choice(['', '2 nguoi', '3 nguoi', 'pro', 'lite'])}".strip()
+            items.append({
+                'id': item_id, 'name': name, 'category': f'Nhóm {item_id % 8}',
+                'price': float(rng.randrange(50_000, 4_000_000, 10_000)),
+                'weight_grams': rng.randrange(50, 3000, 10), 'kind': item_kind(name),
+            })
+        return items
@@ -0,0 +1,51 @@
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from plan.elevation import PROFILE_MAX_SAMPLES
+from plan.itinerary import compute_itinerary
+
+
+class Command(BaseCommand):
+    help = ('Đo thời gian chia chặng theo ngày (Naismith + quy hoạch động) cho một track '
+            'giả lập dài như Pu Si Lung, với các số ngày khác nhau.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--distance-km', type=float, default=60.0)
+        parser.add_argument('--stops', type=int, default=12, help='Số CAMPSITE / WATER_SOURCE dọc track')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        samples = self._synthetic_profile(rng, options['distance_km'])
+        stops = [
+            {'waypoint_id': i, 'type': rng.choice(['CAMPSITE', 'WATER_SOURCE']), 'name': f'Điểm {i}',
+             'latitude': 22.6, 'longitude': 103.3,
+             'distance_km': rng.uniform(0, options['distance_km'])}
+            for i in range(options['stops'])
+        ]
+
+        self.stdout.write(f"Track {options['distance_km']:.0f} km, {len(samples)} mẫu, {len(stops)} điểm dừng")
+        self.stdout.write(f"{'days':>4} | {'median ms':>9} | {'max ms':>7} | {'imbalance h':>11} | stops")
+        self.stdout.write("-" * 60)
+        for days in (2, 3, 4, 6, 10):
+            timings, result = [], None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = compute_itinerary(samples, days, 'medium', stops)
+                timings.append((time.perf_counter() - started) * 1000)
+            kinds = ','.join((stage['stop']['type'] or 'track')[:5] for stage in result['stages'][:-1])
+            self.stdout.write(f"{days:>4} | {statistics.median(timings):>9.2f} | {max(timings):>7.2f} | "
+                              f"{result['imbalance_hours']:>11.2f} | {kinds}")
+
+    def _synthetic_profile(self, rng, distance_km):
+        # Leo dốc, xuống dốc xen kẽ như track núi Tây Bắc
+        distance = np.linspace(0.0, distance_km, PROFILE_MAX_SAMPLES)
+        elevation = 1500 + 800 * np.sin(distance / 7.0) + np.array(
+            [rng.uniform(-30, 30) for _ in distance])
+        lat = 22.6 + distance / 111.0
+        lng = np.full_like(distance, 103.3)
+        return np.column_stack([lat, lng, distance, elevation]).astype(np.float32)
@@ -0,0 +1,118 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from plan.models import Plan, Route
+from plan.search import build_search_text
+from plan.serializers import PlanSerializer, RouteSerializer
+from plan.views import PlanViewSet, RouteViewSet
+
+
+class Command(BaseCommand):
+    help = ('Đo kích thước payload và thời gian serialize của /api/routes/ và /api/plans/: '
+            'trước (toàn bộ bản ghi, mọi field) và sau (cursor page + sparse fieldset). '
+            'Dữ liệu giả lập được rollback sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', type=int, default=200)
+        parser.add_argument('--points', type=int, default=2000, help='Số điểm GPS mỗi route')
+        parser.add_argument('--plans', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.repeat = options['repeat']
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        renderer = CamelCaseJSONRenderer()
+
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(email='bench-payload@example.com', password='x')
+            Route.objects.bulk_create(
+                (self._synthetic_route(rng, i, options['points']) for i in range(options['routes'])),
+                batch_size=100,
+            )
+            Plan.objects.bulk_create(
+                (self._synthetic_plan(rng, user, i) for i in range(options['plans'])),
+                batch_size=500,
+            )
+
+            self.stdout.write(f"{'case':<42} | {'p50 ms':>8} | {'bytes':>12}")
+            self.stdout.write("-" * 68)
+
+            self._measure("routes: before (all rows, all fields)", lambda: renderer.render(
+                RouteSerializer(Route.objects.all(), many=True).data))
+            self._measure("routes: after (page 20, summary fields)", lambda: self._render_view(
+                RouteViewSet, factory.get('/api/routes/')))
+            self._measure("routes: detail (one route, full geometry)", lambda: self._render_view(
+                RouteViewSet, factory.get('/api/routes/'), action='retrieve',
+                pk=Route.objects.values_list('pk', flat=True).first()))
+
+            self._measure("plans: before (all rows, all fields)", lambda: renderer.render(
+                PlanSerializer(Plan.objects.filter(user=user), many=True).data))
+            self._measure("plans: after (page 20, summary fields)", lambda: self._render_view(
+                PlanViewSet, factory.get('/api/plans/'), user=user))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Đã đo xong (dữ liệu giả lập đã được rollback)."))
+
+    def _render_view(self, viewset, request, action='list', user=None, **kwargs):
+        if user is not None:
+            force_authenticate(request, user=user)
+        response = viewset.as_view({'get': action})(request, **kwargs)
+        return response.render().content
+
+    def _measure(self, label, render):
+        timings, size = [], 0
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            size = len(render())
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f"{label:<42} | {statistics.median(timings):>8.2f} | {size:>12,}")
+
+    def _synthetic_route(self, rng, i, points):
+        lat, lng = rng.uniform(10, 23), rng.uniform(103, 108)
+        path = []
+        for _ in range(points):
+            lat += rng.uniform(-0.0005, 0.0005)
+            lng += rng.uniform(-0.0005, 0.0005)
+            path.append([round(lat, 6), round(lng, 6)])
+        name = f"Bench route {i}"
+        description = "Cung đường giả lập. " * 40
+        tags = ['medium', 'Săn mây', 'Cắm trại']
+        return Route(
+            name=name,
+            description=description,
+            total_distance_km=rng.uniform(5, 60),
+            elevation_gain_m=rng.uniform(100, 2500),
+            path_coordinates=path,
+            tags=tags,
+            ai_note="Ghi chú AI giả lập. " * 20,
+            image_url=f"https://example.com/routes/{i}.jpg",
+            gallery=[f"https://example.com/routes/{i}/{n}.jpg" for n in range(4)],
+            search_text=build_search_text(name, description, tags),
+        )
+
+    def _synthetic_plan(self, rng, user, i):
+        return Plan(
+            user=user,
+            name=f"Bench plan {i}",
+            location="Lào Cai",
+            rest_type="Homestay",
+            group_size=rng.randint(1, 8),
+            start_date=datetime.date(2026, 1, 1),
+            duration_days=rng.randint(1, 5),
+            difficulty="Có kinh nghiệm",
+            personal_interests=["Săn mây"],
+            personalized_equipment_list=[
+                {"name": f"Item {n}", "category": "Khác", "checked": False} for n in range(40)
+            ],
+            dangers_snapshot={"warnings": [f"Cảnh báo {n}" for n in range(20)]},
+        )
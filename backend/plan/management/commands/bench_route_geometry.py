@@ -0,0 +1,65 @@
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from plan.simplify import LEVEL_ZOOMS, build_levels, decode_polyline, encode_polyline
+from plan.geometry import path_array
+
+
+class Command(BaseCommand):
+    help = ('Đo số điểm, kích thước payload và thời gian serialize của path_coordinates '
+            'ở từng mức rút gọn (Douglas–Peucker) so với track gốc, dạng [lat, lng] và encoded polyline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=20000, help='Số điểm GPS của track giả lập')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.repeat = options['repeat']
+        self.renderer = CamelCaseJSONRenderer()
+        path = self._synthetic_track(rng, options['points'])
+
+        started = time.perf_counter()
+        levels = build_levels(path)
+        self.stdout.write(f"Track {len(path):,} điểm; rút gọn {len(LEVEL_ZOOMS)} mức: "
+                          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+        self.stdout.write(f"{'level':<16} | {'points':>7} | {'json bytes':>11} | {'json ms':>8} | "
+                          f"{'polyline bytes':>14} | {'polyline ms':>11}")
+        self.stdout.write("-" * 83)
+        self._row('full', len(path), lambda: path,
+                  lambda: encode_polyline(path_array(path)))
+        for level in levels:
+            self._row(f"zoom {level['zoom']} ({level['tolerance_m']:.0f} m)", level['points'],
+                      lambda level=level: decode_polyline(level['polyline']).round(5).tolist(),
+                      lambda level=level: level['polyline'])
+
+    def _row(self, label, points, coordinates, polyline):
+        json_ms, json_bytes = self._measure(lambda: self.renderer.render({'path': coordinates()}))
+        polyline_ms, polyline_bytes = self._measure(lambda: self.renderer.render({'path': polyline()}))
+        self.stdout.write(f"{label:<16} | {points:>7,} | {json_bytes:>11,} | {json_ms:>8.2f} | "
+                          f"{polyline_bytes:>14,} | {polyline_ms:>11.2f}")
+
+    def _measure(self, render):
+        timings, size = [], 0
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            size = len(render())
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), size
+
+    def _synthetic_track(self, rng, points):
+        # Đi bộ ngẫu nhiên ~10 m mỗi điểm, hướng đổi dần như đường mòn thật
+        lat, lng, heading = 22.3364, 103.8438, 0.0
+        path = []
+        for _ in range(points):
+            heading += rng.gauss(0, 0.25)
+            lat += 0.00009 * math.cos(heading)
+            lng += 0.00009 * math.sin(heading) / math.cos(math.radians(lat))
+            path.append([round(lat, 6), round(lng, 6)])
+        return path
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from plan.models import Route
+from plan.search import build_search_text
+from plan.signals import ROUTE_INDEXES
+from plan.suggestions import SUGGESTION_BACKENDS
+
+DIFFICULTY_TAGS = ['easy', 'medium', 'hard']
+INTEREST_TAGS = [
+    'Săn mây', 'Cắm trại', 'Homestay', 'Hang động', 'Ruộng bậc thang', 'flowers',
+    'jungle', 'ridge-walk', 'wildlife', 'waterfall', 'scenic', 'steep',
+]
+LOCATIONS = ['Lào Cai', 'Lai Châu', 'Sơn La', 'Hà Giang', 'Lâm Đồng', 'Quảng Bình', 'Thanh Hóa', 'Đồng Nai']
+
+QUERIES = [
+    {'difficulty_tag': 'easy'},
+    {'difficulty_tag': 'hard', 'interests': ['Săn mây', 'Cắm trại']},
+    {'location': 'Lào Cai', 'difficulty_tag': 'medium', 'interests': ['Homestay']},
+    {'location': 'Hà Giang'},
+]
+
+
+class Command(BaseCommand):
+    help = ('So sánh tốc độ các chiến lược gợi ý Route (python / index / database) '
+            'trên dữ liệu giả lập. Dữ liệu được rollback sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'routes':>8} | {'backend':>8} | {'p50 ms':>9} | {'max ms':>9} | rows")
+        self.stdout.write("-" * 52)
+        for size in options['sizes']:
+            with transaction.atomic():
+                Route.objects.bulk_create(
+                    (self._synthetic_route(rng, i) for i in range(size)),
+                    batch_size=2000,
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE routes')
+
+                started = time.perf_counter()
+                for index in ROUTE_INDEXES:
+                    index.build()
+                build_ms = (time.perf_counter() - started) * 1000
+                self.stdout.write(f"{size:>8} | index build: {build_ms:.1f} ms")
+
+                for name, strategy in SUGGESTION_BACKENDS.items():
+                    timings, rows = [], 0
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        rows = sum(len(list(strategy(**query))) for query in QUERIES)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    self.stdout.write(
+                        f"{size:>8} | {name:>8} | {statistics.median(timings):>9.2f} | "
+                        f"{max(timings):>9.2f} | {rows}"
+                    )
+                transaction.set_rollback(True)
+            for index in ROUTE_INDEXES:
+                index.invalidate()
+
+        self.stdout.write(self.style.SUCCESS("Đã đo xong (dữ liệu giả lập đã được rollback)."))
+
+    def _synthetic_route(self, rng, i):
+        location = rng.choice(LOCATIONS)
+        tags = [rng.choice(DIFFICULTY_TAGS), location] + rng.sample(INTEREST_TAGS, rng.randint(1, 4))
+        name = f"Bench route {i}"
+        description = f"Cung đường giả lập số {i} tại {location}."
+        return Route(
+            name=name,
+            description=description,
+            total_distance_km=rng.uniform(5, 60),
+            elevation_gain_m=rng.uniform(100, 2500),
+            path_coordinates={},
+            tags=tags,
+            ai_note="",
+            search_text=build_search_text(name, description, tags),
+        )
@@ -0,0 +1,88 @@
+import math
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from plan.geometry import path_array
+from plan.models import Route, RouteTrack
+from plan.track import TRACK_ENCODINGS, build_route_track, decode_track, track_view
+
+
+class Command(BaseCommand):
+    help = ('So sánh đọc track GPS từ path_coordinates (JSON) với kho nhị phân RouteTrack: '
+            'thời gian đọc + parse, bộ nhớ giữ lại và dung lượng lưu trong DB. '
+            'Dữ liệu giả lập được rollback sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', type=int, default=200)
+        parser.add_argument('--points', type=int, default=5000, help='Số điểm GPS mỗi track')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.repeat = options['repeat']
+
+        with transaction.atomic():
+            routes = Route.objects.bulk_create([
+                Route(name=f"Bench track {i}", description='', total_distance_km=0, elevation_gain_m=0,
+                      path_coordinates=self._synthetic_track(rng, options['points']), tags=[])
+                for i in range(options['routes'])
+            ])
+            ids = [route.pk for route in routes]
+            self.stdout.write(f"{len(ids)} route x {options['points']:,} điểm")
+            self.stdout.write(f"{'storage':<16} | {'db bytes':>12} | {'p50 ms':>9} | {'max ms':>9} | "
+                              f"{'retained MB':>11} | {'peak MB':>8}")
+            self.stdout.write("-" * 81)
+
+            self._row('json', self._column_bytes(Route._meta.db_table, 'path_coordinates', ids),
+                      lambda: [path_array(path) for path in
+                               Route.objects.filter(pk__in=ids).values_list('path_coordinates', flat=True)])
+
+            for encoding in TRACK_ENCODINGS:
+                for route in Route.objects.filter(pk__in=ids).only('id', 'path_coordinates'):
+                    build_route_track(route, encoding=encoding, force=True)
+                tracks = RouteTrack.objects.filter(route_id__in=ids).values_list('data', 'encoding')
+                db_bytes = self._column_bytes(RouteTrack._meta.db_table, 'data', ids, key='route_id')
+                self._row(f'{encoding}', db_bytes,
+                          lambda: [decode_track(data, enc) for data, enc in tracks.all()])
+                self._row(f'{encoding} (view)', db_bytes,
+                          lambda: [track_view(data, enc) for data, enc in tracks.all()])
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Đã đo xong (dữ liệu giả lập đã được rollback)."))
+
+    def _row(self, label, db_bytes, load):
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            load()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        result = load()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        self.stdout.write(f"{label:<16} | {db_bytes:>12,} | {statistics.median(timings):>9.1f} | "
+                          f"{max(timings):>9.1f} | {retained / 2 ** 20:>11.1f} | {peak / 2 ** 20:>8.1f}")
+
+    def _column_bytes(self, table, column, ids, key='id'):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COALESCE(SUM(pg_column_size({column})), 0) FROM {table} '
+                           f'WHERE {key} = ANY(%s)', [ids])
+            return cursor.fetchone()[0]
+
+    def _synthetic_track(self, rng, points):
+        # Đi bộ ngẫu nhiên ~10 m mỗi điểm, hướng đổi dần như đường mòn thật
+        lat, lng, heading = 22.3364, 103.8438, 0.0
+        path = []
+        for _ in range(points):
+            heading += rng.gauss(0, 0.25)
+            lat += 0.00009 * math.cos(heading)
+            lng += 0.00009 * math.sin(heading) / math.cos(math.radians(lat))
+            path.append([round(lat, 6), round(lng, 6)])
+        return path
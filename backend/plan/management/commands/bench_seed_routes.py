@@ -0,0 +1,52 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from plan.models import Route
+from plan.seeding import SEED_BATCH_SIZE, seed_routes
+
+DIFFICULTY_TAGS = [('easy', 'Người mới'), ('medium', 'Có kinh nghiệm'), ('hard', 'Chuyên nghiệp')]
+INTEREST_TAGS = ['Săn mây', 'Cắm trại', 'Homestay', 'flowers', 'jungle', 'ridge-walk', 'waterfall', 'scenic']
+LOCATIONS = ['Lào Cai', 'Lai Châu', 'Sơn La', 'Hà Giang', 'Lâm Đồng', 'Quảng Bình', 'Thanh Hóa', 'Đồng Nai']
+
+
+class Command(BaseCommand):
+    help = ('Đo thời gian seed_routes (upsert theo tên) trên dữ liệu giả lập: lần nạp đầu, '
+            'chạy lại không đổi và chạy lại với một phần route đã sửa. Dữ liệu được rollback sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', type=int, default=100000)
+        parser.add_argument('--changed', type=float, default=0.1, help='Tỉ lệ route bị sửa ở lần chạy thứ ba')
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        definitions = [self._synthetic_definition(rng, i) for i in range(options['routes'])]
+        edited = [
+            {**item, 'description': item['description'] + ' (đã cập nhật)'} if rng.random() < options['changed']
+            else item
+            for item in definitions
+        ]
+
+        self.stdout.write(f"{'run':>10} | {'seconds':>8} | {'created':>8} | {'updated':>8} | unchanged")
+        self.stdout.write("-" * 58)
+        with transaction.atomic():
+            for label, items in (('initial', definitions), ('rerun', definitions), ('edited', edited)):
+                started = time.perf_counter()
+                stats = seed_routes(items, batch_size=options['batch_size'])
+                self.stdout.write(f"{label:>10} | {time.perf_counter() - started:>8.2f} | {stats['created']:>8} | "
+                                  f"{stats['updated']:>8} | {stats['unchanged']}")
+            self.stdout.write(f"Tổng số route trong bảng: {Route.objects.count()}")
+            transaction.set_rollback(True)
+
+    def _synthetic_definition(self, rng, i):
+        difficulty = rng.choice(DIFFICULTY_TAGS)
+        return {
+            'name': f'Cung giả lập {i:06d}',
+            'description': f'Mô tả cung giả lập số {i}',
+            'total_distance_km': round(rng.uniform(3, 80), 1),
+            'elevation_gain_m': float(rng.randrange(50, 2500)),
+            'tags': [*difficulty, *rng.sample(INTEREST_TAGS, 2), rng.choice(LOCATIONS)],
+        }
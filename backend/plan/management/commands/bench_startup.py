@@ -0,0 +1,85 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Những gì một worker làm khi boot: setup Django (settings, apps, models) và nạp URLconf
+BOOT_SCRIPT = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+PROJECT_PACKAGES = ('trek_guide_project', 'users', 'routes', 'plan', 'safety', 'llm')
+
+
+class Command(BaseCommand):
+    help = ('Đo thời gian cold-start của Django project trong process mới '
+            '(python -X importtime): tổng thời gian boot và các package import chậm nhất. '
+            'Dùng --budget-ms để báo lỗi khi vượt ngưỡng (bắt regression trong CI).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Báo lỗi nếu p50 thời gian boot vượt ngưỡng này')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get(
+            'DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)}
+
+        baseline = self._wall_ms([sys.executable, '-c', 'pass'], env, options['repeat'])
+        boot = self._wall_ms([sys.executable, '-c', BOOT_SCRIPT], env, options['repeat'])
+        self.stdout.write(f"python startup (baseline): {baseline:>8.1f} ms")
+        self.stdout.write(f"django boot (p50)        : {boot:>8.1f} ms  "
+                          f"(+{boot - baseline:.1f} ms so với baseline)")
+
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+                                env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        packages, project = self._parse_importtime(result.stderr)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'package (self time)':<40} | {'ms':>8}")
+        self.stdout.write("-" * 51)
+        for name, us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{name:<40} | {us / 1000:>8.1f}")
+
+        self.stdout.write("")
+        self.stdout.write(f"{'project module (cumulative)':<40} | {'ms':>8}")
+        self.stdout.write("-" * 51)
+        for name, us in sorted(project.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{name:<40} | {us / 1000:>8.1f}")
+
+        budget = options['budget_ms']
+        if budget is not None and boot > budget:
+            raise CommandError(f"Django boot p50 {boot:.1f} ms vượt ngưỡng {budget:.1f} ms")
+        self.stdout.write(self.style.SUCCESS("Đã đo xong."))
+
+    def _wall_ms(self, command, env, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run(command, env=env, cwd=settings.BASE_DIR, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def _parse_importtime(self, output):
+        """Gộp self time theo package gốc; cumulative time cho module của project."""
+        packages, project = defaultdict(int), {}
+        for line in output.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            self_us, cumulative_us, _, module = match.groups()
+            packages[module.split('.')[0]] += int(self_us)
+            if module.split('.')[0] in PROJECT_PACKAGES:
+                project[module] = int(cumulative_us)
+        return packages, project
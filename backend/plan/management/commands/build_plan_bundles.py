@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from plan.bundle import build_plan_bundle, cache_thumbnails
+from plan.models import Plan
+
+
+class Command(BaseCommand):
+    help = ('Dựng trước gói offline (MBTiles/SQLite) cho các Plan, vd. trước chuyến đi vào vùng '
+            'không có sóng. Tải trước thumbnail ảnh gallery (request không bao giờ tải ảnh); '
+            'chỉ dựng lại khi đầu vào đổi (so hash), trừ khi có --force.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ dựng các plan này')
+        parser.add_argument('--force', action='store_true', help='Dựng lại cả bundle còn mới')
+
+    def handle(self, *args, **options):
+        plans = Plan.objects.select_related('route').order_by('id')
+        if options['ids']:
+            plans = plans.filter(pk__in=options['ids'])
+
+        started = time.perf_counter()
+        built = size = 0
+        for plan in plans.iterator(chunk_size=50):
+            if plan.route is not None:
+                cache_thumbnails(plan.route.gallery or [])
+            path, _ = build_plan_bundle(plan, force=options['force'])
+            built += 1
+            size += os.path.getsize(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã xử lý {built} plan ({size / 1024:,.0f} KiB) trong {time.perf_counter() - started:.1f} s."
+        ))
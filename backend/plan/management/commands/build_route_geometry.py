@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from plan.models import Route
+from plan.simplify import LEVEL_ZOOMS, build_route_geometry
+
+
+class Command(BaseCommand):
+    help = (f'Tính trước các mức rút gọn của path_coordinates (zoom {", ".join(map(str, LEVEL_ZOOMS))}) '
+            'cho các Route. Chỉ tính lại route chưa có hoặc path_coordinates đã đổi, trừ khi có --force.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ tính các route này')
+        parser.add_argument('--force', action='store_true', help='Tính lại cả dữ liệu còn mới')
+
+    def handle(self, *args, **options):
+        routes = Route.objects.only('id', 'path_coordinates').prefetch_related('geometry').order_by('id')
+        if options['ids']:
+            routes = routes.filter(pk__in=options['ids'])
+
+        started = time.perf_counter()
+        built = 0
+        for route in routes.iterator(chunk_size=100):
+            build_route_geometry(route, force=options['force'])
+            built += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã xử lý {built} route trong {time.perf_counter() - started:.1f} s."
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from plan.elevation import build_route_profile, dem_tiles
+from plan.models import Route
+
+
+class Command(BaseCommand):
+    help = ('Tính trước hồ sơ độ cao (RouteProfile) cho các Route từ DEM cục bộ (DEM_TILE_DIR). '
+            'Chỉ tính lại route chưa có profile hoặc path_coordinates đã đổi, trừ khi có --force.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ tính các route này')
+        parser.add_argument('--force', action='store_true', help='Tính lại cả profile còn mới')
+
+    def handle(self, *args, **options):
+        routes = Route.objects.only('id', 'path_coordinates').order_by('id')
+        if options['ids']:
+            routes = routes.filter(pk__in=options['ids'])
+
+        self.stdout.write(f"DEM: {dem_tiles.directory}")
+        started = time.perf_counter()
+        built = without_elevation = 0
+        for route in routes.iterator(chunk_size=100):
+            profile = build_route_profile(route, force=options['force'])
+            built += 1
+            if profile.elevation_gain_m is None:
+                without_elevation += 1
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã xử lý {built} route trong {elapsed:.1f} s "
+            f"({without_elevation} route không có dữ liệu DEM)."
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from plan.models import Route
+from plan.track import TRACK_ENCODINGS, build_route_track, default_encoding
+
+
+class Command(BaseCommand):
+    help = ('Chép path_coordinates của các Route sang kho track nhị phân (RouteTrack). '
+            'Chỉ mã hóa lại route chưa có, path_coordinates đã đổi hoặc khác encoding, trừ khi có --force. '
+            'Đặt ROUTE_TRACK_STORE=binary để API đọc tọa độ từ đây.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ xử lý các route này')
+        parser.add_argument('--encoding', choices=list(TRACK_ENCODINGS),
+                            help='Mặc định theo ROUTE_TRACK_ENCODING')
+        parser.add_argument('--force', action='store_true', help='Mã hóa lại cả track còn mới')
+
+    def handle(self, *args, **options):
+        encoding = options['encoding'] or default_encoding()
+        routes = Route.objects.only('id', 'path_coordinates').prefetch_related('track').order_by('id')
+        if options['ids']:
+            routes = routes.filter(pk__in=options['ids'])
+
+        started = time.perf_counter()
+        stored = skipped = points = 0
+        for route in routes.iterator(chunk_size=100):
+            track = build_route_track(route, encoding=encoding, force=options['force'])
+            if track is None:
+                skipped += 1
+            else:
+                stored += 1
+                points += track.point_count
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã lưu {stored} track ({points:,} điểm, {encoding}) trong "
+            f"{time.perf_counter() - started:.1f} s."
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"{skipped} route có path_coordinates không phải [[lat, lng], ...]; API vẫn đọc JSON."
+            ))
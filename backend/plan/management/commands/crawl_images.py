@@ -1,67 +1,48 @@
 import time
-import random
+
 from django.core.management.base import BaseCommand
+from plan.images import DEFAULT_RATE, IMAGES_PER_ROUTE, crawl_route_images, image_search
 from plan.models import Route
-from duckduckgo_search import DDGS
 
 
 class Command(BaseCommand):
-    help = 'Tự động tìm và nạp ảnh cho 36 Route (Chế độ an toàn chống chặn IP)'
+    help = ('Tự động tìm và nạp ảnh cho các Route qua nguồn tìm ảnh (IMAGE_SEARCH_PROVIDER), nhiều route '
+            'song song nhưng không vượt --rate request/giây. Route đã có kết quả được bỏ qua, trừ khi có '
+            '--force; chạy lại sau khi bị ngắt sẽ làm tiếp từ lô đã ghi.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ tìm ảnh cho các route này')
+        parser.add_argument('--force', action='store_true', help='Tìm lại cả route đã có kết quả')
+        parser.add_argument('--provider', help='Nguồn thay cho IMAGE_SEARCH_PROVIDER (vd. fake)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Số request tìm ảnh chạy cùng lúc')
+        parser.add_argument('--rate', type=float,
+                            help=f'Số request/giây tối đa (mặc định IMAGE_CRAWL_RATE hoặc {DEFAULT_RATE})')
+        parser.add_argument('--burst', type=int, help='Số request được dồn liên tiếp (mặc định = concurrency)')
+        parser.add_argument('--max-retries', type=int, default=3, help='Số lần thử lại khi bị chặn')
+        parser.add_argument('--batch-size', type=int, default=20, help='Số route mỗi lần ghi')
+        parser.add_argument('--images', type=int, default=IMAGES_PER_ROUTE, help='Số ảnh mỗi route')
 
     def handle(self, *args, **options):
         routes = Route.objects.all()
-        total = routes.count()
-
-        self.stdout.write(self.style.WARNING(f"🚀 Bắt đầu tìm ảnh cho {total} cung đường..."))
-        self.stdout.write("---------------------------------------------------")
-
-        for index, route in enumerate(routes):
-            query = f"{route.name} trekking vietnam scenery nature"
-            self.stdout.write(f"[{index + 1}/{total}] Đang tìm: {route.name}...")
-
-            # Cơ chế thử lại tối đa 3 lần nếu bị lỗi
-            max_retries = 3
-            success = False
-
-            for attempt in range(max_retries):
-                try:
-                    with DDGS() as ddgs:
-                        # Tìm 4 ảnh
-                        results = list(ddgs.images(
-                            query,
-                            region="vn-vi",
-                            safesearch="off",
-                            max_results=4
-                        ))
-
-                    if results:
-                        route.image_url = results[0]['image']
-                        gallery_urls = [r['image'] for r in results]
-                        route.gallery = gallery_urls
-                        route.save()
-                        self.stdout.write(self.style.SUCCESS(f"   ✅ Đã lưu {len(results)} ảnh."))
-                        success = True
-                        break  # Thành công thì thoát vòng lặp thử lại
-                    else:
-                        self.stdout.write(self.style.WARNING("   ⚠️ Không tìm thấy ảnh."))
-                        break
-
-                except Exception as e:
-                    error_msg = str(e)
-                    if "202" in error_msg or "Ratelimit" in error_msg:
-                        wait_time = 30 + (attempt * 10)  # Lần 1: 30s, Lần 2: 40s...
-                        self.stdout.write(
-                            self.style.ERROR(f"   zzz Bị chặn (Rate Limit). Đang ngủ {wait_time}s để hồi phục..."))
-                        time.sleep(wait_time)
-                    else:
-                        self.stdout.write(self.style.ERROR(f"   ❌ Lỗi khác: {e}"))
-                        break  # Lỗi khác thì bỏ qua luôn
-
-            # Nếu thành công, nghỉ ngơi ngẫu nhiên 5-10 giây trước khi qua cung đường tiếp theo
-            # (Tăng thời gian nghỉ lên để an toàn hơn)
-            if success:
-                sleep_time = random.uniform(5.0, 10.0)
-                time.sleep(sleep_time)
-
-        self.stdout.write("---------------------------------------------------")
-        self.stdout.write(self.style.SUCCESS("\n ĐÃ HOÀN TẤT!"))
\ No newline at end of file
+        if options['ids']:
+            routes = routes.filter(pk__in=options['ids'])
+        provider = image_search(options['provider'])
+        symbols = {'done': self.style.SUCCESS('✅'), 'empty': self.style.WARNING('⚠️'), 'failed': self.style.ERROR('❌')}
+
+        def progress(route, status, urls):
+            self.stdout.write(f"   {symbols[status]} {route['name']}: {len(urls)} ảnh")
+
+        self.stdout.write(self.style.WARNING(
+            f"🚀 Tìm ảnh qua {options['provider'] or 'IMAGE_SEARCH_PROVIDER'}, "
+            f"concurrency {options['concurrency']}..."))
+        started = time.perf_counter()
+        stats = crawl_route_images(routes, provider=provider, concurrency=max(options['concurrency'], 1),
+                                   rate=options['rate'], burst=options['burst'],
+                                   batch_size=max(options['batch_size'], 1),
+                                   max_retries=max(options['max_retries'], 0), images=max(options['images'], 1),
+                                   force=options['force'], progress=progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"ĐÃ HOÀN TẤT trong {elapsed:.1f} s: {stats['done']} route có ảnh, "
+            f"{stats['empty']} không tìm thấy, {stats['failed']} lỗi (chạy lại để thử tiếp)."
+        ))
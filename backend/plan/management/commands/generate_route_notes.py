@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from llm.providers import FakeLLMProvider, llm_provider
+from plan.ai_notes import generate_route_notes
+from plan.models import Route
+
+
+class Command(BaseCommand):
+    help = ('Sinh trước Route.ai_note qua provider LLM (LLM_PROVIDER), nhiều route song song. '
+            'Chỉ sinh lại route có name / description / tags đổi, trừ khi có --force; '
+            'chạy lại sau khi bị ngắt sẽ làm tiếp từ lô đã ghi.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ sinh cho các route này')
+        parser.add_argument('--force', action='store_true', help='Sinh lại cả ghi chú còn mới')
+        parser.add_argument('--provider', help='Provider thay cho LLM_PROVIDER (vd. fake)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Số lời gọi LLM chạy cùng lúc')
+        parser.add_argument('--batch-size', type=int, default=50, help='Số ghi chú mỗi lần bulk_update')
+        parser.add_argument('--limit', type=int, help='Dừng sau chừng này route')
+
+    def handle(self, *args, **options):
+        routes = Route.objects.all()
+        if options['ids']:
+            routes = routes.filter(pk__in=options['ids'])
+        provider = llm_provider(options['provider'])
+        # LLM_PROVIDER rơi về 'fake' khi thiếu GEMINI_API_KEY: không ghi ghi chú giả lập vào DB nếu không chủ ý
+        if isinstance(provider, FakeLLMProvider) and options['provider'] != 'fake':
+            raise CommandError("Provider đang là 'fake' (thiếu GEMINI_API_KEY?); thêm --provider fake nếu muốn dùng.")
+
+        self.stdout.write(f"Provider: {options['provider'] or 'LLM_PROVIDER'} ({provider.model}), "
+                          f"concurrency {options['concurrency']}")
+        started = time.perf_counter()
+        stats = generate_route_notes(routes, provider=provider, concurrency=max(options['concurrency'], 1),
+                                     batch_size=max(options['batch_size'], 1), force=options['force'],
+                                     limit=options['limit'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã sinh {stats['generated']} ghi chú trong {elapsed:.1f} s "
+            f"({stats['failed']} lỗi, {stats['prompt_tokens']} + {stats['completion_tokens']} token)."
+        ))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from plan.tiles import MAX_ZOOM, render_tile, route_bounds, tile_cache, tile_range
+
+
+class Command(BaseCommand):
+    help = ('Làm ấm cache vector tile (/tiles/{z}/{x}/{y}.mvt): render trước mọi tile chạm '
+            'bbox của các Route ở các zoom được chọn và ghi vào TILE_CACHE_DIR. '
+            'Bỏ qua tile đã có trong cache, trừ khi có --force.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zooms', nargs='+', type=int, default=list(range(6, 13)),
+                            help='Các zoom cần render (mặc định 6..12)')
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ các tile chạm những route này')
+        parser.add_argument('--force', action='store_true', help='Render lại cả tile đã có')
+
+    def handle(self, *args, **options):
+        if not tile_cache.directory:
+            raise CommandError('TILE_CACHE_DIR đang tắt; không có chỗ lưu tile.')
+        zooms = sorted(set(options['zooms']))
+        if zooms[0] < 0 or zooms[-1] > MAX_ZOOM:
+            raise CommandError(f'Zoom phải nằm trong [0, {MAX_ZOOM}].')
+
+        route_bounds.invalidate()
+        bounds = route_bounds.all_bounds()
+        if options['ids']:
+            wanted = set(options['ids'])
+            bounds = {route_id: box for route_id, box in bounds.items() if route_id in wanted}
+
+        started = time.perf_counter()
+        for z in zooms:
+            tiles = set()
+            for box in bounds.values():
+                x0, x1, y0, y1 = tile_range(box, z)
+                tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+            rendered = size = 0
+            for x, y in sorted(tiles):
+                if not options['force'] and tile_cache.get(z, x, y) is not None:
+                    continue
+                data = render_tile(z, x, y)
+                tile_cache.put(z, x, y, data)
+                rendered += 1
+                size += len(data)
+            self.stdout.write(f"zoom {z:>2}: {len(tiles):,} tile, render {rendered:,} ({size / 1024:,.0f} KiB)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Xong {len(bounds)} route trong {time.perf_counter() - started:.1f} s."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:25
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0004_equipment_remove_historyinput_personal_interest_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='route',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='routes_tags_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
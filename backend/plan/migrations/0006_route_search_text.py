@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:40
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from plan.search import build_search_text
+
+
+def fill_search_text(apps, schema_editor):
+    Route = apps.get_model('plan', 'Route')
+    routes = list(Route.objects.only('id', 'name', 'description', 'tags'))
+    for route in routes:
+        route.search_text = build_search_text(route.name, route.description, route.tags)
+    Route.objects.bulk_update(routes, ['search_text'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0005_route_tags_gin_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='route',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='route',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_text'], name='routes_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
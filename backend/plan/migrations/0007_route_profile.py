@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0006_route_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteProfile',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to='plan.route')),
+                ('path_hash', models.CharField(max_length=64)),
+                ('total_distance_km', models.FloatField()),
+                ('elevation_gain_m', models.FloatField(blank=True, null=True)),
+                ('elevation_loss_m', models.FloatField(blank=True, null=True)),
+                ('min_elevation_m', models.FloatField(blank=True, null=True)),
+                ('max_elevation_m', models.FloatField(blank=True, null=True)),
+                ('max_grade_pct', models.FloatField(blank=True, null=True)),
+                ('samples', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'route_profiles',
+            },
+        ),
+    ]
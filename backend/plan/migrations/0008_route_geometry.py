@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0007_route_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteGeometry',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='geometry', serialize=False, to='plan.route')),
+                ('path_hash', models.CharField(max_length=64)),
+                ('levels', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'route_geometries',
+            },
+        ),
+    ]
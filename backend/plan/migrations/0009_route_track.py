@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0008_route_geometry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteTrack',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='track', serialize=False, to='plan.route')),
+                ('path_hash', models.CharField(max_length=64)),
+                ('encoding', models.CharField(default='delta_i4', max_length=16)),
+                ('point_count', models.IntegerField()),
+                ('data', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'route_tracks',
+            },
+        ),
+    ]
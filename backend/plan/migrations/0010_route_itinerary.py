@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0009_route_track'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteItinerary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duration_days', models.IntegerField()),
+                ('difficulty', models.CharField(max_length=16)),
+                ('path_hash', models.CharField(max_length=64)),
+                ('total_hours', models.FloatField()),
+                ('target_hours', models.FloatField()),
+                ('capacity_hours', models.FloatField()),
+                ('imbalance_hours', models.FloatField()),
+                ('stages', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itineraries', to='plan.route')),
+            ],
+            options={
+                'db_table': 'route_itineraries',
+                'constraints': [models.UniqueConstraint(fields=('route', 'duration_days', 'difficulty'), name='route_itinerary_unique')],
+            },
+        ),
+    ]
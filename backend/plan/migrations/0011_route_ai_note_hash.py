@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0010_route_itinerary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='ai_note_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
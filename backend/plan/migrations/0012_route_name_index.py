@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0011_route_ai_note_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['name'], name='routes_name_idx'),
+        ),
+    ]
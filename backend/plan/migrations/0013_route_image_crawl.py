@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plan', '0012_route_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteImageCrawl',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='image_crawl', serialize=False, to='plan.route')),
+                ('status', models.CharField(max_length=16)),
+                ('query', models.CharField(max_length=500)),
+                ('attempts', models.IntegerField(default=0)),
+                ('image_count', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'route_image_crawls',
+            },
+        ),
+    ]
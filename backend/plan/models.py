@@ -1,8 +1,12 @@
 # plan/models.py
+import numpy as np
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
+from .track import decode_track, track_coordinates, track_view
+
 
 class Route(models.Model):
     # Định nghĩa dựa trên Bảng Route [cite: 1329, 1331, 1332]
@@ -16,13 +20,148 @@ class Route(models.Model):
 
     image_url = models.URLField(max_length=500, null=True, blank=True)
     gallery = models.JSONField(default=list, blank=True)
+
+    # name + tags + description đã bỏ dấu, tự tính khi save (xem plan/search.py)
+    search_text = models.TextField(blank=True, default='', editable=False)
+    # Hash của name + description + tags lúc sinh ai_note (xem plan/ai_notes.py)
+    ai_note_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     
     class Meta:
         db_table = 'routes'  # Align with Supabase table
+        indexes = [
+            # Phục vụ truy vấn tags @> '["..."]' (xem plan/suggestions.py)
+            GinIndex(fields=['tags'], name='routes_tags_gin', opclasses=['jsonb_path_ops']),
+            # Phục vụ search_text LIKE '%...%' không dấu (xem plan/search.py)
+            GinIndex(fields=['search_text'], name='routes_search_trgm', opclasses=['gin_trgm_ops']),
+            # Khóa tự nhiên khi seed / import theo tên (xem plan/seeding.py)
+            models.Index(fields=['name'], name='routes_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # search_text được tính lại ở pre_save (plan/signals.py): save(update_fields=[...]) phải ghi cả nó
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'description', 'tags'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
+
+class RouteProfile(models.Model):
+    """Hồ sơ độ cao tính sẵn của một Route (xem plan/elevation.py)."""
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='profile')
+    # sha256 của path_coordinates lúc tính; khác đi nghĩa là profile đã cũ
+    path_hash = models.CharField(max_length=64)
+    total_distance_km = models.FloatField()
+    elevation_gain_m = models.FloatField(null=True, blank=True)
+    elevation_loss_m = models.FloatField(null=True, blank=True)
+    min_elevation_m = models.FloatField(null=True, blank=True)
+    max_elevation_m = models.FloatField(null=True, blank=True)
+    max_grade_pct = models.FloatField(null=True, blank=True)
+    # float32 (n, 4): lat, lng, distance_km, elevation_m (NaN nếu không có DEM)
+    samples = models.BinaryField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'route_profiles'
+
+    def sample_array(self):
+        return np.frombuffer(self.samples, dtype=np.float32).reshape(-1, 4)
+
+    def __str__(self):
+        return f"Profile of route {self.route_id}"
+
+
+class RouteGeometry(models.Model):
+    """path_coordinates rút gọn sẵn ở nhiều mức zoom (xem plan/simplify.py)."""
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='geometry')
+    path_hash = models.CharField(max_length=64)
+    # [{"zoom": 12, "tolerance_m": 38.2, "points": 140, "polyline": "..."}], thô -> mịn
+    levels = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'route_geometries'
+
+    def __str__(self):
+        return f"Geometry of route {self.route_id}"
+
+
+class RouteTrack(models.Model):
+    """path_coordinates ở dạng nhị phân theo cột (xem plan/track.py)."""
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='track')
+    path_hash = models.CharField(max_length=64)
+    # 'delta_i4': int32 micro-độ, hàng đầu tuyệt đối, các hàng sau là delta; 'f4': float32 tuyệt đối
+    encoding = models.CharField(max_length=16, default='delta_i4')
+    point_count = models.IntegerField()
+    data = models.BinaryField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'route_tracks'
+
+    def raw_array(self):
+        """View (n, 2) trên dữ liệu đã lưu, không copy."""
+        return track_view(self.data, self.encoding)
+
+    def points(self):
+        return decode_track(self.data, self.encoding)
+
+    def coordinates(self):
+        return track_coordinates(self.points())
+
+    def __str__(self):
+        return f"Track of route {self.route_id}"
+
+
+class RouteItinerary(models.Model):
+    """Các chặng theo ngày của một Route cho (số ngày, trình độ) (xem plan/itinerary.py)."""
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='itineraries')
+    duration_days = models.IntegerField()
+    # 'easy' | 'medium' | 'hard'
+    difficulty = models.CharField(max_length=16)
+    path_hash = models.CharField(max_length=64)
+    total_hours = models.FloatField()
+    target_hours = models.FloatField()
+    capacity_hours = models.FloatField()
+    imbalance_hours = models.FloatField()
+    # [{"day": 1, "start_km": 0, "end_km": 18.2, "hours": 6.1, "stop": {...}}, ...]
+    stages = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'route_itineraries'
+        constraints = [
+            models.UniqueConstraint(fields=['route', 'duration_days', 'difficulty'],
+                                    name='route_itinerary_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.duration_days}-day itinerary of route {self.route_id} ({self.difficulty})"
+
+
+class RouteImageCrawl(models.Model):
+    """Trạng thái tìm ảnh của một Route (xem plan/images.py); chạy crawl_images bị ngắt thì làm tiếp từ đây."""
+    STATUS_DONE = 'done'
+    STATUS_EMPTY = 'empty'
+    STATUS_FAILED = 'failed'
+
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='image_crawl')
+    # 'done' (đã lưu ảnh) | 'empty' (không tìm thấy) | 'failed' (lỗi / bị chặn, lần sau thử lại)
+    status = models.CharField(max_length=16)
+    query = models.CharField(max_length=500)
+    attempts = models.IntegerField(default=0)
+    image_count = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'route_image_crawls'
+
+    def __str__(self):
+        return f"Image crawl of route {self.route_id} ({self.status})"
+
 
 class Plan(models.Model):
     # Định nghĩa dựa trên Bảng Plan [cite: 1338, 1342, 1343]
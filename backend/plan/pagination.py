@@ -0,0 +1,18 @@
+# plan/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Phân trang keyset theo id: `WHERE id < cursor ORDER BY id DESC LIMIT n`.
+    Không dùng OFFSET nên trang sau nhanh như trang đầu, và không bị trùng /
+    sót bản ghi khi có dữ liệu mới chen vào giữa hai lần gọi.
+    """
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class RouteCursorPagination(IdCursorPagination):
+    ordering = 'id'
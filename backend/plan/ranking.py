@@ -0,0 +1,259 @@
+# plan/ranking.py
+"""
+Chấm điểm và lấy top-K Route cho RouteSuggestionView.
+
+Thay vì lọc boolean rồi đẩy toàn bộ danh sách cho LLM xếp hạng, mỗi
+route được chấm điểm theo tổng có trọng số của:
+- interests     : tỉ lệ sở thích của user có trong Route.tags
+- difficulty    : độ khó route so với trình độ user (lệch 1 bậc = 0.5)
+- accommodation : route có tag "Cắm trại"/"Homestay" tương ứng
+- duration      : số ngày ước tính của route gần với duration_days
+- fit           : tổng giờ đi bộ (Naismith) có vừa sức user trong số ngày đó
+
+Ma trận đặc trưng (tag multi-hot + các cột số) được dựng bằng NumPy một
+lần và dùng lại giữa các request; signal của Route đánh dấu ma trận cũ để
+dựng lại ở lần gọi sau. Cùng ma trận đó phục vụ truy vấn "route tương tự"
+(cosine / Jaccard) cho nhiều route trong một lượt.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .tag_index import DEFAULT_TTL_SECONDS
+
+DIFFICULTY_LEVELS = {
+    'easy': 0, 'Người mới': 0,
+    'medium': 1, 'Có kinh nghiệm': 1,
+    'hard': 2, 'Chuyên nghiệp': 2,
+}
+
+ACCOMMODATION_TAGS = {
+    'Cắm trại': 'Cắm trại', 'camping': 'Cắm trại', 'Camping': 'Cắm trại',
+    'Homestay': 'Homestay', 'homestay': 'Homestay',
+}
+
+DEFAULT_WEIGHTS = {
+    'interests': 0.35,
+    'difficulty': 0.25,
+    'accommodation': 0.15,
+    'duration': 0.15,
+    'fit': 0.10,
+}
+
+# Naismith: 1 giờ cho mỗi 5 km + 1 giờ cho mỗi 600 m leo
+NAISMITH_KM_PER_HOUR = 5.0
+NAISMITH_ASCENT_PER_HOUR = 600.0
+HOURS_PER_DAY = 6.0
+# Số giờ đi bộ/ngày user chịu được theo trình độ (easy, medium, hard)
+CAPACITY_HOURS_PER_DAY = np.array([5.0, 7.0, 9.0], dtype=np.float32)
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+SIMILARITY_METRICS = ('cosine', 'jaccard')
+
+
+def naismith_hours(distance_km, elevation_gain_m):
+    return distance_km / NAISMITH_KM_PER_HOUR + elevation_gain_m / NAISMITH_ASCENT_PER_HOUR
+
+
+def route_level(tags):
+    for tag in tags:
+        level = DIFFICULTY_LEVELS.get(tag)
+        if level is not None:
+            return level
+    return np.nan
+
+
+class RouteFeatureMatrix:
+    """Ảnh chụp bất biến của bảng routes dưới dạng mảng NumPy."""
+
+    def __init__(self, rows):
+        ids, tag_lists, distance, elevation = [], [], [], []
+        vocab = {}
+        for route_id, tags, distance_km, elevation_gain_m in rows:
+            tags = [tag for tag in (tags if isinstance(tags, list) else []) if isinstance(tag, str)]
+            ids.append(route_id)
+            tag_lists.append(tags)
+            distance.append(distance_km or 0.0)
+            elevation.append(elevation_gain_m or 0.0)
+            for tag in tags:
+                vocab.setdefault(tag, len(vocab))
+
+        self.ids = np.array(ids, dtype=np.int64)
+        self.vocab = vocab
+        self.tags = np.zeros((len(ids), len(vocab)), dtype=np.float32)
+        for row, tags in enumerate(tag_lists):
+            self.tags[row, [vocab[tag] for tag in tags]] = 1.0
+        self.distance = np.array(distance, dtype=np.float32)
+        self.elevation = np.array(elevation, dtype=np.float32)
+        self.level = np.array([route_level(tags) for tags in tag_lists], dtype=np.float32)
+        self.hours = naismith_hours(self.distance, self.elevation)
+        self.days = np.maximum(1.0, self.hours / HOURS_PER_DAY)
+        self.row_of = {route_id: row for row, route_id in enumerate(ids)}
+        self._similarity_features = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tag_vector(self, tags):
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        for tag in tags:
+            column = self.vocab.get(tag)
+            if column is not None:
+                vector[column] = 1.0
+        return vector
+
+    def score(self, interests=None, difficulty=None, accommodation=None, duration_days=None,
+              weights=None):
+        """Trả về (mảng điểm trong [0, 1], dict điểm thành phần) cho mọi route."""
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        n = len(self)
+        parts = {}
+
+        if interests:
+            parts['interests'] = self.tags @ self.tag_vector(interests) / len(set(interests))
+
+        user_level = DIFFICULTY_LEVELS.get(difficulty)
+        if user_level is not None:
+            gap = np.abs(self.level - user_level)
+            parts['difficulty'] = np.where(np.isnan(gap), 0.5, np.clip(1.0 - gap / 2.0, 0.0, 1.0))
+
+        accommodation_tag = ACCOMMODATION_TAGS.get(accommodation)
+        if accommodation_tag:
+            column = self.vocab.get(accommodation_tag)
+            parts['accommodation'] = self.tags[:, column] if column is not None else np.zeros(n)
+
+        if duration_days:
+            parts['duration'] = np.exp(-np.abs(self.days - duration_days) / 1.5)
+            capacity = CAPACITY_HOURS_PER_DAY[user_level if user_level is not None else 1]
+            parts['fit'] = np.clip(capacity * duration_days / np.maximum(self.hours, 1e-6), 0.0, 1.0)
+
+        total = np.zeros(n, dtype=np.float32)
+        weight_sum = 0.0
+        for name, values in parts.items():
+            total += weights[name] * values
+            weight_sum += weights[name]
+        if weight_sum:
+            total /= weight_sum
+        return total, parts
+
+    def top_k(self, k, candidate_ids=None, **criteria):
+        """Trả về [(route_id, score), ...] của k route điểm cao nhất."""
+        if not len(self) or k <= 0:
+            return []
+        scores, _ = self.score(**criteria)
+        scores = scores.astype(np.float64)
+        if candidate_ids is not None:
+            mask = np.isin(self.ids, np.fromiter(candidate_ids, dtype=np.int64))
+            scores[~mask] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Điểm cao trước, hòa điểm thì id nhỏ trước (ổn định)
+        top = top[np.lexsort((self.ids[top], -scores[top]))]
+        return [(int(self.ids[i]), round(float(scores[i]), 4)) for i in top]
+
+    # --- "Routes like this one" ---
+    def similarity_features(self):
+        """Tag multi-hot + distance/elevation chuẩn hóa min-max về [0, 1]."""
+        if self._similarity_features is None:
+            numeric = np.column_stack([self.distance, self.elevation]).astype(np.float32)
+            if len(self):
+                low = numeric.min(axis=0)
+                span = numeric.max(axis=0) - low
+                numeric = (numeric - low) / np.where(span > 0, span, 1.0)
+            self._similarity_features = np.hstack([self.tags, numeric])
+        return self._similarity_features
+
+    def similarity(self, rows, metric='cosine'):
+        """Ma trận độ tương đồng (len(rows) x số route), tính trong một lượt."""
+        features = self.similarity_features()
+        query = features[rows]
+        if metric == 'cosine':
+            norms = np.linalg.norm(features, axis=1)
+            norms[norms == 0] = 1.0
+            return (query / norms[rows, None]) @ (features / norms[:, None]).T
+        if metric == 'jaccard':
+            # Weighted Jaccard: sum(min) / sum(max). Với cột tag nhị phân,
+            # sum(min) = giao và sum(max) = hợp nên tính được bằng tích ma trận.
+            tags, numeric = self.tags, features[:, -2:]
+            query_tags, query_numeric = tags[rows], numeric[rows]
+            shared = query_tags @ tags.T
+            union = query_tags.sum(axis=1)[:, None] + tags.sum(axis=1)[None, :] - shared
+            shared = shared + np.minimum(query_numeric[:, None, :], numeric[None, :, :]).sum(axis=2)
+            union = union + np.maximum(query_numeric[:, None, :], numeric[None, :, :]).sum(axis=2)
+            return np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+        raise ValueError(f"Unknown similarity metric: {metric!r}")
+
+    def similar(self, route_ids, k=DEFAULT_LIMIT, metric='cosine'):
+        """Trả về {route_id: [(route_id, score), ...]} cho các route đã biết."""
+        known = [route_id for route_id in route_ids if route_id in self.row_of]
+        k = min(k, len(self) - 1)
+        if not known or k <= 0:
+            return {route_id: [] for route_id in known}
+
+        rows = np.array([self.row_of[route_id] for route_id in known])
+        scores = self.similarity(rows, metric).astype(np.float64)
+        scores[np.arange(len(rows)), rows] = -np.inf  # bỏ chính nó
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        neighbours = {}
+        for i, route_id in enumerate(known):
+            candidates = top[i][np.lexsort((self.ids[top[i]], -scores[i, top[i]]))]
+            neighbours[route_id] = [
+                (int(self.ids[j]), round(float(scores[i, j]), 4)) for j in candidates
+            ]
+        return neighbours
+
+
+class RouteRanker:
+    """Giữ RouteFeatureMatrix dùng chung cho cả process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._built_at = 0.0
+
+    def _expired(self):
+        ttl = getattr(settings, 'ROUTE_TAG_INDEX_TTL', DEFAULT_TTL_SECONDS)
+        return self._matrix is None or time.monotonic() - self._built_at > ttl
+
+    def matrix(self):
+        matrix = self._matrix
+        if matrix is None or self._expired():
+            from .models import Route
+
+            with self._lock:
+                if self._expired():
+                    rows = Route.objects.values_list('id', 'tags', 'total_distance_km', 'elevation_gain_m')
+                    self._matrix = RouteFeatureMatrix(rows.iterator())
+                    self._built_at = time.monotonic()
+                matrix = self._matrix
+        return matrix
+
+    def build(self):
+        self.invalidate()
+        return self.matrix()
+
+    def invalidate(self):
+        with self._lock:
+            self._matrix = None
+
+    # Cùng giao diện với các index khác trong plan/signals.py
+    def update_route(self, route):
+        self.invalidate()
+
+    def remove_route(self, route_id):
+        self.invalidate()
+
+    def top_k(self, k=DEFAULT_LIMIT, candidate_ids=None, **criteria):
+        return self.matrix().top_k(k, candidate_ids=candidate_ids, **criteria)
+
+    def similar(self, route_ids, k=DEFAULT_LIMIT, metric='cosine'):
+        return self.matrix().similar(route_ids, k=k, metric=metric)
+
+
+route_ranker = RouteRanker()
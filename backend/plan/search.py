@@ -0,0 +1,171 @@
+# plan/search.py
+"""
+Tìm kiếm địa điểm không phân biệt dấu cho Route.
+
+Mỗi Route có `search_text`: name, tags, description đã được "gập dấu"
+(fold): bỏ dấu tiếng Việt, đ -> d, chữ thường, '-'/'_' -> khoảng trắng.
+Nhờ vậy "Lao Cai", "lao-cai" và "Lào Cai" đều khớp nhau.
+
+- Trên PostgreSQL: `search_text` có GIN index gin_trgm_ops (pg_trgm), nên
+  `search_text LIKE '%...%'` không phải quét toàn bảng.
+- Trong process (và trong test): RouteSearchIndex là inverted index
+  trigram -> route_id, giao các posting list rồi mới kiểm tra chuỗi con.
+
+Độ liên quan: vị trí khớp đầu tiên trong `search_text` (name đứng trước
+tags, tags đứng trước description), càng sớm càng liên quan.
+"""
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import StrIndex
+
+from .tag_index import DEFAULT_TTL_SECONDS
+
+NGRAM_SIZE = 3
+
+_SEPARATORS = str.maketrans({'-': ' ', '_': ' ', ',': ' ', '/': ' '})
+# Chỉ nhớ các ký tự thuộc những khối Latin / dấu kết hợp (đủ cho tiếng Việt)
+_FOLD_CACHE_LIMIT = 0x2000
+
+
+class _FoldTable(dict):
+    """Bảng cho str.translate: ký tự -> ký tự đã bỏ dấu, tính lần đầu gặp rồi nhớ lại."""
+
+    def __missing__(self, code):
+        folded = ''.join(ch for ch in unicodedata.normalize('NFD', chr(code)) if not unicodedata.combining(ch))
+        if code < _FOLD_CACHE_LIMIT:
+            self[code] = folded
+        return folded
+
+
+_FOLD_TABLE = _FoldTable({ord('đ'): 'd', ord('Đ'): 'D'})
+
+
+def fold(text):
+    """'Tà Xùa (Sống lưng)' -> 'ta xua (song lung)'"""
+    if not text:
+        return ''
+    if not text.isascii():
+        text = text.translate(_FOLD_TABLE)
+    return ' '.join(text.lower().translate(_SEPARATORS).split())
+
+
+def build_search_text(name, description, tags):
+    if isinstance(tags, str):
+        tags = [tags]
+    elif not isinstance(tags, (list, tuple)):
+        tags = []
+    tag_text = ' | '.join(fold(tag) for tag in tags if isinstance(tag, str))
+    return '\n'.join([fold(name), tag_text, fold(description)])
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def order_by_rank(queryset, query):
+    """Sắp xếp theo vị trí khớp đầu tiên trong search_text."""
+    folded = fold(query)
+    return queryset.annotate(
+        search_rank=StrIndex('search_text', Value(folded)),
+    ).order_by('search_rank', 'id')
+
+
+def rank_queryset(queryset, query):
+    """Lọc + sắp xếp theo độ liên quan ngay trong DB (dùng trigram index)."""
+    return order_by_rank(queryset.filter(search_text__contains=fold(query)), query)
+
+
+class RouteSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._texts = {}
+        self._postings = {}
+        self._built_at = None
+
+    def build(self):
+        from .models import Route
+
+        rows = Route.objects.values_list('id', 'name', 'description', 'tags')
+        with self._lock:
+            self._texts = {}
+            self._postings = {}
+            for route_id, name, description, tags in rows.iterator():
+                self._add(route_id, build_search_text(name, description, tags))
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self):
+        ttl = getattr(settings, 'ROUTE_TAG_INDEX_TTL', DEFAULT_TTL_SECONDS)
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > ttl:
+                self.build()
+
+    def update_route(self, route):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(route.pk)
+            self._add(route.pk, build_search_text(route.name, route.description, route.tags))
+
+    def remove_route(self, route_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(route_id)
+
+    def _add(self, route_id, text):
+        self._texts[route_id] = text
+        for gram in ngrams(text):
+            self._postings.setdefault(gram, set()).add(route_id)
+
+    def _remove(self, route_id):
+        text = self._texts.pop(route_id, None)
+        if text is None:
+            return
+        for gram in ngrams(text):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(route_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def search(self, query, candidates=None):
+        """
+        Trả về danh sách route_id chứa `query` (đã fold), xếp theo độ liên
+        quan. `candidates` (tùy chọn) giới hạn kết quả trong một tập id.
+        """
+        folded = fold(query)
+        if not folded:
+            return []
+        self._ensure_built()
+        with self._lock:
+            grams = ngrams(folded)
+            if grams:
+                # Giao posting list từ nhỏ đến lớn
+                postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                matched = set(postings[0])
+                for ids in postings[1:]:
+                    matched &= ids
+                    if not matched:
+                        break
+            else:
+                matched = set(self._texts)
+            if candidates is not None:
+                matched &= candidates
+
+            ranked = []
+            for route_id in matched:
+                position = self._texts[route_id].find(folded)
+                if position >= 0:
+                    ranked.append((position, route_id))
+            ranked.sort()
+            return [route_id for _, route_id in ranked]
+
+
+route_search_index = RouteSearchIndex()
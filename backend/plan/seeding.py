@@ -0,0 +1,185 @@
+# plan/seeding.py
+"""
+Nạp danh sách cung đường từ file (JSON / CSV / YAML) vào bảng routes theo kiểu upsert.
+
+Trước đây seed_master_data xóa sạch Route rồi create từng dòng: plan mất
+route (SET_NULL), ai_note / ảnh / track bị xóa, mỗi route một round-trip.
+seed_routes() thay bằng:
+- Khóa tự nhiên là `name`: route đã có (cùng tên) thì giữ nguyên id, chỉ
+  ghi lại những route có cột đổi; route mới thì thêm. Không xóa route nào,
+  nên Plan vẫn trỏ đúng route cũ.
+- Chỉ các cột có trong file được ghi (SEEDED_FIELDS và OPTIONAL_FIELDS nếu
+  file có); ai_note, ảnh, path_coordinates... của route đã có được giữ nguyên.
+- Đọc route hiện có theo lô, ghi bằng bulk_create (route mới) và
+  bulk_create(update_conflicts=True) theo id (route đổi), cả quá trình trong
+  một transaction; chạy lại với cùng file không ghi gì.
+
+bulk_* không phát signal nên search_text được tính tại đây, index trong bộ
+nhớ được làm mới sau commit, dữ liệu dẫn xuất của route đổi path_coordinates bị xóa
+và vector tile (bộ nhớ + TILE_CACHE_DIR) chạm vị trí cũ / mới của route có track
+hoặc thuộc tính trong tile đổi bị xóa như trong plan/signals.py.
+"""
+import csv
+import importlib.util
+import json
+import os
+from collections import Counter
+
+from django.db import transaction
+
+from .geometry import path_array
+from .search import build_search_text
+
+MASTER_ROUTES_FILE = os.path.join(os.path.dirname(__file__), 'seed_data', 'master_routes.json')
+SEED_BATCH_SIZE = 2000
+SEEDED_FIELDS = ('description', 'total_distance_km', 'elevation_gain_m', 'tags')
+OPTIONAL_FIELDS = ('image_url', 'gallery', 'path_coordinates')
+# Tên cột trong file seed cũ -> cột của Route
+ALIASES = {'distance': 'total_distance_km', 'elevation': 'elevation_gain_m'}
+# Ô tags trong CSV: "easy|Người mới|Cắm trại"
+CSV_TAG_SEPARATOR = '|'
+
+
+class SeedError(ValueError):
+    pass
+
+
+def load_route_definitions(path):
+    """Đọc file seed -> danh sách định nghĩa route (xem route_definition)."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8', newline='') as handle:
+        if extension == '.json':
+            rows = json.load(handle)
+        elif extension == '.csv':
+            rows = list(csv.DictReader(handle))
+        elif extension in ('.yaml', '.yml'):
+            if importlib.util.find_spec('yaml') is None:
+                raise SeedError('Cần PyYAML để đọc file YAML: pip install pyyaml')
+            import yaml
+            rows = yaml.safe_load(handle)
+        else:
+            raise SeedError(f'Không hỗ trợ định dạng {extension!r} (json, csv, yaml).')
+    if isinstance(rows, dict):
+        rows = rows.get('routes')
+    if not isinstance(rows, list):
+        raise SeedError('File seed phải là danh sách route (hoặc {"routes": [...]}).')
+    return [route_definition(row, position) for position, row in enumerate(rows, start=1)]
+
+
+def route_definition(row, position=None):
+    """Một dòng của file -> các cột của Route. Như seed cũ, location được thêm vào tags."""
+    if not isinstance(row, dict):
+        raise SeedError(f'Dòng {position}: phải là một object.')
+    row = {ALIASES.get(key, key): value for key, value in row.items() if value not in (None, '')}
+    name = str(row.get('name', '')).strip()
+    if not name:
+        raise SeedError(f'Dòng {position}: thiếu name.')
+
+    tags = row.get('tags', [])
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(CSV_TAG_SEPARATOR) if tag.strip()]
+    tags = list(tags)
+    location = row.get('location')
+    if location and location not in tags:
+        tags.append(location)
+
+    try:
+        definition = {
+            'name': name,
+            'description': str(row.get('description', '')),
+            'total_distance_km': float(row.get('total_distance_km', 0)),
+            'elevation_gain_m': float(row.get('elevation_gain_m', 0)),
+            'tags': tags,
+        }
+        for field in OPTIONAL_FIELDS:
+            if field in row:
+                value = row[field]
+                if field != 'image_url' and isinstance(value, str):
+                    value = json.loads(value)  # ô CSV chứa JSON
+                definition[field] = value
+    except (TypeError, ValueError) as exc:
+        raise SeedError(f'Dòng {position} ({name}): {exc}')
+    return definition
+
+
+def _changed(current, definition, fields):
+    return {field: definition[field] for field in fields
+            if field in definition and current[field] != definition[field]}
+
+
+def seed_routes(definitions, batch_size=SEED_BATCH_SIZE, dry_run=False):
+    """
+    Upsert các route theo name trong một transaction.
+    Trả về {'created', 'updated', 'unchanged'}; dry_run thì rollback sau khi tính.
+    """
+    from .models import Route
+    from .signals import DERIVED_FROM_PATH, ROUTE_INDEXES, TILE_PROPERTIES
+    from .tiles import path_bounds, tile_cache
+
+    duplicates = sorted(name for name, count in Counter(item['name'] for item in definitions).items() if count > 1)
+    if duplicates:
+        raise SeedError(f"Trùng name trong file seed: {', '.join(duplicates[:5])}")
+    optional = [field for field in OPTIONAL_FIELDS if any(field in item for item in definitions)]
+    fields = [*SEEDED_FIELDS, *optional]
+
+    stats = {'created': 0, 'updated': 0, 'unchanged': 0}
+    with transaction.atomic():
+        # Route đổi thuộc tính trong tile nhưng giữ track: bbox đọc lại sau vòng lặp
+        path_changed, tile_bounds, tiles_changed = [], [], []
+        for offset in range(0, len(definitions), batch_size):
+            batch = definitions[offset:offset + batch_size]
+            current = {}
+            # Khóa các route sẽ ghi; tên trùng sẵn trong DB thì lấy route id nhỏ nhất
+            for row in (Route.objects.select_for_update().filter(name__in=[item['name'] for item in batch])
+                        .order_by('-pk').values('pk', 'name', *fields)):
+                current[row['name']] = row
+
+            created, updated = [], []
+            for item in batch:
+                row = current.get(item['name'])
+                if row is None:
+                    values = {'path_coordinates': {}, 'ai_note': '', **item}
+                    if 'path_coordinates' in item:
+                        tile_bounds.append(path_bounds(path_array(item['path_coordinates'])))
+                    created.append(Route(**values, search_text=build_search_text(
+                        values['name'], values['description'], values['tags'])))
+                    continue
+                changes = _changed(row, item, fields)
+                if not changes:
+                    stats['unchanged'] += 1
+                    continue
+                values = {**row, **changes}
+                if 'path_coordinates' in changes:
+                    path_changed.append(row['pk'])
+                    tile_bounds += [path_bounds(path_array(row['path_coordinates'])),
+                                    path_bounds(path_array(changes['path_coordinates']))]
+                elif any(field in changes for field in TILE_PROPERTIES):
+                    tiles_changed.append(row['pk'])
+                # Phần INSERT không bao giờ xảy ra (route đã có và đang bị khóa); chỉ cần đủ cột NOT NULL
+                updated.append(Route(
+                    pk=values.pop('pk'), **{'path_coordinates': {}, **values},
+                    search_text=build_search_text(values['name'], values['description'], values['tags']),
+                ))
+
+            Route.objects.bulk_create(created)
+            Route.objects.bulk_create(updated, update_conflicts=True, unique_fields=['id'],
+                                      update_fields=[*fields, 'search_text'])
+            stats['created'] += len(created)
+            stats['updated'] += len(updated)
+
+        for model in DERIVED_FROM_PATH:
+            model.objects.filter(route_id__in=path_changed).delete()
+        if tiles_changed:
+            tile_bounds += [path_bounds(path_array(path)) for path in Route.objects.filter(
+                pk__in=tiles_changed).values_list('path_coordinates', flat=True).iterator()]
+        if dry_run:
+            transaction.set_rollback(True)
+        elif stats['created'] or stats['updated']:
+            def refresh():
+                for index in ROUTE_INDEXES:
+                    index.invalidate()
+                for bounds in tile_bounds:
+                    if bounds is not None:
+                        tile_cache.invalidate_bounds(bounds)
+            transaction.on_commit(refresh)
+    return stats
@@ -1,22 +1,159 @@
 import json
 import os
+from djangorestframework_camel_case.util import camel_to_underscore
 from rest_framework import serializers
-from .models import Plan, Route, HistoryInput, Equipment
+import numpy as np
+from rest_framework.exceptions import ValidationError
+from .elevation import grades
+from .simplify import GEOMETRY_FORMATS, route_path
+from .track import cached_track
+from .models import Plan, Route, RouteItinerary, RouteProfile, HistoryInput, Equipment
+
+
+def _field_list(value):
+    # Client gửi camelCase (totalDistanceKm) hay snake_case đều được
+    return [camel_to_underscore(name.strip()) for name in value.split(',') if name.strip()]
+
+
+def requested_fieldset(request, default_fields=None):
+    """
+    Đọc sparse fieldset từ query params của một GET request:
+    ?fields=id,name  -> chỉ giữ các field này (ưu tiên hơn default_fields)
+    ?exclude=gallery -> bỏ các field này
+    Trả về (fields hoặc None, exclude).
+    """
+    if request is None or request.method != 'GET':
+        return None, []
+    params = request.query_params
+    fields = _field_list(params['fields']) if params.get('fields') else default_fields
+    exclude = _field_list(params.get('exclude', ''))
+    return fields, exclude
+
+
+def geometry_options(request):
+    """
+    Đọc mức chi tiết hình học từ query params của một GET request:
+    ?zoom=12 hoặc ?tolerance=50 (mét) -> track rút gọn (plan/simplify.py)
+    ?geometry_format=polyline          -> encoded polyline thay vì [[lat, lng], ...]
+    Trả về dict tham số cho route_path, hoặc None nếu client không yêu cầu gì.
+    """
+    if request is None or request.method != 'GET':
+        return None
+    params = request.query_params
+    zoom, tolerance, geometry_format = params.get('zoom'), params.get('tolerance'), params.get('geometry_format')
+    if zoom is None and tolerance is None and geometry_format is None:
+        return None
+
+    options = {'zoom': None, 'tolerance_m': None, 'geometry_format': geometry_format or GEOMETRY_FORMATS[0]}
+    if options['geometry_format'] not in GEOMETRY_FORMATS:
+        raise ValidationError({'geometry_format': f"Chỉ hỗ trợ: {', '.join(GEOMETRY_FORMATS)}."})
+    try:
+        if tolerance is not None:
+            options['tolerance_m'] = float(tolerance)
+        elif zoom is not None:
+            options['zoom'] = int(zoom)
+    except ValueError:
+        raise ValidationError({'zoom' if tolerance is None else 'tolerance': 'Phải là số.'})
+    if options['zoom'] is not None and not 0 <= options['zoom'] <= 22:
+        raise ValidationError({'zoom': 'Phải nằm trong [0, 22].'})
+    if options['tolerance_m'] is not None and options['tolerance_m'] <= 0:
+        raise ValidationError({'tolerance': 'Phải lớn hơn 0.'})
+    return options
+
+
+class SparseFieldsetMixin:
+    """
+    Cho phép GET chọn field trả về (?fields= / ?exclude=). View có thể đặt
+    context['default_fields'] để list chỉ trả các field tóm tắt.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, exclude = requested_fieldset(
+            self.context.get('request'), self.context.get('default_fields'),
+        )
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in exclude:
+            self.fields.pop(name, None)
+
+
+class TrackCoordinatesField(serializers.JSONField):
+    """
+    path_coordinates: lấy từ RouteTrack nhị phân nếu view đã select_related('track')
+    (cột JSON khi đó được defer, không parse), không thì đọc cột JSON như cũ.
+    """
+
+    def get_attribute(self, instance):
+        track = cached_track(instance)
+        if track is not None:
+            return track.coordinates()
+        return super().get_attribute(instance)
+
 
 # 1. RouteSerializer
-class RouteSerializer(serializers.ModelSerializer):
+class RouteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    path_coordinates = TrackCoordinatesField()
+
     class Meta:
         model = Route
-        fields = '__all__'
+        exclude = ['search_text', 'ai_note_hash']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # ?zoom= / ?tolerance= / ?geometry_format=: trả track ở mức chi tiết phù hợp
+        options = geometry_options(self.context.get('request'))
+        if options and 'path_coordinates' in data:
+            data['path_coordinates'], _, _ = route_path(instance, **options)
+        return data
+
+# Các field đủ cho màn hình danh sách (không có path_coordinates, gallery...)
+ROUTE_SUMMARY_FIELDS = ['id', 'name', 'total_distance_km', 'elevation_gain_m', 'tags', 'image_url', 'score']
+
+# 1b. Route kèm điểm xếp hạng (RouteSuggestionView)
+class ScoredRouteSerializer(RouteSerializer):
+    score = serializers.FloatField(read_only=True)
+
+# 1c. Hồ sơ độ cao (RouteProfileView): các mảng song song thay vì list object để payload gọn
+class RouteProfileSerializer(serializers.ModelSerializer):
+    route_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = RouteProfile
+        fields = ['route_id', 'total_distance_km', 'elevation_gain_m', 'elevation_loss_m',
+                  'min_elevation_m', 'max_elevation_m', 'max_grade_pct']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        samples = instance.sample_array().astype(np.float64)
+        elevation = samples[:, 3]
+        has_elevation = len(samples) > 0 and not np.isnan(elevation).any()
+        data['has_elevation'] = bool(has_elevation)
+        data['coordinates'] = np.round(samples[:, :2], 6).tolist()
+        data['distance_km'] = np.round(samples[:, 2], 3).tolist()
+        data['elevation_m'] = np.round(elevation, 1).tolist() if has_elevation else None
+        data['grade_pct'] = (np.round(grades(samples[:, 2], elevation), 1).tolist()
+                             if has_elevation else None)
+        return data
+
+
+class RouteItinerarySerializer(serializers.ModelSerializer):
+    route_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = RouteItinerary
+        fields = ['route_id', 'duration_days', 'difficulty', 'total_hours', 'target_hours',
+                  'capacity_hours', 'imbalance_hours', 'stages']
 
 # 2. HistoryInputSerializer
-class HistoryInputSerializer(serializers.ModelSerializer):
+class HistoryInputSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = HistoryInput
         exclude = ['user']
 
 # 3. PlanSerializer
-class PlanSerializer(serializers.ModelSerializer):
+class PlanSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all(), required=False, allow_null=True)
 
@@ -38,3 +175,9 @@ class PlanSerializer(serializers.ModelSerializer):
         instance.dangers_snapshot = validated_data.get('dangers_snapshot', instance.dangers_snapshot)
         instance.save()
         return instance
+
+# Các field đủ cho màn hình danh sách Plan (không có các snapshot JSON lớn)
+PLAN_SUMMARY_FIELDS = [
+    'id', 'name', 'route', 'location', 'rest_type', 'group_size',
+    'start_date', 'duration_days', 'difficulty',
+]
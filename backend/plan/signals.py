@@ -0,0 +1,167 @@
+# plan/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from routes.models import Waypoint
+
+from .geometry import path_array, path_hash
+from .checklist import equipment_catalog
+from .itinerary import STOP_CORRIDOR_KM
+from .models import Equipment, Route, RouteGeometry, RouteItinerary, RouteProfile, RouteTrack
+from .ranking import route_ranker
+from .search import build_search_text, route_search_index
+from .tag_index import route_tag_index
+from .tiles import WAYPOINT_MIN_ZOOM, path_bounds, route_bounds, tile_cache
+from .track import build_route_track, track_store_enabled
+
+# Các index trong bộ nhớ cần đồng bộ với bảng routes
+ROUTE_INDEXES = (route_tag_index, route_search_index, route_ranker, route_bounds)
+# Các bảng tính từ path_coordinates (có cột path_hash)
+DERIVED_FROM_PATH = (RouteProfile, RouteGeometry, RouteTrack, RouteItinerary)
+# Thuộc tính route được ghi vào vector tile (plan/tiles.py)
+TILE_PROPERTIES = ('name', 'total_distance_km', 'elevation_gain_m')
+
+
+@receiver(pre_save, sender=Route)
+def route_search_text(sender, instance, **kwargs):
+    instance.search_text = build_search_text(instance.name, instance.description, instance.tags)
+
+
+@receiver(post_save, sender=Route)
+def route_saved(sender, instance, **kwargs):
+    # Chỉ cập nhật index khi transaction đã commit (tránh route "ma" khi rollback)
+    def update():
+        for index in ROUTE_INDEXES:
+            index.update_route(instance)
+    transaction.on_commit(update)
+
+
+@receiver(pre_save, sender=Route)
+def route_path_before(sender, instance, update_fields=None, **kwargs):
+    """
+    Ghi nhận path_coordinates (so path_hash) và thuộc tính route trong tile có
+    thực sự đổi không, để các handler post_save bên dưới bỏ qua những lần save
+    không đụng tới chúng (vd. save(update_fields=['ai_note']) không đọc DB).
+    """
+    instance._path_changed = instance._tiles_changed = False
+    instance._tile_bounds_before = None
+    fields = ('path_coordinates', *TILE_PROPERTIES)
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    old = Route.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+    if old is None:
+        instance._path_changed = instance._tiles_changed = True
+        return
+    old_path, *old_properties = old
+    saved = set(fields) if update_fields is None else set(update_fields)
+    instance._path_changed = ('path_coordinates' in saved
+                              and path_hash(old_path) != path_hash(instance.path_coordinates))
+    instance._tiles_changed = instance._path_changed or any(
+        field in saved and getattr(instance, field) != value for field, value in zip(TILE_PROPERTIES, old_properties))
+    instance._tile_bounds_before = path_bounds(path_array(old_path)) if instance._path_changed else None
+
+
+@receiver(post_save, sender=Route)
+def route_derived_geometry_stale(sender, instance, created=False, **kwargs):
+    if not getattr(instance, '_path_changed', True):
+        return
+    # path_coordinates đổi thì bỏ dữ liệu dẫn xuất cũ; lần gọi sau sẽ tính lại
+    if not created:
+        digest = path_hash(instance.path_coordinates)
+        for model in DERIVED_FROM_PATH:
+            model.objects.filter(route_id=instance.pk).exclude(path_hash=digest).delete()
+    # Riêng track nhị phân thì mã hóa lại ngay: API đọc tọa độ từ đây (xem plan/track.py)
+    if track_store_enabled():
+        build_route_track(instance)
+
+
+@receiver(post_delete, sender=Route)
+def route_deleted(sender, instance, **kwargs):
+    route_id = instance.pk
+
+    def remove():
+        for index in ROUTE_INDEXES:
+            index.remove_route(route_id)
+    transaction.on_commit(remove)
+
+
+# --- Vector tile cache (plan/tiles.py): xóa các tile chạm vị trí cũ và mới ---
+
+def _invalidate_tiles(*bounds, min_zoom=0):
+    def invalidate():
+        for box in bounds:
+            if box is not None:
+                tile_cache.invalidate_bounds(box, min_zoom=min_zoom)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Route)
+def route_tiles_stale(sender, instance, **kwargs):
+    # Vị trí cũ (nếu track đổi) được route_path_before ghi lại
+    if not getattr(instance, '_tiles_changed', True):
+        return
+    _invalidate_tiles(getattr(instance, '_tile_bounds_before', None),
+                      path_bounds(path_array(instance.path_coordinates)))
+
+
+@receiver(post_delete, sender=Route)
+def route_tiles_deleted(sender, instance, **kwargs):
+    _invalidate_tiles(path_bounds(path_array(instance.path_coordinates)))
+
+
+def _point_bounds(lat, lng):
+    return None if lat is None or lng is None else (lat, lng, lat, lng)
+
+
+@receiver(pre_save, sender=Waypoint)
+def waypoint_tile_bounds_before(sender, instance, **kwargs):
+    old = (Waypoint.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+           if instance.pk else None)
+    instance._tile_bounds_before = _point_bounds(*old) if old else None
+
+
+@receiver(post_save, sender=Waypoint)
+def waypoint_tiles_stale(sender, instance, **kwargs):
+    _invalidate_tiles(getattr(instance, '_tile_bounds_before', None),
+                      _point_bounds(instance.latitude, instance.longitude),
+                      min_zoom=WAYPOINT_MIN_ZOOM)
+
+
+@receiver(post_delete, sender=Waypoint)
+def waypoint_tiles_deleted(sender, instance, **kwargs):
+    _invalidate_tiles(_point_bounds(instance.latitude, instance.longitude), min_zoom=WAYPOINT_MIN_ZOOM)
+
+
+# --- Lịch trình theo ngày (plan/itinerary.py) dựa trên waypoint gần track ---
+
+def _itineraries_stale(*points):
+    def remove():
+        # Route có bbox cách waypoint không quá STOP_CORRIDOR_KM (1° ~ 111 km, nới gấp đôi cho kinh độ)
+        margin = STOP_CORRIDOR_KM / 111.0 * 2
+        route_ids = set()
+        for lat, lng in points:
+            route_ids.update(route_bounds.intersecting((lat - margin, lng - margin,
+                                                        lat + margin, lng + margin)))
+        if route_ids:
+            RouteItinerary.objects.filter(route_id__in=route_ids).delete()
+    transaction.on_commit(remove)
+
+
+@receiver(post_save, sender=Waypoint)
+def waypoint_itineraries_stale(sender, instance, **kwargs):
+    before = getattr(instance, '_tile_bounds_before', None)
+    _itineraries_stale(*([before[:2]] if before else []), (instance.latitude, instance.longitude))
+
+
+@receiver(post_delete, sender=Waypoint)
+def waypoint_itineraries_deleted(sender, instance, **kwargs):
+    _itineraries_stale((instance.latitude, instance.longitude))
+
+
+# --- Catalogue đồ dùng cho checklist (plan/checklist.py) ---
+
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+def equipment_changed(sender, instance, **kwargs):
+    transaction.on_commit(equipment_catalog.invalidate)
@@ -0,0 +1,182 @@
+# plan/simplify.py
+"""
+Hình học nhiều mức chi tiết (level of detail) cho Route.path_coordinates.
+
+RouteSerializer trả path_coordinates nguyên vẹn, nên track nhiều ngày gửi
+mọi điểm GPS cho mọi request. Ở đây mỗi track được rút gọn sẵn bằng
+Douglas–Peucker ở vài mức zoom (dung sai = kích thước 1 pixel ở zoom đó),
+lưu dưới dạng encoded polyline (Google, precision 5) trong RouteGeometry.
+Request chọn mức bằng ?zoom= hoặc ?tolerance= (mét) và nhận về
+danh sách [lat, lng] hoặc chuỗi polyline (?geometry_format=polyline).
+"""
+import math
+
+import numpy as np
+
+from .geometry import path_array, path_hash
+from .track import cached_track, track_coordinates
+from routes.spatial import EARTH_RADIUS_KM
+
+# Mức zoom được tính sẵn; zoom cao hơn mức cuối dùng track gốc
+LEVEL_ZOOMS = (6, 9, 12, 15)
+# Mét trên pixel ở xích đạo, zoom 0 (tile 256 px, Web Mercator)
+METERS_PER_PIXEL_Z0 = 156543.03392
+POLYLINE_PRECISION = 5
+GEOMETRY_FORMATS = ('coordinates', 'polyline')
+
+
+def zoom_tolerance_m(zoom):
+    """Dung sai rút gọn cho một mức zoom: kích thước 1 pixel (bỏ qua hệ số cos(vĩ độ))."""
+    return METERS_PER_PIXEL_Z0 / 2 ** zoom
+
+
+def project_m(points):
+    """Chiếu equirectangular quanh vĩ độ giữa -> tọa độ phẳng (mét); đủ chính xác cho một track."""
+    lat0 = math.radians(float(points[:, 0].mean()))
+    radius_m = EARTH_RADIUS_KM * 1000
+    return np.column_stack([
+        np.radians(points[:, 1]) * radius_m * math.cos(lat0),
+        np.radians(points[:, 0]) * radius_m,
+    ])
+
+
+def douglas_peucker(points, tolerance_m):
+    """Trả về mask các điểm được giữ lại (luôn giữ điểm đầu và cuối)."""
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[[0, -1]] = True
+    if n < 3:
+        return keep
+
+    xy = project_m(points)
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        inner = xy[start + 1:end]
+        ab = b - a
+        length_sq = float(ab @ ab)
+        if length_sq == 0.0:
+            distances = np.hypot(*(inner - a).T)
+        else:
+            # Khoảng cách từ điểm tới đoạn thẳng AB (kẹp hình chiếu vào [A, B])
+            t = np.clip((inner - a) @ ab / length_sq, 0.0, 1.0)
+            distances = np.hypot(*(inner - (a + t[:, None] * ab)).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+    """Encoded polyline (thuật toán của Google) cho mảng (n, 2) [lat, lng]."""
+    if not len(points):
+        return ''
+    scaled = np.round(np.asarray(points, dtype=np.float64) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chars = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return ''.join(chars)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """Ngược lại của encode_polyline -> mảng float64 (n, 2)."""
+    values, value, shift = [], 0, 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    deltas = np.array(values, dtype=np.int64).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0) / 10 ** precision
+
+
+def build_levels(path_coordinates, zooms=LEVEL_ZOOMS):
+    """Các mức rút gọn: [{'zoom', 'tolerance_m', 'points', 'polyline'}], thô -> mịn."""
+    points = path_array(path_coordinates)
+    levels = []
+    for zoom in zooms:
+        tolerance = zoom_tolerance_m(zoom)
+        simplified = points[douglas_peucker(points, tolerance)]
+        levels.append({
+            'zoom': zoom,
+            'tolerance_m': round(tolerance, 3),
+            'points': len(simplified),
+            'polyline': encode_polyline(simplified),
+        })
+    return levels
+
+
+def pick_level(levels, zoom=None, tolerance_m=None):
+    """
+    Mức thô nhất vẫn đủ chi tiết cho zoom / dung sai được yêu cầu;
+    None nghĩa là cần track gốc (yêu cầu mịn hơn mọi mức đã tính).
+    """
+    if tolerance_m is None:
+        tolerance_m = zoom_tolerance_m(zoom)
+    for level in levels:
+        if level['tolerance_m'] <= tolerance_m:
+            return level
+    return None
+
+
+def build_route_geometry(route, force=False):
+    """Lấy RouteGeometry của route, tính (lại) nếu chưa có hoặc path_coordinates đã đổi."""
+    from .models import RouteGeometry
+
+    digest = path_hash(route.path_coordinates)
+    try:
+        geometry = route.geometry  # dùng kết quả prefetch_related('geometry') nếu có
+    except RouteGeometry.DoesNotExist:
+        geometry = None
+    if geometry is not None and geometry.path_hash == digest and not force:
+        return geometry
+
+    geometry, _ = RouteGeometry.objects.update_or_create(
+        route_id=route.pk,
+        defaults={'path_hash': digest, 'levels': build_levels(route.path_coordinates)},
+    )
+    return geometry
+
+
+def route_path(route, zoom=None, tolerance_m=None, geometry_format='coordinates'):
+    """
+    path_coordinates của route ở mức chi tiết phù hợp.
+    Trả về (giá trị cho API, số điểm, dung sai đã dùng hoặc None nếu là track gốc).
+    """
+    level = None
+    if zoom is not None or tolerance_m is not None:
+        level = pick_level(build_route_geometry(route).levels, zoom, tolerance_m)
+
+    if level is None:
+        track = cached_track(route)
+        if track is not None:
+            points = track.points()
+            if geometry_format == 'polyline':
+                return encode_polyline(points), len(points), None
+            return track_coordinates(points), len(points), None
+        if geometry_format == 'polyline':
+            points = path_array(route.path_coordinates)
+            return encode_polyline(points), len(points), None
+        raw = route.path_coordinates
+        return raw, len(raw) if isinstance(raw, list) else 0, None
+
+    if geometry_format == 'polyline':
+        return level['polyline'], level['points'], level['tolerance_m']
+    coordinates = np.round(decode_polyline(level['polyline']), POLYLINE_PRECISION).tolist()
+    return coordinates, level['points'], level['tolerance_m']
@@ -0,0 +1,99 @@
+# plan/suggestions.py
+"""
+Các chiến lược lọc Route cho RouteSuggestionView.
+
+- 'index'    : inverted index tag -> route_id trong bộ nhớ (tag_index.py).
+- 'database' : đẩy toàn bộ bộ lọc xuống PostgreSQL. `tags @> '["..."]'`
+               dùng GIN index jsonb_path_ops trên routes.tags (migration 0005).
+- 'python'   : cách cũ, nạp tất cả Route rồi lọc bằng Python. Chỉ giữ lại
+               để so sánh trong bench_route_suggestions.
+
+Chọn chiến lược qua setting ROUTE_SUGGESTION_BACKEND.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Route
+from .search import fold, order_by_rank, rank_queryset, route_search_index
+from .tag_index import route_tag_index
+
+DEFAULT_BACKEND = 'index'
+
+
+def index_suggestions(location=None, difficulty_tag=None, interests=None):
+    route_ids = route_tag_index.match(difficulty_tag=difficulty_tag, interests=interests)
+    queryset = Route.objects.filter(pk__in=route_ids)
+    if location:
+        # n-gram index lọc trong bộ nhớ; DB chỉ sắp xếp theo độ liên quan
+        matched_ids = route_search_index.search(location, candidates=route_ids)
+        return order_by_rank(Route.objects.filter(pk__in=matched_ids), location)
+    return queryset.order_by('id')
+
+
+def database_suggestions(location=None, difficulty_tag=None, interests=None):
+    queryset = Route.objects.all()
+
+    if difficulty_tag:
+        queryset = queryset.filter(tags__contains=[difficulty_tag])
+
+    if interests:
+        # JSONField không có __overlap: OR các phép chứa (@>), mỗi nhánh
+        # vẫn dùng được GIN index (BitmapOr)
+        overlap = Q()
+        for interest in interests:
+            overlap |= Q(tags__contains=[interest])
+        queryset = queryset.filter(overlap)
+
+    if location:
+        # search_text LIKE '%...%' dùng trigram GIN index (migration 0006)
+        return rank_queryset(queryset, location)
+    return queryset.order_by('id')
+
+
+def python_suggestions(location=None, difficulty_tag=None, interests=None):
+    results = list(Route.objects.all())
+
+    if location:
+        results = [
+            route for route in results
+            if (location.lower() in route.name.lower()) or
+               (location.lower() in route.description.lower()) or
+               (location in route.tags)
+        ]
+
+    if difficulty_tag:
+        results = [route for route in results if difficulty_tag in route.tags]
+
+    if interests:
+        results = [
+            route for route in results
+            if any(interest in route.tags for interest in interests)
+        ]
+
+    return results
+
+
+SUGGESTION_BACKENDS = {
+    'index': index_suggestions,
+    'database': database_suggestions,
+    'python': python_suggestions,
+}
+
+
+def suggest_routes(location=None, difficulty_tag=None, interests=None, backend=None):
+    backend = backend or getattr(settings, 'ROUTE_SUGGESTION_BACKEND', DEFAULT_BACKEND)
+    try:
+        strategy = SUGGESTION_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown ROUTE_SUGGESTION_BACKEND: {backend!r}")
+    return strategy(location=location, difficulty_tag=difficulty_tag, interests=interests)
+
+
+def location_candidate_ids(location, backend=None):
+    """Tập route_id khớp location (dùng làm điều kiện bắt buộc khi xếp hạng)."""
+    backend = backend or getattr(settings, 'ROUTE_SUGGESTION_BACKEND', DEFAULT_BACKEND)
+    if backend == 'index':
+        return set(route_search_index.search(location))
+    if backend == 'database':
+        return set(Route.objects.filter(search_text__contains=fold(location)).values_list('id', flat=True))
+    return {route.pk for route in suggest_routes(location=location, backend=backend)}
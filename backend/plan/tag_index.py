@@ -0,0 +1,119 @@
+# plan/tag_index.py
+"""
+Inverted index tag -> set(route_id) dùng chung cho cả process.
+
+RouteSuggestionView dùng index này thay cho việc nạp toàn bộ Route
+vào Python ở mỗi request. Index được dựng lười (lần gọi đầu tiên),
+cập nhật từng phần qua signal post_save/post_delete của plan.Route,
+và tự dựng lại sau ROUTE_TAG_INDEX_TTL giây để các worker khác nhau
+không lệch nhau quá lâu.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_TTL_SECONDS = 300
+
+
+def normalize_tags(tags):
+    """Trả về frozenset các tag dạng chuỗi từ giá trị JSON của Route.tags."""
+    if isinstance(tags, str):
+        return frozenset([tags])
+    if not isinstance(tags, (list, tuple, set)):
+        return frozenset()
+    return frozenset(tag for tag in tags if isinstance(tag, str))
+
+
+class RouteTagIndex:
+    def __init__(self, ttl=None):
+        self._lock = threading.RLock()
+        self._ttl = ttl
+        self._tag_to_ids = {}
+        self._route_tags = {}
+        self._built_at = None
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'ROUTE_TAG_INDEX_TTL', DEFAULT_TTL_SECONDS)
+
+    # --- Dựng / làm mới index ---
+    def build(self):
+        from .models import Route
+
+        rows = Route.objects.values_list('id', 'tags')
+        with self._lock:
+            self._tag_to_ids = {}
+            self._route_tags = {}
+            for route_id, tags in rows.iterator():
+                self._add(route_id, tags)
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+                self.build()
+
+    # --- Cập nhật từng phần (gọi từ signals) ---
+    def update_route(self, route):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(route.pk)
+            self._add(route.pk, route.tags)
+
+    def remove_route(self, route_id):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(route_id)
+
+    def _add(self, route_id, tags):
+        tag_set = normalize_tags(tags)
+        self._route_tags[route_id] = tag_set
+        for tag in tag_set:
+            self._tag_to_ids.setdefault(tag, set()).add(route_id)
+
+    def _remove(self, route_id):
+        for tag in self._route_tags.pop(route_id, ()):
+            ids = self._tag_to_ids.get(tag)
+            if ids is not None:
+                ids.discard(route_id)
+                if not ids:
+                    del self._tag_to_ids[tag]
+
+    # --- Truy vấn ---
+    def ids_with_tag(self, tag):
+        self._ensure_built()
+        with self._lock:
+            return set(self._tag_to_ids.get(tag, ()))
+
+    def match(self, difficulty_tag=None, interests=None):
+        """
+        Trả về set route_id thỏa các bộ lọc tag (giống logic cũ của view):
+        - difficulty_tag: route phải có đúng tag này.
+        - interests: route có BẤT KỲ tag nào trong danh sách (hợp).
+        Bộ lọc location do plan/search.py đảm nhiệm.
+        """
+        self._ensure_built()
+        with self._lock:
+            candidates = None
+            if difficulty_tag:
+                candidates = set(self._tag_to_ids.get(difficulty_tag, ()))
+            if interests:
+                matched = set()
+                for interest in interests:
+                    matched |= self._tag_to_ids.get(interest, set())
+                candidates = matched if candidates is None else candidates & matched
+            if candidates is None:
+                candidates = set(self._route_tags)
+            return candidates
+
+
+route_tag_index = RouteTagIndex()
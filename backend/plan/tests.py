@@ -1,3 +1,1110 @@
-from django.test import TestCase
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from .ai_notes import generate_route_notes, note_hash
+from .bundle import collect_bundle
+from .checklist import MAX_BUDGET, MAX_WEIGHT_LIMIT_G, build_checklist, equipment_catalog, trip_conditions
+from .elevation import dem_tiles, tile_name
+from .images import (DuckDuckGoImageSearch, FakeImageSearch, ImageSearchError, TokenBucket, backoff_delay,
+                     crawl_route_images, route_query)
+from .itinerary import compute_itinerary, split_stages
+from .models import (Equipment, Plan, Route, RouteGeometry, RouteImageCrawl, RouteItinerary, RouteProfile,
+                     RouteTrack)
+from .seeding import MASTER_ROUTES_FILE, SeedError, load_route_definitions, seed_routes
+from .serializers import RouteSerializer
+from .simplify import decode_polyline, douglas_peucker, encode_polyline
+from .signals import ROUTE_INDEXES
+from .suggestions import SUGGESTION_BACKENDS, suggest_routes
+from .tiles import route_bounds, tile_cache, tile_range
+from .track import build_route_track, decode_track, encode_track, track_view
+from routes.models import Route as TrailRoute, Waypoint
+from routes.spatial import waypoint_index
+from llm.providers import FakeLLMProvider, LLMProviderError
+from safety.models import Static_Hazard
+
+
+User = get_user_model()
+
+
+def make_route(name, tags, description="", distance=10.0, elevation=500.0, **extra):
+    extra.setdefault('path_coordinates', {})
+    return Route.objects.create(
+        name=name,
+        description=description,
+        total_distance_km=distance,
+        elevation_gain_m=elevation,
+        tags=tags,
+        **extra
+    )
+
+
+class RouteSuggestionTests(APITestCase):
+    def setUp(self):
+        for index in ROUTE_INDEXES:
+            index.invalidate()
+        self.url = reverse('route-suggestion')
+        self.fansipan = make_route("Fansipan", ["hard", "Săn mây", "Lào Cai"], "Nóc nhà Đông Dương.")
+        self.lao_than = make_route("Lảo Thẩn", ["easy", "Săn mây", "Lào Cai"], "Đỉnh nóc nhà Y Tý.")
+        self.pu_luong = make_route("Pù Luông", ["medium", "Homestay"], "Ruộng bậc thang Thanh Hóa.")
+
+    def names(self, response):
+        return sorted(route['name'] for route in response.data)
+
+    def test_strategies_intersect_difficulty_and_union_interests(self):
+        """difficulty là bộ lọc bắt buộc, interests là hợp của các tag"""
+        for backend in SUGGESTION_BACKENDS:
+            with self.subTest(backend=backend):
+                routes = suggest_routes(difficulty_tag='easy', interests=['Săn mây', 'Homestay'], backend=backend)
+                self.assertEqual([route.name for route in routes], ["Lảo Thẩn"])
+
+    def test_location_matches_tags_and_description(self):
+        response = self.client.get(self.url, {'location': 'Thanh Hóa'})
+        self.assertEqual(self.names(response), ["Pù Luông"])
+
+        response = self.client.get(self.url, {'location': 'Lào Cai'})
+        self.assertEqual(self.names(response), ["Fansipan", "Lảo Thẩn"])
+
+    def test_indexes_follow_route_changes(self):
+        """Các index được cập nhật qua post_save/post_delete"""
+        self.client.get(self.url, {'location': 'Lào Cai'})  # dựng index
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pu_luong.tags = ["easy", "Homestay", "Lào Cai"]
+            self.pu_luong.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lao_than.delete()
+
+        response = self.client.get(self.url, {'location': 'Lao Cai', 'difficulty': 'Người mới'})
+        self.assertEqual([route['name'] for route in response.data], ["Pù Luông", "Fansipan"])
+
+    def test_partial_save_writes_search_text(self):
+        self.pu_luong.description = "Bản Kho Mường, Thanh Hóa."
+        self.pu_luong.save(update_fields=['description'])
+        self.assertIn("kho muong", Route.objects.get(pk=self.pu_luong.pk).search_text)
+        routes = suggest_routes(location='Kho Muong', backend='database')
+        self.assertEqual([route.name for route in routes], ["Pù Luông"])
+
+    def test_strategies_return_same_routes(self):
+        """index / database / python phải cho cùng kết quả"""
+        queries = [
+            {'difficulty_tag': 'hard'},
+            {'interests': ['Săn mây', 'Homestay']},
+            {'location': 'Lào Cai', 'interests': ['Săn mây']},
+        ]
+        for backend in SUGGESTION_BACKENDS:
+            with self.subTest(backend=backend):
+                results = [
+                    sorted(route.name for route in suggest_routes(backend=backend, **query))
+                    for query in queries
+                ]
+                self.assertEqual(results, [
+                    ["Fansipan"],
+                    ["Fansipan", "Lảo Thẩn", "Pù Luông"],
+                    ["Fansipan", "Lảo Thẩn"],
+                ])
+
+    def test_location_ignores_diacritics_and_ranks_name_first(self):
+        make_route("Tà Xùa (Sống lưng khủng long)", ["hard", "son-la"], "Săn mây Tà Xùa.")
+        make_route("Sống lưng Sơn La", ["medium"], "Gần Ta Xua, bản Háng Đồng.")
+
+        for backend in ('index', 'database'):
+            with self.subTest(backend=backend):
+                routes = suggest_routes(location='Ta Xua', backend=backend)
+                self.assertEqual(
+                    [route.name for route in routes],
+                    ["Tà Xùa (Sống lưng khủng long)", "Sống lưng Sơn La"],
+                )
+                with override_settings(ROUTE_SUGGESTION_BACKEND=backend):
+                    response = self.client.get(self.url, {'location': 'Lao Cai'})
+                self.assertEqual(self.names(response), ["Fansipan", "Lảo Thẩn"])
+
+    def test_returns_top_k_routes_ordered_by_score(self):
+        """Không còn lọc boolean: route khớp nhiều tiêu chí nhất đứng đầu"""
+        make_route("Bidoup", ["medium", "Cắm trại", "Homestay"], "Rừng nguyên sinh.", distance=28, elevation=1200)
+        response = self.client.get(self.url, {
+            'difficulty': 'Có kinh nghiệm',
+            'interests': ['Homestay'],
+            'accommodation': 'Homestay',
+            'duration_days': 2,
+            'limit': 2,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        # Bidoup (~7.6 giờ Naismith) gần 2 ngày hơn Pù Luông (~2.8 giờ)
+        self.assertEqual(response.data[0]['name'], "Bidoup")
+        self.assertEqual(response.data[1]['name'], "Pù Luông")
+        self.assertGreater(response.data[0]['score'], response.data[1]['score'])
+
+        response = self.client.get(self.url, {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SimilarRoutesTests(APITestCase):
+    def setUp(self):
+        for index in ROUTE_INDEXES:
+            index.invalidate()
+        self.ta_xua = make_route("Tà Xùa", ["hard", "Săn mây", "ridge-walk"], distance=22, elevation=1600)
+        self.ky_quan_san = make_route("Kỳ Quan San", ["hard", "Săn mây", "ridge-walk"], distance=30, elevation=2100)
+        self.lao_than = make_route("Lảo Thẩn", ["easy", "Săn mây"], distance=16, elevation=900)
+        self.cat_tien = make_route("Cát Tiên", ["easy", "wildlife", "flat"], distance=10, elevation=50)
+
+    def test_similar_routes_for_one_route(self):
+        url = reverse('route-similar', args=[self.ta_xua.pk])
+        for metric in ('cosine', 'jaccard'):
+            with self.subTest(metric=metric):
+                response = self.client.get(url, {'limit': 2, 'metric': metric})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual([route['name'] for route in response.data], ["Kỳ Quan San", "Lảo Thẩn"])
+
+        response = self.client.get(reverse('route-similar', args=[self.cat_tien.pk + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_similar_routes(self):
+        url = reverse('route-similar-batch')
+        response = self.client.post(url, {
+            'routeIds': [self.ta_xua.pk, self.cat_tien.pk],
+            'limit': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['route_id'], [route['name'] for route in item['similar']]) for item in response.data],
+            [(self.ta_xua.pk, ["Kỳ Quan San"]), (self.cat_tien.pk, ["Lảo Thẩn"])],
+        )
+
+        response = self.client.post(url, {'routeIds': "1,2"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListPaginationAndFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='trekker@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        for i in range(3):
+            Plan.objects.create(
+                user=self.user, name=f"Plan {i}", location="Lào Cai", rest_type="Homestay",
+                group_size=2, start_date="2026-01-01", duration_days=2, difficulty="Người mới",
+                dangers_snapshot={"weather": "rain"},
+            )
+        self.route = make_route("Fansipan", ["hard"], "Nóc nhà Đông Dương.",
+                                path_coordinates=[[22.3, 103.7], [22.31, 103.77]])
+
+    def test_plan_list_is_cursor_paginated_summary(self):
+        url = reverse('plan-list')
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([plan['name'] for plan in response.data['results']], ["Plan 2", "Plan 1"])
+        self.assertNotIn('dangers_snapshot', response.data['results'][0])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([plan['name'] for plan in response.data['results']], ["Plan 0"])
+        self.assertIsNone(response.data['next'])
+
+        plan_id = response.data['results'][0]['id']
+        response = self.client.get(reverse('plan-detail', args=[plan_id]))
+        self.assertEqual(response.data['dangers_snapshot'], {"weather": "rain"})
+
+    def test_route_list_omits_geometry_and_accepts_fieldsets(self):
+        response = self.client.get(reverse('route-list'))
+        route = response.data['results'][0]
+        self.assertEqual(route['name'], "Fansipan")
+        self.assertNotIn('path_coordinates', route)
+        self.assertNotIn('search_text', route)
+        self.assertFalse({'search_text', 'ai_note_hash'} & set(RouteSerializer().fields))
+
+        response = self.client.get(reverse('route-list'), {'fields': 'id,totalDistanceKm'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'total_distance_km'})
+
+        response = self.client.get(reverse('route-detail', args=[self.route.pk]), {'exclude': 'gallery'})
+        self.assertEqual(response.data['path_coordinates'], [[22.3, 103.7], [22.31, 103.77]])
+        self.assertNotIn('gallery', response.data)
+
+
+class RouteProfileTests(APITestCase):
+    """Hồ sơ độ cao tính từ một tile DEM giả lập: độ cao = 1000 m + 1000 m mỗi độ vĩ."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        size = 121
+        lat = 23 - np.arange(size) / (size - 1)  # hàng 0 là mép bắc
+        tile = np.repeat((1000 + 1000 * (lat - 22))[:, None], size, axis=1).astype('>i2')
+        tile.tofile(os.path.join(tmp.name, tile_name(22, 103)))
+
+        dem_tiles.clear()
+        self.addCleanup(dem_tiles.clear)
+        overrides = override_settings(DEM_TILE_DIR=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        # Đi thẳng lên phía bắc 0.2° (~22.2 km), leo 200 m rồi quay xuống 100 m
+        self.route = make_route("Tà Xùa", ["medium"], path_coordinates=[
+            [22.1, 103.5], [22.2, 103.5], [22.3, 103.5], [22.2, 103.5],
+        ])
+        self.url = reverse('route-profile', args=[self.route.pk])
+
+    def test_profile_distance_elevation_and_grade(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+
+        self.assertAlmostEqual(data['total_distance_km'], 33.36, delta=0.05)
+        self.assertAlmostEqual(data['elevation_gain_m'], 200, delta=1)
+        self.assertAlmostEqual(data['elevation_loss_m'], 100, delta=1)
+        self.assertAlmostEqual(data['max_elevation_m'], 1300, delta=1)
+        self.assertTrue(data['has_elevation'])
+        self.assertEqual(data['distance_km'][0], 0)
+        self.assertAlmostEqual(data['grade_pct'][1], 0.9, delta=0.05)  # 100 m / 11.1 km
+        self.assertEqual(len(data['coordinates']), len(data['elevation_m']))
+
+    def test_profile_is_stored_and_recomputed_when_path_changes(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        self.route.path_coordinates = [[22.1, 103.5], [22.5, 103.5]]
+        self.route.save()
+        self.assertFalse(RouteProfile.objects.filter(route=self.route).exists())
+        self.assertAlmostEqual(self.client.get(self.url).data['elevation_gain_m'], 400, delta=1)
+
+    def test_missing_dem_tile_returns_distances_only(self):
+        route = make_route("Lảo Thẩn", ["hard"], path_coordinates=[[10.1, 106.1], [10.2, 106.1]])
+        data = self.client.get(reverse('route-profile', args=[route.pk])).data
+        self.assertFalse(data['has_elevation'])
+        self.assertIsNone(data['elevation_m'])
+        self.assertAlmostEqual(data['total_distance_km'], 11.12, delta=0.05)
+
+    def test_unknown_route(self):
+        response = self.client.get(reverse('route-profile', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RouteGeometryTests(APITestCase):
+    def setUp(self):
+        # Đường zigzag: 2000 điểm, mỗi điểm ~11 m, lệch ngang ~50 m mỗi 100 điểm
+        path = [[22.0 + i * 0.0001, 103.5 + (0.0005 if (i // 100) % 2 else 0.0)] for i in range(2000)]
+        self.route = make_route("Putaleng", ["hard"], path_coordinates=path)
+
+    def test_polyline_round_trip(self):
+        points = np.array([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+        self.assertEqual(encode_polyline(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        np.testing.assert_allclose(decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), points)
+
+    def test_douglas_peucker(self):
+        line = np.column_stack([np.linspace(22, 22.1, 500), np.full(500, 103.5)])
+        self.assertEqual(douglas_peucker(line, 1.0).sum(), 2)
+        zigzag = np.array(self.route.path_coordinates)
+        # Dung sai 10 m giữ các góc (~50 m), dung sai 100 m bỏ hết
+        self.assertEqual(douglas_peucker(zigzag, 10.0).sum(), 40)
+        self.assertEqual(douglas_peucker(zigzag, 100.0).sum(), 2)
+
+    def test_geometry_endpoint_levels_and_formats(self):
+        url = reverse('route-geometry', args=[self.route.pk])
+        coarse = self.client.get(url, {'zoom': 9}).data
+        fine = self.client.get(url, {'zoom': 15}).data
+        full = self.client.get(url, {'zoom': 20}).data
+        self.assertEqual(coarse['points'], 2)
+        self.assertEqual(fine['points'], 40)
+        self.assertEqual((full['points'], full['tolerance_m']), (2000, None))
+
+        polyline = self.client.get(url, {'tolerance': 10, 'geometry_format': 'polyline'}).data
+        self.assertEqual(len(decode_polyline(polyline['path'])), polyline['points'])
+        self.assertEqual(self.client.get(url, {'zoom': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_route_detail_uses_requested_level(self):
+        url = reverse('route-detail', args=[self.route.pk])
+        self.assertEqual(len(self.client.get(url).data['path_coordinates']), 2000)
+        self.assertEqual(len(self.client.get(url, {'zoom': 15}).data['path_coordinates']), 40)
+
+        self.route.path_coordinates = self.route.path_coordinates[:150]
+        self.route.save()
+        self.assertFalse(RouteGeometry.objects.filter(route=self.route).exists())
+        self.assertEqual(len(self.client.get(url, {'zoom': 15}).data['path_coordinates']), 4)
+
+
+@override_settings(ROUTE_TRACK_STORE='binary')
+class RouteTrackTests(APITestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        points = np.cumsum(rng.normal(0, 0.0001, (3000, 2)), axis=0) + [22.3364, 103.8438]
+        self.path = np.round(points, 6).tolist()
+        self.route = make_route("Lảo Thẩn", ["hard"], path_coordinates=self.path)
+
+    def test_round_trip(self):
+        points = np.array(self.path)
+        decoded = decode_track(encode_track(points, 'delta_i4'), 'delta_i4')
+        np.testing.assert_allclose(decoded, points, rtol=0, atol=1e-9)
+        as_float32 = decode_track(encode_track(points, 'f4'), 'f4')
+        np.testing.assert_allclose(as_float32, points, rtol=0, atol=1e-5)
+
+        data = encode_track(points, 'delta_i4')
+        self.assertEqual(len(data), 8 * len(points))
+        self.assertTrue(np.shares_memory(track_view(data, 'delta_i4'), np.frombuffer(data, dtype=np.int8)))
+
+    def test_saving_route_keeps_track_in_sync(self):
+        track = RouteTrack.objects.get(route=self.route)
+        self.assertEqual((track.encoding, track.point_count), ('delta_i4', 3000))
+
+        self.route.path_coordinates = self.path[:10]
+        self.route.save()
+        self.assertEqual(RouteTrack.objects.get(route=self.route).point_count, 10)
+
+        # Không phải [[lat, lng], ...] thì không lưu nhị phân; API trả JSON gốc
+        self.route.path_coordinates = {}
+        self.route.save()
+        self.assertFalse(RouteTrack.objects.filter(route=self.route).exists())
+        self.assertIsNone(build_route_track(self.route))
+
+    def test_route_detail_reads_binary_track(self):
+        url = reverse('route-detail', args=[self.route.pk])
+        with self.assertNumQueries(1):
+            data = self.client.get(url).data
+        self.assertEqual(data['path_coordinates'], self.path)
+
+        with override_settings(ROUTE_TRACK_STORE='json'):
+            self.assertEqual(self.client.get(url).data['path_coordinates'], self.path)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+
+def _read_message(data):
+    """Các field (number, giá trị) của một message protobuf (chỉ varint, 64-bit và bytes)."""
+    pos, fields = 0, []
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = np.frombuffer(data[pos:pos + 8], '<f8')[0], pos + 8
+        else:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        fields.append((number, value))
+    return fields
+
+
+def _read_packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def decode_mvt(data):
+    """{layer: [{'id', 'properties', 'type'}]} để kiểm tra nội dung tile."""
+    layers = {}
+    for _, layer in _read_message(data):
+        fields = _read_message(layer)
+        keys = [value.decode() for number, value in fields if number == 3]
+        values = []
+        for number, value in fields:
+            if number == 4:
+                (kind, raw), = _read_message(value)
+                values.append(raw.decode() if kind == 1 else raw)
+        name = next(value.decode() for number, value in fields if number == 1)
+        features = []
+        for number, value in fields:
+            if number != 2:
+                continue
+            feature = dict(_read_message(value))
+            tags = _read_packed(feature[2])
+            features.append({
+                'id': feature[1], 'type': feature[3],
+                'properties': {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])},
+            })
+        layers[name] = features
+    return layers
+
+
+class VectorTileTests(APITestCase):
+    # Tile zoom 12 chứa Sa Pa
+    Z, X, Y = 12, 3229, 1787
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(TILE_CACHE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory.name
+        tile_cache.clear()
+        route_bounds.invalidate()
+        waypoint_index.invalidate()
+
+        path = [[22.33 + i * 0.0002, 103.84 + i * 0.0001] for i in range(100)]
+        self.route = make_route("Sa Pa loop", ["easy"], path_coordinates=path)
+        trail = TrailRoute.objects.create(name="Sa Pa trail", total_distance_km=5, elevation_gain_m=300)
+        self.camp = Waypoint.objects.create(route=trail, name='Bãi cắm trại', type='CAMPSITE',
+                                            latitude=22.335, longitude=103.842)
+
+    def get_tile(self, z, x, y):
+        response = self.client.get(f'/tiles/{z}/{x}/{y}.mvt')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        return decode_mvt(response.content)
+
+    def test_tile_contains_routes_and_waypoints(self):
+        self.assertEqual(tile_range((22.33, 103.84, 22.35, 103.85), self.Z)[::2], (self.X, self.Y))
+        layers = self.get_tile(self.Z, self.X, self.Y)
+        self.assertEqual([f['id'] for f in layers['routes']], [self.route.pk])
+        self.assertEqual(layers['routes'][0]['properties']['name'], 'Sa Pa loop')
+        self.assertEqual(layers['waypoints'][0]['properties'],
+                         {'name': 'Bãi cắm trại', 'type': 'CAMPSITE', 'route_id': self.camp.route_id})
+
+        # Zoom thấp chỉ có route; tile ở nơi khác thì rỗng
+        self.assertEqual(set(self.get_tile(8, 201, 111)), {'routes'})
+        self.assertEqual(self.get_tile(self.Z, 0, 0), {})
+        self.assertEqual(self.client.get('/tiles/3/8/0.mvt').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_and_invalidation(self):
+        url = f'/tiles/{self.Z}/{self.X}/{self.Y}.mvt'
+        first = self.client.get(url)
+        path = os.path.join(self.directory, str(self.Z), str(self.X), f'{self.Y}.mvt')
+        self.assertTrue(os.path.exists(path))
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.route.name = 'Sa Pa loop (mới)'
+            self.route.save()
+        self.assertFalse(os.path.exists(path))
+        layers = self.get_tile(self.Z, self.X, self.Y)
+        self.assertEqual(layers['routes'][0]['properties']['name'], 'Sa Pa loop (mới)')
+
+
+class PlanBundleTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(BUNDLE_CACHE_DIR=os.path.join(directory.name, 'bundles'),
+                                              TILE_CACHE_DIR=os.path.join(directory.name, 'tiles'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory.name
+        tile_cache.clear()
+        route_bounds.invalidate()
+        waypoint_index.invalidate()
+
+        self.user = User.objects.create_user(email='trekker@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        path = [[22.0 + i * 0.001, 103.5] for i in range(100)]  # ~11 km về phía bắc
+        route = make_route("Pu Ta Leng", ["hard"], path_coordinates=path)
+        trail = TrailRoute.objects.create(name="Pu Ta Leng trail", total_distance_km=11, elevation_gain_m=1800)
+        self.camp = Waypoint.objects.create(route=trail, name='Lán 2', type='CAMPSITE',
+                                            latitude=22.05, longitude=103.503)
+        Waypoint.objects.create(route=trail, name='Xa đường mòn', type='CAMPSITE',
+                                latitude=22.05, longitude=103.6)
+        Static_Hazard.objects.create(route=trail, description='Dốc trơn', condition='Mùa mưa')
+        tent = Equipment.objects.create(name='Lều 2 người', category='Ngủ', price=1500000, weight_grams=2100)
+        self.plan = Plan.objects.create(
+            user=self.user, route=route, name="Pu Ta Leng 3N2Đ", location="Lai Châu", rest_type="Lều",
+            group_size=4, start_date="2026-11-01", duration_days=3, difficulty="Có kinh nghiệm",
+            personalized_equipment_list={'Ngủ': [{'id': tent.id, 'quantity': 2, 'reason': 'Ngủ rừng'}]},
+            dangers_snapshot={'weather': 'rain'},
+        )
+        self.url = reverse('plan-bundle', args=[self.plan.pk])
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        path = os.path.join(self.directory, 'download.mbtiles')
+        with open(path, 'wb') as handle:
+            handle.write(b''.join(response.streaming_content))
+        self.addCleanup(os.remove, path)
+        return response, sqlite3.connect(path)
+
+    def test_bundle_contents(self):
+        response, db = self.download()
+        self.addCleanup(db.close)
+        documents = {name: json.loads(body) for name, body in db.execute('SELECT name, body FROM documents')}
+        self.assertEqual(documents['plan']['name'], "Pu Ta Leng 3N2Đ")
+        self.assertEqual([w['name'] for w in documents['waypoints']], ['Lán 2'])
+        self.assertAlmostEqual(documents['waypoints'][0]['distanceAlongKm'], 5.56, places=1)
+        self.assertEqual(documents['hazards']['static'][0]['description'], 'Dốc trơn')
+        self.assertEqual(documents['equipment']['items'][0]['name'], 'Lều 2 người')
+        self.assertIn('elevationM', documents['profile'])
+
+        metadata = dict(db.execute('SELECT name, value FROM metadata'))
+        self.assertEqual(metadata['format'], 'pbf')
+        self.assertEqual(response['ETag'], f'"{metadata["content_hash"]}"')
+        self.assertGreater(db.execute('SELECT COUNT(*) FROM tiles').fetchone()[0], 0)
+        full = db.execute('SELECT points, polyline FROM geometry WHERE zoom IS NULL').fetchone()
+        self.assertEqual(len(decode_polyline(full[1])), full[0])
+
+    def test_cached_by_content_hash(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url)['ETag'], first['ETag'])
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'bundles'))), 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+        self.plan.name = "Pu Ta Leng 4N3Đ"
+        self.plan.save()
+        self.assertNotEqual(self.client.get(self.url)['ETag'], first['ETag'])
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'bundles'))), 1)
+
+    def test_bundle_is_collected_only_when_inputs_change(self):
+        with mock.patch('plan.bundle.collect_bundle', wraps=collect_bundle) as collect:
+            first = self.client.get(self.url)['ETag']
+            self.assertEqual(self.client.get(self.url)['ETag'], first)
+            self.assertEqual(collect.call_count, 1)
+
+            # Waypoint gần track đổi tên: đầu vào đổi dù plan / route không đổi
+            self.camp.name = 'Lán 2 (mới)'
+            self.camp.save()
+            second = self.client.get(self.url)['ETag']
+            self.assertNotEqual(second, first)
+            self.assertEqual(collect.call_count, 2)
+        _, db = self.download()
+        self.addCleanup(db.close)
+        waypoints = json.loads(db.execute("SELECT body FROM documents WHERE name = 'waypoints'").fetchone()[0])
+        self.assertEqual(waypoints[0]['name'], 'Lán 2 (mới)')
+
+    def test_range_requests(self):
+        full = self.client.get(self.url)
+        body = b''.join(full.streaming_content)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-15')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'SQLite format 3\x00')
+        self.assertEqual(response['Content-Range'], f'bytes 0-15/{len(body)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-100')
+        self.assertEqual(b''.join(response.streaming_content), body[-100:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(body)}-').status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        # Khoảng không hợp lệ (last < first) thì bỏ qua Range, trả cả file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), body)
+        # If-Range lệch (bundle đã đổi) -> trả cả file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-15', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_other_users_plan_is_hidden(self):
+        other = User.objects.create_user(email='other@example.com', password='password123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RouteItineraryTests(APITestCase):
+    """Route đi thẳng lên phía bắc 0.5° (~55.6 km), DEM giả lập leo đều 500 m."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        size = 121
+        lat = 23 - np.arange(size) / (size - 1)
+        tile = np.repeat((1000 + 1000 * (lat - 22))[:, None], size, axis=1).astype('>i2')
+        tile.tofile(os.path.join(tmp.name, tile_name(22, 103)))
+        dem_tiles.clear()
+        self.addCleanup(dem_tiles.clear)
+        overrides = override_settings(DEM_TILE_DIR=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        route_bounds.invalidate()
+        waypoint_index.invalidate()
+
+        self.route = make_route("Pu Si Lung", ["hard"], distance=55.6, elevation=500.0,
+                                path_coordinates=[[22.1 + i * 0.005, 103.5] for i in range(101)])
+        trail = TrailRoute.objects.create(name="Pu Si Lung trail", total_distance_km=55.6, elevation_gain_m=500)
+        # Lệch giữa track (27.8 km) ~2 km: vẫn tốt hơn dừng giữa đường mòn
+        self.camp = Waypoint.objects.create(route=trail, name='Lán Bản Pao', type='CAMPSITE',
+                                            latitude=22.33, longitude=103.502)
+        Waypoint.objects.create(route=trail, name='Suối', type='WATER_SOURCE', latitude=22.42, longitude=103.501)
+        Waypoint.objects.create(route=trail, name='Xa đường mòn', type='CAMPSITE', latitude=22.35, longitude=103.7)
+        self.url = reverse('route-itinerary', args=[self.route.pk])
+
+    def test_split_stages_balances_effort(self):
+        positions = np.arange(1, 12, dtype=np.float64)  # mỗi giờ một điểm dừng, tổng 12 giờ
+        self.assertEqual(split_stages(positions, np.zeros(11), 12.0, 3), [3, 7])
+        # Phạt nặng ở giờ thứ 4 -> chấp nhận lệch 1 giờ
+        penalties = np.zeros(11)
+        penalties[3] = 10.0
+        self.assertIn(split_stages(positions, penalties, 12.0, 3)[0], (2, 4))
+        self.assertEqual(split_stages(positions, np.zeros(11), 12.0, 1), [])
+
+    def test_two_days_stop_at_campsite(self):
+        response = self.client.get(self.url, {'days': 2, 'difficulty': 'Có kinh nghiệm'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['difficulty'], 'medium')
+        first, second = data['stages']
+        self.assertEqual(first['stop']['name'], 'Lán Bản Pao')
+        self.assertEqual(first['stop']['type'], 'CAMPSITE')
+        self.assertAlmostEqual(first['end_km'], 25.6, delta=0.3)
+        self.assertIsNone(second['stop'])
+        self.assertAlmostEqual(second['end_km'], 55.6, delta=0.1)
+        self.assertAlmostEqual(first['ascent_m'] + second['ascent_m'], 500, delta=2)
+        # Naismith: 55.6 km / 5 + 500 m / 600 ~ 11.95 giờ
+        self.assertAlmostEqual(data['total_hours'], 11.95, delta=0.1)
+        self.assertAlmostEqual(first['hours'] + second['hours'], data['total_hours'], delta=0.02)
+
+    def test_many_days_fall_back_to_track_stops(self):
+        data = self.client.get(self.url, {'days': 5, 'difficulty': 'easy'}).data
+        self.assertEqual(len(data['stages']), 5)
+        self.assertLess(data['imbalance_hours'], 1.6)
+        self.assertGreater(data['total_hours'], 14)  # người mới đi chậm hơn Naismith
+        for stage in data['stages'][:-1]:
+            self.assertIsNotNone(stage['stop']['latitude'])
+
+    def test_cached_and_invalidated(self):
+        self.client.get(self.url, {'days': 2})
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'days': 2})
+        self.assertEqual(RouteItinerary.objects.filter(route=self.route).count(), 1)
+
+        self.camp.latitude = 22.36
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camp.save()
+        self.assertFalse(RouteItinerary.objects.filter(route=self.route).exists())
+        self.client.get(self.url, {'days': 2})
+
+        self.route.path_coordinates = [[22.1, 103.5], [22.3, 103.5]]
+        self.route.save()
+        self.assertFalse(RouteItinerary.objects.filter(route=self.route).exists())
+
+    def test_saves_that_keep_the_track_keep_derived_data(self):
+        self.client.get(self.url, {'days': 2})
+        # update_fields không có path_coordinates: không đọc DB, không xóa gì
+        self.route.ai_note = "Ghi chú"
+        with self.assertNumQueries(1):
+            self.route.save(update_fields=['ai_note'])
+        # Lưu lại cùng track (đổi mô tả): chỉ một SELECT so path_hash, giữ lịch trình
+        self.route.description = "Mô tả mới"
+        with self.assertNumQueries(2):
+            self.route.save()
+        self.assertTrue(RouteItinerary.objects.filter(route=self.route).exists())
+
+    def test_route_without_track_uses_totals(self):
+        data = compute_itinerary(np.empty((0, 4)), 3, 'hard', total_distance_km=30.0, elevation_gain_m=1200)
+        self.assertEqual([stage['distance_km'] for stage in data['stages']], [10.0, 10.0, 10.0])
+        self.assertIsNone(data['stages'][0]['stop']['latitude'])
+
+    def test_plan_itinerary_uses_plan_days_and_difficulty(self):
+        user = User.objects.create_user(email='trekker@example.com', password='password123')
+        self.client.force_authenticate(user=user)
+        plan = Plan.objects.create(
+            user=user, route=self.route, name="Pu Si Lung 3N2Đ", location="Lai Châu", rest_type="Lều",
+            group_size=2, start_date="2026-11-01", duration_days=3, difficulty="Chuyên nghiệp",
+        )
+        data = self.client.get(reverse('plan-itinerary', args=[plan.pk])).data
+        self.assertEqual(data['duration_days'], 3)
+        self.assertEqual(data['difficulty'], 'hard')
+        self.assertEqual(len(data['stages']), 3)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'days': 2, 'difficulty': 'extreme'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('route-itinerary', args=[999999]), {'days': 2}).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+
+class EquipmentChecklistTests(APITestCase):
+    def setUp(self):
+        equipment_catalog.invalidate()
+        self.addCleanup(equipment_catalog.invalidate)
+        item = lambda name, category, price, weight: Equipment.objects.create(
+            name=name, category=category, price=price, weight_grams=weight)
+        self.tent_light = item("Lều siêu nhẹ 2 người", "Cắm trại", 3000000, 1200)
+        self.tent_cheap = item("Lều 3 người", "Cắm trại", 800000, 3000)
+        self.bag = item("Túi ngủ", "Cắm trại", 500000, 1000)
+        self.pack_light = item("Balo 40L", "Balo", 1500000, 900)
+        self.pack_cheap = item("Balo 50L", "Balo", 400000, 1800)
+        self.lamp = item("Đèn pin đội đầu", "Phụ kiện", 150000, 100)
+        self.kit = item("Bộ sơ cứu", "Y tế", 200000, 400)
+        self.route = make_route("Lảo Thẩn", ["Cắm trại", "medium"])
+        self.url = reverse('equipment-checklist')
+
+    def picked(self, data):
+        return {item['id']: item for item in data['items']}
+
+    def test_shared_items_split_across_group(self):
+        conditions = trip_conditions('medium', 2, 'Lều')
+        self.assertEqual(conditions, {'camping', 'overnight'})
+        data = build_checklist(4, 2, 'medium', conditions)
+        picked = self.picked(data)
+        # Không giới hạn ngân sách: chọn lều nhẹ hơn, 2 lều 2 người cho 4 người
+        self.assertNotIn(self.tent_cheap.pk, picked)
+        self.assertEqual(picked[self.tent_light.pk]['quantity'], 2)
+        self.assertEqual(picked[self.tent_light.pk]['weight_per_person_g'], 600)
+        self.assertEqual(picked[self.kit.pk]['quantity'], 1)
+        self.assertEqual(picked[self.bag.pk]['quantity'], 4)
+        self.assertEqual(data['checklist']['Y tế'], [
+            {'id': self.kit.pk, 'quantity': 1, 'reason': 'Dùng chung: 1 cho nhóm 4 người'}])
+        self.assertLessEqual(data['weight_per_person_g'], data['max_weight_per_person_g'])
+
+    def test_budget_and_weight_limits(self):
+        conditions = trip_conditions('medium', 2, 'Lều')
+        data = build_checklist(4, 2, 'medium', conditions, budget=6000000)
+        picked = self.picked(data)
+        self.assertLessEqual(data['total_cost'], 6000000)
+        self.assertIn(self.tent_cheap.pk, picked)  # 2 x 800k thay vì 2 x 3tr
+        self.assertEqual(picked[self.tent_cheap.pk]['quantity'], 2)
+        self.assertIn(self.pack_cheap.pk, picked)
+
+        data = build_checklist(1, 1, 'easy', frozenset(), max_weight_g=1000)
+        self.assertEqual(set(self.picked(data)), {self.pack_light.pk})
+        self.assertLessEqual(data['weight_per_person_g'], 1000)
+
+    def test_homestay_needs_no_tent(self):
+        data = self.client.get(self.url, {'rest_type': 'Homestay', 'group_size': 2, 'duration_days': 2}).data
+        picked = self.picked(data)
+        self.assertNotIn(self.tent_light.pk, picked)
+        self.assertNotIn(self.bag.pk, picked)
+        self.assertIn(self.lamp.pk, picked)
+
+        data = self.client.get(self.url, {'route_id': self.route.pk, 'group_size': 2, 'duration_days': 2}).data
+        self.assertIn('camping', data['conditions'])
+
+    def test_result_cached_until_catalogue_changes(self):
+        conditions = trip_conditions('medium', 2, 'Lều')
+        first = build_checklist(3, 2, 'medium', conditions, budget=5000000)
+        with self.assertNumQueries(0):
+            self.assertEqual(build_checklist(3, 2, 'medium', conditions, budget=5000000), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Equipment.objects.create(name="Lều 4 người", category="Cắm trại", price=500000, weight_grams=2000)
+        data = build_checklist(3, 2, 'medium', conditions, budget=5000000)
+        self.assertNotEqual(data, first)
+
+    def test_plan_checklist_saved(self):
+        user = User.objects.create_user(email='packer@example.com', password='password123')
+        self.client.force_authenticate(user=user)
+        plan = Plan.objects.create(
+            user=user, route=self.route, name="Lảo Thẩn 2N1Đ", location="Lào Cai", rest_type="Lều",
+            group_size=2, start_date="2026-11-01", duration_days=2, difficulty="medium",
+        )
+        response = self.client.post(reverse('plan-checklist', args=[plan.pk]), {'max_weight_kg': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['max_weight_per_person_g'], 5000)
+        plan.refresh_from_db()
+        self.assertEqual(plan.personalized_equipment_list, json.loads(json.dumps(response.data['checklist'])))
+        self.assertIn('Cắm trại', plan.personalized_equipment_list)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'budget': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'max_weight_kg': -1}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'route_id': 999999}).status_code, status.HTTP_404_NOT_FOUND)
+        for value in ('inf', 'nan', '-inf'):
+            self.assertEqual(self.client.get(self.url, {'max_weight_kg': value}).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'budget': 'inf'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_huge_limits_are_capped(self):
+        response = self.client.get(self.url, {'max_weight_kg': 1e6, 'budget': 1e30})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['max_weight_per_person_g'], MAX_WEIGHT_LIMIT_G)
+        self.assertEqual(response.data['budget'], MAX_BUDGET)
+        data = build_checklist(1, 1, 'easy', frozenset(), max_weight_g=1e9)
+        self.assertEqual(data['max_weight_per_person_g'], MAX_WEIGHT_LIMIT_G)
+
+
+class RouteNoteBatchTests(APITestCase):
+    def setUp(self):
+        self.routes = [make_route(f"Cung {i}", ["Săn mây"], description=f"Mô tả {i}") for i in range(7)]
+        self.provider = FakeLLMProvider(responder=lambda task, prompt: f"Ghi chú: {prompt.split(chr(34))[1]}")
+
+    def test_only_changed_routes_are_regenerated(self):
+        stats = generate_route_notes(provider=self.provider, concurrency=3, batch_size=2)
+        self.assertEqual(stats['generated'], 7)
+        self.assertGreater(stats['prompt_tokens'], 0)
+        route = Route.objects.get(pk=self.routes[0].pk)
+        self.assertEqual(route.ai_note, "Ghi chú: Cung 0")
+        self.assertEqual(route.ai_note_hash, note_hash(route.name, route.description, route.tags, 'fake'))
+
+        self.assertEqual(generate_route_notes(provider=self.provider)['generated'], 0)
+        self.routes[3].tags = ["Săn mây", "Suối"]
+        self.routes[3].save()
+        self.assertEqual(generate_route_notes(provider=self.provider)['generated'], 1)
+        self.assertEqual(self.provider.calls, 8)
+        self.assertEqual(generate_route_notes(provider=self.provider, force=True)['generated'], 7)
+
+    def test_model_change_regenerates(self):
+        generate_route_notes(provider=self.provider)
+        real = FakeLLMProvider(responder=lambda task, prompt: 'Ghi chú thật')
+        real.model = 'gemini-test'
+        self.assertEqual(generate_route_notes(provider=real)['generated'], 7)
+        self.assertEqual(generate_route_notes(provider=real)['generated'], 0)
+
+    def test_failures_and_interruptions_resume(self):
+        def flaky(task, prompt):
+            if '"Cung 2"' in prompt:
+                raise LLMProviderError('quota')
+            if '"Cung 5"' in prompt:
+                raise RuntimeError('worker bị ngắt')
+            return 'Ghi chú'
+
+        with self.assertRaises(RuntimeError):
+            generate_route_notes(provider=FakeLLMProvider(responder=flaky), concurrency=1, batch_size=10)
+        # Các ghi chú xong trước khi bị ngắt vẫn được ghi
+        written = set(Route.objects.exclude(ai_note_hash='').values_list('name', flat=True))
+        self.assertEqual(written, {"Cung 0", "Cung 1", "Cung 3", "Cung 4"})
+
+        stats = generate_route_notes(provider=self.provider, concurrency=2)
+        self.assertEqual(stats, {**stats, 'generated': 3, 'failed': 0})
+        self.assertFalse(Route.objects.filter(ai_note_hash='').exists())
+
+    def test_concurrency_is_bounded(self):
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def slow(task, prompt):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return 'Ghi chú'
+
+        stats = generate_route_notes(provider=FakeLLMProvider(responder=slow), concurrency=3, limit=6)
+        self.assertEqual(stats['generated'], 6)
+        self.assertEqual(peak[0], 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('generate_route_notes', '--provider', 'fake', '--ids', str(self.routes[0].pk), stdout=out)
+        self.assertIn('Đã sinh 1 ghi chú', out.getvalue())
+        self.assertTrue(Route.objects.get(pk=self.routes[0].pk).ai_note)
+
+        with override_settings(LLM_PROVIDER='fake'), self.assertRaises(CommandError):
+            call_command('generate_route_notes', stdout=out)
+
+
+class SeedRoutesTests(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_reseed_keeps_plans_and_generated_data(self):
+        definitions = load_route_definitions(MASTER_ROUTES_FILE)
+        self.assertEqual(len(definitions), 36)
+        self.assertEqual(seed_routes(definitions), {'created': 36, 'updated': 0, 'unchanged': 0})
+
+        route = Route.objects.get(name="Hàm Lợn")
+        self.assertIn("Hà Nội", route.tags)
+        self.assertIn("ham lon", route.search_text)
+        user = User.objects.create_user(email='seed@example.com', password='password123')
+        plan = Plan.objects.create(user=user, route=route, name="Hàm Lợn cuối tuần", location="Hà Nội",
+                                   rest_type="Lều", group_size=2, start_date="2026-11-01", duration_days=1,
+                                   difficulty="easy")
+        Route.objects.filter(pk=route.pk).update(ai_note="Ghi chú đã sinh", path_coordinates=[[21.3, 105.8]])
+
+        with self.assertNumQueries(3):  # savepoint, đọc theo tên, savepoint
+            self.assertEqual(seed_routes(definitions), {'created': 0, 'updated': 0, 'unchanged': 36})
+        next(item for item in definitions if item['name'] == "Hàm Lợn")['description'] = "Sân tập quen thuộc của dân trekking Hà Nội."
+        self.assertEqual(seed_routes(definitions)['updated'], 1)
+
+        self.assertEqual(Route.objects.count(), 36)
+        plan.refresh_from_db()
+        self.assertEqual(plan.route_id, route.pk)
+        route.refresh_from_db()
+        self.assertEqual(route.description, "Sân tập quen thuộc của dân trekking Hà Nội.")
+        self.assertIn("san tap quen thuoc", route.search_text)
+        self.assertEqual(route.ai_note, "Ghi chú đã sinh")
+        self.assertEqual(route.path_coordinates, [[21.3, 105.8]])
+
+    def test_csv_and_path_updates(self):
+        path = self.write('routes.csv', (
+            'name,location,description,distance,elevation,tags,path_coordinates\n'
+            'Lảo Thẩn,Lào Cai,Săn mây,18,1200,medium|Săn mây,"[[22.6, 103.3], [22.62, 103.31]]"\n'
+            'Núi Dinh,Vũng Tàu,Rừng tràm,8,500,easy,\n'
+        ))
+        self.assertEqual(seed_routes(load_route_definitions(path))['created'], 2)
+        route = Route.objects.get(name="Lảo Thẩn")
+        self.assertEqual(route.tags, ["medium", "Săn mây", "Lào Cai"])
+        self.assertEqual(route.total_distance_km, 18.0)
+        self.assertEqual(Route.objects.get(name="Núi Dinh").path_coordinates, {})
+
+        RouteProfile.objects.create(route=route, path_hash='x', total_distance_km=2.5, samples=b'')
+        definitions = load_route_definitions(path)
+        definitions[0]['path_coordinates'] = [[22.6, 103.3], [22.7, 103.4]]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(seed_routes(definitions), {'created': 0, 'updated': 1, 'unchanged': 1})
+        self.assertFalse(RouteProfile.objects.filter(route=route).exists())
+
+    def test_reseed_invalidates_disk_tiles(self):
+        directory = os.path.join(self.tmp, 'tiles')
+        with override_settings(TILE_CACHE_DIR=directory):
+            tile_cache.clear()
+            route_bounds.invalidate()
+            path = [[22.33 + i * 0.0002, 103.84 + i * 0.0001] for i in range(100)]
+            definitions = [{'name': 'Sa Pa loop', 'description': '', 'total_distance_km': 5.0,
+                            'elevation_gain_m': 300.0, 'tags': [], 'path_coordinates': path}]
+            with self.captureOnCommitCallbacks(execute=True):
+                seed_routes(definitions)
+            z, x, y = 12, 3229, 1787
+            tile = os.path.join(directory, str(z), str(x), f'{y}.mvt')
+
+            # Chỉ đổi thuộc tính trong tile, giữ track
+            self.client.get(f'/tiles/{z}/{x}/{y}.mvt')
+            self.assertTrue(os.path.exists(tile))
+            definitions[0]['total_distance_km'] = 6.5
+            with self.captureOnCommitCallbacks(execute=True):
+                seed_routes(definitions)
+            self.assertFalse(os.path.exists(tile))
+
+            # Track dời đi nơi khác: tile ở vị trí cũ cũng bị xóa
+            self.client.get(f'/tiles/{z}/{x}/{y}.mvt')
+            self.assertTrue(os.path.exists(tile))
+            definitions[0]['path_coordinates'] = [[10.1, 106.1], [10.2, 106.1]]
+            with self.captureOnCommitCallbacks(execute=True):
+                seed_routes(definitions)
+            self.assertFalse(os.path.exists(tile))
+            self.assertEqual(decode_mvt(self.client.get(f'/tiles/{z}/{x}/{y}.mvt').content), {})
+
+    def test_invalid_files_and_dry_run(self):
+        duplicated = self.write('dup.json', json.dumps([{'name': 'A'}, {'name': 'A'}]))
+        with self.assertRaises(SeedError):
+            seed_routes(load_route_definitions(duplicated))
+        with self.assertRaises(SeedError):
+            load_route_definitions(self.write('bad.json', json.dumps([{'name': 'B', 'distance': 'xa'}])))
+        with self.assertRaises(SeedError):
+            load_route_definitions(self.write('routes.xml', '<routes/>'))
+
+        stats = seed_routes(load_route_definitions(MASTER_ROUTES_FILE), dry_run=True)
+        self.assertEqual(stats['created'], 36)
+        self.assertFalse(Route.objects.exists())
+
+        out = StringIO()
+        call_command('seed_master_data', stdout=out)
+        call_command('seed_master_data', stdout=out)
+        self.assertIn('thêm 0, cập nhật 0, không đổi 36', out.getvalue())
+        self.assertEqual(Route.objects.count(), 36)
+
+
+class RouteImageCrawlTests(APITestCase):
+    def setUp(self):
+        self.routes = [make_route(f"Cung {i}", ["Săn mây"]) for i in range(6)]
+        self.sleeps = []
+
+    def crawl(self, provider, **options):
+        options = {'concurrency': 3, 'rate': 1000, 'batch_size': 2, 'sleep': self.sleeps.append, **options}
+        return crawl_route_images(provider=provider, **options)
+
+    def test_results_are_saved_and_reruns_skip_finished_routes(self):
+        provider = FakeImageSearch(empty=[route_query("Cung 4")])
+        self.assertEqual(self.crawl(provider), {'done': 5, 'empty': 1, 'failed': 0})
+        route = Route.objects.get(pk=self.routes[0].pk)
+        self.assertEqual(len(route.gallery), 4)
+        self.assertEqual(route.image_url, route.gallery[0])
+        state = RouteImageCrawl.objects.get(route=route)
+        self.assertEqual((state.status, state.attempts, state.image_count), ('done', 1, 4))
+        self.assertEqual(RouteImageCrawl.objects.get(route=self.routes[4]).status, 'empty')
+
+        self.assertEqual(self.crawl(provider), {'done': 0, 'empty': 0, 'failed': 0})
+        self.assertEqual(provider.calls, 6)
+        self.assertEqual(self.crawl(provider, force=True)['done'], 5)
+
+    def test_rate_limited_routes_back_off_and_resume(self):
+        # Cung 1 bị chặn một lần rồi qua; Cung 2 luôn bị chặn
+        blocked = {route_query("Cung 1"): 1, route_query("Cung 2"): 99}
+
+        def rate_limited(query, call_number):
+            if blocked.get(query, 0) > 0:
+                blocked[query] -= 1
+                return True
+            return False
+
+        stats = self.crawl(FakeImageSearch(rate_limited=rate_limited), max_retries=2)
+        self.assertEqual(stats, {'done': 5, 'empty': 0, 'failed': 1})
+        self.assertEqual(len(self.sleeps), 3)
+        self.assertEqual(RouteImageCrawl.objects.get(route=self.routes[1]).attempts, 2)
+        failed = RouteImageCrawl.objects.get(route=self.routes[2])
+        self.assertEqual((failed.status, failed.attempts), ('failed', 3))
+        self.assertIn('rate limited', failed.last_error)
+        self.assertEqual(Route.objects.get(pk=self.routes[2].pk).gallery, [])
+
+        # Chạy lại chỉ thử route lỗi
+        provider = FakeImageSearch()
+        self.assertEqual(self.crawl(provider), {'done': 1, 'empty': 0, 'failed': 0})
+        self.assertEqual(provider.calls, 1)
+
+    def test_interrupted_run_keeps_finished_routes(self):
+        class Interrupted(FakeImageSearch):
+            def search(self, query, max_results=4):
+                if query == route_query("Cung 3"):
+                    raise KeyboardInterrupt
+                return super().search(query, max_results)
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.crawl(Interrupted(), concurrency=1, batch_size=10)
+        self.assertEqual(set(RouteImageCrawl.objects.values_list('route__name', flat=True)),
+                         {"Cung 0", "Cung 1", "Cung 2"})
+        provider = FakeImageSearch()
+        self.assertEqual(self.crawl(provider)['done'], 3)
+        self.assertEqual(provider.calls, 3)
+
+    def test_token_bucket_and_backoff(self):
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=2, burst=3, clock=lambda: now[0], sleep=sleep)
+        for _ in range(7):
+            bucket.acquire()
+        # 3 lần đầu dồn được, 4 lần sau mỗi lần 0.5 s
+        self.assertAlmostEqual(now[0], 2.0)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+        delays = [backoff_delay(attempt, base=1, cap=5) for attempt in range(10) for _ in range(20)]
+        self.assertTrue(all(0 <= delay <= 5 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_throughput_scales_with_concurrency_up_to_rate(self):
+        def elapsed(**options):
+            RouteImageCrawl.objects.all().delete()
+            started = time.perf_counter()
+            self.crawl(FakeImageSearch(delay=0.1), **options)
+            return time.perf_counter() - started
+
+        serial, parallel = elapsed(concurrency=1), elapsed(concurrency=6)
+        self.assertLess(parallel, serial / 2)
+        # Giới hạn của nguồn thắng số worker: 6 request ở 10 request/giây, burst 1 -> >= 0.5 s
+        self.assertGreaterEqual(elapsed(concurrency=6, rate=10, burst=1), 0.45)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('crawl_images', '--provider', 'fake', '--rate', '100', '--ids', str(self.routes[0].pk),
+                     stdout=out)
+        self.assertIn('1 route có ảnh', out.getvalue())
+        self.assertEqual(len(Route.objects.get(pk=self.routes[0].pk).gallery), 4)
+
+    def test_missing_duckduckgo_package_is_reported(self):
+        with mock.patch.dict('sys.modules', {'duckduckgo_search': None}):
+            with self.assertRaises(ImageSearchError):
+                DuckDuckGoImageSearch().search('x')
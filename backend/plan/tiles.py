@@ -0,0 +1,455 @@
+# plan/tiles.py
+"""
+Vector tile (Mapbox Vector Tile, MVT v2) cho màn hình bản đồ: mọi Route
+(plan.Route, layer 'routes') và routes.Waypoint (layer 'waypoints') trong
+một ô /tiles/{z}/{x}/{y}.mvt, để app vẽ cả vùng mà không tải từng route.
+
+- Hình học route lấy từ các mức rút gọn của RouteGeometry (plan/simplify.py)
+  theo zoom của tile; zoom cao hơn mức cuối dùng track gốc.
+- Route giao với tile được tìm bằng RouteBoundsIndex (bbox của mọi route,
+  mảng NumPy trong bộ nhớ); waypoint bằng backend của routes/spatial.py.
+- MVT được mã hóa trực tiếp (protobuf wire format), không cần thư viện ngoài.
+- TileCache: LRU trong bộ nhớ (TILE_MEMORY_CACHE_SIZE ô, sống
+  TILE_MEMORY_CACHE_TTL giây) trước cache trên đĩa (TILE_CACHE_DIR/z/x/y.mvt).
+  Khi route / waypoint đổi, signal xóa các ô chạm bbox cũ và mới
+  (xem plan/signals.py); lệnh prerender_tiles làm ấm các zoom hay dùng.
+"""
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .geometry import path_array
+from .simplify import build_route_geometry, decode_polyline, pick_level
+from .tag_index import DEFAULT_TTL_SECONDS
+from .track import route_points, track_store_enabled
+
+EXTENT = 4096
+# Lề quanh tile (đơn vị tile) để nét vẽ không bị cắt cụt ở mép
+BUFFER = 64
+MAX_ZOOM = 18
+# Waypoint chỉ hiện từ zoom này (ở zoom thấp chỉ vẽ route)
+WAYPOINT_MIN_ZOOM = 10
+MAX_MERCATOR_LAT = 85.0511287798
+
+GEOM_POINT, GEOM_LINESTRING = 1, 2
+CMD_MOVE_TO, CMD_LINE_TO = 1, 2
+
+
+# --- Tọa độ tile (Web Mercator, sơ đồ XYZ) ---
+
+def mercator(lat, lng):
+    """lat/lng (độ) -> tọa độ Mercator chuẩn hóa [0, 1] (x sang đông, y xuống nam)."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    return x, y
+
+
+def _lat_of(y):
+    return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * y))))
+
+
+def tile_bounds(z, x, y, buffer=0):
+    """(min_lat, min_lng, max_lat, max_lng) của tile, nới thêm `buffer` đơn vị tile mỗi phía."""
+    n = 2 ** z
+    pad = buffer / EXTENT
+    x0, x1 = (x - pad) / n, (x + 1 + pad) / n
+    y0, y1 = (y - pad) / n, (y + 1 + pad) / n
+    return (_lat_of(min(y1, 1.0)), max(x0 * 360.0 - 180.0, -180.0),
+            _lat_of(max(y0, 0.0)), min(x1 * 360.0 - 180.0, 180.0))
+
+
+def tile_range(bounds, z):
+    """Các tile ở zoom z chạm bbox: (x_min, x_max, y_min, y_max), gồm cả hai đầu."""
+    min_lat, min_lng, max_lat, max_lng = bounds
+    n = 2 ** z
+    (x0, x1), (y1, y0) = (
+        np.clip(np.floor(np.array(v) * n), 0, n - 1).astype(int).tolist()
+        for v in mercator([min_lat, max_lat], [min_lng, max_lng])
+    )
+    return x0, x1, y0, y1
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def to_tile_coords(points, z, x, y):
+    """Mảng (n, 2) [lat, lng] -> tọa độ nguyên trong tile (0..EXTENT, có thể âm / vượt ra lề)."""
+    mx, my = mercator(points[:, 0], points[:, 1])
+    n = 2 ** z
+    return np.column_stack([
+        np.round((mx * n - x) * EXTENT), np.round((my * n - y) * EXTENT),
+    ]).astype(np.int64)
+
+
+def clip_lines(coords, low=-BUFFER, high=EXTENT + BUFFER):
+    """
+    Giữ các đoạn có bbox chạm tile (kể cả lề), tách thành nhiều đường
+    nếu track ra rồi vào lại. Bỏ các điểm trùng nhau liên tiếp.
+    """
+    if len(coords) < 2:
+        return []
+    a, b = coords[:-1], coords[1:]
+    keep = ((np.minimum(a, b) <= high) & (np.maximum(a, b) >= low)).all(axis=1)
+    lines = []
+    # Mỗi dãy đoạn liên tiếp được giữ -> một đường
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], keep.astype(np.int8), [0]])))
+    for start, end in zip(edges[::2], edges[1::2]):
+        line = coords[start:end + 1]
+        line = line[np.concatenate([[True], (np.diff(line, axis=0) != 0).any(axis=1)])]
+        if len(line) >= 2:
+            lines.append(line)
+    return lines
+
+
+# --- Mã hóa MVT (protobuf wire format) ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _bytes(field, b''.join(_varint(value) for value in values))
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _value(value):
+    """Tile.Value: string=1, double=3, uint=5, sint=6, bool=7."""
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _key(5, 0) + _varint(value)
+        return _key(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + np.float64(value).astype('<f8').tobytes()
+    return _bytes(1, str(value).encode())
+
+
+def _geometry(parts, geometry_type):
+    """Lệnh MoveTo / LineTo với tọa độ delta zigzag; con trỏ nối tiếp qua các phần."""
+    commands, cursor = [], (0, 0)
+    for part in parts:
+        deltas = np.diff(part, axis=0, prepend=[cursor])
+        cursor = tuple(part[-1].tolist())
+        values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).ravel().tolist()
+        if geometry_type == GEOM_POINT:
+            commands += [CMD_MOVE_TO | (len(part) << 3), *values]
+        else:
+            commands += [CMD_MOVE_TO | (1 << 3), *values[:2],
+                         CMD_LINE_TO | ((len(part) - 1) << 3), *values[2:]]
+    return commands
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    features: [{'id', 'type' (GEOM_POINT / GEOM_LINESTRING), 'parts' (list mảng
+    (n, 2) tọa độ tile), 'properties' (dict)}].
+    """
+    keys, values = {}, {}
+    body = [_key(15, 0) + _varint(2), _bytes(1, name.encode())]
+    for feature in features:
+        tags = []
+        for key, value in feature['properties'].items():
+            if value is None:
+                continue
+            # bool là int trong Python: phân biệt để 1 và True không dùng chung Value
+            value_key = (type(value).__name__, value)
+            tags += [keys.setdefault(key, len(keys)), values.setdefault(value_key, len(values))]
+        body.append(_bytes(2, b''.join([
+            _key(1, 0) + _varint(feature['id']),
+            _packed(2, tags),
+            _key(3, 0) + _varint(feature['type']),
+            _packed(4, _geometry(feature['parts'], feature['type'])),
+        ])))
+    body += [_bytes(3, key.encode()) for key in keys]
+    body += [_bytes(4, _value(value)) for _, value in values]
+    body.append(_key(5, 0) + _varint(extent))
+    return _bytes(3, b''.join(body))
+
+
+# --- Chọn dữ liệu cho một tile ---
+
+class RouteBoundsIndex:
+    """bbox của mọi plan.Route (mảng NumPy) để tìm route giao với một tile."""
+
+    def __init__(self, ttl=None):
+        self._lock = threading.RLock()
+        self._ttl = ttl
+        self._bounds = {}
+        self._ids = np.empty(0, dtype=np.int64)
+        self._boxes = np.empty((0, 4), dtype=np.float64)
+        self._built_at = None
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'ROUTE_TAG_INDEX_TTL', DEFAULT_TTL_SECONDS)
+
+    def build(self):
+        from .models import Route
+
+        routes = Route.objects.only('id', 'path_coordinates')
+        if track_store_enabled():
+            routes = routes.select_related('track').defer('path_coordinates')
+        with self._lock:
+            self._bounds = {}
+            for route in routes.iterator(chunk_size=200):
+                self._set(route.pk, route_points(route))
+            self._pack()
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+                self.build()
+
+    def update_route(self, route):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._set(route.pk, path_array(route.path_coordinates))
+            self._pack()
+
+    def remove_route(self, route_id):
+        with self._lock:
+            if self._built_at is None:
+                return
+            if self._bounds.pop(route_id, None) is not None:
+                self._pack()
+
+    def _set(self, route_id, points):
+        bounds = path_bounds(points)
+        if bounds is None:
+            self._bounds.pop(route_id, None)
+        else:
+            self._bounds[route_id] = bounds
+
+    def _pack(self):
+        self._ids = np.fromiter(self._bounds, dtype=np.int64, count=len(self._bounds))
+        self._boxes = np.array(list(self._bounds.values()), dtype=np.float64).reshape(-1, 4)
+
+    def all_bounds(self):
+        self._ensure_built()
+        with self._lock:
+            return dict(self._bounds)
+
+    def intersecting(self, bounds):
+        """id các route có bbox giao với bounds (min_lat, min_lng, max_lat, max_lng)."""
+        self._ensure_built()
+        min_lat, min_lng, max_lat, max_lng = bounds
+        with self._lock:
+            boxes, ids = self._boxes, self._ids
+        mask = ((boxes[:, 0] <= max_lat) & (boxes[:, 2] >= min_lat)
+                & (boxes[:, 1] <= max_lng) & (boxes[:, 3] >= min_lng))
+        return ids[mask].tolist()
+
+
+def path_bounds(points):
+    if not len(points):
+        return None
+    return (float(points[:, 0].min()), float(points[:, 1].min()),
+            float(points[:, 0].max()), float(points[:, 1].max()))
+
+
+route_bounds = RouteBoundsIndex()
+
+
+def _route_features(z, x, y):
+    from .models import Route
+
+    ids = route_bounds.intersecting(tile_bounds(z, x, y, BUFFER))
+    if not ids:
+        return []
+    routes = (Route.objects.filter(pk__in=ids).order_by('id')
+              .only('id', 'name', 'total_distance_km', 'elevation_gain_m', 'path_coordinates')
+              .prefetch_related('geometry'))
+    if track_store_enabled():
+        routes = routes.select_related('track')
+
+    features = []
+    for route in routes:
+        level = pick_level(build_route_geometry(route).levels, zoom=z)
+        points = route_points(route) if level is None else decode_polyline(level['polyline'])
+        parts = clip_lines(to_tile_coords(points, z, x, y)) if len(points) else []
+        if parts:
+            features.append({
+                'id': route.pk, 'type': GEOM_LINESTRING, 'parts': parts,
+                'properties': {'name': route.name, 'distance_km': route.total_distance_km,
+                               'elevation_gain_m': route.elevation_gain_m},
+            })
+    return features
+
+
+def _waypoint_features(z, x, y):
+    from routes.models import Waypoint
+    from routes.spatial import spatial_backend
+
+    if z < WAYPOINT_MIN_ZOOM:
+        return []
+    found = spatial_backend().within_bbox(*tile_bounds(z, x, y, BUFFER))
+    rows = (Waypoint.objects.filter(pk__in=[waypoint_id for waypoint_id, _ in found]).order_by('id')
+            .values_list('id', 'name', 'type', 'route_id', 'latitude', 'longitude'))
+    features = []
+    for waypoint_id, name, waypoint_type, route_id, lat, lng in rows:
+        point = to_tile_coords(np.array([[lat, lng]]), z, x, y)
+        features.append({
+            'id': waypoint_id, 'type': GEOM_POINT, 'parts': [point],
+            'properties': {'name': name, 'type': waypoint_type, 'route_id': route_id},
+        })
+    return features
+
+
+def render_tile(z, x, y):
+    """Bytes MVT của tile (rỗng nếu không có gì trong ô)."""
+    layers = []
+    for name, features in (('routes', _route_features(z, x, y)),
+                           ('waypoints', _waypoint_features(z, x, y))):
+        if features:
+            layers.append(encode_layer(name, features))
+    return b''.join(layers)
+
+
+# --- Cache ---
+
+class TileCache:
+    """LRU trong bộ nhớ (mỗi process) trước một thư mục z/x/y.mvt dùng chung."""
+
+    def __init__(self, directory=None, max_entries=None, ttl=None):
+        self._directory = directory
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._tiles = OrderedDict()  # (z, x, y) -> (bytes, stored_at)
+
+    @property
+    def directory(self):
+        if self._directory is not None:
+            return self._directory
+        return getattr(settings, 'TILE_CACHE_DIR', '')
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'TILE_MEMORY_CACHE_SIZE', 512)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'TILE_MEMORY_CACHE_TTL', 60)
+
+    def path(self, z, x, y):
+        return os.path.join(self.directory, str(z), str(x), f'{y}.mvt')
+
+    def get(self, z, x, y):
+        """Tile đã cache (bộ nhớ rồi đĩa) hoặc None."""
+        key = (z, x, y)
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._tiles.move_to_end(key)
+                return entry[0]
+        if not self.directory:
+            return None
+        try:
+            with open(self.path(z, x, y), 'rb') as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, z, x, y, data):
+        self._remember((z, x, y), data)
+        if not self.directory:
+            return
+        path = self.path(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Ghi file tạm rồi đổi tên: worker khác không bao giờ đọc phải tile dở dang
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp, path)
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._tiles[key] = (data, time.monotonic())
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+
+    def get_or_render(self, z, x, y):
+        data = self.get(z, x, y)
+        if data is None:
+            data = render_tile(z, x, y)
+            self.put(z, x, y, data)
+        return data
+
+    def invalidate_bounds(self, bounds, min_zoom=0, max_zoom=MAX_ZOOM):
+        """Xóa mọi tile (bộ nhớ + đĩa) chạm bbox ở các zoom min_zoom..max_zoom."""
+        ranges = {z: tile_range(bounds, z) for z in range(min_zoom, max_zoom + 1)}
+
+        def touched(z, x, y):
+            x0, x1, y0, y1 = ranges[z]
+            return x0 <= x <= x1 and y0 <= y <= y1
+
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] in ranges and touched(*key)]:
+                del self._tiles[key]
+        if not self.directory:
+            return
+        # Chỉ duyệt các file đang có, không sinh mọi (x, y) trong vùng
+        for z, (x0, x1, y0, y1) in ranges.items():
+            zoom_dir = os.path.join(self.directory, str(z))
+            if not os.path.isdir(zoom_dir):
+                continue
+            for x_name in os.listdir(zoom_dir):
+                if not (x_name.isdigit() and x0 <= int(x_name) <= x1):
+                    continue
+                for y_name in os.listdir(os.path.join(zoom_dir, x_name)):
+                    stem = y_name.removesuffix('.mvt')
+                    if stem.isdigit() and y0 <= int(stem) <= y1:
+                        try:
+                            os.remove(os.path.join(zoom_dir, x_name, y_name))
+                        except FileNotFoundError:
+                            pass
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+
+tile_cache = TileCache()
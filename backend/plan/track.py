@@ -0,0 +1,130 @@
+# plan/track.py
+"""
+Kho track nhị phân dạng cột cho Route.path_coordinates (tùy chọn).
+
+path_coordinates là JSON [[lat, lng], ...]: mỗi lần đọc một track dày phải
+parse hàng nghìn số thực qua `json`. Khi ROUTE_TRACK_STORE = 'binary', mỗi
+route có thêm một RouteTrack lưu tọa độ trong BinaryField:
+- 'delta_i4' (mặc định): int32 micro-độ (1e-6° ~ 11 cm), hàng đầu là điểm
+  xuất phát, các hàng sau là chênh lệch so với điểm trước. Giải mã bằng một
+  lần np.cumsum.
+- 'f4': float32 tuyệt đối (sai số < 1 m ở Việt Nam); np.frombuffer cho
+  view (n, 2) dùng thẳng được, không copy.
+JSON chỉ được tạo ở biên API (RouteSerializer); mọi phép tính dùng mảng NumPy.
+"""
+import numpy as np
+from django.conf import settings
+
+from .geometry import path_array, path_hash
+
+TRACK_ENCODINGS = {'delta_i4': '<i4', 'f4': '<f4'}
+MICRODEGREES = 1_000_000
+COORDINATE_DECIMALS = 6
+
+
+def track_store_enabled():
+    return getattr(settings, 'ROUTE_TRACK_STORE', 'json') == 'binary'
+
+
+def default_encoding():
+    encoding = getattr(settings, 'ROUTE_TRACK_ENCODING', 'delta_i4')
+    if encoding not in TRACK_ENCODINGS:
+        raise ValueError(f"ROUTE_TRACK_ENCODING không hợp lệ: {encoding!r} "
+                         f"(chỉ hỗ trợ {', '.join(TRACK_ENCODINGS)})")
+    return encoding
+
+
+def track_points(path_coordinates):
+    """
+    path_coordinates -> mảng float64 (n, 2), hoặc None nếu không lưu được
+    mà vẫn trả lại đúng JSON cũ (không phải list, phần tử lạ, có cột thứ 3...).
+    """
+    if not isinstance(path_coordinates, list):
+        return None
+    if not path_coordinates:
+        return np.empty((0, 2), dtype=np.float64)
+    try:
+        points = np.array(path_coordinates, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if points.ndim != 2 or points.shape[1] != 2 or not np.isfinite(points).all():
+        return None
+    return points
+
+
+def encode_track(points, encoding='delta_i4'):
+    """Mảng (n, 2) [lat, lng] -> bytes theo `encoding`."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if encoding == 'f4':
+        return points.astype('<f4').tobytes()
+    scaled = np.round(points * MICRODEGREES).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return deltas.astype('<i4').tobytes()
+
+
+def track_view(data, encoding):
+    """View (n, 2) trên bytes đã lưu, không copy (delta int32 hoặc float32 tuyệt đối)."""
+    return np.frombuffer(data, dtype=TRACK_ENCODINGS[encoding]).reshape(-1, 2)
+
+
+def decode_track(data, encoding):
+    """Bytes đã lưu -> tọa độ (n, 2). 'f4' trả thẳng view float32 (chỉ đọc)."""
+    view = track_view(data, encoding)
+    if encoding == 'f4':
+        return view
+    return np.cumsum(view, axis=0, dtype=np.int64) / MICRODEGREES
+
+
+def track_coordinates(points):
+    """Mảng tọa độ -> [[lat, lng], ...] cho JSON ở biên API."""
+    return np.round(np.asarray(points, dtype=np.float64), COORDINATE_DECIMALS).tolist()
+
+
+def cached_track(route):
+    """RouteTrack đã được select_related('track') / prefetch cùng route, không tốn truy vấn."""
+    from .models import Route, RouteTrack
+
+    if not Route.track.is_cached(route):
+        return None
+    try:
+        return route.track
+    except RouteTrack.DoesNotExist:
+        return None
+
+
+def route_points(route):
+    """Tọa độ (n, 2) của route: từ RouteTrack nếu đã nạp sẵn, không thì parse path_coordinates."""
+    track = cached_track(route)
+    if track is not None:
+        return track.points()
+    return path_array(route.path_coordinates)
+
+
+def build_route_track(route, encoding=None, force=False):
+    """
+    Lấy RouteTrack của route, mã hóa (lại) nếu chưa có, path_coordinates đã đổi
+    hoặc đổi encoding. Trả về None (và xóa track cũ) nếu path_coordinates
+    không lưu được dạng nhị phân; khi đó API tiếp tục đọc JSON.
+    """
+    from .models import RouteTrack
+
+    encoding = encoding or default_encoding()
+    digest = path_hash(route.path_coordinates)
+    try:
+        track = route.track  # dùng kết quả prefetch_related('track') nếu có
+    except RouteTrack.DoesNotExist:
+        track = None
+    if (track is not None and track.path_hash == digest and track.encoding == encoding
+            and not force):
+        return track
+
+    points = track_points(route.path_coordinates)
+    if points is None:
+        RouteTrack.objects.filter(route_id=route.pk).delete()
+        return None
+    track, _ = RouteTrack.objects.update_or_create(
+        route_id=route.pk,
+        defaults={'path_hash': digest, 'encoding': encoding, 'point_count': len(points),
+                  'data': encode_track(points, encoding)},
+    )
+    return track
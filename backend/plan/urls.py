@@ -7,17 +7,47 @@ from . import views
 router = DefaultRouter()
 router.register(r'plans', views.PlanViewSet, basename='plan')
 router.register(r'history-inputs', views.HistoryInputViewSet, basename='historyinput')
+router.register(r'routes', views.RouteViewSet, basename='route')
 
 urlpatterns = [
     # Các URL do Router tạo:
     # /api/plans/ (GET, POST)
     # /api/plans/<id>/ (GET, PUT, DELETE)
     # /api/history-inputs/ (GET, POST)
+    # /api/routes/ (GET, tóm tắt) và /api/routes/<id>/ (GET, đầy đủ)
     path('', include(router.urls)),
 
     # URL tùy chỉnh cho việc gợi ý Route
     # /api/routes/suggested/ (GET)
-    # path('routes/suggested/',
-    #      views.RouteSuggestionView.as_view(),
-    #      name='route-suggestion'),
+    path('routes/suggested/',
+         views.RouteSuggestionView.as_view(),
+         name='route-suggestion'),
+
+    # /api/routes/<id>/similar/ (GET) và /api/routes/similar/ (POST, nhiều route)
+    path('routes/<int:pk>/similar/',
+         views.SimilarRoutesView.as_view(),
+         name='route-similar'),
+    path('routes/similar/',
+         views.SimilarRoutesBatchView.as_view(),
+         name='route-similar-batch'),
+
+    # /api/routes/<id>/profile/ (GET, hồ sơ độ cao)
+    path('routes/<int:pk>/profile/',
+         views.RouteProfileView.as_view(),
+         name='route-profile'),
+
+    # /api/routes/<id>/geometry/ (GET, track rút gọn theo zoom / tolerance)
+    path('routes/<int:pk>/geometry/',
+         views.RouteGeometryView.as_view(),
+         name='route-geometry'),
+
+    # /api/routes/<id>/itinerary/?days=3 (GET, chia chặng theo ngày)
+    path('routes/<int:pk>/itinerary/',
+         views.RouteItineraryView.as_view(),
+         name='route-itinerary'),
+
+    # /api/equipment/checklist/ (GET, chọn đồ theo khối lượng / ngân sách)
+    path('equipment/checklist/',
+         views.EquipmentChecklistView.as_view(),
+         name='equipment-checklist'),
 ]
\ No newline at end of file
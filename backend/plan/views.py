@@ -1,9 +1,62 @@
  # plan/views.py
+import hashlib
+import math
+
 from django.db.models import Q
+from django.http import HttpResponse
 from rest_framework import viewsets, permissions, generics
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from .models import Plan, Route, HistoryInput
-from .serializers import PlanSerializer, RouteSerializer, HistoryInputSerializer
+from rest_framework.views import APIView
+from .bundle import open_plan_bundle, ranged_file_response
+from .checklist import MAX_BUDGET, MAX_WEIGHT_LIMIT_G, plan_checklist
+from .elevation import build_route_profile
+from .itinerary import MAX_DAYS, build_route_itinerary, difficulty_name
+from .simplify import route_path
+from .tiles import tile_cache, valid_tile
+from .track import track_store_enabled
+from .models import Plan, Route, RouteItinerary, RouteProfile, HistoryInput
+from .pagination import IdCursorPagination, RouteCursorPagination
+from .serializers import (
+    PLAN_SUMMARY_FIELDS, ROUTE_SUMMARY_FIELDS,
+    HistoryInputSerializer, PlanSerializer, RouteItinerarySerializer, RouteProfileSerializer, RouteSerializer,
+    ScoredRouteSerializer, geometry_options,
+)
+from .ranking import DEFAULT_LIMIT, DIFFICULTY_LEVELS, MAX_LIMIT, SIMILARITY_METRICS, route_ranker
+from .suggestions import location_candidate_ids
+from safety.hazards import evaluate_plans, stored_inputs_hash
+from trek_guide_project.params import positive_int
+
+
+def _positive_number(params, name, maximum=None):
+    """Số thực dương hữu hạn (bị chặn ở maximum nếu có); thiếu hoặc rỗng -> None."""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Phải là số dương.'})
+    if not (value > 0 and math.isfinite(value)):
+        raise ValidationError({name: 'Phải là số dương.'})
+    return min(value, maximum) if maximum else value
+
+
+def _checklist_limits(params):
+    """budget (VND, cả nhóm) và max_weight_kg (mỗi người) -> tham số của plan_checklist."""
+    max_weight_kg = _positive_number(params, 'max_weight_kg', MAX_WEIGHT_LIMIT_G / 1000)
+    return {
+        'budget': _positive_number(params, 'budget', MAX_BUDGET),
+        'max_weight_g': max_weight_kg * 1000 if max_weight_kg else None,
+    }
+
+
+def _similarity_metric(value):
+    value = value or SIMILARITY_METRICS[0]
+    if value not in SIMILARITY_METRICS:
+        raise ValidationError({'metric': f"Chỉ hỗ trợ: {', '.join(SIMILARITY_METRICS)}."})
+    return value
 
 
 # --- Endpoint 1: Gợi ý Lộ trình (Xử lý nút "Xác nhận") ---
@@ -12,107 +65,296 @@ class RouteSuggestionView(generics.ListAPIView):
     """
     API View này mô phỏng 'PreferenceMatcherService'.
     Nó nhận thông tin Trip Info 1-4 làm query params và trả về
-    danh sách các Routes phù hợp.
+    top-K Routes phù hợp nhất kèm điểm `score` (xem plan/ranking.py).
     """
-    serializer_class = RouteSerializer
+    serializer_class = ScoredRouteSerializer
     permission_classes = [permissions.AllowAny]
 
-    # def get_queryset(self):
-    #     # 1. Lấy dữ liệu từ query params (gửi từ frontend)
-    #     # (Ví dụ: /api/routes/suggested/?difficulty=New&location=Thanh%20H%C3%B3a)
-    #     params = self.request.query_params
-    #
-    #     # Dữ liệu từ Trip Info 3/5
-    #     difficulty = params.get('difficulty')
-    #     # Dữ liệu từ Trip Info 1/5
-    #     location = params.get('location')
-    #     # Dữ liệu từ Trip Info 4/5 (dạng list, vd: ?interests=Ngắm%20bình%20minh)
-    #     interests = params.getlist('interests')
-    #
-    #     # 2. Bắt đầu lọc
-    #     queryset = Route.objects.all()
-    #
-    #     # 3. Mô phỏng logic matching (logic thật sẽ phức tạp hơn)
-    #     if location:
-    #         queryset = queryset.filter(
-    #             Q(name__icontains=location) |
-    #             Q(description__icontains=location)
-    #         )
-    #
-    #     if difficulty:
-    #         # Giả sử 'tags' trong model Route có chứa "easy", "medium", "hard"
-    #         # [cite: 1332]
-    #         difficulty_map = {
-    #             'Người mới': 'easy',
-    #             'Có kinh nghiệm': 'medium',
-    #             'Chuyên nghiệp': 'hard'
-    #         }
-    #         tag_to_search = difficulty_map.get(difficulty)
-    #         if tag_to_search:
-    #             queryset = queryset.filter(tags__contains=tag_to_search)
-    #
-    #     if interests:
-    #         # Tìm các route có chứa BẤT KỲ tag sở thích nào
-    #         queryset = queryset.filter(tags__overlap=interests)
-    #
-    #     # 4. Trả về các Routes đã được lọc
-    #     return queryset
     def get_queryset(self):
         # 1. Lấy dữ liệu từ query params
         params = self.request.query_params
         difficulty = params.get('difficulty')
         location = params.get('location')
         interests = params.getlist('interests') # Lấy danh sách sở thích
+        accommodation = params.get('accommodation')
+        duration_days = positive_int(params, 'duration_days')
+        limit = positive_int(params, 'limit', default=DEFAULT_LIMIT, maximum=MAX_LIMIT)
 
-        # 2. CHUẨN BỊ BỘ LỌC
-        # Chuyển đổi difficulty từ text sang tag
-        difficulty_map = {
-            'Người mới': 'easy',
-            'Có kinh nghiệm': 'medium',
-            'Chuyên nghiệp': 'hard'
-        }
-        tag_to_search = difficulty_map.get(difficulty)
-
-        # 3. LẤY TẤT CẢ ROUTE (ĐỂ LỌC BẰNG PYTHON)
-        # Đây là cách an toàn nhất cho SQLite
-        all_routes = list(Route.objects.all())
-
-        # Gán results bằng tất cả route ban đầu
-        results = all_routes
-
-        # 4. LỌC 'location' BẰNG PYTHON
-        if location:
-            results = [
-                route for route in results
-                if (location.lower() in route.name.lower()) or \
-                   (location.lower() in route.description.lower()) or \
-                   (location in route.tags) # <-- SỬA QUAN TRỌNG: TÌM TRONG TAGS
-            ]
-
-        # 5. LỌC 'difficulty' BẰNG PYTHON
-        if tag_to_search:
-            results = [route for route in results if tag_to_search in route.tags]
-
-        # 6. LỌC 'interests' BẰNG PYTHON
-        if interests:
-            # Chỉ giữ lại route nếu có BẤT KỲ sở thích nào khớp
-            results = [
-                route for route in results
-                if any(interest in route.tags for interest in interests)
-            ]
-
-        # 7. Trả về danh sách đã được lọc
+        # 2. 'location' vẫn là điều kiện bắt buộc (tìm không dấu, xem plan/search.py)
+        candidate_ids = location_candidate_ids(location) if location else None
+
+        # 3. CHẤM ĐIỂM CÁC TIÊU CHÍ CÒN LẠI BẰNG MA TRẬN ĐẶC TRƯNG (NumPy)
+        ranked = route_ranker.top_k(
+            limit,
+            candidate_ids=candidate_ids,
+            interests=interests,
+            difficulty=difficulty,
+            accommodation=accommodation,
+            duration_days=duration_days,
+        )
+
+        # 4. Chỉ lấy đúng K route, giữ thứ tự theo điểm
+        routes = Route.objects.in_bulk([route_id for route_id, _ in ranked])
+        results = []
+        for route_id, score in ranked:
+            route = routes.get(route_id)
+            if route is not None:
+                route.score = score
+                results.append(route)
         return results
 
 
+# --- Endpoint 1b: Route tương tự ---
+# Tương ứng: GET /api/routes/<id>/similar/?limit=5&metric=cosine
+class SimilarRoutesView(generics.ListAPIView):
+    """
+    Trả về các Route giống route <id> nhất (tag + quãng đường + độ cao),
+    tính trên ma trận đặc trưng dùng chung (xem plan/ranking.py).
+    """
+    serializer_class = ScoredRouteSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        route_id = self.kwargs['pk']
+        params = self.request.query_params
+        limit = positive_int(params, 'limit', default=DEFAULT_LIMIT, maximum=MAX_LIMIT)
+        metric = _similarity_metric(params.get('metric'))
+
+        if not Route.objects.filter(pk=route_id).exists():
+            raise NotFound('Không tìm thấy cung đường.')
+        neighbours = route_ranker.similar([route_id], k=limit, metric=metric).get(route_id, [])
+
+        routes = Route.objects.in_bulk([neighbour_id for neighbour_id, _ in neighbours])
+        results = []
+        for neighbour_id, score in neighbours:
+            route = routes.get(neighbour_id)
+            if route is not None:
+                route.score = score
+                results.append(route)
+        return results
+
+
+# Tương ứng: POST /api/routes/similar/  {"route_ids": [1, 2, 3], "limit": 5}
+class SimilarRoutesBatchView(APIView):
+    """
+    Trả về các route tương tự cho nhiều route trong một lần gọi.
+    Chỉ trả id, name, score để payload nhỏ.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_route_ids = 100
+
+    def post(self, request):
+        route_ids = request.data.get('route_ids')
+        if (not isinstance(route_ids, list) or not route_ids
+                or not all(isinstance(route_id, int) for route_id in route_ids)):
+            raise ValidationError({'route_ids': 'Phải là danh sách id (số nguyên).'})
+        if len(route_ids) > self.max_route_ids:
+            raise ValidationError({'route_ids': f'Tối đa {self.max_route_ids} id mỗi lần gọi.'})
+        limit = positive_int(request.data, 'limit', default=DEFAULT_LIMIT, maximum=MAX_LIMIT)
+        metric = _similarity_metric(request.data.get('metric'))
+
+        neighbours = route_ranker.similar(route_ids, k=limit, metric=metric)
+        neighbour_ids = {neighbour_id for pairs in neighbours.values() for neighbour_id, _ in pairs}
+        names = dict(Route.objects.filter(pk__in=neighbour_ids).values_list('id', 'name'))
+
+        return Response([
+            {
+                'route_id': route_id,
+                'similar': [
+                    {'id': neighbour_id, 'name': names[neighbour_id], 'score': score}
+                    for neighbour_id, score in neighbours.get(route_id, [])
+                    if neighbour_id in names
+                ],
+            }
+            for route_id in route_ids
+        ])
+
+
+# --- Endpoint 1d: Hồ sơ độ cao ---
+# Tương ứng: GET /api/routes/<id>/profile/
+class RouteProfileView(APIView):
+    """
+    Khoảng cách cộng dồn, độ cao (DEM cục bộ), độ dốc và tổng leo/xuống của
+    route. Tính một lần rồi lưu trong RouteProfile (xem plan/elevation.py).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        profile = RouteProfile.objects.filter(route_id=pk).first()
+        if profile is None:
+            route = Route.objects.only('id', 'path_coordinates').filter(pk=pk).first()
+            if route is None:
+                raise NotFound('Không tìm thấy cung đường.')
+            profile = build_route_profile(route)
+        return Response(RouteProfileSerializer(profile).data)
+
+
+# --- Endpoint 1e: Hình học nhiều mức chi tiết ---
+# Tương ứng: GET /api/routes/<id>/geometry/?zoom=12&geometry_format=polyline
+class RouteGeometryView(APIView):
+    """Track của route đã rút gọn theo zoom / dung sai (xem plan/simplify.py)."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        route = Route.objects.only('id', 'path_coordinates').filter(pk=pk).first()
+        if route is None:
+            raise NotFound('Không tìm thấy cung đường.')
+        options = geometry_options(request) or {'zoom': None, 'tolerance_m': None,
+                                                'geometry_format': 'coordinates'}
+        path, points, tolerance_m = route_path(route, **options)
+        return Response({
+            'route_id': route.pk,
+            'geometry_format': options['geometry_format'],
+            'tolerance_m': tolerance_m,
+            'points': points,
+            'path': path,
+        })
+
+
+# --- Endpoint 1f: Vector tile cho màn hình bản đồ ---
+# Tương ứng: GET /tiles/<z>/<x>/<y>.mvt
+class VectorTileView(APIView):
+    """
+    Mapbox Vector Tile gồm layer 'routes' (mọi Route, rút gọn theo zoom) và
+    'waypoints' (từ zoom 10). Tile được cache trong bộ nhớ và trên đĩa (xem plan/tiles.py).
+    """
+    permission_classes = [permissions.AllowAny]
+    content_type = 'application/vnd.mapbox-vector-tile'
+
+    def get(self, request, z, x, y):
+        if not valid_tile(z, x, y):
+            raise NotFound('Không có tile này.')
+        data = tile_cache.get_or_render(z, x, y)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(data, content_type=self.content_type)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
+
+
+# --- Endpoint 1g: Lịch trình theo ngày ---
+# Tương ứng: GET /api/routes/<id>/itinerary/?days=3&difficulty=easy
+class RouteItineraryView(APIView):
+    """
+    Chia route thành `days` chặng cân bằng thời gian đi (Naismith), nghỉ đêm
+    ưu tiên ở CAMPSITE / WATER_SOURCE. Lưu theo (route, số ngày, trình độ) (xem plan/itinerary.py).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        params = request.query_params
+        days = positive_int(params, 'days')
+        if days is None:
+            raise ValidationError({'days': 'Bắt buộc.'})
+        if days > MAX_DAYS:
+            raise ValidationError({'days': f'Tối đa {MAX_DAYS} ngày.'})
+        difficulty = params.get('difficulty')
+        if difficulty and difficulty not in DIFFICULTY_LEVELS:
+            raise ValidationError({'difficulty': f"Chỉ hỗ trợ: {', '.join(DIFFICULTY_LEVELS)}."})
+
+        itinerary = RouteItinerary.objects.filter(route_id=pk, duration_days=days,
+                                                  difficulty=difficulty_name(difficulty)).first()
+        if itinerary is None:
+            route = (Route.objects.only('id', 'path_coordinates', 'total_distance_km', 'elevation_gain_m')
+                     .filter(pk=pk).first())
+            if route is None:
+                raise NotFound('Không tìm thấy cung đường.')
+            itinerary = build_route_itinerary(route, days, difficulty)
+        return Response(RouteItinerarySerializer(itinerary).data)
+
+
+# --- Endpoint 1h: Checklist đồ dùng ---
+# Tương ứng: GET /api/equipment/checklist/?route_id=1&difficulty=easy&group_size=4&duration_days=3&budget=5000000
+class EquipmentChecklistView(APIView):
+    """
+    Chọn đồ từ bảng equipment theo Trip Info (knapsack theo khối lượng mỗi
+    người và ngân sách cả nhóm, đồ dùng chung chia cho nhóm; xem plan/checklist.py).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        route = None
+        route_id = positive_int(params, 'route_id')
+        if route_id is not None:
+            route = Route.objects.only('id', 'tags').filter(pk=route_id).first()
+            if route is None:
+                raise NotFound('Không tìm thấy cung đường.')
+        return Response(plan_checklist(
+            route=route,
+            difficulty=params.get('difficulty'),
+            group_size=positive_int(params, 'group_size', default=1, maximum=50),
+            duration_days=positive_int(params, 'duration_days', default=1, maximum=MAX_DAYS),
+            rest_type=params.get('rest_type'),
+            **_checklist_limits(params),
+        ))
+
+
+class SparseFieldsetViewMixin:
+    """
+    - list dùng `summary_fields` làm fieldset mặc định (client vẫn có thể
+      đổi bằng ?fields= / ?exclude=), retrieve trả đầy đủ.
+    - list chỉ SELECT các cột thật sự được serialize (QuerySet.only).
+    """
+    summary_fields = None
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list' and self.summary_fields:
+            context['default_fields'] = self.summary_fields
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != 'list':
+            return queryset
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = {
+            field.source for field in self.get_serializer().fields.values()
+            if field.source in model_fields
+        }
+        return queryset.only('pk', *columns)
+
+
+# --- Endpoint 1c: Danh sách / chi tiết Route ---
+# Tương ứng: GET /api/routes/ (tóm tắt, phân trang cursor), GET /api/routes/<id>/ (đầy đủ)
+class RouteViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Route.objects.all()
+    serializer_class = RouteSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = RouteCursorPagination
+    summary_fields = ROUTE_SUMMARY_FIELDS
+    # Không để /routes/suggested/, /routes/similar/ bị hiểu là <pk>
+    lookup_value_regex = '[0-9]+'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if geometry_options(self.request):
+            # RouteSerializer đọc các mức rút gọn; tránh một truy vấn cho mỗi route
+            queryset = queryset.prefetch_related('geometry')
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if (track_store_enabled() and not geometry_options(self.request)
+                and 'path_coordinates' in self.get_serializer().fields):
+            # Tọa độ đọc từ RouteTrack nhị phân; không kéo (và parse) cột JSON
+            queryset = queryset.select_related('track').defer('path_coordinates')
+        return queryset
+
+
 # --- Endpoint 2: Quản lý "Mẫu nhập nhanh" (Xử lý nút "Lưu mẫu này") ---
-class HistoryInputViewSet(viewsets.ModelViewSet):
+class HistoryInputViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API View này cho phép TẠO (POST) và XEM (GET) các mẫu
     đã lưu (HistoryInput).
     """
     serializer_class = HistoryInputSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         # Chỉ trả về các mẫu của user đang đăng nhập
@@ -125,13 +367,15 @@ class HistoryInputViewSet(viewsets.ModelViewSet):
 
 # --- Endpoint 3: Quản lý Kế hoạch (Tạo Plan sau khi chọn Route) ---
 # Tương ứng: POST /api/plans/ [cite: 1424]
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API View này cho phép TẠO (POST) một Plan hoàn chỉnh,
     và xem lại (GET) các Plan đã tạo.
     """
     serializer_class = PlanSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IdCursorPagination
+    summary_fields = PLAN_SUMMARY_FIELDS
 
     def get_queryset(self):
         # Chỉ trả về các Plan của user đang đăng nhập
@@ -141,4 +385,41 @@ class PlanViewSet(viewsets.ModelViewSet):
         # Tự động gán 'user' là user đang đăng nhập [cite: 1338]
         serializer.save(user=self.request.user)
 
+    # GET /api/plans/<id>/bundle/: gói offline MBTiles/SQLite (xem plan/bundle.py), hỗ trợ Range
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        plan = self.get_object()
+        handle, digest = open_plan_bundle(plan)
+        return ranged_file_response(request, handle, digest, content_type='application/vnd.sqlite3',
+                                    filename=f'plan-{plan.pk}.mbtiles')
+
+    # GET /api/plans/<id>/itinerary/: chia route của plan thành duration_days chặng (xem plan/itinerary.py)
+    @action(detail=True, methods=['get'])
+    def itinerary(self, request, pk=None):
+        plan = self.get_object()
+        if plan.route is None:
+            raise NotFound('Kế hoạch chưa chọn cung đường.')
+        days = min(max(plan.duration_days, 1), MAX_DAYS)
+        itinerary = build_route_itinerary(plan.route, days, plan.difficulty)
+        return Response(RouteItinerarySerializer(itinerary).data)
+
+    # POST /api/plans/<id>/checklist/: chọn đồ ở backend, lưu vào personalized_equipment_list
+    @action(detail=True, methods=['post'])
+    def checklist(self, request, pk=None):
+        plan = self.get_object()
+        result = plan_checklist(plan, **_checklist_limits(request.data))
+        plan.personalized_equipment_list = result['checklist']
+        plan.save(update_fields=['personalized_equipment_list'])
+        return Response(result)
+
+    # POST /api/plans/<id>/dangers/: đánh giá lại dangers_snapshot ở backend (xem safety/hazards.py)
+    @action(detail=True, methods=['post'])
+    def dangers(self, request, pk=None):
+        plan = self.get_object()
+        snapshots = evaluate_plans([plan], stored_hashes={plan.pk: stored_inputs_hash(plan.dangers_snapshot)})
+        if plan.pk in snapshots:
+            plan.dangers_snapshot = snapshots[plan.pk]
+            plan.save(update_fields=['dangers_snapshot'])
+        return Response(plan.dangers_snapshot)
+
 
@@ -0,0 +1,150 @@
+import math
+import random
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from routes.models import Route, Waypoint
+from routes.spatial import SPATIAL_BACKENDS, EARTH_RADIUS_KM, haversine_km
+
+TYPES = ['CAMPSITE', 'WATER_SOURCE', 'VIEWPOINT', 'SHELTER', 'SUMMIT']
+# Các cụm điểm quanh vùng trekking phía Bắc và Tây Nguyên
+CENTERS = [(22.34, 103.84), (22.82, 104.98), (21.33, 103.91), (20.25, 105.00), (11.95, 108.44)]
+
+QUERIES = [
+    ('radius 10 km, CAMPSITE', 'within_radius', (22.34, 103.84, 10), {'types': ['CAMPSITE']}),
+    ('radius 50 km, mọi loại', 'within_radius', (21.33, 103.91, 50), {}),
+    ('10 nearest WATER_SOURCE', 'nearest', (22.82, 104.98, 10), {'types': ['WATER_SOURCE']}),
+    ('bbox 0.2° x 0.2°', 'within_bbox', (22.2, 103.7, 22.4, 103.9), {}),
+]
+
+
+class FullScan:
+    """Cách làm cũ: nạp mọi Waypoint vào Python, tính haversine từng điểm."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @staticmethod
+    def _haversine(lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+    def within_radius(self, lat, lon, radius_km, types=None, limit=None):
+        found = sorted(
+            (distance, waypoint_id) for waypoint_id, waypoint_type, wlat, wlon in self.rows
+            if (not types or waypoint_type in types)
+            and (distance := self._haversine(lat, lon, wlat, wlon)) <= radius_km
+        )
+        return [(waypoint_id, distance) for distance, waypoint_id in found[:limit]]
+
+    def nearest(self, lat, lon, k, types=None):
+        return self.within_radius(lat, lon, math.inf, types, limit=k)
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, types=None, limit=None):
+        return sorted((waypoint_id, None) for waypoint_id, waypoint_type, lat, lon in self.rows
+                      if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+                      and (not types or waypoint_type in types))[:limit]
+
+
+class NumpyScan:
+    """Quét toàn bộ nhưng vector hóa (không có index)."""
+
+    def __init__(self, rows):
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.types = np.array([row[1] for row in rows])
+        self.lat = np.array([row[2] for row in rows])
+        self.lon = np.array([row[3] for row in rows])
+
+    def _mask(self, types):
+        return np.isin(self.types, types) if types else np.ones(len(self.ids), dtype=bool)
+
+    def within_radius(self, lat, lon, radius_km, types=None, limit=None):
+        distances = haversine_km(lat, lon, self.lat, self.lon)
+        mask = self._mask(types) & (distances <= radius_km)
+        order = np.lexsort((self.ids[mask], distances[mask]))[:limit]
+        return list(zip(self.ids[mask][order].tolist(), distances[mask][order].tolist()))
+
+    def nearest(self, lat, lon, k, types=None):
+        return self.within_radius(lat, lon, math.inf, types, limit=k)
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, types=None, limit=None):
+        mask = (self._mask(types) & (self.lat >= min_lat) & (self.lat <= max_lat)
+                & (self.lon >= min_lon) & (self.lon <= max_lon))
+        return [(waypoint_id, None) for waypoint_id in np.sort(self.ids[mask])[:limit]]
+
+
+class Command(BaseCommand):
+    help = ('So sánh truy vấn không gian trên Waypoint (bán kính / kNN / bbox): quét toàn bộ '
+            'bằng Python, quét NumPy, lưới trong bộ nhớ (index) và lọc bbox trong DB (database). '
+            'Dữ liệu giả lập được rollback sau khi đo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--skip-python', action='store_true', help='Bỏ qua quét Python (chậm)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        size = options['size']
+
+        with transaction.atomic():
+            route = Route.objects.create(name='Bench waypoints', total_distance_km=0, elevation_gain_m=0)
+            started = time.perf_counter()
+            Waypoint.objects.bulk_create(
+                (self._synthetic_waypoint(rng, route, i) for i in range(size)),
+                batch_size=10000,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Waypoint._meta.db_table}')
+            self.stdout.write(f"Tạo {size:,} waypoint: {time.perf_counter() - started:.1f} s")
+
+            index = SPATIAL_BACKENDS['index']
+            started = time.perf_counter()
+            index.build()
+            self.stdout.write(f"Dựng lưới (index): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+            rows = list(Waypoint.objects.values_list('id', 'type', 'latitude', 'longitude').iterator(
+                chunk_size=10000))
+            strategies = {'numpy scan': NumpyScan(rows), 'index': index,
+                          'database': SPATIAL_BACKENDS['database']}
+            if not options['skip_python']:
+                strategies = {'python scan': FullScan(rows), **strategies}
+
+            self.stdout.write(f"{'query':<26} | {'backend':>11} | {'p50 ms':>9} | {'max ms':>9} | rows")
+            self.stdout.write("-" * 70)
+            for label, method, args_, kwargs in QUERIES:
+                expected = None
+                for name, strategy in strategies.items():
+                    repeat = 1 if name == 'python scan' else options['repeat']
+                    timings, found = [], []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        found = getattr(strategy, method)(*args_, **kwargs)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    ids = [waypoint_id for waypoint_id, _ in found]
+                    expected = ids if expected is None else expected
+                    mismatch = '' if ids == expected else '  (KHÁC KẾT QUẢ!)'
+                    self.stdout.write(
+                        f"{label:<26} | {name:>11} | {statistics.median(timings):>9.2f} | "
+                        f"{max(timings):>9.2f} | {len(found)}{mismatch}"
+                    )
+            transaction.set_rollback(True)
+        index.invalidate()
+
+        self.stdout.write(self.style.SUCCESS("Đã đo xong (dữ liệu giả lập đã được rollback)."))
+
+    def _synthetic_waypoint(self, rng, route, i):
+        lat, lon = rng.choice(CENTERS)
+        return Waypoint(
+            route=route,
+            name=f"Bench waypoint {i}",
+            type=rng.choice(TYPES),
+            latitude=lat + rng.gauss(0, 0.8),
+            longitude=lon + rng.gauss(0, 0.8),
+        )
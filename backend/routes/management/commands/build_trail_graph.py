@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from routes.routing import TrailGraph
+
+
+class Command(BaseCommand):
+    help = ('Dựng đồ thị đường mòn (CSR) từ các file OSM XML cục bộ (.osm, .osm.gz, .osm.bz2) '
+            'cho định tuyến đi bộ (routes/routing.py). File .pbf cần đổi sang XML trước, '
+            'vd. `osmium cat vietnam.osm.pbf -o vietnam.osm.bz2`.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='Các file OSM XML')
+        parser.add_argument('--output', help='Thư mục lưu đồ thị (mặc định TRAIL_GRAPH_DIR)')
+
+    def handle(self, *args, **options):
+        missing = [path for path in options['sources'] if not os.path.exists(path)]
+        if missing:
+            raise CommandError(f"Không thấy file: {', '.join(missing)}")
+        output = options['output'] or settings.TRAIL_GRAPH_DIR
+
+        started = time.perf_counter()
+        graph = TrailGraph.from_osm(options['sources'])
+        graph.save(output, sources=options['sources'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Đồ thị {graph.version}: {len(graph):,} nút, {len(graph.indices):,} cạnh (có hướng) "
+            f"-> {output} ({time.perf_counter() - started:.1f} s). "
+            f"Chạy `manage.py route_trails` để tính lại path_coordinates."
+        ))
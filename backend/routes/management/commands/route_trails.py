@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from routes.models import Route
+from routes.routing import route_trail, trail_graph
+
+
+class Command(BaseCommand):
+    help = ('Tính trước path_coordinates của các routes.Route bằng định tuyến đi bộ qua các Waypoint. '
+            'Chỉ tính lại route có đồ thị hoặc waypoint đã đổi, trừ khi có --force.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ tính các route này')
+        parser.add_argument('--force', action='store_true', help='Tính lại cả route còn mới')
+
+    def handle(self, *args, **options):
+        if trail_graph.get() is None:
+            raise CommandError('Chưa có đồ thị đường mòn; chạy `manage.py build_trail_graph` trước.')
+        routes = Route.objects.order_by('id')
+        if options['ids']:
+            routes = routes.filter(pk__in=options['ids'])
+
+        started = time.perf_counter()
+        counts = {'routed': 0, 'cached': 0}
+        straight = 0
+        for route in routes.iterator(chunk_size=100):
+            _, straight_legs, status = route_trail(route, force=options['force'])
+            counts[status] += 1
+            straight += straight_legs or 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tính {counts['routed']} route, giữ nguyên {counts['cached']} route "
+            f"({time.perf_counter() - started:.1f} s)."
+        ))
+        if straight:
+            self.stdout.write(self.style.WARNING(
+                f"{straight} đoạn không tìm được đường trên đồ thị và được nối thẳng."
+            ))
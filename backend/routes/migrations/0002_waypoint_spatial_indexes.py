@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+# Index GiST cho backend 'postgis' của routes/spatial.py: chỉ tạo khi DB có
+# extension postgis. Biểu thức phải trùng với PostgisWaypointSearch.geography.
+CREATE_GEOGRAPHY_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'postgis') THEN
+        CREATE INDEX IF NOT EXISTS waypoint_geography_gist ON routes_waypoint
+        USING gist ((ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography));
+    END IF;
+END
+$$;
+"""
+DROP_GEOGRAPHY_INDEX = "DROP INDEX IF EXISTS waypoint_geography_gist;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='waypoint',
+            index=models.Index(fields=['type', 'latitude', 'longitude'], name='waypoint_type_lat_lng_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waypoint',
+            index=models.Index(fields=['latitude', 'longitude'], name='waypoint_lat_lng_idx'),
+        ),
+        migrations.RunSQL(CREATE_GEOGRAPHY_INDEX, DROP_GEOGRAPHY_INDEX),
+    ]
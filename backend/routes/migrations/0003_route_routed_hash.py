@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0002_waypoint_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='routed_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -9,6 +9,8 @@ class Route(models.Model):
     path_coordinates = models.JSONField(blank=True, null=True)
     tags = models.JSONField(default=list, blank=True)
     preference_note = models.TextField(blank=True, null=True)
+    # path_coordinates tìm trên đồ thị đường mòn cho phiên bản đồ thị + waypoint này (routes/routing.py)
+    routed_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
 
     def __str__(self):
         return self.name
@@ -21,6 +23,13 @@ class Waypoint(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
 
+    class Meta:
+        indexes = [
+            # Lọc bounding box cho backend 'database' của routes/spatial.py
+            models.Index(fields=['type', 'latitude', 'longitude'], name='waypoint_type_lat_lng_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='waypoint_lat_lng_idx'),
+        ]
+
 class InterestTag(models.Model):
     name = models.CharField(max_length=100, unique=True)
     category = models.CharField(max_length=100, blank=True)
@@ -0,0 +1,345 @@
+# routes/routing.py
+"""
+Định tuyến đi bộ cục bộ trên đồ thị đường mòn, thay cho việc app gọi
+router.project-osrm.org (profile foot) mỗi lần mở bản đồ.
+
+- Đồ thị dựng từ file OSM XML (.osm, .osm.gz, .osm.bz2) đặt trên máy
+  (lệnh build_trail_graph): chỉ giữ các way đi bộ được (path, footway,
+  track, steps...). Lưu dạng CSR: lat / lon / cells (mã ô lưới) của nút,
+  indptr / indices / weights (mét) là các file .npy, mở bằng mmap nên các
+  worker dùng chung page cache thay vì mỗi process một bản.
+- Mỗi lần dựng ghi vào thư mục con mới TRAIL_GRAPH_DIR/<version>/ rồi mới
+  đổi file CURRENT (os.replace) sang nó: file đang được worker mmap không
+  bao giờ bị ghi đè.
+- Nút được đánh số theo mã ô lưới, nên lat / lon / cells đã là lưới của
+  routes/spatial.py (WaypointGrid.presorted) để gắn waypoint vào nút gần
+  nhất, không chép mảng nào. A* (heuristic haversine) đọc thẳng từng đoạn
+  CSR của mảng mmap.
+- Kết quả lưu vào Route.path_coordinates kèm routed_hash (phiên bản đồ thị
+  + tọa độ waypoint): chỉ tính lại khi đồ thị hoặc waypoint đổi.
+"""
+import bz2
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+from django.conf import settings
+
+from .spatial import DEFAULT_CELL_DEG, WaypointGrid, cell_keys, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Các loại đường đi bộ được (theo highway=*); đường ô tô lớn bị loại
+FOOT_HIGHWAYS = frozenset({
+    'path', 'footway', 'track', 'steps', 'bridleway', 'pedestrian', 'cycleway', 'living_street',
+    'residential', 'unclassified', 'service', 'tertiary', 'tertiary_link', 'secondary',
+    'secondary_link', 'road',
+})
+NO_ACCESS = frozenset({'no', 'private'})
+# Waypoint cách nút gần nhất quá khoảng này thì đoạn đó nối thẳng
+SNAP_MAX_KM = 0.5
+GRAPH_ARRAYS = ('lat', 'lon', 'cells', 'indptr', 'indices', 'weights')
+# Số phiên bản đồ thị cũ giữ lại cho worker chưa kịp nạp bản mới
+KEEP_VERSIONS = 2
+
+
+def foot_accessible(tags):
+    if tags.get('foot') in NO_ACCESS:
+        return False
+    if tags.get('foot') in ('yes', 'designated', 'permissive'):
+        return True
+    return tags.get('highway') in FOOT_HIGHWAYS and tags.get('access') not in NO_ACCESS
+
+
+def _open_osm(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _iter_elements(path, tag):
+    with _open_osm(path) as handle:
+        for _, element in ElementTree.iterparse(handle, events=('end',)):
+            if element.tag == tag:
+                yield element
+            if element.tag in ('node', 'way', 'relation'):
+                element.clear()
+
+
+def read_osm(paths):
+    """
+    Hai lượt đọc để không giữ mọi nút của file trong bộ nhớ:
+    lượt 1 lấy các way đi bộ được, lượt 2 chỉ lấy tọa độ các nút chúng dùng.
+    """
+    ways = []
+    for path in paths:
+        for element in _iter_elements(path, 'way'):
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if foot_accessible(tags):
+                refs = [int(nd.get('ref')) for nd in element.iter('nd')]
+                if len(refs) >= 2:
+                    ways.append(refs)
+    wanted = {ref for refs in ways for ref in refs}
+    coords = {}
+    for path in paths:
+        for element in _iter_elements(path, 'node'):
+            node_id = int(element.get('id'))
+            if node_id in wanted:
+                coords[node_id] = (float(element.get('lat')), float(element.get('lon')))
+    return ways, coords
+
+
+class TrailGraph:
+    """Đồ thị vô hướng dạng CSR; nút là chỉ số 0..n-1."""
+
+    def __init__(self, lat, lon, cells, indptr, indices, weights, version=''):
+        self.lat, self.lon, self.cells = lat, lon, cells
+        self.indptr, self.indices, self.weights = indptr, indices, weights
+        self.version = version
+        self.grid = WaypointGrid.presorted(cells, lat, lon, DEFAULT_CELL_DEG)
+
+    @classmethod
+    def from_osm(cls, paths):
+        ways, coords = read_osm(paths)
+        # Cạnh giữa hai nút liên tiếp của way (bỏ đoạn có nút thiếu tọa độ)
+        pairs = [(a, b) for refs in ways for a, b in zip(refs, refs[1:])
+                 if a != b and a in coords and b in coords]
+        node_ids = np.array(sorted({ref for pair in pairs for ref in pair}), dtype=np.int64)
+        points = np.array([coords[node_id] for node_id in node_ids.tolist()],
+                          dtype=np.float64).reshape(-1, 2)
+        edges = np.searchsorted(node_ids, np.array(pairs, dtype=np.int64).reshape(-1, 2))
+        return cls.from_edges(points, edges)
+
+    @classmethod
+    def from_edges(cls, points, edges):
+        """points: (n, 2) [lat, lon]; edges: (m, 2) chỉ số nút; trọng số là độ dài (mét)."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        # Đánh số lại nút theo mã ô lưới (xem WaypointGrid.presorted)
+        cells = cell_keys(points[:, 0], points[:, 1], DEFAULT_CELL_DEG)
+        order = np.argsort(cells, kind='stable')
+        renumber = np.empty(len(points), dtype=np.int64)
+        renumber[order] = np.arange(len(points))
+        points, cells, edges = points[order], cells[order], renumber[edges]
+
+        both = np.concatenate([edges, edges[:, ::-1]])
+        lengths = haversine_km(points[both[:, 0], 0], points[both[:, 0], 1],
+                               points[both[:, 1], 0], points[both[:, 1], 1]) * 1000.0
+        # Sắp theo (nguồn, đích, độ dài) rồi bỏ cạnh lặp, giữ cạnh ngắn nhất
+        order = np.lexsort((lengths, both[:, 1], both[:, 0]))
+        both, lengths = both[order], lengths[order]
+        first = np.ones(len(both), dtype=bool)
+        first[1:] = (both[1:] != both[:-1]).any(axis=1)
+        both, lengths = both[first], lengths[first]
+
+        indptr = np.zeros(len(points) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(both[:, 0], minlength=len(points)), out=indptr[1:])
+        version = hashlib.sha256(b''.join(
+            array.tobytes() for array in (points, both, lengths))).hexdigest()[:16]
+        return cls(points[:, 0].copy(), points[:, 1].copy(), cells, indptr,
+                   both[:, 1].astype(np.int32), lengths.astype(np.float32), version=version)
+
+    # --- Lưu / nạp (.npy, mmap) ---
+    def save(self, directory, sources=()):
+        """
+        Ghi vào thư mục con `<version>` mới (tạo ở thư mục tạm rồi đổi tên) rồi
+        trỏ CURRENT sang nó; không bao giờ ghi đè file mà worker khác đang mmap.
+        """
+        os.makedirs(directory, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=directory, prefix='.building-')
+        try:
+            for name in GRAPH_ARRAYS:
+                np.save(os.path.join(staging, f'{name}.npy'), getattr(self, name))
+            with open(os.path.join(staging, 'meta.json'), 'w') as handle:
+                json.dump({'version': self.version, 'nodes': len(self), 'edges': int(len(self.indices)),
+                           'sources': [os.path.basename(path) for path in sources]}, handle)
+            target = os.path.join(directory, self.version)
+            if os.path.isdir(target):
+                shutil.rmtree(staging)  # cùng nội dung đã có sẵn
+            else:
+                os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        fd, pointer = tempfile.mkstemp(dir=directory, prefix='.current-')
+        with os.fdopen(fd, 'w') as handle:
+            handle.write(self.version)
+        os.replace(pointer, os.path.join(directory, 'CURRENT'))
+        _remove_old_versions(directory, keep=self.version)
+
+    @classmethod
+    def load(cls, directory):
+        """Phiên bản mà CURRENT trỏ tới; OSError / ValueError nếu chưa dựng hoặc đang bị xóa."""
+        with open(os.path.join(directory, 'CURRENT')) as handle:
+            version = handle.read().strip()
+        path = os.path.join(directory, version)
+        with open(os.path.join(path, 'meta.json')) as handle:
+            meta = json.load(handle)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                  for name in GRAPH_ARRAYS}
+        return cls(**arrays, version=meta['version'])
+
+    def __len__(self):
+        return len(self.lat)
+
+    # --- Tìm đường ---
+    def nearest_node(self, lat, lon, max_km=SNAP_MAX_KM):
+        found = self.grid.nearest(lat, lon, 1, max_radius_km=max_km)
+        return found[0][0] if found else None
+
+    def shortest_path(self, source, target):
+        """
+        Danh sách nút từ source tới target (A*), hoặc None nếu không nối được.
+        Mỗi nút chỉ đọc đoạn indptr[node]:indptr[node + 1] của các mảng (mmap).
+        """
+        indptr, indices, weights, lat, lon = self.indptr, self.indices, self.weights, self.lat, self.lon
+        target_lat, target_lon = float(lat[target]), float(lon[target])
+
+        def heuristic(nodes):
+            # Hơi nhỏ hơn khoảng cách thật để bù sai số float32 của trọng số
+            return haversine_km(lat[nodes], lon[nodes], target_lat, target_lon) * 999.0
+
+        best = {source: 0.0}
+        parent = {source: -1}
+        heap = [(float(heuristic(source)), 0.0, source)]
+        closed = set()
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                path = [node]
+                while parent[path[-1]] != -1:
+                    path.append(parent[path[-1]])
+                return path[::-1]
+            if node in closed:
+                continue
+            closed.add(node)
+            start, end = int(indptr[node]), int(indptr[node + 1])
+            if start == end:
+                continue
+            neighbours = indices[start:end]
+            costs = (cost + weights[start:end].astype(np.float64)).tolist()
+            estimates = heuristic(neighbours).tolist()
+            for neighbour, new_cost, estimate in zip(neighbours.tolist(), costs, estimates):
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    parent[neighbour] = node
+                    heapq.heappush(heap, (new_cost + estimate, new_cost, neighbour))
+        return None
+
+    def route_through(self, points):
+        """
+        Đường đi qua lần lượt các điểm [lat, lon]. Trả về (mảng (n, 2), số đoạn
+        không tìm được đường và phải nối thẳng).
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) < 2:
+            return points, 0
+        nodes = [self.nearest_node(lat, lon) for lat, lon in points.tolist()]
+        pieces, unrouted = [points[:1]], 0
+        for i in range(len(points) - 1):
+            path = None
+            if nodes[i] is not None and nodes[i + 1] is not None:
+                path = self.shortest_path(nodes[i], nodes[i + 1])
+            if path is None:
+                unrouted += 1
+                pieces.append(points[i + 1:i + 2])
+                continue
+            pieces.append(np.column_stack([self.lat[path], self.lon[path]]))
+            pieces.append(points[i + 1:i + 2])
+        path = np.concatenate(pieces)
+        keep = np.concatenate([[True], (np.diff(path, axis=0) != 0).any(axis=1)])
+        return path[keep], unrouted
+
+
+def _remove_old_versions(directory, keep):
+    """
+    Xóa các phiên bản cũ, trừ KEEP_VERSIONS bản mới nhất. Worker đang mmap bản
+    bị xóa vẫn đọc được (chỉ unlink, không ghi đè) cho tới khi nạp bản mới.
+    """
+    versions = sorted(
+        (entry for entry in os.scandir(directory)
+         if entry.is_dir() and not entry.name.startswith('.') and entry.name != keep),
+        key=lambda entry: entry.stat().st_mtime_ns, reverse=True,
+    )
+    for entry in versions[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class TrailGraphStore:
+    """Đồ thị trong TRAIL_GRAPH_DIR, nạp lười; tự nạp lại khi CURRENT đổi (lệnh build_trail_graph)."""
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._graph = None
+        self._stamp = None
+
+    @property
+    def directory(self):
+        return self._directory or getattr(settings, 'TRAIL_GRAPH_DIR', '')
+
+    def get(self):
+        """TrailGraph hiện tại, hoặc None nếu chưa dựng đồ thị."""
+        try:
+            stamp = (self.directory, os.stat(os.path.join(self.directory, 'CURRENT')).st_mtime_ns)
+        except OSError:
+            return None
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    self._graph = TrailGraph.load(self.directory)
+                except (OSError, ValueError) as exc:
+                    # Đang có bản dựng mới chen vào: giữ đồ thị cũ (nếu có), lần sau thử lại
+                    logger.warning('Không nạp được đồ thị đường mòn: %s', exc)
+                    return self._graph
+                self._stamp = stamp
+            return self._graph
+
+    def invalidate(self):
+        with self._lock:
+            self._graph = None
+            self._stamp = None
+
+
+trail_graph = TrailGraphStore()
+
+
+def routed_hash(graph, waypoints):
+    raw = json.dumps([graph.version, waypoints], separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def route_trail(route, force=False):
+    """
+    path_coordinates của routes.Route đi theo đường mòn qua các Waypoint
+    (theo thứ tự tạo). Dùng kết quả đã lưu nếu đồ thị và waypoint không đổi.
+    Trả về (path_coordinates, số đoạn phải nối thẳng, trạng thái):
+    'cached' (đã lưu từ trước, số đoạn là None), 'routed' (vừa tính và lưu),
+    'no_graph' (chưa dựng đồ thị: nối thẳng các waypoint, không lưu gì).
+    """
+    waypoints = [[lat, lon] for lat, lon in
+                 route.waypoints.order_by('id').values_list('latitude', 'longitude')]
+    graph = trail_graph.get()
+    if graph is None:
+        return waypoints, max(len(waypoints) - 1, 0), 'no_graph'
+
+    digest = routed_hash(graph, waypoints)
+    if route.routed_hash == digest and not force:
+        return route.path_coordinates, None, 'cached'
+
+    path, unrouted = graph.route_through(waypoints)
+    route.path_coordinates = np.round(path, 6).tolist()
+    route.routed_hash = digest
+    route.save(update_fields=['path_coordinates', 'routed_hash'])
+    return route.path_coordinates, unrouted, 'routed'
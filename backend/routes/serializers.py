@@ -0,0 +1,12 @@
+# routes/serializers.py
+from rest_framework import serializers
+from .models import Waypoint
+
+
+class WaypointSerializer(serializers.ModelSerializer):
+    # Khoảng cách (km) tới điểm truy vấn; None với truy vấn bounding box
+    distance_km = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Waypoint
+        fields = ['id', 'route', 'name', 'description', 'type', 'latitude', 'longitude', 'distance_km']
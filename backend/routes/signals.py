@@ -0,0 +1,18 @@
+# routes/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Waypoint
+from .spatial import waypoint_index
+
+
+@receiver(post_save, sender=Waypoint)
+def waypoint_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: waypoint_index.update_waypoint(instance))
+
+
+@receiver(post_delete, sender=Waypoint)
+def waypoint_deleted(sender, instance, **kwargs):
+    waypoint_id = instance.pk
+    transaction.on_commit(lambda: waypoint_index.remove_waypoint(waypoint_id))
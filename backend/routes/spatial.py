@@ -0,0 +1,399 @@
+# routes/spatial.py
+"""
+Truy vấn không gian trên routes.Waypoint: bán kính, bounding box và
+k điểm gần nhất, có lọc theo Waypoint.type (CAMPSITE, WATER_SOURCE, ...).
+
+Ba backend, chọn bằng setting WAYPOINT_SPATIAL_BACKEND:
+- 'index' (mặc định): lưới ô cố định (kiểu geohash) trong bộ nhớ, mảng
+  NumPy sắp theo mã ô. Mỗi truy vấn chỉ xét các ô giao với vùng tìm rồi
+  tính haversine vector hóa cho các điểm đó. Dựng lười, dựng lại sau
+  WAYPOINT_INDEX_TTL giây; lưu / xóa một Waypoint (signal) chỉ chèn / bỏ
+  đúng điểm đó.
+- 'database': lọc bounding box bằng index B-tree (type, latitude, longitude)
+  trong Postgres, rồi tính khoảng cách chính xác bằng NumPy.
+- 'postgis': ST_DWithin / toán tử <-> trên index GiST biểu thức
+  geography(longitude, latitude); chỉ có khi DB cài extension postgis
+  (migration 0002 tự tạo index nếu có).
+
+Mọi backend trả về [(waypoint_id, distance_km)] (bbox: distance_km = None).
+"""
+import copy
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = EARTH_RADIUS_KM * math.pi / 180  # ~111.2 km, khớp với haversine_km
+HALF_EARTH_CIRCUMFERENCE_KM = math.pi * EARTH_RADIUS_KM
+DEFAULT_CELL_DEG = 0.1  # ~11 km theo vĩ độ
+DEFAULT_TTL_SECONDS = 300
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Khoảng cách vòng lớn (km); nhận số hoặc mảng NumPy (broadcast)."""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bbox_around(lat, lon, radius_km):
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) chứa trọn vòng tròn bán kính radius_km."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-6 or radius_km / (KM_PER_DEG_LAT * cos_lat) >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    dlon = radius_km / (KM_PER_DEG_LAT * cos_lat)
+    # Không xử lý vòng qua kinh tuyến 180: mở rộng ra toàn dải kinh độ
+    if lon - dlon < -180 or lon + dlon > 180:
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, lon - dlon, max_lat, lon + dlon
+
+
+def _by_distance(ids, distances, limit=None):
+    order = np.lexsort((ids, distances))
+    if limit is not None:
+        order = order[:limit]
+    return [(int(ids[i]), round(float(distances[i]), 4)) for i in order]
+
+
+def expanding_nearest(search, lat, lon, k, types=None, max_radius_km=None,
+                      start_km=DEFAULT_CELL_DEG * KM_PER_DEG_LAT):
+    """k điểm gần nhất: gấp đôi bán kính đến khi đủ k điểm (kết quả vẫn chính xác)."""
+    if k <= 0:
+        return []
+    limit = max_radius_km if max_radius_km is not None else HALF_EARTH_CIRCUMFERENCE_KM
+    radius = min(start_km, limit)
+    while True:
+        found = search.within_radius(lat, lon, radius, types, limit=k)
+        if len(found) >= k or radius >= limit:
+            return found
+        radius = min(radius * 2, limit)
+
+
+def grid_columns(cell_deg=DEFAULT_CELL_DEG):
+    return int(math.ceil(360 / cell_deg)) + 1
+
+
+def _cell_row(lat, cell_deg):
+    return np.floor((np.asarray(lat) + 90.0) / cell_deg).astype(np.int64)
+
+
+def _cell_column(lon, cell_deg):
+    return np.floor((np.asarray(lon) + 180.0) / cell_deg).astype(np.int64)
+
+
+def cell_keys(lat, lon, cell_deg=DEFAULT_CELL_DEG):
+    """Mã ô lưới của từng điểm; ô liên tiếp trong một hàng có mã liên tiếp."""
+    return _cell_row(lat, cell_deg) * grid_columns(cell_deg) + _cell_column(lon, cell_deg)
+
+
+class WaypointGrid:
+    """
+    Ảnh chụp bất biến của bảng Waypoint, nhóm theo ô lưới cell_deg x cell_deg.
+    with_point / without trả về lưới mới (chép mảng, O(n) NumPy) nên luồng
+    đang đọc lưới cũ không bị ảnh hưởng.
+    """
+
+    def __init__(self, ids, types, lat, lon, cell_deg=DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.columns = grid_columns(cell_deg)
+        self.type_codes = {}
+        type_array = np.array([self.type_codes.setdefault(t, len(self.type_codes)) for t in types],
+                              dtype=np.int32)
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        keys = cell_keys(lat, lon, cell_deg)
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.types = type_array[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+
+    @classmethod
+    def presorted(cls, keys, lat, lon, cell_deg=DEFAULT_CELL_DEG):
+        """
+        Lưới trên các mảng đã sắp theo cell_keys (vd. nút của routes.routing.TrailGraph,
+        mở bằng mmap): không chép mảng nào, id của điểm là chỉ số của nó, không có type.
+        """
+        grid = cls.__new__(cls)
+        grid.cell_deg = cell_deg
+        grid.columns = grid_columns(cell_deg)
+        grid.type_codes = {}
+        grid.keys, grid.lat, grid.lon = keys, lat, lon
+        grid.ids = grid.types = None
+        return grid
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """rows: iterable (id, type, latitude, longitude)."""
+        ids, types, lat, lon = [], [], [], []
+        for waypoint_id, waypoint_type, latitude, longitude in rows:
+            ids.append(waypoint_id)
+            types.append(waypoint_type)
+            lat.append(latitude)
+            lon.append(longitude)
+        return cls(ids, types, lat, lon, **kwargs)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _ids(self, index):
+        return index if self.ids is None else self.ids[index]
+
+    def _derive(self, index=None, insert_at=None, point=None):
+        """Lưới mới gồm các điểm `index` (mặc định: tất cả), chèn thêm `point` tại insert_at."""
+        grid = copy.copy(self)
+        grid.type_codes = dict(self.type_codes)
+        arrays = {name: getattr(self, name) for name in ('keys', 'ids', 'types', 'lat', 'lon')}
+        for name, array in arrays.items():
+            if index is not None:
+                array = array[index]
+            if point is not None:
+                array = np.insert(array, insert_at, point[name])
+            setattr(grid, name, array)
+        return grid
+
+    def without(self, waypoint_id):
+        keep = self.ids != waypoint_id
+        return self if keep.all() else self._derive(index=keep)
+
+    def with_point(self, waypoint_id, waypoint_type, lat, lon):
+        """Thêm hoặc thay (cùng id) một điểm."""
+        grid = self.without(waypoint_id)
+        if grid is self:
+            grid = self._derive()
+        key = int(self._row(lat) * self.columns + self._column(lon))
+        point = {'keys': key, 'ids': waypoint_id, 'lat': lat, 'lon': lon,
+                 'types': grid.type_codes.setdefault(waypoint_type, len(grid.type_codes))}
+        # Giữ thứ tự ổn định theo mã ô như lúc dựng
+        return grid._derive(insert_at=np.searchsorted(grid.keys, key, side='right'), point=point)
+
+    def _row(self, lat):
+        return _cell_row(lat, self.cell_deg)
+
+    def _column(self, lon):
+        return _cell_column(lon, self.cell_deg)
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon, types=None):
+        """Chỉ số (trong mảng đã sắp) của các điểm thuộc những ô giao với bbox."""
+        rows = np.arange(self._row(min_lat), self._row(max_lat) + 1)
+        first, last = self._column(min_lon), self._column(max_lon)
+        # Trong một hàng lưới, các ô liên tiếp có mã liên tiếp -> một đoạn liền trong mảng
+        starts = np.searchsorted(self.keys, rows * self.columns + first, side='left')
+        ends = np.searchsorted(self.keys, rows * self.columns + last, side='right')
+        spans = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+        index = np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+        if types and self.types is not None:
+            codes = [self.type_codes[t] for t in types if t in self.type_codes]
+            index = index[np.isin(self.types[index], codes)]
+        return index
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, types=None, limit=None):
+        index = self._candidates(min_lat, min_lon, max_lat, max_lon, types)
+        lat, lon = self.lat[index], self.lon[index]
+        index = index[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+        ids = np.sort(self._ids(index))
+        if limit is not None:
+            ids = ids[:limit]
+        return [(int(waypoint_id), None) for waypoint_id in ids]
+
+    def within_radius(self, lat, lon, radius_km, types=None, limit=None):
+        index = self._candidates(*bbox_around(lat, lon, radius_km), types)
+        distances = haversine_km(lat, lon, self.lat[index], self.lon[index])
+        inside = distances <= radius_km
+        return _by_distance(self._ids(index)[inside], distances[inside], limit)
+
+    def nearest(self, lat, lon, k, types=None, max_radius_km=None):
+        if not len(self):
+            return []
+        return expanding_nearest(self, lat, lon, k, types, max_radius_km,
+                                 start_km=self.cell_deg * KM_PER_DEG_LAT)
+
+
+class WaypointIndex:
+    """Giữ WaypointGrid dùng chung cho cả process (cùng giao diện với index của plan)."""
+
+    def __init__(self, cell_deg=DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._grid = None
+        self._built_at = 0.0
+
+    def _expired(self):
+        ttl = getattr(settings, 'WAYPOINT_INDEX_TTL', DEFAULT_TTL_SECONDS)
+        return self._grid is None or time.monotonic() - self._built_at > ttl
+
+    def grid(self):
+        grid = self._grid
+        if grid is None or self._expired():
+            from .models import Waypoint
+
+            with self._lock:
+                if self._expired():
+                    rows = Waypoint.objects.values_list('id', 'type', 'latitude', 'longitude')
+                    self._grid = WaypointGrid.from_rows(rows.iterator(chunk_size=10000),
+                                                        cell_deg=self.cell_deg)
+                    self._built_at = time.monotonic()
+                grid = self._grid
+        return grid
+
+    def build(self):
+        self.invalidate()
+        return self.grid()
+
+    def invalidate(self):
+        with self._lock:
+            self._grid = None
+
+    def update_waypoint(self, waypoint):
+        with self._lock:
+            if self._grid is not None:
+                self._grid = self._grid.with_point(waypoint.pk, waypoint.type, waypoint.latitude,
+                                                   waypoint.longitude)
+
+    def remove_waypoint(self, waypoint_id):
+        with self._lock:
+            if self._grid is not None:
+                self._grid = self._grid.without(waypoint_id)
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, types=None, limit=None):
+        return self.grid().within_bbox(min_lat, min_lon, max_lat, max_lon, types, limit)
+
+    def within_radius(self, lat, lon, radius_km, types=None, limit=None):
+        return self.grid().within_radius(lat, lon, radius_km, types, limit)
+
+    def nearest(self, lat, lon, k, types=None, max_radius_km=None):
+        return self.grid().nearest(lat, lon, k, types, max_radius_km)
+
+
+class DatabaseWaypointSearch:
+    """Lọc bbox trong Postgres (index B-tree), khoảng cách chính xác tính bằng NumPy."""
+
+    def _rows(self, min_lat, min_lon, max_lat, max_lon, types=None):
+        from .models import Waypoint
+
+        qs = Waypoint.objects.filter(latitude__range=(min_lat, max_lat),
+                                     longitude__range=(min_lon, max_lon))
+        if types:
+            qs = qs.filter(type__in=types)
+        rows = np.array(list(qs.values_list('id', 'latitude', 'longitude')), dtype=np.float64)
+        return rows.reshape(-1, 3)
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, types=None, limit=None):
+        ids = np.sort(self._rows(min_lat, min_lon, max_lat, max_lon, types)[:, 0].astype(np.int64))
+        if limit is not None:
+            ids = ids[:limit]
+        return [(int(waypoint_id), None) for waypoint_id in ids]
+
+    def within_radius(self, lat, lon, radius_km, types=None, limit=None):
+        rows = self._rows(*bbox_around(lat, lon, radius_km), types)
+        distances = haversine_km(lat, lon, rows[:, 1], rows[:, 2])
+        inside = distances <= radius_km
+        return _by_distance(rows[inside, 0].astype(np.int64), distances[inside], limit)
+
+    def nearest(self, lat, lon, k, types=None, max_radius_km=None):
+        return expanding_nearest(self, lat, lon, k, types, max_radius_km)
+
+
+class PostgisWaypointSearch:
+    """Truy vấn trên index GiST geography (chỉ khi Postgres có extension postgis)."""
+
+    # Phải trùng khớp biểu thức của index waypoint_geography_gist (migration 0002)
+    geography = 'ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography'
+    point = 'ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography'
+
+    def _query(self, where, params, order_by, limit, select_distance=True, point=None):
+        from .models import Waypoint
+
+        distance = f'ST_Distance({self.geography}, {self.point}) / 1000.0' if select_distance else 'NULL'
+        sql = (f'SELECT id, {distance} FROM {Waypoint._meta.db_table} '
+               f'WHERE {where} ORDER BY {order_by}')
+        if select_distance:
+            params = [*point, *params]
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params = [*params, limit]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(row[0], round(row[1], 4) if row[1] is not None else None)
+                    for row in cursor.fetchall()]
+
+    def _type_filter(self, types):
+        return (' AND type = ANY(%s)', [list(types)]) if types else ('', [])
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon, types=None, limit=None):
+        type_sql, type_params = self._type_filter(types)
+        where = f'{self.geography} && ST_MakeEnvelope(%s, %s, %s, %s, 4326)::geography{type_sql}'
+        return self._query(where, [min_lon, min_lat, max_lon, max_lat, *type_params], 'id', limit,
+                           select_distance=False)
+
+    def within_radius(self, lat, lon, radius_km, types=None, limit=None):
+        type_sql, type_params = self._type_filter(types)
+        where = f'ST_DWithin({self.geography}, {self.point}, %s){type_sql}'
+        return self._query(where, [lon, lat, radius_km * 1000, *type_params], '2, id', limit,
+                           point=(lon, lat))
+
+    def nearest(self, lat, lon, k, types=None, max_radius_km=None):
+        if max_radius_km is not None:
+            return self.within_radius(lat, lon, max_radius_km, types, limit=k)
+        type_sql, type_params = self._type_filter(types)
+        return self._query(f'TRUE{type_sql}', [*type_params, lon, lat],
+                           f'{self.geography} <-> {self.point}, id', k, point=(lon, lat))
+
+
+def waypoints_near_path(points, corridor_km, types=None, backend=None):
+    """
+    Waypoint cách track (mảng (n, 2) [lat, lng]) không quá corridor_km.
+    Trả về [(waypoint_id, chỉ số điểm gần nhất trên track, khoảng cách km)]
+    theo thứ tự dọc track.
+    """
+    from .models import Waypoint
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return []
+    (min_lat, min_lon), (max_lat, max_lon) = points.min(axis=0), points.max(axis=0)
+    dlat = corridor_km / KM_PER_DEG_LAT
+    cos_lat = max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)) + dlat)), 1e-6)
+    dlon = corridor_km / (KM_PER_DEG_LAT * cos_lat)
+    found = (backend or spatial_backend()).within_bbox(
+        min_lat - dlat, min_lon - dlon, max_lat + dlat, max_lon + dlon, types)
+    rows = np.array(list(Waypoint.objects.filter(pk__in=[waypoint_id for waypoint_id, _ in found])
+                         .values_list('id', 'latitude', 'longitude')), dtype=np.float64).reshape(-1, 3)
+
+    result = []
+    # Ma trận khoảng cách waypoint x điểm track, theo từng khối để giới hạn bộ nhớ
+    for chunk in np.array_split(rows, max(1, math.ceil(len(rows) * len(points) / 2_000_000))):
+        distances = haversine_km(chunk[:, 1, None], chunk[:, 2, None], points[None, :, 0], points[None, :, 1])
+        nearest = distances.argmin(axis=1)
+        offsets = distances[np.arange(len(chunk)), nearest]
+        result += [(int(waypoint_id), int(index), round(float(offset), 4))
+                   for waypoint_id, index, offset in zip(chunk[:, 0], nearest, offsets)
+                   if offset <= corridor_km]
+    return sorted(result, key=lambda item: (item[1], item[2], item[0]))
+
+
+waypoint_index = WaypointIndex()
+
+SPATIAL_BACKENDS = {
+    'index': waypoint_index,
+    'database': DatabaseWaypointSearch(),
+    'postgis': PostgisWaypointSearch(),
+}
+
+
+def spatial_backend(name=None):
+    name = name or getattr(settings, 'WAYPOINT_SPATIAL_BACKEND', 'index')
+    try:
+        return SPATIAL_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown WAYPOINT_SPATIAL_BACKEND: {name!r}")
@@ -1,3 +1,222 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
 
-# Create your tests here.
+import numpy as np
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .models import Route, Waypoint
+from .routing import TrailGraph, route_trail, trail_graph
+from .spatial import WaypointGrid, haversine_km, spatial_backend, waypoint_index
+
+# Sa Pa (Lào Cai)
+SAPA = (22.3364, 103.8438)
+
+
+def make_route(name='Fansipan'):
+    return Route.objects.create(name=name, total_distance_km=10, elevation_gain_m=1000)
+
+
+class WaypointGridTests(TestCase):
+    """So kết quả của lưới với quét toàn bộ bằng haversine."""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.points = [
+            (i, rng.choice(['CAMPSITE', 'WATER_SOURCE', 'VIEWPOINT']),
+             SAPA[0] + rng.uniform(-1, 1), SAPA[1] + rng.uniform(-1, 1))
+            for i in range(1, 2001)
+        ]
+        self.grid = WaypointGrid.from_rows(self.points)
+
+    def brute_force(self, radius_km, types=None):
+        found = []
+        for waypoint_id, waypoint_type, lat, lon in self.points:
+            distance = float(haversine_km(SAPA[0], SAPA[1], lat, lon))
+            if distance <= radius_km and (not types or waypoint_type in types):
+                found.append((distance, waypoint_id))
+        return [waypoint_id for _, waypoint_id in sorted(found)]
+
+    def test_radius_matches_full_scan(self):
+        for radius_km, types in [(5, None), (25, ['CAMPSITE']), (60, ['CAMPSITE', 'WATER_SOURCE'])]:
+            found = self.grid.within_radius(*SAPA, radius_km, types=types)
+            self.assertEqual([waypoint_id for waypoint_id, _ in found], self.brute_force(radius_km, types))
+
+    def test_nearest_matches_full_scan(self):
+        found = self.grid.nearest(*SAPA, 7, types=['WATER_SOURCE'])
+        self.assertEqual([waypoint_id for waypoint_id, _ in found], self.brute_force(1000, ['WATER_SOURCE'])[:7])
+
+    def test_bbox(self):
+        box = (22.2, 103.7, 22.4, 103.9)
+        expected = sorted(i for i, _, lat, lon in self.points
+                          if box[0] <= lat <= box[2] and box[1] <= lon <= box[3])
+        self.assertEqual([i for i, _ in self.grid.within_bbox(*box)], expected)
+
+    def test_point_updates_match_rebuild(self):
+        grid = self.grid.without(5).with_point(9, 'SUMMIT', *SAPA)
+        grid = grid.with_point(5000, 'CAMPSITE', 22.5, 103.9)
+        self.assertEqual(len(self.grid), 2000)  # lưới cũ không đổi
+        points = [point for point in self.points if point[0] not in (5, 9)]
+        points += [(9, 'SUMMIT', *SAPA), (5000, 'CAMPSITE', 22.5, 103.9)]
+        rebuilt = WaypointGrid.from_rows(points)
+        for types in (None, ['SUMMIT'], ['CAMPSITE']):
+            self.assertEqual(grid.within_radius(*SAPA, 40, types=types),
+                             rebuilt.within_radius(*SAPA, 40, types=types))
+        self.assertIs(grid.without(123456), grid)
+
+
+class WaypointSpatialApiTests(APITestCase):
+    def setUp(self):
+        waypoint_index.invalidate()
+        route = make_route()
+        self.camp = Waypoint.objects.create(route=route, name='Trạm Tôn camp', type='CAMPSITE',
+                                            latitude=22.3500, longitude=103.7750)
+        self.water = Waypoint.objects.create(route=route, name='Suối Vàng', type='WATER_SOURCE',
+                                             latitude=22.3400, longitude=103.8400)
+        self.far_camp = Waypoint.objects.create(route=route, name='Hà Giang camp', type='CAMPSITE',
+                                                latitude=23.0000, longitude=105.0000)
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def test_nearby_filters_by_type_and_radius(self):
+        data = self.get('waypoint-nearby', lat=SAPA[0], lng=SAPA[1], radius_km=20, type='CAMPSITE')
+        self.assertEqual([w['id'] for w in data], [self.camp.id])
+        self.assertLess(data[0]['distance_km'], 20)
+
+        data = self.get('waypoint-nearby', lat=SAPA[0], lng=SAPA[1], radius_km=20,
+                        type='CAMPSITE,WATER_SOURCE')
+        self.assertEqual([w['id'] for w in data], [self.water.id, self.camp.id])
+
+    def test_nearest_and_bbox(self):
+        data = self.get('waypoint-nearest', lat=SAPA[0], lng=SAPA[1], k=2, type='CAMPSITE')
+        self.assertEqual([w['id'] for w in data], [self.camp.id, self.far_camp.id])
+
+        data = self.get('waypoint-within', min_lat=22, min_lng=103, max_lat=22.5, max_lng=104)
+        self.assertEqual({w['id'] for w in data}, {self.camp.id, self.water.id})
+
+    def test_backends_agree(self):
+        for name in ('index', 'database'):
+            with self.subTest(backend=name), override_settings(WAYPOINT_SPATIAL_BACKEND=name):
+                found = spatial_backend().nearest(*SAPA, 3)
+                self.assertEqual([i for i, _ in found], [self.water.id, self.camp.id, self.far_camp.id])
+
+    def test_index_follows_waypoint_changes(self):
+        self.get('waypoint-nearby', lat=SAPA[0], lng=SAPA[1], radius_km=5)  # dựng index
+        with self.captureOnCommitCallbacks(execute=True):
+            new = Waypoint.objects.create(route=self.camp.route, name='Bãi mới', type='CAMPSITE',
+                                          latitude=SAPA[0], longitude=SAPA[1])
+        data = self.get('waypoint-nearby', lat=SAPA[0], lng=SAPA[1], radius_km=5, type='CAMPSITE')
+        self.assertEqual([w['id'] for w in data], [new.id])
+        grid = waypoint_index.grid()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new.delete()
+        # Cập nhật tại chỗ, không dựng lại từ DB
+        self.assertIsNot(waypoint_index.grid(), grid)
+        self.assertEqual(len(waypoint_index.grid()), len(grid) - 1)
+        self.assertEqual(self.get('waypoint-nearby', lat=SAPA[0], lng=SAPA[1], radius_km=5, type='CAMPSITE'), [])
+
+    def test_invalid_parameters(self):
+        response = self.client.get(reverse('waypoint-nearby'), {'lat': 100, 'lng': 0, 'radius_km': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# Đường mòn hình chữ U quanh một quốc lộ (ô tô) nối thẳng 1 -> 3, và một nhánh tách rời 10 - 11
+TRAIL_OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="22.00" lon="103.00"/><node id="2" lat="22.00" lon="103.01"/>
+  <node id="3" lat="22.00" lon="103.02"/><node id="4" lat="22.01" lon="103.00"/>
+  <node id="6" lat="22.01" lon="103.02"/><node id="7" lat="22.02" lon="103.00"/>
+  <node id="8" lat="22.02" lon="103.01"/><node id="9" lat="22.02" lon="103.02"/>
+  <node id="10" lat="23.00" lon="104.00"/><node id="11" lat="23.00" lon="104.01"/>
+  <way id="100"><nd ref="1"/><nd ref="4"/><nd ref="7"/><nd ref="8"/><nd ref="9"/>
+    <tag k="highway" v="path"/></way>
+  <way id="101"><nd ref="9"/><nd ref="6"/><nd ref="3"/><tag k="highway" v="track"/></way>
+  <way id="102"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="trunk"/></way>
+  <way id="103"><nd ref="4"/><nd ref="6"/><tag k="highway" v="footway"/><tag k="foot" v="no"/></way>
+  <way id="104"><nd ref="10"/><nd ref="11"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+class TrailRoutingTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = os.path.join(directory.name, 'trails.osm')
+        with open(source, 'w') as handle:
+            handle.write(TRAIL_OSM)
+        self.graph_dir = os.path.join(directory.name, 'graph')
+        TrailGraph.from_osm([source]).save(self.graph_dir, sources=[source])
+        settings_override = override_settings(TRAIL_GRAPH_DIR=self.graph_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        trail_graph.invalidate()
+
+        self.route = make_route('Chữ U')
+        self.start = Waypoint.objects.create(route=self.route, name='Đầu', type='TRAILHEAD',
+                                             latitude=22.0001, longitude=103.0001)
+        self.end = Waypoint.objects.create(route=self.route, name='Cuối', type='CAMPSITE',
+                                           latitude=22.0001, longitude=103.0199)
+
+    def test_graph_keeps_only_foot_ways(self):
+        graph = trail_graph.get()
+        # Nút 2 chỉ nằm trên quốc lộ
+        self.assertEqual(len(graph), 9)
+        self.assertNotIn(103.01, [round(lon, 2) for lat, lon in zip(graph.lat, graph.lon) if lat == 22.0])
+
+    def test_route_follows_trail_and_is_cached(self):
+        path, straight_legs, status = route_trail(self.route)
+        self.assertEqual((status, straight_legs), ('routed', 0))
+        self.assertEqual(path[1:-1], [[22.0, 103.0], [22.01, 103.0], [22.02, 103.0], [22.02, 103.01],
+                                      [22.02, 103.02], [22.01, 103.02], [22.0, 103.02]])
+
+        self.route.refresh_from_db()
+        self.assertEqual(self.route.path_coordinates, path)
+        with self.assertNumQueries(1):
+            self.assertEqual(route_trail(self.route)[2], 'cached')
+
+        # Thêm waypoint ở nhánh tách rời -> tính lại, đoạn đó nối thẳng
+        Waypoint.objects.create(route=self.route, name='Xa', type='SUMMIT', latitude=23.0, longitude=104.0)
+        path, straight_legs, status = route_trail(self.route)
+        self.assertEqual((status, straight_legs, path[-1]), ('routed', 1, [23.0, 104.0]))
+
+    def test_rebuild_never_overwrites_loaded_arrays(self):
+        graph = trail_graph.get()
+        self.assertIsInstance(graph.lat, np.memmap)
+        loaded = os.path.join(self.graph_dir, graph.version, 'lat.npy')
+        inode = os.stat(loaded).st_ino
+
+        # Đồ thị mới (bỏ một cạnh): thư mục mới, CURRENT trỏ sang, file cũ không bị ghi đè
+        points = np.column_stack([graph.lat, graph.lon])
+        edges = [(a, int(b)) for a in range(len(graph))
+                 for b in graph.indices[graph.indptr[a]:graph.indptr[a + 1]] if a < b][1:]
+        TrailGraph.from_edges(points, edges).save(self.graph_dir)
+        self.assertEqual(os.stat(loaded).st_ino, inode)
+        # Worker còn giữ đồ thị cũ vẫn tìm đường được
+        path, unrouted = graph.route_through([[22.0001, 103.0001], [22.0001, 103.0199]])
+        self.assertEqual((len(path), unrouted), (9, 0))
+        reloaded = trail_graph.get()
+        self.assertNotEqual(reloaded.version, graph.version)
+        with open(os.path.join(self.graph_dir, 'CURRENT')) as handle:
+            self.assertEqual(handle.read(), reloaded.version)
+        self.assertEqual(route_trail(self.route)[2], 'routed')
+
+    def test_path_endpoint(self):
+        url = reverse('trail-route-path', args=[self.route.pk])
+        self.assertEqual(self.client.get(url).data['status'], 'routed')
+        data = self.client.get(url).data
+        self.assertEqual((data['status'], data['points']), ('cached', 9))
+
+        with override_settings(TRAIL_GRAPH_DIR=os.path.join(self.graph_dir, 'missing')):
+            data = self.client.get(url).data
+        self.assertEqual((data['status'], data['points']), ('no_graph', 2))
+        self.assertEqual(self.client.get(reverse('trail-route-path', args=[0])).status_code,
+                         status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,15 @@
+# routes/urls.py
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Truy vấn không gian trên Waypoint (xem routes/spatial.py)
+    # /api/waypoints/nearby/ (GET, theo bán kính)
+    path('waypoints/nearby/', views.WaypointNearbyView.as_view(), name='waypoint-nearby'),
+    # /api/waypoints/nearest/ (GET, k điểm gần nhất)
+    path('waypoints/nearest/', views.WaypointNearestView.as_view(), name='waypoint-nearest'),
+    # /api/waypoints/within/ (GET, bounding box)
+    path('waypoints/within/', views.WaypointWithinView.as_view(), name='waypoint-within'),
+    # /api/trail-routes/<id>/path/ (GET, đường đi bộ qua các waypoint, xem routes/routing.py)
+    path('trail-routes/<int:pk>/path/', views.TrailRoutePathView.as_view(), name='trail-route-path'),
+]
@@ -1,3 +1,121 @@
-from django.shortcuts import render
+# routes/views.py
+from rest_framework import generics, permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import Route, Waypoint
+from .routing import route_trail
+from .serializers import WaypointSerializer
+from .spatial import spatial_backend
+from trek_guide_project.params import positive_int
 
-# Create your views here.
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+MAX_RADIUS_KM = 500
+
+
+def _float(params, name, minimum, maximum, default=None):
+    value = params.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise ValidationError({name: 'Bắt buộc.'})
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Phải là số.'})
+    if not minimum <= value <= maximum:
+        raise ValidationError({name: f'Phải nằm trong [{minimum}, {maximum}].'})
+    return value
+
+
+def _types(params):
+    """?type=CAMPSITE&type=WATER_SOURCE hoặc ?type=CAMPSITE,WATER_SOURCE"""
+    return [t.strip() for value in params.getlist('type') for t in value.split(',') if t.strip()]
+
+
+class WaypointSpatialView(generics.ListAPIView):
+    """
+    Lớp chung: chạy truy vấn không gian rồi nạp đúng các Waypoint tìm được, giữ thứ tự.
+    Lớp con định nghĩa search(backend, params) -> [(waypoint_id, distance_km)].
+    """
+    serializer_class = WaypointSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        found = self.search(spatial_backend(), self.request.query_params)
+        waypoints = Waypoint.objects.in_bulk([waypoint_id for waypoint_id, _ in found])
+        results = []
+        for waypoint_id, distance_km in found:
+            waypoint = waypoints.get(waypoint_id)
+            if waypoint is not None:
+                waypoint.distance_km = distance_km
+                results.append(waypoint)
+        return results
+
+
+# Tương ứng: GET /api/waypoints/nearby/?lat=22.3&lng=103.8&radius_km=5&type=CAMPSITE
+class WaypointNearbyView(WaypointSpatialView):
+    """Waypoint trong bán kính radius_km quanh (lat, lng), gần nhất trước."""
+
+    def search(self, backend, params):
+        return backend.within_radius(
+            _float(params, 'lat', -90, 90),
+            _float(params, 'lng', -180, 180),
+            _float(params, 'radius_km', 0, MAX_RADIUS_KM),
+            types=_types(params),
+            limit=positive_int(params, 'limit', DEFAULT_LIMIT, MAX_LIMIT),
+        )
+
+
+# Tương ứng: GET /api/waypoints/nearest/?lat=22.3&lng=103.8&k=3&type=WATER_SOURCE
+class WaypointNearestView(WaypointSpatialView):
+    """k Waypoint gần (lat, lng) nhất, tùy chọn giới hạn max_radius_km."""
+
+    def search(self, backend, params):
+        max_radius_km = params.get('max_radius_km')
+        return backend.nearest(
+            _float(params, 'lat', -90, 90),
+            _float(params, 'lng', -180, 180),
+            positive_int(params, 'k', 5, MAX_LIMIT),
+            types=_types(params),
+            max_radius_km=_float(params, 'max_radius_km', 0, MAX_RADIUS_KM) if max_radius_km else None,
+        )
+
+
+# Tương ứng: GET /api/waypoints/within/?min_lat=..&min_lng=..&max_lat=..&max_lng=..&type=CAMPSITE
+class WaypointWithinView(WaypointSpatialView):
+    """Waypoint nằm trong bounding box (vd. vùng bản đồ đang hiển thị)."""
+
+    def search(self, backend, params):
+        min_lat, max_lat = _float(params, 'min_lat', -90, 90), _float(params, 'max_lat', -90, 90)
+        min_lng, max_lng = _float(params, 'min_lng', -180, 180), _float(params, 'max_lng', -180, 180)
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValidationError({'bbox': 'min_* phải nhỏ hơn hoặc bằng max_*.'})
+        return backend.within_bbox(
+            min_lat, min_lng, max_lat, max_lng,
+            types=_types(params),
+            limit=positive_int(params, 'limit', DEFAULT_LIMIT, MAX_LIMIT),
+        )
+
+
+# Tương ứng: GET /api/trail-routes/<id>/path/
+class TrailRoutePathView(APIView):
+    """
+    Đường đi bộ qua các Waypoint của route, tìm trên đồ thị đường mòn cục bộ
+    (xem routes/routing.py) thay cho OSRM. Tính một lần rồi lưu trong Route.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        route = Route.objects.filter(pk=pk).first()
+        if route is None:
+            raise NotFound('Không tìm thấy cung đường.')
+        path, straight_legs, status = route_trail(route)
+        return Response({
+            'route_id': route.pk,
+            'status': status,
+            'straight_legs': straight_legs,
+            'points': len(path),
+            'path_coordinates': path,
+        })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SafetyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'safety'
+
+    def ready(self):
+        # Đăng ký signal cập nhật RouteRisk khi có Community_Report mới
+        from . import signals  # noqa: F401
@@ -0,0 +1,305 @@
+# safety/hazards.py
+"""
+Đánh giá nguy hiểm cho Plan ở backend -> Plan.dangers_snapshot.
+
+Trước đây app Flutter tự gọi Open-Meteo rồi ghi dangers_snapshot
+(saveDangerSnapshotForPlan); Static_Hazard và Community_Report không được
+dùng tới. evaluate_plans() tính snapshot cho cả lô plan với số truy vấn cố định:
+- Route của plan (plan.Route) -> các routes.Route có waypoint cách track
+  không quá HAZARD_CORRIDOR_KM (cùng cách ghép như gói offline), mỗi route
+  chỉ tính một lần cho cả lô.
+- Static_Hazard của các route đó, lọc theo mùa ghi trong `condition` so với
+  các tháng của chuyến đi.
+- Community_Report trong REPORT_WINDOW_DAYS ngày gần nhất, gộp theo route
+  và mức độ bằng một truy vấn GROUP BY.
+- Dự báo thời tiết tại điểm xuất phát từ nguồn cắm được (safety/weather.py),
+  một lần gọi cho cả lô.
+
+Snapshot giữ định dạng app đang đọc ({'dangers': [...], 'heavy_rain': true, ...})
+và kèm `inputs_hash`: hash của chính các đầu vào trên (ngày đi, trail, hàng
+Static_Hazard, số báo cáo / lần gần nhất theo mức độ, dự báo) chứ không phải
+của kết quả. refresh_danger_snapshots() so hash này với hash đã lưu và chỉ dựng
+lại + ghi những plan có đầu vào đổi. Dự báo cũng là đầu vào nên vẫn được lấy
+(một lần cho cả lô) cho các plan trong tầm dự báo; plan ngoài tầm không gọi
+nguồn thời tiết.
+"""
+import datetime
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from plan.search import fold
+
+from .weather import weather_feed
+
+HAZARD_CORRIDOR_KM = 1.0
+REPORT_WINDOW_DAYS = 30
+# Dự báo chỉ có cho chừng này ngày tới (Open-Meteo: 16)
+FORECAST_HORIZON_DAYS = 16
+SNAPSHOT_VERSION = 1
+
+SEVERITY_ORDER = ('low', 'medium', 'high')
+
+# Từ khóa (đã bỏ dấu) trong Static_Hazard.condition -> các tháng áp dụng (miền Bắc)
+SEASON_MONTHS = {
+    'mua mua': {5, 6, 7, 8, 9, 10}, 'rainy': {5, 6, 7, 8, 9, 10},
+    'mua lu': {7, 8, 9, 10}, 'flood': {7, 8, 9, 10},
+    'mua kho': {11, 12, 1, 2, 3, 4}, 'dry': {11, 12, 1, 2, 3, 4},
+    'mua dong': {12, 1, 2}, 'winter': {12, 1, 2},
+    'mua he': {5, 6, 7, 8}, 'summer': {5, 6, 7, 8},
+}
+
+# Ngưỡng thời tiết theo ngày; khóa giữ nguyên như app đang hiển thị
+WEATHER_RULES = (
+    ('heavy_rain', 'precipitation_sum', lambda value: value > 20, 'high',
+     'Mưa lớn', 'mưa {value:g} mm', 'Tránh suối, vách đá; chuẩn bị áo mưa và phương án lùi lịch.'),
+    ('strong_wind', 'windspeed_max', lambda value: value > 40, 'medium',
+     'Gió mạnh', 'gió {value:g} km/h', 'Không cắm trại trên sống núi trống; gia cố lều.'),
+    ('extreme_heat', 'temperature_max', lambda value: value > 38, 'medium',
+     'Nắng nóng cực độ', 'cao nhất {value:g}°C', 'Mang thêm nước, tránh đi bộ buổi trưa.'),
+    ('extreme_cold', 'temperature_min', lambda value: value < 0, 'high',
+     'Lạnh cực độ', 'thấp nhất {value:g}°C', 'Mang đồ giữ nhiệt; đề phòng băng giá trên đỉnh.'),
+)
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+def trip_dates(plan):
+    start = _as_date(plan.start_date)
+    return start, start + datetime.timedelta(days=max(plan.duration_days or 1, 1) - 1)
+
+
+def trip_months(start, end):
+    months, day = set(), start.replace(day=1)
+    while day <= end:
+        months.add(day.month)
+        day = (day + datetime.timedelta(days=32)).replace(day=1)
+    return months
+
+
+def condition_months(condition):
+    """Các tháng một Static_Hazard có hiệu lực; None = quanh năm / không rõ."""
+    folded = fold(condition)
+    months = set()
+    for keyword, season in SEASON_MONTHS.items():
+        if keyword in folded:
+            months |= season
+    return months or None
+
+
+def _max_severity(levels):
+    ranked = [SEVERITY_ORDER.index(level) for level in levels if level in SEVERITY_ORDER]
+    return SEVERITY_ORDER[max(ranked)] if ranked else None
+
+
+# --- Đầu vào cho cả lô ---
+
+def route_contexts(route_ids):
+    """{plan.Route id: {'start': (lat, lng) | None, 'trail_ids': [routes.Route id]}}"""
+    from plan.models import Route
+    from plan.track import route_points, track_store_enabled
+    from routes.models import Waypoint
+    from routes.spatial import waypoints_near_path
+
+    routes = Route.objects.filter(pk__in=route_ids).only('id', 'path_coordinates')
+    if track_store_enabled():
+        routes = routes.select_related('track').defer('path_coordinates')
+    near = {}
+    for route in routes:
+        points = route_points(route)
+        near[route.pk] = (
+            (float(points[0, 0]), float(points[0, 1])) if len(points) else None,
+            [waypoint_id for waypoint_id, _, _ in waypoints_near_path(points, HAZARD_CORRIDOR_KM)],
+        )
+    trail_of = dict(Waypoint.objects.filter(
+        pk__in={waypoint_id for _, ids in near.values() for waypoint_id in ids}
+    ).values_list('id', 'route_id'))
+    return {
+        route_id: {'start': start, 'trail_ids': sorted({trail_of[i] for i in ids if i in trail_of})}
+        for route_id, (start, ids) in near.items()
+    }
+
+
+def static_hazards(trail_ids):
+    from .models import Static_Hazard
+
+    hazards = {}
+    for row in (Static_Hazard.objects.filter(route_id__in=trail_ids).order_by('id')
+                .values('id', 'route_id', 'description', 'condition')):
+        row['months'] = condition_months(row['condition'])
+        hazards.setdefault(row['route_id'], []).append(row)
+    return hazards
+
+
+def community_reports(trail_ids, since):
+    """{routes.Route id: {severity: (số báo cáo, lần gần nhất)}} cho báo cáo từ `since`."""
+    from .models import Community_Report
+
+    rows = (Community_Report.objects.filter(route_id__in=trail_ids, created_at__gte=since)
+            .values('route_id', 'severity').annotate(count=Count('id'), latest=Max('created_at'))
+            .order_by())
+    reports = {}
+    for row in rows:
+        severity = (row['severity'] or '').strip().lower()
+        count, latest = reports.setdefault(row['route_id'], {}).get(severity, (0, None))
+        reports[row['route_id']][severity] = (count + row['count'],
+                                              max(filter(None, (latest, row['latest']))))
+    return reports
+
+
+# --- Snapshot ---
+
+def _weather_dangers(days):
+    flags, dangers = {}, []
+    for key, field, exceeded, severity, name, detail, advice in WEATHER_RULES:
+        hits = [(day, values[field]) for day, values in sorted(days.items())
+                if isinstance(values.get(field), (int, float)) and exceeded(values[field])]
+        if hits:
+            flags[key] = True
+            dangers.append({
+                'name': name, 'severity': severity, 'source': 'weather', 'recommendation': advice,
+                'description': '; '.join(f'{day}: {detail.format(value=value)}' for day, value in hits),
+            })
+    return flags, dangers
+
+
+def build_snapshot(plan, context, hazards, reports, forecast, inputs_hash):
+    start, end = trip_dates(plan)
+    months = trip_months(start, end)
+    dangers = []
+    for trail_id in context['trail_ids'] if context else ():
+        for hazard in hazards.get(trail_id, ()):
+            if hazard['months'] is None or hazard['months'] & months:
+                dangers.append({
+                    'name': hazard['description'], 'severity': 'medium', 'source': 'static',
+                    'description': hazard['condition'] or '', 'hazard_id': hazard['id'],
+                    'recommendation': 'Đi chậm, theo sát người dẫn đường ở đoạn này.',
+                })
+        for severity, (count, latest) in sorted(reports.get(trail_id, {}).items()):
+            dangers.append({
+                'name': 'Báo cáo từ cộng đồng', 'severity': severity if severity in SEVERITY_ORDER else 'medium',
+                'source': 'community', 'route_id': trail_id, 'count': count,
+                'description': (f'{count} báo cáo mức "{severity or "?"}" trong {REPORT_WINDOW_DAYS} ngày qua, '
+                                f'gần nhất {timezone.localtime(latest).date().isoformat()}'),
+                'recommendation': 'Đọc các báo cáo gần đây trước khi khởi hành.',
+            })
+    flags, weather = _weather_dangers(forecast or {})
+    dangers += weather
+
+    snapshot = {
+        'dangers': dangers,
+        **flags,
+        'level': _max_severity(danger['severity'] for danger in dangers),
+        'source': 'backend',
+        'version': SNAPSHOT_VERSION,
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'weather_available': forecast is not None,
+    }
+    if context and context['start']:
+        snapshot['latitude'], snapshot['longitude'] = context['start']
+    snapshot['inputs_hash'] = inputs_hash
+    snapshot['evaluated_at'] = timezone.now().isoformat(timespec='seconds')
+    return snapshot
+
+
+def plan_inputs_hash(plan, context, hazards, reports, forecast):
+    """sha256 của mọi đầu vào mà build_snapshot() đọc cho một plan."""
+    start, end = trip_dates(plan)
+    trails = [
+        [trail_id,
+         [[hazard['id'], hazard['description'], hazard['condition']] for hazard in hazards.get(trail_id, ())],
+         sorted([severity, count, latest] for severity, (count, latest) in reports.get(trail_id, {}).items())]
+        for trail_id in (context['trail_ids'] if context else ())
+    ]
+    inputs = {
+        'version': SNAPSHOT_VERSION,
+        'route_id': plan.route_id,
+        'dates': [start, end],
+        'start': context['start'] if context else None,
+        'trails': trails,
+        'forecast': forecast,
+    }
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    ).hexdigest()
+
+
+def stored_inputs_hash(snapshot):
+    return snapshot.get('inputs_hash') if isinstance(snapshot, dict) else None
+
+
+def evaluate_plans(plans, feed=None, today=None, stored_hashes=None):
+    """
+    {plan id: snapshot} cho cả lô plan (cần route_id, start_date, duration_days).
+    `stored_hashes` ({plan id: inputs_hash đã lưu}): plan có đầu vào còn khớp hash
+    đã lưu thì không dựng lại snapshot và không có trong kết quả.
+    """
+    today = today or timezone.localdate()
+    feed = feed or weather_feed()
+    stored_hashes = stored_hashes or {}
+    plans = list(plans)
+
+    contexts = route_contexts({plan.route_id for plan in plans if plan.route_id})
+    trail_ids = {trail_id for context in contexts.values() for trail_id in context['trail_ids']}
+    hazards = static_hazards(trail_ids)
+    since = timezone.now() - datetime.timedelta(days=REPORT_WINDOW_DAYS)
+    reports = community_reports(trail_ids, since)
+
+    horizon = today + datetime.timedelta(days=FORECAST_HORIZON_DAYS)
+    locations = []
+    for plan in plans:
+        context = contexts.get(plan.route_id)
+        start, end = trip_dates(plan)
+        if context and context['start'] and end >= today and start <= horizon:
+            locations.append((plan.pk, *context['start'], max(start, today), min(end, horizon)))
+    forecasts = feed.forecast(locations) if locations else {}
+
+    snapshots = {}
+    for plan in plans:
+        context, forecast = contexts.get(plan.route_id), forecasts.get(plan.pk)
+        digest = plan_inputs_hash(plan, context, hazards, reports, forecast)
+        if stored_hashes.get(plan.pk) != digest:
+            snapshots[plan.pk] = build_snapshot(plan, context, hazards, reports, forecast, digest)
+    return snapshots
+
+
+def refresh_danger_snapshots(queryset=None, feed=None, today=None, batch_size=200, force=False):
+    """
+    Tính lại dangers_snapshot cho các plan chưa kết thúc (hoặc `queryset`),
+    theo lô batch_size; chỉ dựng lại và bulk_update plan có đầu vào đổi (trừ khi `force`).
+    Trả về (số plan đã xét, số đã ghi).
+    """
+    from plan.models import Plan
+
+    today = today or timezone.localdate()
+    if queryset is None:
+        # Chuyến dài nhất hợp lý ~ 60 ngày; lọc chính xác theo ngày kết thúc ở dưới
+        queryset = Plan.objects.filter(start_date__gte=today - datetime.timedelta(days=60))
+    queryset = queryset.only('id', 'route_id', 'start_date', 'duration_days', 'dangers_snapshot').order_by('pk')
+
+    evaluated = updated = 0
+    last_pk = 0
+    while True:
+        batch = [plan for plan in queryset.filter(pk__gt=last_pk)[:batch_size]]
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        batch = [plan for plan in batch if trip_dates(plan)[1] >= today]
+        stored = {} if force else {plan.pk: stored_inputs_hash(plan.dangers_snapshot) for plan in batch}
+        snapshots = evaluate_plans(batch, feed=feed, today=today, stored_hashes=stored)
+        changed = []
+        for plan in batch:
+            if plan.pk in snapshots:
+                plan.dangers_snapshot = snapshots[plan.pk]
+                changed.append(plan)
+        Plan.objects.bulk_update(changed, ['dangers_snapshot'])
+        evaluated += len(batch)
+        updated += len(changed)
+    return evaluated, updated
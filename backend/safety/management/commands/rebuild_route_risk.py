@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from safety.risk import rebuild_route_risk
+
+
+class Command(BaseCommand):
+    help = ('Tính lại toàn bộ RouteRisk (điểm rủi ro theo báo cáo cộng đồng) từ bảng Community_Report. '
+            'Bình thường điểm được cập nhật dần theo từng báo cáo; chỉ cần chạy sau khi đổi '
+            'ROUTE_RISK_HALF_LIFE_DAYS hoặc nạp báo cáo trực tiếp vào DB.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ tính lại các route này')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_route_risk(options['ids'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Đã tính lại điểm rủi ro cho {count} route trong {elapsed:.1f} s."))
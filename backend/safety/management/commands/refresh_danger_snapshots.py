@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from plan.models import Plan
+from safety.hazards import refresh_danger_snapshots
+from safety.weather import WEATHER_FEEDS, weather_feed
+
+
+class Command(BaseCommand):
+    help = ('Tính lại Plan.dangers_snapshot (hazard tĩnh, báo cáo cộng đồng, thời tiết) cho các '
+            'plan chưa kết thúc, theo lô. Chỉ ghi plan có snapshot đổi, trừ khi có --force. '
+            'Chạy định kỳ bằng cron, vd. mỗi giờ.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help='Chỉ đánh giá các plan này')
+        parser.add_argument('--feed', choices=sorted(WEATHER_FEEDS),
+                            help='Nguồn thời tiết (mặc định theo WEATHER_FEED)')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='Ghi lại cả snapshot không đổi')
+
+    def handle(self, *args, **options):
+        queryset = None
+        if options['ids']:
+            queryset = Plan.objects.filter(pk__in=options['ids'])
+        feed = weather_feed(options['feed'])
+
+        name = options['feed'] if options['feed'] is not None else settings.WEATHER_FEED
+        self.stdout.write(f"Nguồn thời tiết: {name!r}")
+        started = time.perf_counter()
+        evaluated, updated = refresh_danger_snapshots(queryset, feed=feed, batch_size=options['batch_size'],
+                                                      force=options['force'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã đánh giá {evaluated} plan trong {elapsed:.1f} s, cập nhật {updated} snapshot."
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_route_risk(apps, schema_editor):
+    # Điểm rủi ro cho các báo cáo đã có (về sau được cập nhật dần, xem safety/risk.py)
+    import numpy as np
+    from safety.risk import report_term
+
+    Community_Report = apps.get_model('safety', 'Community_Report')
+    RouteRisk = apps.get_model('safety', 'RouteRisk')
+    terms, last = {}, {}
+    for route_id, severity, created_at in (Community_Report.objects.filter(route__isnull=False)
+                                           .order_by('route', 'created_at')
+                                           .values_list('route_id', 'severity', 'created_at')):
+        terms.setdefault(route_id, []).append(report_term(severity, created_at))
+        last[route_id] = created_at
+    RouteRisk.objects.bulk_create([
+        RouteRisk(route_id=route_id, log_mass=float(np.logaddexp.reduce(values)),
+                  report_count=len(values), last_report_at=last[route_id])
+        for route_id, values in terms.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0003_route_routed_hash'),
+        ('safety', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteRisk',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk', serialize=False, to='routes.route')),
+                ('log_mass', models.FloatField()),
+                ('report_count', models.IntegerField(default=0)),
+                ('last_report_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'route_risks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='community_report',
+            index=models.Index(fields=['route', 'created_at'], name='report_route_created_idx'),
+        ),
+        migrations.RunPython(backfill_route_risk, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,12 @@ class Community_Report(models.Model):
     severity = models.CharField(max_length=50) # 'High', 'Medium', 'Low'
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Báo cáo gần đây của một route; tính lại RouteRisk (xem safety/risk.py)
+            models.Index(fields=['route', 'created_at'], name='report_route_created_idx'),
+        ]
+
     def __str__(self):
         return f"Report by {self.user.email} on {self.route.name if self.route else 'N/A'}"
 
@@ -19,3 +25,18 @@ class Static_Hazard(models.Model):
 
     def __str__(self):
         return f"Hazard on {self.route.name}: {self.description}"
+
+
+class RouteRisk(models.Model):
+    """Điểm rủi ro suy giảm theo thời gian từ Community_Report, cập nhật dần (xem safety/risk.py)."""
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, primary_key=True, related_name='risk')
+    # ln Σ w(severity) * exp(t / tau), t là giây epoch của created_at
+    log_mass = models.FloatField()
+    report_count = models.IntegerField(default=0)
+    last_report_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'route_risks'
+
+    def __str__(self):
+        return f"Risk of route {self.route_id}"
@@ -0,0 +1,128 @@
+# safety/risk.py
+"""
+Điểm rủi ro "ngay lúc này" của mỗi routes.Route, tính từ Community_Report:
+
+    risk(now) = Σ w(severity_i) * exp(-(now - t_i) / tau),   tau = half-life / ln 2
+
+Không quét lại báo cáo: RouteRisk lưu log_mass = ln Σ w_i * exp(t_i / tau)
+(t_i là giây epoch). Mỗi báo cáo mới chỉ là một câu UPDATE
+    log_mass = logaddexp(log_mass, ln w + t / tau)
+viết bằng GREATEST / LN / EXP / ABS ngay trong DB: O(1) bất kể số báo cáo,
+không phụ thuộc thứ tự chèn, không tràn số và an toàn khi nhiều request ghi
+cùng lúc. Điểm hiện tại = exp(log_mass - now / tau).
+
+Sửa / xóa báo cáo (hiếm) thì tính lại route đó từ index (route, created_at).
+Đổi ROUTE_RISK_HALF_LIFE_DAYS thì chạy `manage.py rebuild_route_risk`.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+SEVERITY_WEIGHTS = {'high': 5.0, 'medium': 2.0, 'low': 1.0}
+DEFAULT_HALF_LIFE_DAYS = 7.0
+# Ngưỡng điểm -> mức rủi ro, cao -> thấp
+RISK_LEVELS = ((4.0, 'high'), (1.5, 'medium'), (0.5, 'low'))
+
+
+def severity_weight(severity):
+    return SEVERITY_WEIGHTS.get((severity or '').strip().lower(), SEVERITY_WEIGHTS['medium'])
+
+
+def decay_seconds():
+    """tau (giây): sau một half-life điểm của báo cáo còn một nửa."""
+    half_life = float(getattr(settings, 'ROUTE_RISK_HALF_LIFE_DAYS', DEFAULT_HALF_LIFE_DAYS))
+    return half_life * 86400 / math.log(2)
+
+
+def report_term(severity, created_at):
+    """ln(w * exp(t / tau)) của một báo cáo."""
+    return math.log(severity_weight(severity)) + created_at.timestamp() / decay_seconds()
+
+
+def risk_level(score):
+    for threshold, level in RISK_LEVELS:
+        if score >= threshold:
+            return level
+    return 'none'
+
+
+def record_report(route_id, severity, created_at):
+    """Cộng một báo cáo vào RouteRisk của route: một UPDATE (thêm một INSERT ở báo cáo đầu tiên)."""
+    from .models import RouteRisk
+
+    term = Value(report_term(severity, created_at), output_field=FloatField())
+    mass = F('log_mass')
+
+    def update():
+        return RouteRisk.objects.filter(route_id=route_id).update(
+            log_mass=Greatest(mass, term) + Ln(Value(1.0) + Exp(-Abs(mass - term))),
+            report_count=F('report_count') + 1,
+            last_report_at=Greatest(F('last_report_at'), Value(created_at)),
+        )
+
+    if update():
+        return
+    try:
+        with transaction.atomic():
+            RouteRisk.objects.create(route_id=route_id, log_mass=term.value, report_count=1,
+                                     last_report_at=created_at)
+    except IntegrityError:
+        # Request khác vừa tạo dòng cho route này
+        update()
+
+
+def rebuild_route_risk(route_ids=None):
+    """Tính lại RouteRisk từ toàn bộ báo cáo (của `route_ids` hoặc mọi route). Trả về số route có điểm."""
+    from .models import Community_Report, RouteRisk
+
+    reports = Community_Report.objects.filter(route__isnull=False)
+    if route_ids is not None:
+        reports = reports.filter(route_id__in=route_ids)
+    terms, last = {}, {}
+    for route_id, severity, created_at in (reports.order_by('route', 'created_at')
+                                           .values_list('route_id', 'severity', 'created_at')
+                                           .iterator(chunk_size=2000)):
+        terms.setdefault(route_id, []).append(report_term(severity, created_at))
+        last[route_id] = created_at
+
+    rows = [
+        RouteRisk(route_id=route_id, log_mass=float(np.logaddexp.reduce(values)),
+                  report_count=len(values), last_report_at=last[route_id])
+        for route_id, values in terms.items()
+    ]
+    with transaction.atomic():
+        stale = RouteRisk.objects.exclude(route_id__in=terms)
+        if route_ids is not None:
+            stale = stale.filter(route_id__in=route_ids)
+        stale.delete()
+        RouteRisk.objects.bulk_create(rows, update_conflicts=True, unique_fields=['route'],
+                                      update_fields=['log_mass', 'report_count', 'last_report_at'])
+    return len(rows)
+
+
+def current_risk(route_ids, now=None):
+    """{route_id: {'score', 'level', 'report_count', 'last_report_at'}} cho nhiều route trong một truy vấn."""
+    from .models import RouteRisk
+
+    now = now or timezone.now()
+    offset = now.timestamp() / decay_seconds()
+    found = {
+        row['route_id']: row for row in RouteRisk.objects.filter(route_id__in=route_ids)
+        .values('route_id', 'log_mass', 'report_count', 'last_report_at')
+    }
+    result = {}
+    for route_id in route_ids:
+        row = found.get(route_id)
+        score = math.exp(row['log_mass'] - offset) if row else 0.0
+        result[route_id] = {
+            'score': round(score, 4),
+            'level': risk_level(score),
+            'report_count': row['report_count'] if row else 0,
+            'last_report_at': row['last_report_at'] if row else None,
+        }
+    return result
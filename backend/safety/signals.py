@@ -0,0 +1,32 @@
+# safety/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Community_Report
+from .risk import rebuild_route_risk, record_report
+
+
+@receiver(pre_save, sender=Community_Report)
+def report_before(sender, instance, **kwargs):
+    instance._risk_before = (
+        Community_Report.objects.filter(pk=instance.pk).values_list('route_id', 'severity', 'created_at').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Community_Report)
+def report_saved(sender, instance, created, **kwargs):
+    # Cùng transaction với báo cáo: rollback thì điểm rủi ro cũng không đổi
+    if created:
+        if instance.route_id:
+            record_report(instance.route_id, instance.severity, instance.created_at)
+        return
+    before = getattr(instance, '_risk_before', None)
+    if before and before != (instance.route_id, instance.severity, instance.created_at):
+        rebuild_route_risk({route_id for route_id in (before[0], instance.route_id) if route_id})
+
+
+@receiver(post_delete, sender=Community_Report)
+def report_deleted(sender, instance, **kwargs):
+    if instance.route_id:
+        rebuild_route_risk([instance.route_id])
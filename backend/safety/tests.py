@@ -1,3 +1,228 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from plan.models import Plan, Route
+from plan.tiles import route_bounds
+from routes.models import Route as TrailRoute, Waypoint
+from routes.spatial import waypoint_index
+
+from .hazards import condition_months, evaluate_plans, refresh_danger_snapshots
+from .models import Community_Report, RouteRisk, Static_Hazard
+from .risk import current_risk, rebuild_route_risk, record_report
+from .weather import FileWeatherFeed
+
+
+User = get_user_model()
+
+
+class DangerSnapshotTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.weather_file = os.path.join(directory.name, 'weather.json')
+        overrides = override_settings(WEATHER_FEED='file', WEATHER_FEED_FILE=self.weather_file)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        route_bounds.invalidate()
+        waypoint_index.invalidate()
+
+        self.today = timezone.localdate()
+        self.user = User.objects.create_user(email='trekker@example.com', password='password123')
+        path = [[22.0 + i * 0.001, 103.5] for i in range(100)]
+        self.route = Route.objects.create(name="Pu Ta Leng", description="", total_distance_km=11,
+                                          elevation_gain_m=1800, tags=["hard"], path_coordinates=path)
+        self.trail = TrailRoute.objects.create(name="Pu Ta Leng trail", total_distance_km=11, elevation_gain_m=1800)
+        Waypoint.objects.create(route=self.trail, name='Lán 2', type='CAMPSITE', latitude=22.05, longitude=103.503)
+        Static_Hazard.objects.create(route=self.trail, description='Suối lũ', condition='Mùa mưa')
+        Static_Hazard.objects.create(route=self.trail, description='Vực sâu', condition='')
+
+        # Một trail khác, xa route: hazard của nó không được tính
+        far = TrailRoute.objects.create(name="Tà Xùa trail", total_distance_km=9, elevation_gain_m=900)
+        Waypoint.objects.create(route=far, name='Mỏm cá heo', type='VIEWPOINT', latitude=21.3, longitude=104.4)
+        Static_Hazard.objects.create(route=far, description='Sống lưng khủng long', condition='')
+
+        for severity in ('High', 'high'):
+            Community_Report.objects.create(user=self.user, route=self.trail, report_content='Sạt lở',
+                                            severity=severity)
+        old = Community_Report.objects.create(user=self.user, route=self.trail, report_content='Cũ',
+                                              severity='Low')
+        Community_Report.objects.filter(pk=old.pk).update(created_at=timezone.now() - datetime.timedelta(days=90))
+
+        self.plan = self.make_plan(self.today + datetime.timedelta(days=2), 3)
+
+    def make_plan(self, start_date, days, route=None):
+        return Plan.objects.create(
+            user=self.user, route=route or self.route, name="Pu Ta Leng", location="Lai Châu",
+            rest_type="Lều", group_size=4, start_date=start_date, duration_days=days, difficulty="hard",
+        )
+
+    def write_weather(self, rain_mm):
+        day = (self.today + datetime.timedelta(days=3)).isoformat()
+        with open(self.weather_file, 'w', encoding='utf-8') as handle:
+            json.dump({'cells': [{'latitude': 22.0, 'longitude': 103.5, 'daily': {
+                day: {'precipitation_sum': rain_mm, 'windspeed_max': 12, 'temperature_max': 24,
+                      'temperature_min': 14},
+            }}]}, handle)
+        # mtime có thể không đổi trong cùng một giây
+        os.utime(self.weather_file, (rain_mm, rain_mm))
+
+    def test_condition_months(self):
+        self.assertEqual(condition_months('Mùa mưa (tháng 5-10)'), {5, 6, 7, 8, 9, 10})
+        self.assertEqual(condition_months('Mùa đông'), {12, 1, 2})
+        self.assertIsNone(condition_months(''))
+
+    def test_snapshot_joins_hazards_reports_and_weather(self):
+        self.write_weather(35)
+        snapshot = evaluate_plans([self.plan])[self.plan.pk]
+
+        by_source = {}
+        for danger in snapshot['dangers']:
+            by_source.setdefault(danger['source'], []).append(danger)
+        self.assertIn('Vực sâu', [d['name'] for d in by_source['static']])
+        self.assertNotIn('Sống lưng khủng long', [d['name'] for d in by_source['static']])
+        self.assertEqual([(d['severity'], d['count']) for d in by_source['community']], [('high', 2)])
+        self.assertTrue(snapshot['heavy_rain'])
+        self.assertIn('35 mm', by_source['weather'][0]['description'])
+        self.assertEqual(snapshot['level'], 'high')
+        self.assertTrue(snapshot['weather_available'])
+
+    def test_static_hazards_follow_trip_season(self):
+        july = self.make_plan(datetime.date(self.today.year + 2, 7, 10), 3)
+        december = self.make_plan(datetime.date(self.today.year + 2, 12, 10), 3)
+        snapshots = evaluate_plans([july, december])
+
+        def static(plan):
+            return {d['name'] for d in snapshots[plan.pk]['dangers'] if d['source'] == 'static'}
+        self.assertEqual(static(july), {'Suối lũ', 'Vực sâu'})
+        self.assertEqual(static(december), {'Vực sâu'})
+        self.assertFalse(snapshots[july.pk]['weather_available'])  # ngoài tầm dự báo
+
+    def test_refresh_only_writes_changed_plans(self):
+        other_route = Route.objects.create(name="Lảo Thẩn", description="", total_distance_km=8,
+                                           elevation_gain_m=900, tags=[], path_coordinates=[[10.1, 106.1], [10.2, 106.1]])
+        other = self.make_plan(self.today + datetime.timedelta(days=5), 2, route=other_route)
+        ended = self.make_plan(self.today - datetime.timedelta(days=10), 2)
+        self.write_weather(5)
+
+        self.assertEqual(refresh_danger_snapshots(batch_size=1), (2, 2))
+        self.assertEqual(refresh_danger_snapshots(), (2, 0))
+        ended.refresh_from_db()
+        self.assertIsNone(ended.dangers_snapshot)
+
+        # Dự báo mưa lớn chỉ đổi đầu vào của plan trên Pu Ta Leng
+        self.write_weather(40)
+        before = Plan.objects.get(pk=other.pk).dangers_snapshot
+        self.assertEqual(refresh_danger_snapshots(feed=FileWeatherFeed()), (2, 1))
+        self.plan.refresh_from_db()
+        self.assertTrue(self.plan.dangers_snapshot['heavy_rain'])
+        self.assertEqual(Plan.objects.get(pk=other.pk).dangers_snapshot, before)
+
+    def test_refresh_skips_plans_with_unchanged_inputs(self):
+        class CountingFeed(FileWeatherFeed):
+            calls = 0
+
+            def forecast(self, locations):
+                self.calls += 1
+                return super().forecast(locations)
+
+        # Ngoài tầm dự báo: không cần gọi nguồn thời tiết
+        Plan.objects.filter(pk=self.plan.pk).update(start_date=self.today + datetime.timedelta(days=40))
+        feed = CountingFeed()
+        self.assertEqual(refresh_danger_snapshots(feed=feed), (1, 1))
+        Plan.objects.filter(pk=self.plan.pk).update(
+            dangers_snapshot={**Plan.objects.get(pk=self.plan.pk).dangers_snapshot, 'evaluated_at': 'stale'})
+
+        self.assertEqual(refresh_danger_snapshots(feed=feed), (1, 0))
+        self.assertEqual(feed.calls, 0)
+        self.assertEqual(Plan.objects.get(pk=self.plan.pk).dangers_snapshot['evaluated_at'], 'stale')
+
+        # Đổi một hàng Static_Hazard là đổi đầu vào
+        Static_Hazard.objects.filter(description='Vực sâu').update(condition='Mùa khô')
+        self.assertEqual(refresh_danger_snapshots(feed=feed), (1, 1))
+        self.assertNotEqual(Plan.objects.get(pk=self.plan.pk).dangers_snapshot['evaluated_at'], 'stale')
+
+    def test_plan_endpoint_refreshes_snapshot(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('plan-dangers', args=[self.plan.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.dangers_snapshot['inputs_hash'], response.data['inputs_hash'])
+        self.assertEqual(self.plan.dangers_snapshot['source'], 'backend')
+
+
+class RouteRiskTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reporter@example.com', password='password123')
+        self.trail = TrailRoute.objects.create(name="Fansipan", total_distance_km=11, elevation_gain_m=1900)
+        self.other = TrailRoute.objects.create(name="Lảo Thẩn", total_distance_km=8, elevation_gain_m=900)
+
+    def report(self, severity, route=None):
+        return Community_Report.objects.create(user=self.user, route=route or self.trail,
+                                               report_content='Sạt lở', severity=severity)
+
+    @override_settings(ROUTE_RISK_HALF_LIFE_DAYS=7)
+    def test_score_decays_with_half_life(self):
+        now = timezone.now()
+        # Chèn lệch thứ tự thời gian: kết quả không phụ thuộc thứ tự
+        record_report(self.other.pk, 'Low', now - datetime.timedelta(days=7))
+        record_report(self.other.pk, 'High', now - datetime.timedelta(days=14))
+        record_report(self.other.pk, 'Medium', now)
+        risk = current_risk([self.other.pk], now=now)[self.other.pk]
+        self.assertAlmostEqual(risk['score'], 1 * 0.5 + 5 * 0.25 + 2, places=3)
+        self.assertEqual(risk['level'], 'medium')
+        self.assertEqual(risk['report_count'], 3)
+        later = current_risk([self.other.pk], now=now + datetime.timedelta(days=7))[self.other.pk]
+        self.assertAlmostEqual(later['score'], risk['score'] / 2, places=3)
+
+    def test_insert_cost_does_not_grow_with_report_volume(self):
+        self.report('High')
+        with CaptureQueriesContext(connection) as few:
+            self.report('Low')
+        for _ in range(50):
+            self.report('Medium')
+        with CaptureQueriesContext(connection) as many:
+            self.report('Low')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(RouteRisk.objects.get(route=self.trail).report_count, 53)
+
+    def test_incremental_score_matches_rebuild(self):
+        for severity in ('High', 'low', 'Medium', 'không rõ'):
+            self.report(severity)
+        incremental = current_risk([self.trail.pk])[self.trail.pk]['score']
+        RouteRisk.objects.all().delete()
+        self.assertEqual(rebuild_route_risk(), 1)
+        self.assertAlmostEqual(current_risk([self.trail.pk])[self.trail.pk]['score'], incremental, places=3)
+        self.assertAlmostEqual(incremental, 5 + 1 + 2 + 2, delta=0.01)
+
+    def test_edit_and_delete_recompute_route(self):
+        report = self.report('High')
+        report.route = self.other
+        report.save()
+        risks = current_risk([self.trail.pk, self.other.pk])
+        self.assertEqual(risks[self.trail.pk]['score'], 0.0)
+        self.assertAlmostEqual(risks[self.other.pk]['score'], 5.0, places=2)
+        report.delete()
+        self.assertFalse(RouteRisk.objects.exists())
+
+    def test_batch_endpoint_uses_one_query(self):
+        self.report('High')
+        self.report('Low', route=self.other)
+        url = reverse('route-risk-batch')
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {'route_ids': [self.trail.pk, self.other.pk, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['route_id'], row['level']) for row in response.data],
+                         [(self.trail.pk, 'high'), (self.other.pk, 'low'), (999999, 'none')])
+        self.assertEqual(self.client.post(url, {'route_ids': 'all'}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
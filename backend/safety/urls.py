@@ -0,0 +1,8 @@
+# safety/urls.py
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # /api/route-risk/ (POST, điểm rủi ro hiện tại của nhiều route, xem safety/risk.py)
+    path('route-risk/', views.RouteRiskBatchView.as_view(), name='route-risk-batch'),
+]
@@ -1,3 +1,28 @@
-from django.shortcuts import render
+# safety/views.py
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .risk import current_risk
+
+
+# Tương ứng: POST /api/route-risk/  {"route_ids": [1, 2, 3]}
+class RouteRiskBatchView(APIView):
+    """
+    Điểm rủi ro hiện tại (báo cáo cộng đồng, suy giảm theo thời gian) của
+    nhiều routes.Route trong một truy vấn (xem safety/risk.py).
+    """
+    permission_classes = [permissions.AllowAny]
+    max_route_ids = 500
+
+    def post(self, request):
+        route_ids = request.data.get('route_ids')
+        if (not isinstance(route_ids, list) or not route_ids
+                or not all(isinstance(route_id, int) for route_id in route_ids)):
+            raise ValidationError({'route_ids': 'Phải là danh sách id (số nguyên).'})
+        if len(route_ids) > self.max_route_ids:
+            raise ValidationError({'route_ids': f'Tối đa {self.max_route_ids} id mỗi lần gọi.'})
+
+        risks = current_risk(list(dict.fromkeys(route_ids)))
+        return Response([{'route_id': route_id, **risks[route_id]} for route_id in risks])
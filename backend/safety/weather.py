@@ -0,0 +1,152 @@
+# safety/weather.py
+"""
+Nguồn dự báo thời tiết cho bộ đánh giá nguy hiểm (safety/hazards.py).
+
+Mọi nguồn có cùng giao diện, nhận cả lô vị trí một lần:
+
+    feed.forecast([(key, lat, lng, start_date, end_date), ...])
+        -> {key: {'2026-11-01': {'temperature_max': .., 'temperature_min': ..,
+                                  'precipitation_sum': .., 'windspeed_max': ..}, ...}}
+
+Vị trí không có dữ liệu thì không có trong kết quả.
+- 'file'       : file JSON cục bộ (WEATHER_FEED_FILE), dùng khi dev / test
+                 hoặc khi đã tải sẵn dự báo bằng job khác.
+- 'open_meteo' : api.open-meteo.com (nguồn app Flutter đang gọi), mọi vị
+                 trí trong một request.
+- ''           : không có nguồn thời tiết.
+"""
+import datetime
+import json
+import logging
+import os
+
+import numpy as np
+import requests
+from django.conf import settings
+
+from routes.spatial import haversine_km
+
+logger = logging.getLogger(__name__)
+
+DAILY_FIELDS = ('temperature_max', 'temperature_min', 'precipitation_sum', 'windspeed_max')
+
+
+class NullWeatherFeed:
+    def forecast(self, locations):
+        return {}
+
+
+class FileWeatherFeed:
+    """
+    File JSON dạng:
+        {"cells": [{"latitude": 22.3, "longitude": 103.8,
+                    "daily": {"2026-11-01": {"precipitation_sum": 32, ...}}}]}
+    Mỗi vị trí lấy ô gần nhất trong phạm vi max_distance_km. File được đọc lại khi mtime đổi.
+    """
+
+    def __init__(self, path=None, max_distance_km=50.0):
+        self._path = path
+        self.max_distance_km = max_distance_km
+        self._loaded = (None, None)  # ((path, mtime), cells)
+
+    @property
+    def path(self):
+        return self._path or getattr(settings, 'WEATHER_FEED_FILE', '')
+
+    def _cells(self):
+        path = self.path
+        if not path or not os.path.exists(path):
+            return []
+        mtime = os.path.getmtime(path)
+        if self._loaded[0] != (path, mtime):
+            with open(path, encoding='utf-8') as handle:
+                cells = json.load(handle).get('cells', [])
+            self._loaded = ((path, mtime), cells)
+        return self._loaded[1]
+
+    def forecast(self, locations):
+        cells = self._cells()
+        if not cells or not locations:
+            return {}
+        lat = np.array([cell['latitude'] for cell in cells], dtype=np.float64)
+        lng = np.array([cell['longitude'] for cell in cells], dtype=np.float64)
+
+        result = {}
+        for key, point_lat, point_lng, start, end in locations:
+            distances = haversine_km(point_lat, point_lng, lat, lng)
+            nearest = int(distances.argmin())
+            if distances[nearest] > self.max_distance_km:
+                continue
+            daily = cells[nearest].get('daily', {})
+            days = {day: daily[day] for day in _date_range(start, end) if day in daily}
+            if days:
+                result[key] = days
+        return result
+
+
+class OpenMeteoWeatherFeed:
+    """Open-Meteo nhận nhiều tọa độ trong một request (latitude=a,b&longitude=c,d)."""
+    url = 'https://api.open-meteo.com/v1/forecast'
+    max_locations = 100
+    timeout = 15
+
+    def forecast(self, locations):
+        result = {}
+        for offset in range(0, len(locations), self.max_locations):
+            chunk = locations[offset:offset + self.max_locations]
+            try:
+                result.update(self._fetch(chunk))
+            except (requests.RequestException, ValueError, KeyError) as exc:
+                logger.warning('Open-Meteo: bỏ qua %d vị trí (%s)', len(chunk), exc)
+        return result
+
+    def _fetch(self, chunk):
+        start = min(item[3] for item in chunk)
+        end = max(item[4] for item in chunk)
+        response = requests.get(self.url, timeout=self.timeout, params={
+            'latitude': ','.join(f'{item[1]:.4f}' for item in chunk),
+            'longitude': ','.join(f'{item[2]:.4f}' for item in chunk),
+            'daily': 'temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max',
+            'timezone': 'Asia/Ho_Chi_Minh',
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+        })
+        response.raise_for_status()
+        payload = response.json()
+        if isinstance(payload, dict):  # một vị trí -> object thay vì list
+            payload = [payload]
+
+        result = {}
+        for (key, _, _, item_start, item_end), location in zip(chunk, payload):
+            daily = location['daily']
+            wanted = set(_date_range(item_start, item_end))
+            days = {
+                day: dict(zip(DAILY_FIELDS, values))
+                for day, *values in zip(daily['time'], daily['temperature_2m_max'],
+                                        daily['temperature_2m_min'], daily['precipitation_sum'],
+                                        daily['windspeed_10m_max'])
+                if day in wanted
+            }
+            if days:
+                result[key] = days
+        return result
+
+
+def _date_range(start, end):
+    days = (end - start).days
+    return [(start + datetime.timedelta(days=offset)).isoformat() for offset in range(max(days, 0) + 1)]
+
+
+WEATHER_FEEDS = {
+    '': NullWeatherFeed(),
+    'file': FileWeatherFeed(),
+    'open_meteo': OpenMeteoWeatherFeed(),
+}
+
+
+def weather_feed(name=None):
+    name = getattr(settings, 'WEATHER_FEED', 'file') if name is None else name
+    try:
+        return WEATHER_FEEDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown WEATHER_FEED: {name!r}")
@@ -0,0 +1,85 @@
+# trek_guide_project/hosts.py
+"""
+ALLOWED_HOSTS không dò IP mạng lúc import settings.
+
+Trước đây settings mở socket UDP tới 8.8.8.8 ngay khi import để lấy IP LAN,
+nên mọi lệnh manage.py, mỗi lần boot worker và mỗi lần chạy test đều phải
+chờ (trên máy offline có thể treo). Giờ:
+- ALLOWED_HOSTS (env, phân tách bằng dấu phẩy) được dùng nguyên văn, không dò gì.
+- Nếu không có, dùng danh sách mặc định; IP LAN chỉ được dò (và thêm vào
+  ALLOWED_HOSTS) khi có request đầu tiên với Host chưa được phép, trong
+  HostIPMiddleware, và được nhớ lại. manage.py, boot worker và test không dò.
+- HOST_IP (env) bỏ qua việc dò; DETECT_HOST_IP=False tắt hẳn.
+"""
+import functools
+import logging
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def detect_host_ip():
+    ip = os.getenv('HOST_IP')
+    if ip:
+        return ip
+    try:
+        # Kết nối UDP "giả" tới Google DNS (không gửi gói tin nào) để biết card
+        # mạng nào đang ra internet. Chính xác hơn gethostname().
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(0.5)
+            s.connect(('8.8.8.8', 80))
+            ip = s.getsockname()[0]
+    except OSError:
+        ip = '127.0.0.1'
+    logger.info("DETECTED SYSTEM IP: %s", ip)
+    return ip
+
+
+def allowed_hosts(defaults):
+    """ALLOWED_HOSTS (env) nếu có, không thì danh sách mặc định; IP LAN do HostIPMiddleware thêm sau."""
+    configured = os.getenv('ALLOWED_HOSTS')
+    if configured:
+        return [host.strip() for host in configured.split(',') if host.strip()]
+    return list(defaults)
+
+
+def detect_host_ip_enabled():
+    return not os.getenv('ALLOWED_HOSTS') and os.getenv('DETECT_HOST_IP', 'True') != 'False'
+
+
+class HostIPMiddleware:
+    """
+    Thêm IP LAN vào settings.ALLOWED_HOSTS ở request đầu tiên có Host chưa
+    được phép (vd. điện thoại gọi http://192.168.1.10:8000). Request với
+    Host đã có trong danh sách (localhost, testserver...) không bao giờ dò.
+    Phải đứng đầu MIDDLEWARE, trước mọi chỗ gọi request.get_host().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'DETECT_HOST_IP', False)
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        if self.enabled:
+            self._allow_host_ip(request)
+        return self.get_response(request)
+
+    def _allow_host_ip(self, request):
+        domain, _ = split_domain_port(request._get_raw_host())
+        if not domain or validate_host(domain, settings.ALLOWED_HOSTS):
+            return
+        with self._lock:
+            if not self.enabled:
+                return
+            ip = detect_host_ip()
+            # settings.ALLOWED_HOSTS có thể đã bị thay (vd. test runner thêm 'testserver'): đọc lại
+            if ip not in settings.ALLOWED_HOSTS:
+                settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, ip]
+            self.enabled = False
@@ -0,0 +1,17 @@
+# trek_guide_project/params.py
+"""Đọc tham số query / body dùng chung cho view của các app."""
+from rest_framework.exceptions import ValidationError
+
+
+def positive_int(params, name, default=None, maximum=None):
+    """Số nguyên >= 1 (bị chặn ở maximum nếu có); thiếu hoặc rỗng -> default."""
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Phải là số nguyên dương.'})
+    if value < 1:
+        raise ValidationError({name: 'Phải là số nguyên dương.'})
+    return min(value, maximum) if maximum else value
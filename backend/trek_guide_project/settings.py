@@ -11,11 +11,12 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
 from dotenv import load_dotenv
-import socket
 import urllib.parse as urlparse
-import logging
+
+from .hosts import allowed_hosts, detect_host_ip_enabled
 
 # Prefer loading a repo-level .env (one central file). If not present, fall back to default
 # location resolution used by python-dotenv.
@@ -43,24 +44,10 @@ if not SECRET_KEY:
 
 DEBUG = os.getenv('DEBUG') == 'True'
 
-def get_host_ip():
-    try:
-        # Tạo một kết nối giả đến Google DNS (8.8.8.8) để xác định IP mạng LAN
-        # Cách này chính xác hơn gethostname() vì nó chọn đúng card mạng đang có internet
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(('8.8.8.8', 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return '127.0.0.1'
-
-HOST_IP = get_host_ip()
-
-# Log detected host IP instead of printing to stdout
-logging.getLogger(__name__).info("DETECTED SYSTEM IP: %s", HOST_IP)
-
-ALLOWED_HOSTS = ['10.0.2.2', 'localhost', '127.0.0.1', HOST_IP]
+# Host IP LAN được HostIPMiddleware dò lười ở request đầu tiên có Host lạ
+# (xem trek_guide_project/hosts.py); đặt ALLOWED_HOSTS hoặc HOST_IP trong .env để bỏ qua việc dò.
+ALLOWED_HOSTS = allowed_hosts(['10.0.2.2', 'localhost', '127.0.0.1'])
+DETECT_HOST_IP = detect_host_ip_enabled()
 # ---------------------------------
 
 
@@ -84,10 +71,12 @@ INSTALLED_APPS = [
     'routes',
     'plan',
     'safety',
+    'llm',
 
 ]
 
 MIDDLEWARE = [
+    'trek_guide_project.hosts.HostIPMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -156,9 +145,102 @@ else:
             'PORT': os.getenv('DB_PORT', '5432'),
         }
     }
+
+# Chiến lược kết nối DB, chọn bằng DB_CONN_MODE:
+# - persistent (mặc định): giữ kết nối DB_CONN_MAX_AGE giây và kiểm tra còn sống
+#   trước khi dùng lại, tránh bắt tay TLS tới Supabase ở mỗi request
+# - pool: pool native của psycopg3 (cần `pip install "psycopg[binary,pool]"`),
+#   kích thước DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE, chờ tối đa DB_POOL_TIMEOUT giây
+# - pgbouncer: đi qua PgBouncer / Supabase pooler ở transaction mode: tắt
+#   server-side cursor và prepared statement (không sống qua các transaction)
+# - none: mở kết nối mới cho mỗi request (hành vi cũ)
+DB_CONN_MODE = os.getenv('DB_CONN_MODE', 'persistent')
+
+
+def configure_db_connections(database, mode):
+    options = database.setdefault('OPTIONS', {})
+    if mode == 'persistent':
+        database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+        database['CONN_HEALTH_CHECKS'] = True
+    elif mode == 'pool':
+        # Django yêu cầu CONN_MAX_AGE = 0 khi bật pool; pool tự giữ kết nối
+        database['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }
+    elif mode == 'pgbouncer':
+        # Kết nối tới PgBouncer rẻ nên vẫn giữ lại; server thật do PgBouncer cấp theo transaction
+        database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+        database['CONN_HEALTH_CHECKS'] = True
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if importlib.util.find_spec('psycopg'):
+            # psycopg3 tự prepare câu lệnh lặp lại; psycopg2 thì không
+            options['prepare_threshold'] = None
+    elif mode == 'none':
+        database['CONN_MAX_AGE'] = 0
+    else:
+        raise RuntimeError(f"Unknown DB_CONN_MODE {mode!r}: use persistent, pool, pgbouncer or none.")
+
+
+configure_db_connections(DATABASES['default'], DB_CONN_MODE)
+
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
+# Route suggestion filtering strategy (see plan/suggestions.py):
+# 'index' (in-memory tag index) or 'database' (GIN-indexed JSONB queries)
+ROUTE_SUGGESTION_BACKEND = os.getenv('ROUTE_SUGGESTION_BACKEND', 'index')
+
+# Waypoint spatial queries (see routes/spatial.py): 'index' (in-memory grid),
+# 'database' (B-tree bbox filter) or 'postgis' (GiST geography index, needs PostGIS)
+WAYPOINT_SPATIAL_BACKEND = os.getenv('WAYPOINT_SPATIAL_BACKEND', 'index')
+
+# Local foot-routing graph built from OSM extracts (see routes/routing.py, build_trail_graph)
+TRAIL_GRAPH_DIR = os.getenv('TRAIL_GRAPH_DIR', str(BASE_DIR / 'data' / 'trail_graph'))
+
+# Local DEM tiles (SRTM .hgt, e.g. N22E103.hgt) for route elevation profiles (see plan/elevation.py)
+DEM_TILE_DIR = os.getenv('DEM_TILE_DIR', str(BASE_DIR / 'data' / 'dem'))
+
+# Route GPS track storage (see plan/track.py): 'json' (path_coordinates only) or
+# 'binary' (also keep a RouteTrack per route and serve coordinates from it);
+# encoding 'delta_i4' (int32 micro-degree deltas) or 'f4' (absolute float32)
+ROUTE_TRACK_STORE = os.getenv('ROUTE_TRACK_STORE', 'json')
+ROUTE_TRACK_ENCODING = os.getenv('ROUTE_TRACK_ENCODING', 'delta_i4')
+
+# Vector tile cache (see plan/tiles.py): directory of z/x/y.mvt files shared by
+# workers ('' disables the disk cache) in front of a per-process LRU
+TILE_CACHE_DIR = os.getenv('TILE_CACHE_DIR', str(BASE_DIR / 'data' / 'tiles'))
+TILE_MEMORY_CACHE_SIZE = int(os.getenv('TILE_MEMORY_CACHE_SIZE', '512'))
+TILE_MEMORY_CACHE_TTL = int(os.getenv('TILE_MEMORY_CACHE_TTL', '60'))
+
+# Offline plan bundles (MBTiles/SQLite, see plan/bundle.py), cached by content hash
+BUNDLE_CACHE_DIR = os.getenv('BUNDLE_CACHE_DIR', str(BASE_DIR / 'data' / 'bundles'))
+
+# Weather feed for plan danger snapshots (see safety/weather.py): 'file' (local JSON stand-in),
+# 'open_meteo' or '' (none); refreshed by `manage.py refresh_danger_snapshots`
+WEATHER_FEED = os.getenv('WEATHER_FEED', 'file')
+WEATHER_FEED_FILE = os.getenv('WEATHER_FEED_FILE', str(BASE_DIR / 'data' / 'weather.json'))
+
+# Half-life of a community report in the per-route risk score (see safety/risk.py);
+# run `manage.py rebuild_route_risk` after changing it
+ROUTE_RISK_HALF_LIFE_DAYS = float(os.getenv('ROUTE_RISK_HALF_LIFE_DAYS', '7'))
+
+# Server-side LLM gateway (see llm/gateway.py): provider 'gemini' or 'fake' (local, no network);
+# responses are shared across users by normalised input for LLM_CACHE_TTL_HOURS
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini' if GEMINI_API_KEY else 'fake')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-flash-latest')
+LLM_TIMEOUT = int(os.getenv('LLM_TIMEOUT', '30'))
+LLM_CACHE_TTL_HOURS = float(os.getenv('LLM_CACHE_TTL_HOURS', '168'))
+
+# Image search used by `manage.py crawl_images` (see plan/images.py): 'duckduckgo'
+# (needs the duckduckgo_search package) or 'fake' (local, no network); requests
+# from all crawl workers share one limit of IMAGE_CRAWL_RATE per second
+IMAGE_SEARCH_PROVIDER = os.getenv('IMAGE_SEARCH_PROVIDER', 'duckduckgo')
+IMAGE_CRAWL_RATE = float(os.getenv('IMAGE_CRAWL_RATE', '0.5'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
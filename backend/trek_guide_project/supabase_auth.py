@@ -1,12 +1,269 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
 import os
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connections
 from rest_framework.authentication import BaseAuthentication
 from rest_framework import exceptions
 
 User = get_user_model()
 
 
+def fetch_jwks(url):
+    """Tải JWKS (dict) từ Supabase. Test thay hàm này bằng JWKS cục bộ."""
+    return jwt.PyJWKClient(url, cache_jwk_set=False).fetch_data()
+
+
+class JWKSCache:
+    """
+    Cache khóa công khai JWKS dùng chung cho cả process.
+    - Giữ bộ khóa trong `ttl` giây rồi mới tải lại.
+    - Gặp `kid` lạ (Supabase xoay khóa) thì tải lại ngay, nhưng không quá
+      một lần mỗi `min_refresh_interval` giây để token rác không gây bão request.
+    """
+
+    def __init__(self, ttl=3600, min_refresh_interval=30, fetcher=fetch_jwks):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        self._keys = {}  # url -> {kid: PyJWK}
+        self._fetched_at = {}  # url -> monotonic time
+
+    def _refresh(self, url):
+        jwk_set = jwt.PyJWKSet.from_dict(self.fetcher(url))
+        self._keys[url] = {key.key_id: key for key in jwk_set.keys}
+        self._fetched_at[url] = time.monotonic()
+
+    def get_signing_key(self, url, kid):
+        with self._lock:
+            fetched_at = self._fetched_at.get(url)
+            age = time.monotonic() - fetched_at if fetched_at is not None else None
+            if age is None or age > self.ttl:
+                self._refresh(url)
+            elif kid not in self._keys[url] and age > self.min_refresh_interval:
+                self._refresh(url)
+
+            key = self._keys[url].get(kid)
+            if key is None:
+                raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+            return key.key
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._fetched_at.clear()
+
+
+class VerifiedTokenCache:
+    """
+    LRU giới hạn: sha256(token) -> claims đã xác thực, giữ tới khi token
+    hết hạn (`exp`). Token không có `exp` chỉ được giữ `max_age` giây.
+    """
+
+    def __init__(self, max_size=1024, max_age=300):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (claims, expires_at)
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return claims
+
+    def set(self, token, claims):
+        exp = claims.get('exp')
+        expires_at = exp if isinstance(exp, (int, float)) else time.time() + self.max_age
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (claims, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+jwks_cache = JWKSCache(
+    ttl=int(os.getenv('SUPABASE_JWKS_TTL', '3600')),
+)
+verified_tokens = VerifiedTokenCache(
+    max_size=int(os.getenv('SUPABASE_TOKEN_CACHE_SIZE', '1024')),
+)
+
+
+class UserResolver:
+    """
+    email -> user cho SupabaseJWTAuthentication mà không ghi DB mỗi request.
+    - LRU trong process giữ ảnh chụp vài cột của user trong `ttl` giây;
+      lượt truy cập "ấm" không tốn truy vấn nào.
+    - `shared_cache` (alias trong CACHES, vd. Redis) để các worker dùng chung.
+    - User mới được tạo bằng một câu INSERT ... ON CONFLICT (email), nên
+      nhiều request đăng nhập lần đầu cùng lúc không đụng độ nhau.
+    """
+
+    # Các cột đủ để dựng request.user; cột khác được defer (truy vấn khi cần)
+    snapshot_fields = ('id', 'email', 'full_name', 'is_active', 'is_staff', 'is_superuser')
+
+    def __init__(self, max_size=4096, ttl=300, shared_cache=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # email -> (values, expires_at)
+        # Giữ đúng thứ tự concrete field để dùng được với Model.from_db
+        self.fields = [f.attname for f in User._meta.concrete_fields if f.attname in self.snapshot_fields]
+
+    @staticmethod
+    def _shared_key(email):
+        return 'supabase-user:' + hashlib.sha256(email.encode()).hexdigest()
+
+    def _shared(self):
+        return caches[self.shared_cache] if self.shared_cache else None
+
+    def _get_local(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return values
+
+    def _set_local(self, email, values):
+        with self._lock:
+            self._entries[email] = (values, time.monotonic() + self.ttl)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, email):
+        values = User.objects.filter(email=email).values_list(*self.fields).first()
+        return values if values is not None else self._insert(email)
+
+    def _insert(self, email):
+        """Tạo user (không mật khẩu) hoặc lấy user đã có, trong một câu lệnh."""
+        db = User.objects.db
+        ops = connections[db].ops
+        table = ops.quote_name(User._meta.db_table)
+        returning = ', '.join(ops.quote_name(User._meta.get_field(name).column) for name in self.fields)
+        # DO UPDATE (không phải DO NOTHING) để RETURNING luôn trả về dòng,
+        # kể cả khi request khác vừa tạo cùng email.
+        sql = (
+            f'INSERT INTO {table} (email, password, full_name, is_active, is_staff, is_superuser) '
+            f'VALUES (%s, %s, %s, %s, %s, %s) '
+            f'ON CONFLICT (email) DO UPDATE SET email = EXCLUDED.email '
+            f'RETURNING {returning}'
+        )
+        with connections[db].cursor() as cursor:
+            cursor.execute(sql, [email, make_password(None), '', True, False, False])
+            return tuple(cursor.fetchone())
+
+    def resolve(self, email):
+        values = self._get_local(email)
+        if values is None:
+            shared = self._shared()
+            values = shared.get(self._shared_key(email)) if shared else None
+            if values is None:
+                values = self._load(email)
+                if shared:
+                    shared.set(self._shared_key(email), values, self.ttl)
+            self._set_local(email, values)
+        return User.from_db(User.objects.db, self.fields, values)
+
+    def forget(self, email=None, user_id=None):
+        """Bỏ cache của user (gọi khi User được lưu/xóa)."""
+        id_index = self.fields.index('id')
+        with self._lock:
+            stale = [key for key, (values, _) in self._entries.items()
+                     if key == email or values[id_index] == user_id]
+            for key in stale:
+                del self._entries[key]
+        shared = self._shared()
+        if shared:
+            shared.delete_many([self._shared_key(key) for key in {email, *stale} if key])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_resolver = UserResolver(
+    max_size=int(os.getenv('SUPABASE_USER_CACHE_SIZE', '4096')),
+    ttl=int(os.getenv('SUPABASE_USER_CACHE_TTL', '300')),
+    shared_cache=os.getenv('SUPABASE_USER_CACHE_ALIAS') or None,
+)
+
+
+def jwks_url():
+    supabase_jwks = os.getenv('SUPABASE_JWKS_URL')
+    supabase_url = os.getenv('SUPABASE_URL')
+
+    if not supabase_jwks:
+        if not supabase_url:
+            raise exceptions.AuthenticationFailed('SUPABASE_URL or SUPABASE_JWKS_URL must be set')
+        # Tự động thêm đường dẫn nếu thiếu
+        supabase_jwks = f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    return supabase_jwks
+
+
+def verify_supabase_token(token):
+    """Giải mã + xác thực token, dùng lại kết quả đã xác thực nếu còn hạn."""
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
+
+    # 1. Lấy Secret từ file .env
+    supabase_secret = os.getenv('SUPABASE_JWT_SECRET')
+
+    # ƯU TIÊN: Dùng Secret với thuật toán HS256
+    if supabase_secret:
+        payload = jwt.decode(
+            token,
+            supabase_secret,
+            algorithms=["HS256"],
+            options={"verify_aud": False}  # Supabase thường không yêu cầu check audience chặt chẽ
+        )
+
+    # DỰ PHÒNG: Nếu không có Secret thì dùng RS256 / JWKS (khóa đã cache)
+    else:
+        kid = jwt.get_unverified_header(token).get('kid')
+        signing_key = jwks_cache.get_signing_key(jwks_url(), kid)
+        payload = jwt.decode(
+            token,
+            signing_key,
+            algorithms=["RS256"],
+            options={"verify_aud": False}
+        )
+
+    verified_tokens.set(token, payload)
+    return payload
+
+
 class SupabaseJWTAuthentication(BaseAuthentication):
     """
     Authenticate requests using Supabase-issued JWTs.
@@ -20,55 +277,20 @@ class SupabaseJWTAuthentication(BaseAuthentication):
 
         token = auth.split(' ', 1)[1].strip()
 
-        # 1. Lấy Secret từ file .env (Cái bạn vừa thêm)
-        supabase_secret = os.getenv('SUPABASE_JWT_SECRET')
-
         try:
-            # ƯU TIÊN: Dùng Secret với thuật toán HS256 (Fix lỗi hiện tại của bạn)
-            if supabase_secret:
-                payload = jwt.decode(
-                    token,
-                    supabase_secret,
-                    algorithms=["HS256"],
-                    options={"verify_aud": False}  # Supabase thường không yêu cầu check audience chặt chẽ
-                )
-
-            # DỰ PHÒNG: Nếu không có Secret thì dùng cách cũ (RS256 / JWKS)
-            else:
-                supabase_jwks = os.getenv('SUPABASE_JWKS_URL')
-                supabase_url = os.getenv('SUPABASE_URL')
-
-                if not supabase_jwks:
-                    if not supabase_url:
-                        raise exceptions.AuthenticationFailed('SUPABASE_URL or SUPABASE_JWKS_URL must be set')
-                    # Tự động thêm đường dẫn nếu thiếu
-                    supabase_jwks = f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
-
-                jwk_client = jwt.PyJWKClient(supabase_jwks)
-                signing_key = jwk_client.get_signing_key_from_jwt(token)
-                payload = jwt.decode(
-                    token,
-                    signing_key.key,
-                    algorithms=["RS256"],
-                    options={"verify_aud": False}
-                )
+            payload = verify_supabase_token(token)
 
             # 2. Xử lý logic User sau khi giải mã Token thành công
             email = payload.get('email')
             if not email:
                 raise exceptions.AuthenticationFailed('Token does not contain email')
 
-            # Tìm user trong Database Django, nếu chưa có thì tạo mới
-            user, created = User.objects.get_or_create(
-                email=email,
-                defaults={'username': email}  # Dùng email làm username
-            )
-
-            return (user, None)
+            # Tìm user (qua cache) trong Database Django, nếu chưa có thì tạo mới
+            return (user_resolver.resolve(email), None)
 
         except jwt.ExpiredSignatureError:
             raise exceptions.AuthenticationFailed('Token has expired')
         except jwt.DecodeError:
             raise exceptions.AuthenticationFailed('Error decoding token')
         except Exception as e:
-            raise exceptions.AuthenticationFailed(f'Authentication error: {str(e)}')
\ No newline at end of file
+            raise exceptions.AuthenticationFailed(f'Authentication error: {str(e)}')
@@ -16,9 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from plan.views import VectorTileView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
     path('api/', include('plan.urls')),
+    path('api/', include('routes.urls')),
+    path('api/', include('safety.urls')),
+    path('api/', include('llm.urls')),
+    # Vector tile cho bản đồ: /tiles/<z>/<x>/<y>.mvt
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', VectorTileView.as_view(), name='vector-tile'),
 ]
@@ -0,0 +1,17 @@
+# users/signals.py
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from trek_guide_project.supabase_auth import user_resolver
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Bỏ ảnh chụp user đã cache để request sau đọc lại từ DB
+    email, user_id = instance.email, instance.pk
+    transaction.on_commit(lambda: user_resolver.forget(email=email, user_id=user_id))
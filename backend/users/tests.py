@@ -1,3 +1,139 @@
-from django.test import TestCase
+import os
+import time
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+from trek_guide_project import supabase_auth
+
+User = get_user_model()
+
+JWKS_URL = 'https://example.supabase.co/auth/v1/.well-known/jwks.json'
+
+
+class LocalJWKS:
+    """JWKS giả lập thay cho Supabase: giữ các khóa RSA và đếm số lần bị tải."""
+
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+
+    def add_key(self, kid):
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def __call__(self, url):
+        self.fetches += 1
+        jwks = []
+        for kid, private_key in self.keys.items():
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+            jwks.append({**jwk, 'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+        return {'keys': jwks}
+
+    def token(self, kid, email='trekker@example.com', expires_in=3600):
+        claims = {'email': email, 'sub': f'sub-{email}', 'exp': int(time.time()) + expires_in}
+        return jwt.encode(claims, self.keys[kid], algorithm='RS256', headers={'kid': kid})
+
+
+class SupabaseJWKSAuthenticationTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(email='trekker@example.com', password='password123')
+        self.jwks = LocalJWKS()
+        self.jwks.add_key('key-1')
+        self.url = reverse('plan-list')
+
+        supabase_auth.jwks_cache.clear()
+        supabase_auth.verified_tokens.clear()
+        supabase_auth.user_resolver.clear()
+        patches = [
+            mock.patch.object(supabase_auth.jwks_cache, 'fetcher', self.jwks),
+            mock.patch.object(supabase_auth.jwks_cache, 'min_refresh_interval', 0),
+            mock.patch.dict(os.environ, {'SUPABASE_JWKS_URL': JWKS_URL, 'SUPABASE_JWT_SECRET': ''}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, token):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_jwks_and_verified_token_are_cached(self):
+        token = self.jwks.token('key-1')
+        with mock.patch.object(supabase_auth.jwt, 'decode', wraps=jwt.decode) as decode:
+            for _ in range(3):
+                self.assertEqual(self.get(token).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.jwks.fetches, 1)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_unknown_kid_triggers_jwks_refresh(self):
+        self.assertEqual(self.get(self.jwks.token('key-1')).status_code, status.HTTP_200_OK)
+
+        self.jwks.add_key('key-2')  # Supabase xoay khóa
+        self.assertEqual(self.get(self.jwks.token('key-2')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.jwks.fetches, 2)
+
+    def test_cached_token_is_rejected_after_exp(self):
+        token = self.jwks.token('key-1', expires_in=1)
+        self.assertEqual(self.get(token).status_code, status.HTTP_200_OK)
+
+        time.sleep(1.2)
+        response = self.get(token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn('expired', str(response.data))
+
+
+class SupabaseUserResolutionTests(APITestCase):
+    def setUp(self):
+        self.jwks = LocalJWKS()
+        self.jwks.add_key('key-1')
+        self.auth = supabase_auth.SupabaseJWTAuthentication()
+        self.factory = APIRequestFactory()
+
+        supabase_auth.jwks_cache.clear()
+        supabase_auth.verified_tokens.clear()
+        supabase_auth.user_resolver.clear()
+        patches = [
+            mock.patch.object(supabase_auth.jwks_cache, 'fetcher', self.jwks),
+            mock.patch.dict(os.environ, {'SUPABASE_JWKS_URL': JWKS_URL, 'SUPABASE_JWT_SECRET': ''}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def authenticate(self, email='trekker@example.com'):
+        token = self.jwks.token('key-1', email=email)
+        request = self.factory.get('/api/plans/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = self.auth.authenticate(request)
+        return user
+
+    def test_warm_path_makes_no_queries(self):
+        existing = User.objects.create_user(email='trekker@example.com', password='password123')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().pk, existing.pk)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.pk, user.email, user.is_authenticated), (existing.pk, existing.email, True))
+
+    def test_first_login_creates_user_once(self):
+        with self.assertNumQueries(2):  # SELECT + INSERT ... ON CONFLICT
+            user = self.authenticate('new@example.com')
+        created = User.objects.get(email='new@example.com')
+        self.assertEqual(user.pk, created.pk)
+        self.assertFalse(created.has_usable_password())
+
+        # Hai request đăng nhập lần đầu chạy song song: INSERT thứ hai không lỗi, trả cùng id
+        self.assertEqual(supabase_auth.user_resolver._insert('new@example.com')[0], created.pk)
+        self.assertEqual(User.objects.filter(email='new@example.com').count(), 1)
+
+    def test_saving_user_invalidates_cache(self):
+        existing = User.objects.create_user(email='trekker@example.com', password='password123')
+        self.authenticate()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            existing.full_name = 'Trekker'
+            existing.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().full_name, 'Trekker')